@@ -50,6 +50,7 @@ Overview of Services
     aioxmpp.DiscoClient
     aioxmpp.DiscoServer
     aioxmpp.EntityCapsService
+    aioxmpp.MAMClient
     aioxmpp.MUCClient
     aioxmpp.PingService
     aioxmpp.PresenceClient
@@ -130,6 +131,7 @@ from .ping import PingService  # NOQA
 from .pep import PEPClient  # NOQA
 from .bookmarks import BookmarkClient  # NOQA
 from .version import VersionServer  # NOQA
+from .mam import MAMClient  # NOQA
 
 
 def set_strict_mode():
@@ -47,10 +47,7 @@ Server-side
 
 .. autoclass:: AdHocServer
 
-.. currentmodule:: aioxmpp.adhoc.service
-
-..
-    .. autoclass:: ServerSession
+.. autoclass:: ServerSession
 
 XSOs
 ====
@@ -77,6 +74,7 @@ from .service import (  # NOQA
     AdHocClient,
     ClientSession,
     AdHocServer,
+    ServerSession,
 )
 
 from .xso import (  # NOQA
@@ -20,13 +20,14 @@
 #
 ########################################################################
 import asyncio
-# import base64
+import base64
 import collections
+import functools
+import heapq
 import logging
 import random
 
-# from datetime import timedelta
-
+import aioxmpp.cache
 import aioxmpp.disco
 import aioxmpp.disco.xso as disco_xso
 import aioxmpp.service
@@ -182,8 +183,10 @@ CommandEntry = collections.namedtuple(
 
 
 class CommandEntry(aioxmpp.disco.StaticNode):
-    def __init__(self, name, handler, features=set(), is_allowed=None):
+    def __init__(self, name, handler, features=set(), is_allowed=None,
+                 stateful=False):
         super().__init__()
+        self.__stateful = stateful
         if isinstance(name, str):
             self.__name = aioxmpp.structs.LanguageMap({None: name})
         else:
@@ -214,6 +217,10 @@ class CommandEntry(aioxmpp.disco.StaticNode):
     def is_allowed(self):
         return self.__is_allowed
 
+    @property
+    def is_stateful(self):
+        return self.__stateful
+
     def is_allowed_for(self, *args, **kwargs):
         if self.__is_allowed is None:
             return True
@@ -229,11 +236,45 @@ class AdHocServer(aioxmpp.service.Service, aioxmpp.disco.Node):
     """
     Support for serving Ad-Hoc commands.
 
-    .. .. automethod:: register_stateful_command
+    .. automethod:: register_stateful_command
 
     .. automethod:: register_stateless_command
 
     .. automethod:: unregister_command
+
+    The resources used by commands are limited by the following attributes,
+    which can be changed at any time:
+
+    .. attribute:: max_sessions
+
+       Maximum number of concurrent sessions of stateful commands, or
+       :data:`None` for no limit. Defaults to 256.
+
+    .. attribute:: max_sessions_per_peer
+
+       Maximum number of concurrent sessions and in-flight stateless command
+       requests per bare JID, or :data:`None` for no limit. Defaults to 16.
+
+    .. attribute:: session_timeout
+
+       Time in seconds a stateful command session may wait for the next
+       request of the peer before it expires. Defaults to 60.
+
+       Changing the value only affects sessions which start waiting for the
+       peer afterwards.
+
+    .. attribute:: executor
+
+       The :class:`concurrent.futures.Executor` used by
+       :meth:`ServerSession.run_in_executor`, or :data:`None` to use the
+       default executor of the event loop.
+
+    Requests exceeding the limits are rejected with a ``resource-constraint``
+    error without invoking the handler.
+
+    .. versionchanged:: 0.10
+
+       Stateful commands, session limits and :attr:`executor` were added.
     """
 
     ORDER_AFTER = [aioxmpp.disco.DiscoServer]
@@ -254,10 +295,31 @@ class AdHocServer(aioxmpp.service.Service, aioxmpp.disco.Node):
         self._commands = {}
         self._disco = self.dependencies[aioxmpp.disco.DiscoServer]
 
+        self.max_sessions = 256
+        self.max_sessions_per_peer = 16
+        self.session_timeout = 60
+        self.executor = None
+
+        self._sessions = {}
+        self._peer_load = collections.Counter()
+        # deadlines of the sessions waiting for the peer; the heap holds
+        # (deadline, sessionid) pairs, including stale ones of sessions which
+        # have been resumed or removed since. a single timer is armed for the
+        # earliest deadline.
+        self._idle = {}
+        self._idle_heap = []
+        self._idle_timer = None
+        self._idle_timer_deadline = None
+        self._expired_sessionids = aioxmpp.cache.LRUDict()
+        self._expired_sessionids.maxsize = 1024
+
     @aioxmpp.service.iq_handler(aioxmpp.IQType.SET,
                                 adhoc_xso.Command)
     @asyncio.coroutine
     def _handle_command(self, stanza):
+        if stanza.payload.sessionid is not None:
+            return (yield from self._handle_session_request(stanza))
+
         try:
             info = self._commands[stanza.payload.node]
         except KeyError:
@@ -273,7 +335,218 @@ class AdHocServer(aioxmpp.service.Service, aioxmpp.disco.Node):
                 (namespaces.stanzas, "forbidden"),
             )
 
-        return (yield from info.handler(stanza))
+        peer = self._peer_key(stanza.from_)
+        self._check_limits(peer, info.is_stateful)
+
+        if not info.is_stateful:
+            self._peer_load[peer] += 1
+            try:
+                return (yield from info.handler(stanza))
+            finally:
+                self._release_peer(peer)
+
+        session = ServerSession(
+            self,
+            stanza.payload.node,
+            stanza.from_,
+            stanza.payload,
+        )
+        self._sessions[session.sessionid] = session
+        self._peer_load[peer] += 1
+
+        task = asyncio.ensure_future(info.handler(session))
+        session._task = task
+        task.add_done_callback(
+            functools.partial(self._session_done, session)
+        )
+
+        return (yield from asyncio.shield(session._response_fut))
+
+    @asyncio.coroutine
+    def _handle_session_request(self, stanza):
+        request = stanza.payload
+        session = self._sessions.get(request.sessionid)
+        if (session is None or
+                session.peer_jid != stanza.from_ or
+                session.node != request.node):
+            if request.sessionid in self._expired_sessionids:
+                raise aioxmpp.errors.XMPPCancelError(
+                    (namespaces.stanzas, "not-allowed"),
+                    application_defined_condition=adhoc_xso.SessionExpired(),
+                )
+            raise aioxmpp.errors.XMPPModifyError(
+                (namespaces.stanzas, "bad-request"),
+                application_defined_condition=adhoc_xso.BadSessionID(),
+            )
+
+        if request.action == adhoc_xso.ActionType.CANCEL:
+            self._remove_session(session)
+            session._cancel()
+            return adhoc_xso.Command(
+                session.node,
+                status=adhoc_xso.CommandStatus.CANCELED,
+                sessionid=session.sessionid,
+            )
+
+        if session._request_fut is None:
+            # the handler is still busy with the previous request
+            raise aioxmpp.errors.XMPPWaitError(
+                (namespaces.stanzas, "unexpected-request"),
+            )
+
+        if request.action not in session._allowed_actions:
+            raise aioxmpp.errors.XMPPModifyError(
+                (namespaces.stanzas, "bad-request"),
+                application_defined_condition=adhoc_xso.BadAction(),
+            )
+
+        self._idle.pop(session.sessionid, None)
+        response_fut = session._deliver(request)
+        return (yield from asyncio.shield(response_fut))
+
+    def _peer_key(self, jid):
+        if jid is None:
+            jid = self.client.local_jid
+        return jid.bare()
+
+    def _check_limits(self, peer, stateful):
+        if (stateful and
+                self.max_sessions is not None and
+                len(self._sessions) >= self.max_sessions):
+            raise aioxmpp.errors.XMPPWaitError(
+                (namespaces.stanzas, "resource-constraint"),
+                text="too many command sessions",
+            )
+
+        if (self.max_sessions_per_peer is not None and
+                self._peer_load[peer] >= self.max_sessions_per_peer):
+            raise aioxmpp.errors.XMPPWaitError(
+                (namespaces.stanzas, "resource-constraint"),
+                text="too many concurrent commands",
+            )
+
+    def _release_peer(self, peer):
+        self._peer_load[peer] -= 1
+        if self._peer_load[peer] <= 0:
+            del self._peer_load[peer]
+
+    def _remove_session(self, session):
+        if self._sessions.get(session.sessionid) is not session:
+            return
+        del self._sessions[session.sessionid]
+        self._idle.pop(session.sessionid, None)
+        self._release_peer(self._peer_key(session.peer_jid))
+
+    def _session_done(self, session, task):
+        self._remove_session(session)
+
+        if task.cancelled():
+            exc = None
+        else:
+            exc = task.exception()
+
+        if not session._response_fut.done():
+            if task.cancelled():
+                session._response_fut.set_result(adhoc_xso.Command(
+                    session.node,
+                    status=adhoc_xso.CommandStatus.CANCELED,
+                    sessionid=session.sessionid,
+                ))
+            elif exc is not None:
+                session._response_fut.set_exception(exc)
+            else:
+                # the handler returned without sending a final reply
+                session._response_fut.set_result(adhoc_xso.Command(
+                    session.node,
+                    status=adhoc_xso.CommandStatus.COMPLETED,
+                    sessionid=session.sessionid,
+                ))
+        elif (exc is not None and
+              not isinstance(exc, (SessionError, TimeoutError))):
+            self.logger.error(
+                "handler of command %r failed after the last reply",
+                session.node,
+                exc_info=exc,
+            )
+
+    def _mark_idle(self, session):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.session_timeout
+        self._idle[session.sessionid] = deadline
+        heapq.heappush(self._idle_heap, (deadline, session.sessionid))
+
+        if len(self._idle_heap) > 2 * len(self._idle) + 16:
+            # drop the stale entries
+            self._idle_heap = [
+                (deadline, sessionid)
+                for sessionid, deadline in self._idle.items()
+            ]
+            heapq.heapify(self._idle_heap)
+
+        # the deadline may be earlier than the armed one if session_timeout
+        # has been lowered in the meantime
+        if (self._idle_timer is None or
+                deadline < self._idle_timer_deadline):
+            self._arm_idle_timer()
+
+    def _pop_stale_idle_entries(self):
+        heap = self._idle_heap
+        while heap and self._idle.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _arm_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+
+        self._pop_stale_idle_entries()
+        if not self._idle_heap:
+            self._idle_timer = None
+            self._idle_timer_deadline = None
+            return
+
+        deadline = self._idle_heap[0][0]
+        self._idle_timer_deadline = deadline
+        self._idle_timer = asyncio.get_event_loop().call_at(
+            deadline,
+            self._expire_idle_sessions,
+        )
+
+    def _expire_idle_sessions(self):
+        self._idle_timer = None
+        now = asyncio.get_event_loop().time()
+        while True:
+            self._pop_stale_idle_entries()
+            if not self._idle_heap:
+                break
+            deadline, sessionid = self._idle_heap[0]
+            if deadline > now:
+                break
+            heapq.heappop(self._idle_heap)
+            del self._idle[sessionid]
+
+            session = self._sessions.get(sessionid)
+            if session is None:
+                continue
+
+            self.logger.debug("command session %r of %s expired",
+                              sessionid, session.peer_jid)
+            self._expired_sessionids[sessionid] = True
+            self._remove_session(session)
+            session._expire()
+
+        self._arm_idle_timer()
+
+    @aioxmpp.service.depsignal(aioxmpp.Client, "on_stream_destroyed")
+    def _close_sessions(self, reason=None):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+            self._idle_timer_deadline = None
+
+        for session in list(self._sessions.values()):
+            self._remove_session(session)
+            session._task.cancel()
+        self._idle_heap.clear()
 
     def iter_items(self, stanza):
         local_jid = self.client.local_jid
@@ -295,51 +568,63 @@ class AdHocServer(aioxmpp.service.Service, aioxmpp.disco.Node):
                 node=node,
             )
 
-    # def register_stateful_command(self, node, name, handler, *,
-    #                               is_allowed=None,
-    #                               features={namespaces.xep0004_data}):
-    #     """
-    #     Register a handler for a stateful command.
-
-    #     :param node: Name of the command (``node`` in the service discovery
-    #                  list).
-    #     :type node: :class:`str`
-    #     :param name: Human-readable name of the command
-    #     :type name: :class:`str` or :class:`~.LanguageMap`
-    #     :param handler: Coroutine function to spawn when a new session is
-    #                     started.
-    #     :param is_allowed: A predicate which determines whether the command is
-    #                        shown and allowed for a given peer.
-    #     :type is_allowed: function or :data:`None`
-    #     :param features: Set of features to announce for the command
-    #     :type features: :class:`set` of :class:`str`
-
-    #     Whenever a new session is started, `handler` is invoked with a session
-    #     object which allows the handler to communicate with the client. The
-    #     details of the session are described at :class:`ServerSession`.
-
-    #     If `is_allowed` is not :data:`None`, it is invoked whenever a command
-    #     listing is generated and whenever a command session is about to start.
-    #     The :class:`~aioxmpp.JID` of the requester is passed as positional
-    #     argument to `is_allowed`. If `is_allowed` returns false, the command
-    #     is not included in the list and attempts to execute it are rejected
-    #     with ``<forbidden/>`` without calling `handler`.
-
-    #     If `is_allowed` is :data:`None`, the command is always visible and
-    #     allowed.
-
-    #     The `features` are returned on a service discovery info request for the
-    #     command node. By default, the :xep:`4` (Data Forms) namespace is
-    #     included, but this can be overridden by passing a different set without
-    #     that feature to `features`.
-
-    #     .. warning::
-
-    #        There is currently no rate-limiting mechanism implemented. It is
-    #        trivial for an attacker to exhaust memory by starting a huge amount
-    #        of sessions.
-
-    #     """
+    def register_stateful_command(self, node, name, handler, *,
+                                  is_allowed=None,
+                                  features={namespaces.xep0004_data}):
+        """
+        Register a handler for a stateful command.
+
+        :param node: Name of the command (``node`` in the service discovery
+                     list).
+        :type node: :class:`str`
+        :param name: Human-readable name of the command
+        :type name: :class:`str` or :class:`~.LanguageMap`
+        :param handler: Coroutine function to spawn when a new session is
+                        started.
+        :param is_allowed: A predicate which determines whether the command is
+                           shown and allowed for a given peer.
+        :type is_allowed: function or :data:`None`
+        :param features: Set of features to announce for the command
+        :type features: :class:`set` of :class:`str`
+
+        Whenever a new session is started, `handler` is invoked with a session
+        object which allows the handler to communicate with the client. The
+        details of the session are described at :class:`ServerSession`.
+
+        If `is_allowed` is not :data:`None`, it is invoked whenever a command
+        listing is generated and whenever a command session is about to start.
+        The :class:`~aioxmpp.JID` of the requester is passed as positional
+        argument to `is_allowed`. If `is_allowed` returns false, the command
+        is not included in the list and attempts to execute it are rejected
+        with ``<forbidden/>`` without calling `handler`.
+
+        If `is_allowed` is :data:`None`, the command is always visible and
+        allowed.
+
+        The `features` are returned on a service discovery info request for the
+        command node. By default, the :xep:`4` (Data Forms) namespace is
+        included, but this can be overridden by passing a different set without
+        that feature to `features`.
+
+        The number of sessions is limited by :attr:`max_sessions` and
+        :attr:`max_sessions_per_peer`, and sessions expire if the peer does not
+        continue them within :attr:`session_timeout`.
+
+        .. versionadded:: 0.10
+        """
+
+        info = CommandEntry(
+            name,
+            handler,
+            is_allowed=is_allowed,
+            features=features,
+            stateful=True,
+        )
+        self._commands[node] = info
+        self._disco.mount_node(
+            node,
+            info,
+        )
 
     def register_stateless_command(self, node, name, handler, *,
                                    is_allowed=None,
@@ -657,107 +942,216 @@ class ClientSession:
         yield from self.close()
 
 
-# class ServerSession:
-#     """
-#     Represent an Ad-Hoc Commands session on the server side.
-
-#     :param stream: The stanza stream to communicate over
-#     :type stream: :class:`~.stream.StanzaStream`
-#     :param sessionid: Session ID to use for communication
-#     :type sessionid: :class:`str` or :data:`None`
-#     :param timeout: Maximum time to wait for a follow-up from the peer
-#     :type timeout: :class:`datetime.timedelta`
-
-#     The session knows its session ID and the peer JID and keeps track of client
-#     timeouts as well as the most recent reply.
-
-#     If `sessionid` is :data:`None`, a random session ID with at least 64 bits
-#     of entropy is generated.
-#     """
-
-#     def __init__(self, stream,
-#                  sessionid=None,
-#                  timeout=timedelta(seconds=60)):
-#         super().__init__()
-#         self.stream = stream
-#         self.peer_jid = peer_jid
-#         if sessionid is None:
-#             sessionid = base64.urlsafe_b64encode(
-#                 _rng.getrandbits(64).to_bytes(
-#                     64//8,
-#                     "little"
-#                 )
-#             ).rstrip(b"=").decode("ascii")
-#         self.sessionid = sessionid
-#         self.timeout = timeout
-#         self._future = None
-
-#     @asyncio.coroutine
-#     def handle(self, stanza):
-#         pass
-
-#     @asyncio.coroutine
-#     def reply(self, payload, status,
-#               *,
-#               actions={adhoc_xso.ActionType.NEXT,
-#                        adhoc_xso.ActionType.COMPLETE},
-#               default_action=adhoc_xso.ActionType.NEXT):
-#         """
-#         Send a reply to the peer.
-
-#         :param payload: Payload to send in the reply.
-#         :type payload: :class:`~.XSO` or sequence of :class:`~.XSO`
-#         :param status: Status of the command execution.
-#         :type status: :class:`~.adhoc.CommandStatus`
-#         :param actions: Set of actions allowed now.
-#         :type actions: set of :class:`~.adhoc.xso.ActionType`
-#         :param default_action: The action to assume if the client simply
-#                                continues with
-#                                :attr:`~.adhoc.xso.ActionType.EXECUTE`.
-#         :type default_action: :class:`~.adhoc.xso.ActionType` member which is
-#                               not :attr:`~.adhoc.xso.ActionType.EXECUTE`
-#         :raise ClientCancelledError: if the client cancels the execution
-#         :raise RuntimeError: if the client has not yet sent a request
-#         :raise TimeoutError: if the client does not send a follow-up message in
-#                              time
-#         :return: The chosen action and the payload given by the peer.
-#         :rtype: Pair of :class:`~.adhoc.xso.ActionType` and sequence of
-#                 :class:`~.XSO` objects.
-
-#         Send a reply to the peer. The `payload` must be a single
-#         :class:`~.XSO` or a sequence of :class:`~.XSO` objects. A single
-#         :class:`~.XSO` is wrapped in a sequence. The sequence is used as
-#         payload for the Ad-Hoc Command response.
-
-#         `status` informs the client about the current status of execution. For
-#         all but the last reply, this should be
-#         :attr:`~.adhoc.CommandStatus.EXECUTING`, but it should be set to
-#         :attr:`~.adhoc.CommandStatus.COMPLETED` on the last reply.
-#         Unfortunately, we do not have a sensible way to infer this, which is
-#         why there is no default for this argument.
-
-#         `actions` is the set of actions allowed for the client. The default is
-#         to allow the :attr:`~.adhoc.xso.ActionType.NEXT` and
-#         :attr:`~.adhoc.xso.ActionType.COMPLETE` actions. Depending on your
-#         application, you may need a different set of actions. You do not need
-#         to specify the :attr:`~.adhoc.xso.ActionType.EXECUTE` or
-#         :attr:`~.adhoc.xso.ActionType.CANCEL` action types, which are
-#         implicitly allowed.
-
-#         `default_action` is the action which is assumed when the client simply
-#         specifies the :attr:`~.adhoc.xso.ActionType.EXECUTE` action. It
-#         defaults to :attr:`~.adhoc.xso.ActionType.NEXT` and *must* be included
-#         in the `actions` set.
-
-#         The response from the client is generally returned a as a tuple
-#         consisting of the action chosen by the client and the payload sent by
-#         the client.
-
-#         If the client chooses the :attr:`~.adhoc.xso.ActionType.CANCEL` action,
-#         a :class:`RuntimeError` exception is raised and a confirmation of
-#         cancellation is sent to the client automatically and the session is
-#         closed.
-
-#         If the client does not answer within the timeout, :class:`TimeoutError`
-#         is raised and the session is closed.
-#         """
+class ServerSession:
+    """
+    Represent an Ad-Hoc Commands session on the server side.
+
+    Sessions are created by :class:`AdHocServer` for commands registered with
+    :meth:`~AdHocServer.register_stateful_command` and passed to the command
+    handler; they are not meant to be instantiated directly.
+
+    The session knows its session ID and the peer JID and keeps track of the
+    request/reply cycle with the peer. The session ID is random with 64 bits
+    of entropy.
+
+    .. autoattribute:: node
+
+    .. autoattribute:: peer_jid
+
+    .. autoattribute:: sessionid
+
+    .. autoattribute:: first_request
+
+    .. automethod:: reply
+
+    .. automethod:: run_in_executor
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, server, node, peer_jid, request):
+        super().__init__()
+        self._server = server
+        self._node = node
+        self._peer_jid = peer_jid
+        self._first_request = request
+        self._sessionid = base64.urlsafe_b64encode(
+            _rng.getrandbits(64).to_bytes(
+                64//8,
+                "little"
+            )
+        ).rstrip(b"=").decode("ascii")
+        self._task = None
+        self._closed = False
+        # the reply to the request the handler is currently working on
+        self._response_fut = asyncio.Future()
+        # the next request of the peer, while the handler waits for it
+        self._request_fut = None
+        self._allowed_actions = frozenset()
+        self._default_action = None
+
+    @property
+    def node(self):
+        """
+        The node of the command this session executes.
+        """
+        return self._node
+
+    @property
+    def peer_jid(self):
+        """
+        The JID of the peer which started the session.
+        """
+        return self._peer_jid
+
+    @property
+    def sessionid(self):
+        """
+        The session ID of the session.
+        """
+        return self._sessionid
+
+    @property
+    def first_request(self):
+        """
+        The :class:`~.adhoc.xso.Command` payload of the request which started
+        the session.
+        """
+        return self._first_request
+
+    @asyncio.coroutine
+    def reply(self, payload, status,
+              *,
+              actions={adhoc_xso.ActionType.NEXT,
+                       adhoc_xso.ActionType.COMPLETE},
+              default_action=adhoc_xso.ActionType.NEXT,
+              notes=[]):
+        """
+        Send a reply to the peer.
+
+        :param payload: Payload to send in the reply.
+        :type payload: :class:`~.XSO` or sequence of :class:`~.XSO`
+        :param status: Status of the command execution.
+        :type status: :class:`~.adhoc.CommandStatus`
+        :param actions: Set of actions allowed now.
+        :type actions: set of :class:`~.adhoc.xso.ActionType`
+        :param default_action: The action to assume if the client simply
+                               continues with
+                               :attr:`~.adhoc.xso.ActionType.EXECUTE`.
+        :type default_action: :class:`~.adhoc.xso.ActionType` member which is
+                              not :attr:`~.adhoc.xso.ActionType.EXECUTE`
+        :param notes: Notes to include in the reply.
+        :type notes: sequence of :class:`~.adhoc.xso.Note`
+        :raise ClientCancelledError: if the client cancels the execution
+        :raise TimeoutError: if the client does not send a follow-up request
+                             within :attr:`AdHocServer.session_timeout`
+        :raise RuntimeError: if the session is already closed
+        :return: The chosen action and the payload given by the peer, or
+                 :data:`None` if `status` is not
+                 :attr:`~.adhoc.CommandStatus.EXECUTING`.
+        :rtype: Pair of :class:`~.adhoc.xso.ActionType` and sequence of
+                :class:`~.XSO` objects.
+
+        `status` informs the client about the current status of execution. For
+        all but the last reply, this must be
+        :attr:`~.adhoc.CommandStatus.EXECUTING`. Any other status ends the
+        session and makes this coroutine return :data:`None` immediately.
+
+        `actions` is the set of actions allowed for the client. The
+        :attr:`~.adhoc.xso.ActionType.EXECUTE` and
+        :attr:`~.adhoc.xso.ActionType.CANCEL` actions are always allowed.
+        Requests with other actions are rejected with ``<bad-action/>``
+        without waking up the handler. `default_action` *must* be included in
+        `actions`.
+
+        If the client chooses the :attr:`~.adhoc.xso.ActionType.CANCEL` action,
+        a confirmation of cancellation is sent to the client automatically, the
+        session is closed and :class:`ClientCancelledError` is raised.
+        """
+        if self._closed or self._response_fut.done():
+            raise RuntimeError("session is closed or not processing a request")
+
+        if payload is None:
+            payload = []
+
+        if status != adhoc_xso.CommandStatus.EXECUTING:
+            self._closed = True
+            self._server._remove_session(self)
+            self._response_fut.set_result(adhoc_xso.Command(
+                self._node,
+                status=status,
+                sessionid=self._sessionid,
+                payload=payload,
+                notes=notes,
+            ))
+            return None
+
+        if default_action not in actions:
+            raise ValueError("default_action must be one of actions")
+
+        response_actions = adhoc_xso.Actions()
+        response_actions.allowed_actions = (
+            set(actions) | {adhoc_xso.ActionType.EXECUTE,
+                            adhoc_xso.ActionType.CANCEL}
+        )
+        response_actions.execute = default_action
+
+        self._allowed_actions = response_actions.allowed_actions
+        self._default_action = default_action
+        self._request_fut = asyncio.Future()
+        request_fut = self._request_fut
+        self._response_fut.set_result(adhoc_xso.Command(
+            self._node,
+            status=status,
+            sessionid=self._sessionid,
+            payload=payload,
+            notes=notes,
+            actions=response_actions,
+        ))
+        self._server._mark_idle(self)
+
+        request = yield from request_fut
+
+        action = request.action
+        if action == adhoc_xso.ActionType.EXECUTE:
+            action = self._default_action
+        return action, list(request.payload)
+
+    @asyncio.coroutine
+    def run_in_executor(self, func, *args):
+        """
+        Run a function in the :attr:`AdHocServer.executor`.
+
+        :param func: The function to call.
+        :param args: Positional arguments for `func`.
+        :return: The return value of `func`.
+
+        Use this for CPU-heavy or blocking parts of a command handler, so that
+        other commands and stanzas keep being processed meanwhile.
+        """
+        return (yield from asyncio.get_event_loop().run_in_executor(
+            self._server.executor,
+            functools.partial(func, *args),
+        ))
+
+    def _deliver(self, request):
+        self._response_fut = asyncio.Future()
+        request_fut, self._request_fut = self._request_fut, None
+        request_fut.set_result(request)
+        return self._response_fut
+
+    def _fail_request(self, exc):
+        self._closed = True
+        if self._request_fut is not None:
+            request_fut, self._request_fut = self._request_fut, None
+            request_fut.set_exception(exc)
+            return True
+        return False
+
+    def _cancel(self):
+        if not self._fail_request(ClientCancelledError()):
+            # the handler is busy, there is nothing it waits for
+            self._task.cancel()
+
+    def _expire(self):
+        self._fail_request(TimeoutError())
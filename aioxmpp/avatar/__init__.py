@@ -57,6 +57,11 @@ avatar image:
 
 .. currentmodule:: aioxmpp.avatar
 
+Caching
+=======
+
+.. autoclass:: ImageCache
+
 Helpers
 =======
 
@@ -89,3 +94,4 @@ handle it in the application:
 
 from .service import (AvatarSet, AvatarService,  # NOQA
                       normalize_id)
+from .cache import ImageCache  # NOQA
@@ -0,0 +1,283 @@
+########################################################################
+# File name: cache.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import logging
+import os
+import pathlib
+import re
+import tempfile
+
+import aioxmpp.hashes
+
+from aioxmpp.cache import LRUDict
+
+
+logger = logging.getLogger(__name__)
+
+_ID_RE = re.compile("[0-9a-f]{40}")
+
+
+class _ByteWeightedLRUDict(LRUDict):
+    weight_func = len
+
+
+def _sha1_hexdigest(data):
+    h = aioxmpp.hashes.hash_from_algo("sha-1")
+    h.update(data)
+    return h.hexdigest()
+
+
+def _is_valid_id(id_):
+    return _ID_RE.fullmatch(id_) is not None
+
+
+class ImageCache:
+    """
+    Content-addressed cache for avatar image data.
+
+    :param max_bytes: Maximum total size of the images kept in memory.
+    :type max_bytes: :class:`int`
+    :param directory: Directory for the on-disk tier, or :data:`None` to keep
+        images only in memory.
+    :type directory: :class:`str` or :class:`pathlib.Path`
+
+    Images are keyed by the SHA-1 of their data, which is the avatar id used
+    by :xep:`84` and :xep:`153`. As the key is derived from the content,
+    contacts using the same avatar share a single cache entry. Data is only
+    stored if it actually hashes to the id it is stored under.
+
+    Avatar ids are supplied by remote entities. Ids which are not exactly 40
+    hexadecimal digits are never looked up in or stored to the cache; in
+    particular, they never touch the disk.
+
+    The memory tier evicts the least recently used images once their total
+    size exceeds `max_bytes`. If a `directory` is given, images are also
+    written to it (one file per image, named after the id) and images evicted
+    from memory are read back from there. Files which do not match their name
+    are discarded on read. The disk is accessed synchronously; avatar images
+    are expected to be small.
+
+    Concurrent requests for the same image are coalesced by :meth:`fetch`.
+
+    .. autoattribute:: max_bytes
+
+    .. autoattribute:: directory
+
+    .. automethod:: get
+
+    .. automethod:: put
+
+    .. automethod:: fetch
+
+    .. automethod:: clear
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, *, max_bytes=4*1024*1024, directory=None):
+        self._memory = _ByteWeightedLRUDict()
+        # the weight limit alone would allow an unbounded number of tiny
+        # images
+        self._memory.maxsize = 4096
+        self._memory.maxweight = max_bytes
+        if directory is not None:
+            directory = pathlib.Path(directory)
+            os.makedirs(str(directory), exist_ok=True)
+        self._directory = directory
+        self._in_flight = {}
+
+    @property
+    def max_bytes(self):
+        """
+        Maximum total size in bytes of the images kept in memory.
+        """
+        return self._memory.maxweight
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        self._memory.maxweight = value
+
+    @property
+    def directory(self):
+        """
+        The directory of the on-disk tier as :class:`pathlib.Path`, or
+        :data:`None`.
+        """
+        return self._directory
+
+    def _path(self, id_):
+        if not _is_valid_id(id_):
+            raise ValueError("invalid avatar id: {!r}".format(id_))
+        path = self._directory / id_
+        # defense in depth: the id check above already excludes separators
+        if path.resolve().parent != self._directory.resolve():
+            raise ValueError("avatar path outside of cache directory: "
+                             "{!r}".format(id_))
+        return path
+
+    def _load(self, id_):
+        path = self._path(id_)
+        try:
+            with path.open("rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise KeyError(id_) from None
+        except OSError as exc:
+            logger.warning("failed to read cached avatar %s: %s", path, exc)
+            raise KeyError(id_) from None
+
+        if _sha1_hexdigest(data) != id_:
+            logger.warning("cached avatar %s is corrupt, discarding", path)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            raise KeyError(id_)
+
+        return data
+
+    def _store(self, id_, data):
+        path = self._path(id_)
+        if path.exists():
+            return
+
+        try:
+            with tempfile.NamedTemporaryFile(dir=str(self._directory),
+                                             delete=False) as f:
+                f.write(data)
+            os.replace(f.name, str(path))
+        except OSError as exc:
+            logger.warning("failed to write avatar to %s: %s", path, exc)
+
+    def get(self, id_):
+        """
+        Return the image data for the avatar `id_`.
+
+        :param id_: The avatar id, i.e. the hex-encoded SHA-1 of the data.
+        :type id_: :class:`str`
+        :raises KeyError: if the image is not cached or `id_` is not a valid
+            avatar id.
+        :rtype: :class:`bytes`
+        """
+        id_ = id_.lower()
+        if not _is_valid_id(id_):
+            raise KeyError(id_)
+
+        try:
+            return self._memory[id_]
+        except KeyError:
+            if self._directory is None:
+                raise
+
+        data = self._load(id_)
+        self._memory[id_] = data
+        return data
+
+    def put(self, id_, data):
+        """
+        Store the image data `data` for the avatar `id_`.
+
+        :param id_: The avatar id, i.e. the hex-encoded SHA-1 of the data.
+        :type id_: :class:`str`
+        :param data: The image data.
+        :type data: :class:`bytes`
+        :return: Whether the data was stored.
+        :rtype: :class:`bool`
+
+        The data is not stored (and :data:`False` is returned) if `id_` is not
+        a valid avatar id or if the data does not hash to `id_`.
+        """
+        id_ = id_.lower()
+        if not _is_valid_id(id_):
+            logger.debug("invalid avatar id %r, not caching", id_)
+            return False
+
+        if _sha1_hexdigest(data) != id_:
+            logger.debug("avatar data does not match id %s, not caching", id_)
+            return False
+
+        self._memory[id_] = data
+        if self._directory is not None:
+            self._store(id_, data)
+        return True
+
+    @asyncio.coroutine
+    def fetch(self, id_, fetch_func):
+        """
+        Return the image data for `id_`, retrieving it if necessary.
+
+        :param id_: The avatar id, i.e. the hex-encoded SHA-1 of the data.
+        :type id_: :class:`str`
+        :param fetch_func: Coroutine function which retrieves the image data.
+        :rtype: :class:`bytes`
+
+        If the image is cached, it is returned immediately. Otherwise,
+        `fetch_func` is called without arguments and its result is stored in
+        the cache (see :meth:`put`) and returned. If a retrieval of the same
+        image is already in progress, its result is awaited instead of
+        calling `fetch_func`. Cancelling one of the waiting callers does not
+        affect the others.
+
+        If `id_` is not a valid avatar id, the cache is bypassed: the result
+        of `fetch_func` is returned without being stored.
+        """
+        id_ = id_.lower()
+        if not _is_valid_id(id_):
+            return (yield from fetch_func())
+
+        try:
+            return self.get(id_)
+        except KeyError:
+            pass
+
+        try:
+            task = self._in_flight[id_]
+        except KeyError:
+            task = asyncio.ensure_future(self._fetch(id_, fetch_func))
+            self._in_flight[id_] = task
+            task.add_done_callback(
+                lambda task: self._fetch_done(id_, task)
+            )
+
+        return (yield from asyncio.shield(task))
+
+    @asyncio.coroutine
+    def _fetch(self, id_, fetch_func):
+        data = yield from fetch_func()
+        self.put(id_, data)
+        return data
+
+    def _fetch_done(self, id_, task):
+        if self._in_flight.get(id_) is task:
+            del self._in_flight[id_]
+        if not task.cancelled():
+            # all waiters may have been cancelled; do not complain about the
+            # exception not being retrieved
+            task.exception()
+
+    def clear(self):
+        """
+        Remove all images from the memory tier.
+
+        The on-disk tier is left untouched.
+        """
+        self._memory.clear()
@@ -38,6 +38,7 @@ from aioxmpp.cache import LRUDict
 from aioxmpp.utils import namespaces, gather_reraise_multi
 
 from . import xso as avatar_xso
+from .cache import ImageCache
 
 logger = logging.getLogger(__name__)
 
@@ -366,9 +367,11 @@ class AbstractAvatarDescriptor:
 
 class PubsubAvatarDescriptor(AbstractAvatarDescriptor):
 
-    def __init__(self, remote_jid, id_, *, pubsub=None, **kwargs):
+    def __init__(self, remote_jid, id_, *, pubsub=None, image_cache=None,
+                 **kwargs):
         super().__init__(remote_jid, id_, **kwargs)
         self._pubsub = pubsub
+        self._image_cache = image_cache
 
     def __eq__(self, other):
         return (isinstance(other, PubSubAvatarDescriptor) and
@@ -380,6 +383,15 @@ class PubsubAvatarDescriptor(AbstractAvatarDescriptor):
 
     @asyncio.coroutine
     def get_image_bytes(self):
+        if self._image_cache is not None:
+            return (yield from self._image_cache.fetch(
+                self.normalized_id,
+                self._retrieve_image_bytes,
+            ))
+        return (yield from self._retrieve_image_bytes())
+
+    @asyncio.coroutine
+    def _retrieve_image_bytes(self):
         image_data = yield from self._pubsub.get_items_by_id(
             self._remote_jid,
             namespaces.xep0084_data,
@@ -405,10 +417,11 @@ class HttpAvatarDescriptor(AbstractAvatarDescriptor):
 class VCardAvatarDescriptor(AbstractAvatarDescriptor):
 
     def __init__(self, remote_jid, id_, *, vcard=None, image_bytes=None,
-                 **kwargs):
+                 image_cache=None, **kwargs):
         super().__init__(remote_jid, id_, **kwargs)
         self._vcard = vcard
         self._image_bytes = image_bytes
+        self._image_cache = image_cache
 
     def __eq__(self, other):
         # NOTE: we explicitely do *not* check for the equality of
@@ -425,6 +438,15 @@ class VCardAvatarDescriptor(AbstractAvatarDescriptor):
         if self._image_bytes is not None:
             return self._image_bytes
 
+        if self._image_cache is not None:
+            return (yield from self._image_cache.fetch(
+                self.normalized_id,
+                self._retrieve_image_bytes,
+            ))
+        return (yield from self._retrieve_image_bytes())
+
+    @asyncio.coroutine
+    def _retrieve_image_bytes(self):
         logger.debug("retrieving vCard %s", self._remote_jid)
         vcard = yield from self._vcard.get_vcard(self._remote_jid)
         photo = vcard.get_photo_data()
@@ -450,8 +472,10 @@ class AvatarService(service.Service):
 
     Observing avatars:
 
-    .. note:: :class:`AvatarService` only caches the metadata, not the
-              actual image data. This is the job of the caller.
+    .. note:: The image data retrieved via
+              :meth:`~.AbstractAvatarDescriptor.get_image_bytes` of the
+              descriptors returned by this service is cached in
+              :attr:`image_cache`, keyed by the avatar id.
 
     .. signal:: on_metadata_changed(jid, metadata)
 
@@ -491,6 +515,8 @@ class AvatarService(service.Service):
 
     .. autoattribute:: metadata_cache_size
        :annotation: = 200
+
+    .. autoattribute:: image_cache
     """
 
     ORDER_AFTER = [
@@ -515,6 +541,8 @@ class AvatarService(service.Service):
         self._has_pep_avatar = set()
         self._metadata_cache = LRUDict()
         self._metadata_cache.maxsize = 200
+        self._metadata_fetches = {}
+        self._image_cache = ImageCache()
         self._pubsub = self.dependencies[pubsub.PubSubClient]
         self._pep = self.dependencies[pep.PEPClient]
         self._presence_server = self.dependencies[presence.PresenceServer]
@@ -551,6 +579,23 @@ class AvatarService(service.Service):
     def metadata_cache_size(self, value):
         self._metadata_cache.maxsize = value
 
+    @property
+    def image_cache(self):
+        """
+        The :class:`~aioxmpp.avatar.ImageCache` used for avatar image data.
+
+        By default, a memory-only cache is used. Assign a cache with a
+        directory to keep images across restarts; the new cache is used by
+        descriptors created afterwards.
+
+        .. versionadded:: 0.10
+        """
+        return self._image_cache
+
+    @image_cache.setter
+    def image_cache(self, value):
+        self._image_cache = value
+
     @property
     def synchronize_vcard(self):
         """
@@ -646,6 +691,9 @@ class AvatarService(service.Service):
         else:
             cache_jid = full_jid.bare()
 
+        # drop the cached vCard if the avatar changed
+        self._vcard.handle_photo_hash(cache_jid, stanza.xep0153_x.photo)
+
         if cache_jid not in self._has_pep_avatar:
             metadata = self._cook_vcard_notify(cache_jid, stanza)
             self._update_metadata(cache_jid, metadata)
@@ -747,6 +795,7 @@ class AvatarService(service.Service):
                     mime_type=None,
                     vcard=self._vcard,
                     nbytes=None,
+                    image_cache=self._image_cache,
                 )
             )
         return result
@@ -777,6 +826,7 @@ class AvatarService(service.Service):
                     width=info_node.width,
                     height=info_node.height,
                     pubsub=self._pubsub,
+                    image_cache=self._image_cache,
                 )
             result.append(descriptor)
 
@@ -802,13 +852,16 @@ class AvatarService(service.Service):
                      jid)
         sha1 = hashlib.sha1()
         sha1.update(photo)
+        id_ = sha1.hexdigest()
+        self._image_cache.put(id_, photo)
         return [VCardAvatarDescriptor(
             remote_jid=jid,
-            id_=sha1.hexdigest(),
+            id_=id_,
             mime_type=mime_type,
             nbytes=len(photo),
             vcard=self._vcard,
             image_bytes=photo,
+            image_cache=self._image_cache,
         )]
 
     @asyncio.coroutine
@@ -867,6 +920,11 @@ class AvatarService(service.Service):
            exception are vCard avatars over MUC, where the IQ requests
            for the vCard may be translated by the MUC server. It is
            recommended to use the `disable_pep` option in that case.
+
+        .. versionchanged:: 0.10
+
+           Concurrent calls for the same `jid` (and `disable_pep` value) share
+           a single retrieval.
         """
 
         if require_fresh:
@@ -877,6 +935,28 @@ class AvatarService(service.Service):
             except KeyError:
                 pass
 
+        key = jid, disable_pep
+        try:
+            task = self._metadata_fetches[key]
+        except KeyError:
+            task = asyncio.ensure_future(
+                self._fetch_avatar_metadata(jid, disable_pep)
+            )
+            self._metadata_fetches[key] = task
+            task.add_done_callback(
+                lambda task: self._metadata_fetch_done(key, task)
+            )
+
+        return (yield from asyncio.shield(task))
+
+    def _metadata_fetch_done(self, key, task):
+        if self._metadata_fetches.get(key) is task:
+            del self._metadata_fetches[key]
+        if not task.cancelled():
+            task.exception()
+
+    @asyncio.coroutine
+    def _fetch_avatar_metadata(self, jid, disable_pep):
         if disable_pep:
             metadata = []
         else:
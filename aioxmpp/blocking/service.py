@@ -20,6 +20,7 @@
 #
 ########################################################################
 import asyncio
+import collections.abc
 
 import aioxmpp
 import aioxmpp.callbacks as callbacks
@@ -30,6 +31,35 @@ from aioxmpp.utils import namespaces
 from . import xso as blocking_xso
 
 
+class _BlocklistView(collections.abc.Set):
+    """
+    Read-only live view on the mutable blocklist of a
+    :class:`BlockingClient`.
+    """
+
+    __slots__ = ("_jids",)
+
+    def __init__(self, jids):
+        super().__init__()
+        self._jids = jids
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return frozenset(iterable)
+
+    def __contains__(self, jid):
+        return jid in self._jids
+
+    def __iter__(self):
+        return iter(self._jids)
+
+    def __len__(self):
+        return len(self._jids)
+
+    def __repr__(self):
+        return "<blocklist view of {} JIDs>".format(len(self._jids))
+
+
 class BlockingClient(service.Service):
     """
     A :class:`~aioxmpp.service.Service` implementing :xep:`Blocking
@@ -38,10 +68,24 @@ class BlockingClient(service.Service):
     This service maintains the list of blocked JIDs and allows
     manipulating the blocklist.
 
-    Attribute:
+    Attributes:
 
     .. autoattribute:: blocklist
 
+    .. attribute:: drop_blocked_stanzas
+
+       If true, inbound messages and presences whose sender is matched by the
+       blocklist (see :meth:`is_blocked`) are dropped before they are
+       dispatched to any handler. Defaults to :data:`False`.
+
+       The server is expected to not deliver stanzas from blocked entities
+       anyways; this is a cheap safety net for servers which deliver stanzas
+       from blocked entities while a block push is in flight.
+
+       .. versionadded:: 0.10
+
+    .. automethod:: is_blocked
+
     Signals:
 
     .. signal:: on_initial_blocklist_received(blocklist)
@@ -59,7 +103,7 @@ class BlockingClient(service.Service):
        :type blocked_jids: :class:`~collections.abc.Set`
            of :class:`~aioxmpp.JID`
 
-    .. signal:: on_jids_blocked(blocked_jids)
+    .. signal:: on_jids_unblocked(unblocked_jids)
 
        Fires when JIDs are unblocked.
 
@@ -81,6 +125,7 @@ class BlockingClient(service.Service):
         super().__init__(client, **kwargs)
         self._blocklist = None
         self._lock = asyncio.Lock()
+        self.drop_blocked_stanzas = False
         self._disco = self.dependencies[aioxmpp.DiscoClient]
 
     on_jids_blocked = callbacks.Signal()
@@ -118,8 +163,8 @@ class BlockingClient(service.Service):
                     payload=blocking_xso.BlockList(),
                 )
                 result = yield from self.client.send(iq)
-                self._blocklist = frozenset(result.items)
-            self.on_initial_blocklist_received(self._blocklist)
+                self._blocklist = set(result.items)
+            self.on_initial_blocklist_received(frozenset(self._blocklist))
 
         return True
 
@@ -127,44 +172,147 @@ class BlockingClient(service.Service):
     def blocklist(self):
         """
         :class:`~collections.abc.Set` of JIDs blocked by the account.
+
+        This is :data:`None` as long as the blocklist has not been fetched
+        from the server.
+
+        .. versionchanged:: 0.10
+
+           This is now a read-only live view of the blocklist which reflects
+           later block and unblock pushes, instead of a :class:`frozenset`
+           snapshot. Use ``frozenset(client.blocklist)`` to obtain a
+           snapshot.
         """
-        return self._blocklist
+        if self._blocklist is None:
+            return None
+        return _BlocklistView(self._blocklist)
+
+    def is_blocked(self, jid):
+        """
+        Check whether stanzas from `jid` are blocked by the blocklist.
+
+        :param jid: The JID to check.
+        :type jid: :class:`aioxmpp.JID`
+        :return: Whether the blocklist matches `jid`.
+        :rtype: :class:`bool`
+
+        Following :xep:`191`, a blocklist entry matches the JID itself, a
+        bare JID entry matches all full JIDs of that account and a domain
+        entry matches all JIDs at that domain. Each check is a constant number
+        of set lookups, independent of the size of the blocklist.
+
+        If the blocklist has not been fetched yet, :data:`False` is returned.
+
+        .. versionadded:: 0.10
+        """
+        blocklist = self._blocklist
+        if not blocklist:
+            return False
+
+        if jid in blocklist:
+            return True
+
+        if jid.resource is not None and jid.localpart is not None:
+            if jid.bare() in blocklist:
+                return True
+
+        if jid.resource is not None or jid.localpart is not None:
+            if jid.replace(localpart=None, resource=None) in blocklist:
+                return True
+
+        return False
+
+    def _drop_if_blocked(self, stanza):
+        if (self.drop_blocked_stanzas and
+                stanza.from_ is not None and
+                self.is_blocked(stanza.from_)):
+            self.logger.debug("dropping %s from blocked JID %s",
+                              type(stanza).__name__,
+                              stanza.from_)
+            return None
+        return stanza
+
+    @service.inbound_message_filter
+    def _filter_inbound_message(self, message):
+        return self._drop_if_blocked(message)
+
+    @service.inbound_presence_filter
+    def _filter_inbound_presence(self, presence):
+        return self._drop_if_blocked(presence)
+
+    @staticmethod
+    def _chunked(jids, chunk_size):
+        jids = list(jids)
+        if chunk_size is None:
+            chunk_size = len(jids) or 1
+        elif chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        for i in range(0, len(jids), chunk_size):
+            yield jids[i:i+chunk_size]
 
     @asyncio.coroutine
-    def block_jids(self, jids_to_block):
+    def block_jids(self, jids_to_block, *, chunk_size=None):
         """
         Add the JIDs in the sequence `jids_to_block` to the client's
         blocklist.
+
+        :param chunk_size: Maximum number of JIDs to send per request.
+        :type chunk_size: :class:`int` or :data:`None`
+        :raises ValueError: if `chunk_size` is not positive
+
+        If `chunk_size` is :data:`None`, all JIDs are sent in a single request.
+        Otherwise, the JIDs are sent in consecutive requests of at most
+        `chunk_size` JIDs each, which allows to import large blocklists
+        without hitting server-side stanza size limits. If a request fails,
+        the JIDs of the earlier requests stay blocked and the error is
+        re-raised.
+
+        .. versionchanged:: 0.10
+
+           The `chunk_size` argument was added.
         """
         yield from self._check_for_blocking()
 
         if not jids_to_block:
             return
 
-        cmd = blocking_xso.BlockCommand(jids_to_block)
-        iq = aioxmpp.IQ(
-            type_=aioxmpp.IQType.SET,
-            payload=cmd,
-        )
-        yield from self.client.send(iq)
+        for chunk in self._chunked(jids_to_block, chunk_size):
+            cmd = blocking_xso.BlockCommand(chunk)
+            iq = aioxmpp.IQ(
+                type_=aioxmpp.IQType.SET,
+                payload=cmd,
+            )
+            yield from self.client.send(iq)
 
     @asyncio.coroutine
-    def unblock_jids(self, jids_to_unblock):
+    def unblock_jids(self, jids_to_unblock, *, chunk_size=None):
         """
         Remove the JIDs in the sequence `jids_to_block` from the
         client's blocklist.
+
+        :param chunk_size: Maximum number of JIDs to send per request.
+        :type chunk_size: :class:`int` or :data:`None`
+        :raises ValueError: if `chunk_size` is not positive
+
+        `chunk_size` works as for :meth:`block_jids`.
+
+        .. versionchanged:: 0.10
+
+           The `chunk_size` argument was added.
         """
         yield from self._check_for_blocking()
 
         if not jids_to_unblock:
             return
 
-        cmd = blocking_xso.UnblockCommand(jids_to_unblock)
-        iq = aioxmpp.IQ(
-            type_=aioxmpp.IQType.SET,
-            payload=cmd,
-        )
-        yield from self.client.send(iq)
+        for chunk in self._chunked(jids_to_unblock, chunk_size):
+            cmd = blocking_xso.UnblockCommand(chunk)
+            iq = aioxmpp.IQ(
+                type_=aioxmpp.IQType.SET,
+                payload=cmd,
+            )
+            yield from self.client.send(iq)
 
     @asyncio.coroutine
     def unblock_all(self):
@@ -197,6 +345,8 @@ class BlockingClient(service.Service):
                     # WORKAROUND: ejabberd#2287
                     block_command.from_ == self.client.local_jid):
                 diff = frozenset(block_command.payload.items)
+                # in-place update, the cost only depends on the size of the
+                # push, not on the size of the blocklist
                 self._blocklist |= diff
             else:
                 self.logger.debug(
@@ -225,7 +375,7 @@ class BlockingClient(service.Service):
                     unblock_command.from_ == self.client.local_jid):
                 if not unblock_command.payload.items:
                     diff = frozenset(self._blocklist)
-                    self._blocklist = frozenset()
+                    self._blocklist = set()
                 else:
                     diff = frozenset(unblock_command.payload.items)
                     self._blocklist -= diff
@@ -35,6 +35,8 @@ Service
 
 .. currentmodule:: aioxmpp.bookmarks
 
+.. autoclass:: BookmarkTransaction
+
 XSOs
 ====
 
@@ -69,8 +71,13 @@ provided signals and the get-modify-set methods
 :meth:`~BookmarkClient.set_bookmarks` directly is error prone and
 might cause data loss due to race conditions.
 
+To apply many modifications at once, record them in a
+:class:`~aioxmpp.bookmarks.BookmarkTransaction` and pass it to
+:meth:`~BookmarkClient.apply_transaction`, which needs a single write
+instead of one get-modify-set cycle per modification.
+
 """
 
 from .xso import (Storage, Bookmark, Conference, URL,  # NOQA
                   as_bookmark_class)
-from .service import BookmarkClient  # NOQA
+from .service import BookmarkClient, BookmarkTransaction  # NOQA
@@ -20,6 +20,8 @@
 #
 ########################################################################
 import asyncio
+import bisect
+import collections
 
 import aioxmpp
 import aioxmpp.callbacks as callbacks
@@ -29,6 +31,223 @@ import aioxmpp.private_xml as private_xml
 from . import xso as bookmark_xso
 
 
+class _BookmarkStore:
+    """
+    Ordered multiset of bookmarks, indexed by the type and the
+    :attr:`~.Bookmark.primary` key of the bookmarks.
+
+    Membership tests, lookups, removal and replacement only compare against
+    the bookmarks with the same type and primary key, instead of scanning
+    the whole list.
+    """
+
+    def __init__(self, bookmarks=()):
+        super().__init__()
+        # removed bookmarks leave a None hole so that the positions stored in
+        # the index stay valid
+        self._slots = []
+        self._index = {}
+        self._len = 0
+        for bookmark in bookmarks:
+            self.append(bookmark)
+
+    @staticmethod
+    def _key(bookmark):
+        return type(bookmark), bookmark.primary
+
+    def __iter__(self):
+        return (bookmark for bookmark in self._slots if bookmark is not None)
+
+    def __len__(self):
+        return self._len
+
+    def keys(self):
+        return self._index.keys()
+
+    def lookup(self, type_, primary):
+        return [self._slots[i] for i in self._index.get((type_, primary), ())]
+
+    def _find(self, bookmark):
+        for i in self._index.get(self._key(bookmark), ()):
+            if self._slots[i] == bookmark:
+                return i
+        return None
+
+    def __contains__(self, bookmark):
+        return self._find(bookmark) is not None
+
+    def count(self, bookmark):
+        return sum(
+            1
+            for i in self._index.get(self._key(bookmark), ())
+            if self._slots[i] == bookmark
+        )
+
+    def append(self, bookmark):
+        self._index.setdefault(self._key(bookmark), []).append(
+            len(self._slots)
+        )
+        self._slots.append(bookmark)
+        self._len += 1
+
+    def _unindex(self, i):
+        key = self._key(self._slots[i])
+        positions = self._index[key]
+        positions.remove(i)
+        if not positions:
+            del self._index[key]
+
+    def remove(self, bookmark):
+        """
+        Remove the first occurence of `bookmark`.
+
+        :return: Whether a bookmark was removed.
+        """
+        i = self._find(bookmark)
+        if i is None:
+            return False
+        self._unindex(i)
+        self._slots[i] = None
+        self._len -= 1
+        return True
+
+    def replace(self, old, new):
+        """
+        Replace the first occurence of `old` with `new`, keeping its position.
+
+        :return: Whether a bookmark was replaced.
+        """
+        i = self._find(old)
+        if i is None:
+            return False
+        self._unindex(i)
+        self._slots[i] = new
+        bisect.insort(self._index.setdefault(self._key(new), []), i)
+        return True
+
+
+class _AddOperation:
+    def __init__(self, bookmark):
+        self.bookmark = bookmark
+
+    def prepare(self, store):
+        pass
+
+    def satisfied(self, store):
+        return self.bookmark in store
+
+    def apply(self, store):
+        if self.bookmark in store:
+            return False
+        store.append(self.bookmark)
+        return True
+
+
+class _DiscardOperation:
+    def __init__(self, bookmark):
+        self.bookmark = bookmark
+        self.occurences = 0
+
+    def prepare(self, store):
+        self.occurences = store.count(self.bookmark)
+
+    def satisfied(self, store):
+        return (not self.occurences or
+                store.count(self.bookmark) < self.occurences)
+
+    def apply(self, store):
+        return store.remove(self.bookmark)
+
+
+class _UpdateOperation:
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+
+    def prepare(self, store):
+        pass
+
+    def satisfied(self, store):
+        return self.new in store
+
+    def apply(self, store):
+        if not store.replace(self.old, self.new):
+            store.append(self.new)
+        return True
+
+
+class BookmarkTransaction:
+    """
+    A batch of bookmark modifications which is written in one go by
+    :meth:`BookmarkClient.apply_transaction`.
+
+    The modifications are recorded by calling the methods below and are
+    applied in that order to the bookmark list fetched from the server when
+    the transaction is applied. They have the same semantics as the
+    get-modify-set methods of :class:`BookmarkClient` of the same name.
+
+    .. automethod:: add_bookmark
+
+    .. automethod:: discard_bookmark
+
+    .. automethod:: update_bookmark
+
+    Each bookmark (by bookmark equality) may only be mentioned once in a
+    transaction; otherwise, it would be ambiguous whether the transaction
+    succeeded. :class:`ValueError` is raised when trying to record a
+    modification which mentions a bookmark a second time.
+
+    The number of recorded modifications is available via :func:`len`.
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._operations = []
+        self._mentioned = _BookmarkStore()
+
+    def __len__(self):
+        return len(self._operations)
+
+    def _mention(self, *bookmarks):
+        for bookmark in bookmarks:
+            if bookmark in self._mentioned:
+                raise ValueError(
+                    "bookmark {!r} is already part of the transaction".format(
+                        bookmark
+                    )
+                )
+        for bookmark in bookmarks:
+            self._mentioned.append(bookmark)
+
+    def add_bookmark(self, bookmark):
+        """
+        Add `bookmark` to the bookmark list, unless an equal bookmark exists.
+        """
+        self._mention(bookmark)
+        self._operations.append(_AddOperation(bookmark))
+
+    def discard_bookmark(self, bookmark):
+        """
+        Remove one occurence of `bookmark` from the bookmark list, if there is
+        one.
+        """
+        self._mention(bookmark)
+        self._operations.append(_DiscardOperation(bookmark))
+
+    def update_bookmark(self, old, new):
+        """
+        Replace the first bookmark equal to `old` with `new`, or add `new` if
+        no such bookmark exists.
+        """
+        if old == new:
+            self._mention(old)
+        else:
+            self._mention(old, new)
+        self._operations.append(_UpdateOperation(old, new))
+
+
 # TODO: use private storage in pubsub where available.
 # TODO: sync bookmarks between pubsub and private xml storage
 # TODO: do we need merge-capabilities to reconcile the bookmarks
@@ -62,6 +281,17 @@ class BookmarkClient(service.Service):
 
     .. automethod:: update_bookmark
 
+    To apply several modifications with a single write (and a single
+    verification round-trip), record them in a :class:`BookmarkTransaction`
+    and use:
+
+    .. automethod:: apply_transaction
+
+    The bookmarks seen at the last synchronisation can be looked up without
+    a round-trip to the server:
+
+    .. automethod:: lookup_bookmarks
+
 
     The following signals are provided that allow tracking the changes to
     the bookmark list:
@@ -108,7 +338,7 @@ class BookmarkClient(service.Service):
     def __init__(self, client, **kwargs):
         super().__init__(client, **kwargs)
         self._private_xml = self.dependencies[private_xml.PrivateXMLService]
-        self._bookmark_cache = []
+        self._bookmark_cache = _BookmarkStore()
         self._lock = asyncio.Lock()
 
     @service.depsignal(aioxmpp.Client, "on_stream_established", defer=True)
@@ -144,7 +374,7 @@ class BookmarkClient(service.Service):
         needed and set the bookmark cache to the new data.
         """
 
-        self.logger.debug("diffing %s, %s", self._bookmark_cache,
+        self.logger.debug("diffing %s, %s", list(self._bookmark_cache),
                           new_bookmarks)
 
         def subdivide(level, old, new):
@@ -209,24 +439,18 @@ class BookmarkClient(service.Service):
 
         # group the bookmarks into groups whose elements may transform
         # among one another by on_bookmark_changed events. This information
-        # is given by the type of the bookmark and the .primary property
-        changable_groups = {}
+        # is given by the type of the bookmark and the .primary property,
+        # which is what the bookmark store is indexed by
+        old_store = self._bookmark_cache
+        new_store = _BookmarkStore(new_bookmarks)
 
-        for item in self._bookmark_cache:
-            group = changable_groups.setdefault(
-                (type(item), item.primary),
-                ([], [])
-            )
-            group[0].append(item)
+        keys = list(old_store.keys())
+        keys.extend(key for key in new_store.keys()
+                    if key not in old_store.keys())
 
-        for item in new_bookmarks:
-            group = changable_groups.setdefault(
-                (type(item), item.primary),
-                ([], [])
-            )
-            group[1].append(item)
-
-        for old, new in changable_groups.values():
+        for key in keys:
+            old = old_store.lookup(*key)
+            new = new_store.lookup(*key)
 
             # the first branches are fast paths which should catch
             # most cases – especially all cases where each bare jid of
@@ -250,6 +474,7 @@ class BookmarkClient(service.Service):
                     self.logger.debug("added %s", added)
                     self.on_bookmark_added(added)
             else:
+                old, new = self._cancel_unchanged(old, new)
                 old, new = subdivide(0, old, new)
 
                 assert len(old) == 0 or len(new) == 0
@@ -262,7 +487,64 @@ class BookmarkClient(service.Service):
                     self.logger.debug("added %s", added)
                     self.on_bookmark_added(added)
 
-        self._bookmark_cache = new_bookmarks
+        self._bookmark_cache = new_store
+
+    @staticmethod
+    def _cancel_unchanged(old, new):
+        """
+        Drop pairs of equal bookmarks from `old` and `new`.
+
+        All bookmarks passed share type and primary key, so they are equal if
+        and only if their secondary keys are equal. Equal pairs would end up
+        in the same bin of the subdivision and not generate any events, so
+        dropping them up front by hashing keeps the subdivision small.
+        """
+        try:
+            unmatched = collections.Counter(entry.secondary for entry in new)
+        except TypeError:
+            # the secondary keys of custom bookmark classes are not required
+            # to be hashable
+            return old, new
+
+        old_rest = []
+        for entry in old:
+            secondary = entry.secondary
+            if unmatched[secondary] > 0:
+                unmatched[secondary] -= 1
+            else:
+                old_rest.append(entry)
+
+        matched = collections.Counter(entry.secondary for entry in old)
+        new_rest = []
+        for entry in new:
+            secondary = entry.secondary
+            if matched[secondary] > 0:
+                matched[secondary] -= 1
+            else:
+                new_rest.append(entry)
+
+        return old_rest, new_rest
+
+    def lookup_bookmarks(self, type_, primary):
+        """
+        Return the bookmarks with the given type and primary key.
+
+        :param type_: The bookmark class to look for.
+        :type type_: :class:`~.Bookmark` subclass
+        :param primary: The :attr:`~.Bookmark.primary` key to look for (the
+            JID for :class:`~.Conference` and the URL for :class:`~.URL`
+            bookmarks).
+        :return: The matching bookmarks, in bookmark list order.
+        :rtype: :class:`list` of :class:`~.Bookmark`
+
+        This uses the bookmark list as of the last call to :meth:`sync` (or
+        any other method of this service which fetches or stores the
+        bookmarks) and does not contact the server. The lookup does not
+        depend on the number of bookmarks.
+
+        .. versionadded:: 0.10
+        """
+        return self._bookmark_cache.lookup(type_, primary)
 
     @asyncio.coroutine
     def get_bookmarks(self):
@@ -329,31 +611,12 @@ class BookmarkClient(service.Service):
         is raised if the bookmark could not be added successfully after
         `max_retries`.
         """
-        with (yield from self._lock):
-            bookmarks = yield from self._get_bookmarks()
-
-            try:
-                modified_bookmarks = list(bookmarks)
-                if new_bookmark not in bookmarks:
-                    modified_bookmarks.append(new_bookmark)
-                yield from self._set_bookmarks(modified_bookmarks)
-
-                retries = 0
-                bookmarks = yield from self._get_bookmarks()
-                while retries < max_retries:
-                    if new_bookmark in bookmarks:
-                        break
-                    modified_bookmarks = list(bookmarks)
-                    modified_bookmarks.append(new_bookmark)
-                    yield from self._set_bookmarks(modified_bookmarks)
-                    bookmarks = yield from self._get_bookmarks()
-                    retries += 1
-
-                if new_bookmark not in bookmarks:
-                    raise RuntimeError("Could not add bookmark")
-
-            finally:
-                self._diff_emit_update(bookmarks)
+        transaction = BookmarkTransaction()
+        transaction.add_bookmark(new_bookmark)
+        yield from self._apply_transaction(
+            transaction, max_retries,
+            "Could not add bookmark",
+        )
 
     @asyncio.coroutine
     def discard_bookmark(self, bookmark_to_remove, *, max_retries=3):
@@ -382,35 +645,12 @@ class BookmarkClient(service.Service):
         :class:`RuntimeError` is raised if the bookmark could not be
         removed successfully after `max_retries`.
         """
-        with (yield from self._lock):
-            bookmarks = yield from self._get_bookmarks()
-            occurences = bookmarks.count(bookmark_to_remove)
-
-            try:
-                if not occurences:
-                    return
-
-                modified_bookmarks = list(bookmarks)
-                modified_bookmarks.remove(bookmark_to_remove)
-                yield from self._set_bookmarks(modified_bookmarks)
-
-                retries = 0
-                bookmarks = yield from self._get_bookmarks()
-                new_occurences = bookmarks.count(bookmark_to_remove)
-                while retries < max_retries:
-                    if new_occurences < occurences:
-                        break
-                    modified_bookmarks = list(bookmarks)
-                    modified_bookmarks.remove(bookmark_to_remove)
-                    yield from self._set_bookmarks(modified_bookmarks)
-                    bookmarks = yield from self._get_bookmarks()
-                    new_occurences = bookmarks.count(bookmark_to_remove)
-                    retries += 1
-
-                if new_occurences >= occurences:
-                    raise RuntimeError("Could not remove bookmark")
-            finally:
-                self._diff_emit_update(bookmarks)
+        transaction = BookmarkTransaction()
+        transaction.discard_bookmark(bookmark_to_remove)
+        yield from self._apply_transaction(
+            transaction, max_retries,
+            "Could not remove bookmark",
+        )
 
     @asyncio.coroutine
     def update_bookmark(self, old, new, *, max_retries=3):
@@ -445,35 +685,85 @@ class BookmarkClient(service.Service):
                   and modify the copy.
 
         """
-        def replace_bookmark(bookmarks, old, new):
-            modified_bookmarks = list(bookmarks)
-            try:
-                i = bookmarks.index(old)
-                modified_bookmarks[i] = new
-            except ValueError:
-                modified_bookmarks.append(new)
-            return modified_bookmarks
+        transaction = BookmarkTransaction()
+        transaction.update_bookmark(old, new)
+        yield from self._apply_transaction(
+            transaction, max_retries,
+            "Could not update bookmark",
+        )
+
+    @asyncio.coroutine
+    def apply_transaction(self, transaction, *, max_retries=3):
+        """
+        Apply all modifications recorded in a transaction with a single
+        get-modify-set cycle.
+
+        :param transaction: the modifications to apply
+        :type transaction: :class:`BookmarkTransaction`
+        :param max_retries: the number of retries if applying the
+                            modifications fails
+        :type max_retries: :class:`int`
+
+        :raises RuntimeError: if not all modifications are reflected in the
+                              bookmark list after `max_retries` retries.
+
+        The bookmarks are fetched once, all modifications of `transaction`
+        are applied to the list and the result is stored with a single
+        write. If the list is unchanged by the transaction, nothing is
+        written.
+
+        After writing the bookmarks it is checked whether all modifications
+        are reflected in the online storage. The modifications which are not
+        are applied again to the current bookmark list, at most `max_retries`
+        times. This is the same check as performed by :meth:`add_bookmark`,
+        :meth:`discard_bookmark` and :meth:`update_bookmark`, which are
+        equivalent to transactions with a single modification.
+
+        Signals are fired to reflect the changes, even if an exception is
+        raised.
+
+        .. versionadded:: 0.10
+        """
+        yield from self._apply_transaction(
+            transaction, max_retries,
+            "Could not apply bookmark transaction",
+        )
+
+    @asyncio.coroutine
+    def _apply_transaction(self, transaction, max_retries, error_message):
+        operations = transaction._operations
 
         with (yield from self._lock):
             bookmarks = yield from self._get_bookmarks()
 
             try:
-                yield from self._set_bookmarks(
-                    replace_bookmark(bookmarks, old, new)
-                )
+                store = _BookmarkStore(bookmarks)
+                for operation in operations:
+                    operation.prepare(store)
 
+                pending = operations
                 retries = 0
-                bookmarks = yield from self._get_bookmarks()
-                while retries < max_retries:
-                    if new in bookmarks:
+                while True:
+                    changed = False
+                    for operation in pending:
+                        changed = operation.apply(store) or changed
+
+                    if changed:
+                        yield from self._set_bookmarks(list(store))
+                        bookmarks = yield from self._get_bookmarks()
+                        store = _BookmarkStore(bookmarks)
+
+                    pending = [
+                        operation
+                        for operation in operations
+                        if not operation.satisfied(store)
+                    ]
+                    if not pending:
                         break
-                    yield from self._set_bookmarks(
-                        replace_bookmark(bookmarks, old, new)
-                    )
-                    bookmarks = yield from self._get_bookmarks()
+
+                    if retries >= max_retries:
+                        raise RuntimeError(error_message)
                     retries += 1
 
-                if new not in bookmarks:
-                    raise RuntimeError("Cold not update bookmark")
             finally:
                 self._diff_emit_update(bookmarks)
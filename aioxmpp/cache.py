@@ -29,61 +29,49 @@
 
 .. autoclass:: LRUDict
 
+.. autoclass:: LRUStats
+
 """
 
+import collections
 import collections.abc
+import time
 
 
-class Node:
-    __slots__ = ("prev", "next_", "key", "value")
-
-
-def _init_linked_list():
-    root = Node()
-    root.prev = root
-    root.next_ = root
-    root.key = None
-    root.value = None
-    return root
-
-
-def _remove_node(node):
-    node.next_.prev = node.prev
-    node.prev.next_ = node.next_
-    return node
-
+#: Statistics of a :class:`LRUDict`.
+#:
+#: .. versionadded:: 0.10
+LRUStats = collections.namedtuple(
+    "LRUStats",
+    [
+        "hits",
+        "misses",
+        "evictions",
+        "expirations",
+    ]
+)
 
-def _insert_node(before, new_node):
-    new_node.next_ = before.next_
-    new_node.next_.prev = new_node
-    new_node.prev = before
-    before.next_ = new_node
 
+class _LRUItemsView(collections.abc.ItemsView):
+    def __iter__(self):
+        mapping = self._mapping
+        for key in mapping:
+            try:
+                yield key, mapping[key]
+            except KeyError:
+                # expired between the snapshot of the keys and the lookup
+                pass
 
-def _length(node):
-    # this is used only for testing
-    cur = node.next_
-    i = 0
-    while cur is not node:
-        i += 1
-        cur = cur.next_
-    return i
-
-
-def _has_consistent_links(node, node_dict=None):
-    # this is used only for testing
-    cur = node.next_
-
-    if cur.prev is not node:
-        return False
 
-    while cur is not node:
-        if node_dict is not None and node_dict[cur.key] is not cur:
-            return False
-        if cur is not cur.next_.prev:
-            return False
-        cur = cur.next_
-    return True
+class _LRUValuesView(collections.abc.ValuesView):
+    def __iter__(self):
+        mapping = self._mapping
+        for key in mapping:
+            try:
+                yield mapping[key]
+            except KeyError:
+                # expired between the snapshot of the keys and the lookup
+                pass
 
 
 class LRUDict(collections.abc.MutableMapping):
@@ -100,30 +88,83 @@ class LRUDict(collections.abc.MutableMapping):
     entries are purged first. Setting an entry does *not* count as use!
 
     .. autoattribute:: maxsize
+
+    .. versionchanged:: 0.10
+
+       Entries can expire after a time-to-live, the cache can be bounded by the
+       total weight of its entries and usage statistics are collected.
+
+    Time-based expiry:
+
+    .. autoattribute:: ttl
+
+    .. automethod:: set
+
+    .. automethod:: expire
+
+    Entries which have expired are removed lazily when they are accessed or
+    when the dict is iterated over. They are still counted by :func:`len`
+    until then or until :meth:`expire` is called. Services which need a tight
+    bound on memory should call :meth:`expire` periodically (for example
+    using :meth:`asyncio.AbstractEventLoop.call_later`).
+
+    Weight-based capacity:
+
+    .. autoattribute:: maxweight
+
+    .. autoattribute:: weight_func
+
+    .. autoattribute:: weight
+
+    Statistics:
+
+    .. autoattribute:: stats
+
+    .. automethod:: reset_stats
     """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.__links = {}
-        self.__root = _init_linked_list()
+        self.__data = collections.OrderedDict()
+        self.__deadlines = {}
+        self.__weights = {}
+        self.__weight = 0
 
         self.__maxsize = 1
+        self.__maxweight = None
+        self.__ttl = None
+
+        self.reset_stats()
 
     def _test_consistency(self):
         """
         This method is only used for testing to assert that the operations
         leave the LRUDict in a valid state.
         """
-        return (_length(self.__root) == len(self.__links) and
-                _has_consistent_links(self.__root, self.__links))
+        return (all(key in self.__data for key in self.__deadlines) and
+                all(key in self.__data for key in self.__weights) and
+                sum(self.__weights.values()) == self.__weight)
 
-    def _purge(self):
-        if self.__maxsize is None:
-            return
+    def __drop(self, key):
+        del self.__data[key]
+        self.__deadlines.pop(key, None)
+        self.__weight -= self.__weights.pop(key, 0)
 
-        while len(self.__links) > self.__maxsize:
-            link = _remove_node(self.__root.prev)
-            del self.__links[link.key]
+    def _purge(self):
+        data = self.__data
+        if self.__maxsize is not None:
+            while len(data) > self.__maxsize:
+                key, _ = data.popitem(last=False)
+                self.__deadlines.pop(key, None)
+                self.__weight -= self.__weights.pop(key, 0)
+                self._evictions += 1
+
+        if self.__maxweight is not None:
+            while self.__weight > self.__maxweight:
+                key, _ = data.popitem(last=False)
+                self.__deadlines.pop(key, None)
+                self.__weight -= self.__weights.pop(key, 0)
+                self._evictions += 1
 
     @property
     def maxsize(self):
@@ -147,33 +188,210 @@ class LRUDict(collections.abc.MutableMapping):
         self.__maxsize = value
         self._purge()
 
+    @property
+    def maxweight(self):
+        """
+        Maximum total :attr:`weight` of the entries in the cache. Changing
+        this property purges overhanging entries immediately.
+
+        If set to :data:`None` (the default), the weight of entries is not
+        limited. An entry which on its own is heavier than :attr:`maxweight`
+        is not retained in the cache.
+
+        .. versionadded:: 0.10
+        """
+        return self.__maxweight
+
+    @maxweight.setter
+    def maxweight(self, value):
+        if value is not None and value <= 0:
+            raise ValueError("maxweight must be positive integer or None")
+        self.__maxweight = value
+        self._purge()
+
+    @property
+    def weight(self):
+        """
+        Total weight of the entries currently in the cache.
+
+        Entries which have been stored without a weight and while
+        :attr:`weight_func` was :data:`None` have a weight of zero.
+
+        .. versionadded:: 0.10
+        """
+        return self.__weight
+
+    #: Function used to calculate the weight of a value stored with
+    #: dictionary-style access or without explicit weight.
+    #:
+    #: If not :data:`None`, it is called with the value and must return a
+    #: non-negative integer, for example the size of the value in bytes.
+    #:
+    #: .. versionadded:: 0.10
+    weight_func = None
+
+    @property
+    def ttl(self):
+        """
+        Default time-to-live of new entries, in seconds.
+
+        If set to :data:`None` (the default), entries do not expire by time.
+        Changing this property does not affect entries which are already in
+        the cache.
+
+        .. versionadded:: 0.10
+        """
+        return self.__ttl
+
+    @ttl.setter
+    def ttl(self, value):
+        if value is not None and value <= 0:
+            raise ValueError("ttl must be positive number or None")
+        self.__ttl = value
+
+    @property
+    def stats(self):
+        """
+        Current usage statistics as :class:`LRUStats` instance.
+
+        Only lookups with dictionary-style access (including :meth:`get` and
+        the ``in`` operator) count as hits or misses.
+
+        .. versionadded:: 0.10
+        """
+        return LRUStats(
+            self._hits,
+            self._misses,
+            self._evictions,
+            self._expirations,
+        )
+
+    def reset_stats(self):
+        """
+        Reset all counters of :attr:`stats` to zero.
+
+        .. versionadded:: 0.10
+        """
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def set(self, key, value, *, ttl=None, weight=None):
+        """
+        Store an entry with explicit time-to-live and weight.
+
+        :param key: The key of the entry.
+        :param value: The value to store.
+        :param ttl: Time-to-live of the entry in seconds.
+        :type ttl: :class:`float` or :data:`None`
+        :param weight: Weight of the entry.
+        :type weight: :class:`int` or :data:`None`
+
+        If `ttl` is :data:`None`, the :attr:`ttl` of the dict is used. If
+        `weight` is :data:`None`, :attr:`weight_func` is used to calculate it
+        (if set).
+
+        Like setting an item, this does *not* count as use of the entry.
+
+        .. versionadded:: 0.10
+        """
+        data = self.__data
+        if key in data:
+            self.__deadlines.pop(key, None)
+            self.__weight -= self.__weights.pop(key, 0)
+        data[key] = value
+
+        if ttl is None:
+            ttl = self.__ttl
+        if ttl is not None:
+            self.__deadlines[key] = time.monotonic() + ttl
+
+        if weight is None and self.weight_func is not None:
+            weight = self.weight_func(value)
+        if weight:
+            self.__weights[key] = weight
+            self.__weight += weight
+
+        self._purge()
+
+    def expire(self):
+        """
+        Remove all entries whose time-to-live has passed.
+
+        :return: The number of removed entries.
+        :rtype: :class:`int`
+
+        .. versionadded:: 0.10
+        """
+        if not self.__deadlines:
+            return 0
+
+        now = time.monotonic()
+        expired = [
+            key
+            for key, deadline in self.__deadlines.items()
+            if deadline <= now
+        ]
+        for key in expired:
+            self.__drop(key)
+        self._expirations += len(expired)
+        return len(expired)
+
     def __len__(self):
-        return len(self.__links)
+        return len(self.__data)
 
     def __iter__(self):
-        return iter(self.__links)
+        # do not hand out keys which would raise KeyError on lookup
+        self.expire()
+        # iterate over a snapshot: lookups move entries to the end, which
+        # OrderedDict does not allow during iteration
+        return iter(list(self.__data))
+
+    def items(self):
+        return _LRUItemsView(self)
+
+    def values(self):
+        return _LRUValuesView(self)
 
     def __setitem__(self, key, value):
+        if (self.__ttl is None and self.weight_func is None and
+                not self.__weights):
+            data = self.__data
+            if key in data:
+                self.__deadlines.pop(key, None)
+                data[key] = value
+            else:
+                data[key] = value
+                self._purge()
+            return
+
+        self.set(key, value)
+
+    def __getitem__(self, key):
         try:
-            self.__links[key].value = value
+            value = self.__data[key]
         except KeyError:
-            link = Node()
-            link.key = key
-            link.value = value
-            self.__links[key] = link
-            _insert_node(self.__root, link)
-            self._purge()
+            self._misses += 1
+            raise
 
-    def __getitem__(self, key):
-        link = self.__links[key]
-        _remove_node(link)
-        _insert_node(self.__root, link)
-        return link.value
+        if self.__deadlines:
+            deadline = self.__deadlines.get(key)
+            if deadline is not None and deadline <= time.monotonic():
+                self.__drop(key)
+                self._expirations += 1
+                self._misses += 1
+                raise KeyError(key)
+
+        self.__data.move_to_end(key)
+        self._hits += 1
+        return value
 
     def __delitem__(self, key):
-        link = self.__links.pop(key)
-        _remove_node(link)
+        self.__drop(key)
 
     def clear(self):
-        self.__links.clear()
-        self.__root = _init_linked_list()
+        self.__data.clear()
+        self.__deadlines.clear()
+        self.__weights.clear()
+        self.__weight = 0
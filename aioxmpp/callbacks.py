@@ -566,6 +566,8 @@ class SyncAdHocSignal(AbstractAdHocSignal):
 
     .. automethod:: fire
 
+    .. automethod:: fire_concurrently
+
     .. automethod:: disconnect
     """
 
@@ -617,6 +619,46 @@ class SyncAdHocSignal(AbstractAdHocSignal):
             if not keep:
                 del self._connections[token]
 
+    @asyncio.coroutine
+    def fire_concurrently(self, *args, **kwargs):
+        """
+        Emit the signal, running all coroutines concurrently with the given
+        arguments.
+
+        The coroutines are started in the order they were registered, so
+        that requests they send right away are sent in that order. This
+        coroutine returns when all of them have finished. Coroutines which
+        return a false value are disconnected, like with :meth:`fire`.
+
+        If any of the coroutines raises, the exception of the first such
+        coroutine (in registration order) is re-raised after all coroutines
+        have finished.
+
+        .. versionadded:: 0.10
+        """
+        connections = list(self._connections.items())
+        # wrap the coroutines explicitly to guarantee the start order
+        tasks = [
+            asyncio.ensure_future(coro(*args, **kwargs))
+            for _, coro in connections
+        ]
+        results = yield from asyncio.gather(
+            *tasks,
+            return_exceptions=True
+        )
+
+        first_exc = None
+        for (token, _), result in zip(connections, results):
+            if isinstance(result, BaseException):
+                if first_exc is None:
+                    first_exc = result
+                continue
+            if not result:
+                self._connections.pop(token, None)
+
+        if first_exc is not None:
+            raise first_exc
+
     __call__ = fire
 
 
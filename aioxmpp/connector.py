@@ -159,6 +159,11 @@ class STARTTLSConnector(BaseConnector):
         :attr:`~.security_layer.SecurityLayer.ssl_context_factory` and
         :attr:`~.security_layer.SecurityLayer.certificate_verifier_factory` are
         used to configure the TLS connection.
+
+        If :attr:`~.security_layer.SecurityLayer.tls_session_cache` is set, a
+        TLS session stored for the `domain`, `host`, `port` and trust
+        configuration is offered to the server, and the new session is stored
+        after the stream features have been received over TLS.
         """
 
         features_future = asyncio.Future(loop=loop)
@@ -242,16 +247,33 @@ class STARTTLSConnector(BaseConnector):
         ssl_context = metadata.ssl_context_factory()
         verifier.setup_context(ssl_context, transport)
 
-        yield from stream.starttls(
-            ssl_context=ssl_context,
-            post_handshake_callback=verifier.post_handshake,
-        )
+        session_cache = metadata.tls_session_cache
+        post_handshake_callback = verifier.post_handshake
+        if session_cache is not None:
+            session_key = session_cache.make_key(metadata, domain, host, port)
+            session_cache.setup_context(ssl_context, session_key)
+            post_handshake_callback = session_cache.wrap_post_handshake(
+                post_handshake_callback
+            )
+
+        try:
+            yield from stream.starttls(
+                ssl_context=ssl_context,
+                post_handshake_callback=post_handshake_callback,
+            )
+        except:  # NOQA
+            if session_cache is not None:
+                session_cache.discard(session_key)
+            raise
 
         features_future = yield from protocol.reset_stream_and_get_features(
             stream,
             timeout=negotiation_timeout,
         )
 
+        if session_cache is not None:
+            session_cache.store(session_key, transport)
+
         return transport, stream, features_future
 
 
@@ -270,7 +292,8 @@ class XMPPOverTLSConnector(BaseConnector):
     def tls_supported(self):
         return True
 
-    def _context_factory_factory(self, logger, metadata, verifier):
+    def _context_factory_factory(self, logger, metadata, verifier,
+                                 session_key=None):
         def context_factory(transport):
             ssl_context = metadata.ssl_context_factory()
 
@@ -288,6 +311,9 @@ class XMPPOverTLSConnector(BaseConnector):
                 )
 
             verifier.setup_context(ssl_context, transport)
+            if session_key is not None:
+                metadata.tls_session_cache.setup_context(ssl_context,
+                                                         session_key)
             return ssl_context
         return context_factory
 
@@ -311,6 +337,9 @@ class XMPPOverTLSConnector(BaseConnector):
         :attr:`~.security_layer.SecurityLayer.ssl_context_factory` and
         :attr:`~.security_layer.SecurityLayer.certificate_verifier_factory` are
         used to configure the TLS connection.
+
+        :attr:`~.security_layer.SecurityLayer.tls_session_cache` is used as
+        described in :meth:`STARTTLSConnector.connect`.
         """
 
         features_future = asyncio.Future(loop=loop)
@@ -336,8 +365,21 @@ class XMPPOverTLSConnector(BaseConnector):
             metadata,
         )
 
-        context_factory = self._context_factory_factory(logger, metadata,
-                                                        verifier)
+        session_cache = metadata.tls_session_cache
+        post_handshake_callback = verifier.post_handshake
+        if session_cache is not None:
+            session_key = session_cache.make_key(metadata, domain, host, port)
+            post_handshake_callback = session_cache.wrap_post_handshake(
+                post_handshake_callback
+            )
+            context_factory = self._context_factory_factory(
+                logger, metadata, verifier,
+                session_key=session_key,
+            )
+        else:
+            context_factory = self._context_factory_factory(
+                logger, metadata, verifier,
+            )
 
         try:
             transport, _ = yield from ssl_transport.create_starttls_connection(
@@ -347,12 +389,19 @@ class XMPPOverTLSConnector(BaseConnector):
                 port=port,
                 peer_hostname=host,
                 server_hostname=domain,
-                post_handshake_callback=verifier.post_handshake,
+                post_handshake_callback=post_handshake_callback,
                 ssl_context_factory=context_factory,
                 use_starttls=False,
             )
         except:  # NOQA
             stream.abort()
+            if session_cache is not None:
+                session_cache.discard(session_key)
             raise
 
-        return transport, stream, (yield from features_future)
+        features = yield from features_future
+
+        if session_cache is not None:
+            session_cache.store(session_key, transport)
+
+        return transport, stream, features
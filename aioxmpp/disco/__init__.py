@@ -80,6 +80,11 @@ Entity information
 
 .. autoclass:: RegisteredFeature
 
+Persistent caching
+------------------
+
+.. autoclass:: PersistentCache
+
 .. module:: aioxmpp.disco.xso
 
 .. currentmodule:: aioxmpp.disco.xso
@@ -115,5 +120,6 @@ Item queries
 """
 
 from . import xso  # NOQA
+from .cache import PersistentCache  # NOQA
 from .service import (DiscoClient, DiscoServer, Node, StaticNode,  # NOQA
                       mount_as_node, register_feature, RegisteredFeature)
@@ -0,0 +1,378 @@
+########################################################################
+# File name: cache.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import concurrent.futures
+import io
+import logging
+import sqlite3
+import time
+
+import aioxmpp.structs as structs
+import aioxmpp.xml
+
+from . import xso as disco_xso
+
+
+logger = logging.getLogger(__name__)
+
+_KINDS = {
+    disco_xso.InfoQuery: "info",
+    disco_xso.ItemsQuery: "items",
+}
+
+
+class PersistentCache:
+    """
+    On-disk cache for service discovery results.
+
+    :param path: Path to the SQLite database file.
+    :type path: :class:`str` or :class:`pathlib.Path`
+    :param info_ttl: Time in seconds for which :xep:`30` info results are
+        retained.
+    :type info_ttl: :class:`float`
+    :param items_ttl: Time in seconds for which :xep:`30` items results are
+        retained.
+    :type items_ttl: :class:`float`
+
+    .. versionadded:: 0.10
+
+    The cache stores :class:`~.xso.InfoQuery` and :class:`~.xso.ItemsQuery`
+    results keyed by the entity and node they were obtained from. It is meant
+    to be assigned to :attr:`.DiscoClient.persistent_cache`; the
+    :class:`.DiscoClient` then consults it before sending queries and stores
+    fresh results in it. Since the file outlives the process, results survive
+    both reconnects and restarts.
+
+    Entries expire after the TTL given for their kind. Expired entries are
+    never returned; :meth:`expire` removes them from the file.
+
+    The database is only accessed from a thread of its own, so that a flood of
+    presences does not block the event loop on disk I/O. The entries are held
+    in memory: :meth:`load` reads them from the database and :meth:`lookup`
+    only returns entries which have been loaded or stored before.
+    :meth:`store` and :meth:`discard` take effect in memory immediately and
+    are written in batches (see :attr:`writeback_delay`). :meth:`flush` and
+    :meth:`close` write outstanding changes.
+
+    The response of a peer to a query may depend on which account is asking.
+    Each database should therefore only be used by the clients of a single
+    account.
+
+    .. autoattribute:: writeback_delay
+
+    .. automethod:: lookup
+
+    .. automethod:: store
+
+    .. automethod:: discard
+
+    .. automethod:: load
+
+    .. automethod:: expire
+
+    .. automethod:: clear
+
+    .. automethod:: flush
+
+    .. automethod:: close
+    """
+
+    #: Time in seconds for which changes are collected before they are
+    #: written to the database in one transaction.
+    writeback_delay = 1.0
+
+    def __init__(self, path, *, info_ttl=86400, items_ttl=3600):
+        super().__init__()
+        self._ttls = {
+            disco_xso.InfoQuery: info_ttl,
+            disco_xso.ItemsQuery: items_ttl,
+        }
+        # the known entries, by key
+        self._entries = {}
+        # changes not written yet, by key; None marks a removed entry
+        self._pending = {}
+        # the batch currently being written by the executor
+        self._writing = {}
+        self._writeback_task = None
+        # a single thread keeps the database operations in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS disco_cache ("
+                " kind TEXT NOT NULL,"
+                " jid TEXT NOT NULL,"
+                " node TEXT,"
+                " expires REAL NOT NULL,"
+                " data TEXT NOT NULL"
+                ")"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS disco_cache_key"
+                " ON disco_cache (kind, jid, node)"
+            )
+
+    def lookup(self, type_, jid, node):
+        """
+        Return the cached result for an entity.
+
+        :param type_: The kind of result to look up.
+        :type type_: :class:`~.xso.InfoQuery` or :class:`~.xso.ItemsQuery`
+        :param jid: The entity whose result to look up.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: The node whose result to look up.
+        :type node: :class:`str` or :data:`None`
+        :raises KeyError: if there is no unexpired entry.
+        :return: The cached result.
+        :rtype: `type_`
+
+        This does not access the database; entries which have neither been
+        loaded with :meth:`load` nor stored are not found.
+        """
+        key = self._key(type_, jid, node)
+        try:
+            expires, data = self._entries[key]
+        except KeyError:
+            raise KeyError((type_, jid, node)) from None
+
+        if expires <= time.time():
+            del self._entries[key]
+            raise KeyError((type_, jid, node))
+
+        return self._parse(type_, data)
+
+    def store(self, jid, node, result):
+        """
+        Store a result for an entity.
+
+        :param jid: The entity the result was obtained from.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: The node the result was obtained from.
+        :type node: :class:`str` or :data:`None`
+        :param result: The result to store.
+        :type result: :class:`~.xso.InfoQuery` or :class:`~.xso.ItemsQuery`
+
+        An existing entry for the same entity, node and kind is replaced.
+        """
+        type_ = type(result)
+        self._queue_write(
+            self._key(type_, jid, node),
+            (time.time() + self._ttls[type_],
+             aioxmpp.xml.serialize_single_xso(result)),
+        )
+
+    def discard(self, type_, jid, node):
+        """
+        Remove the entry of the given kind for an entity, if any.
+
+        :param type_: The kind of result to remove.
+        :type type_: :class:`~.xso.InfoQuery` or :class:`~.xso.ItemsQuery`
+        :param jid: The entity whose entry to remove.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: The node whose entry to remove.
+        :type node: :class:`str` or :data:`None`
+        """
+        self._queue_write(self._key(type_, jid, node), None)
+
+    @asyncio.coroutine
+    def load(self):
+        """
+        Load all unexpired entries from the database.
+
+        :return: List of tuples ``(jid, node, result)`` for all unexpired
+            entries, including those stored but not written yet.
+
+        This is used by :class:`.DiscoClient` to warm its in-memory cache.
+        """
+        now = time.time()
+        rows = yield from self._run_in_executor(self._select_all, now)
+
+        for kind, jid, node, expires, data in rows:
+            key = kind, jid, node
+            if (key in self._entries or
+                    key in self._pending or
+                    key in self._writing):
+                # changed while we were reading
+                continue
+            self._entries[key] = expires, data
+
+        types = {kind: type_ for type_, kind in _KINDS.items()}
+        return [
+            (structs.JID.fromstr(jid),
+             node,
+             self._parse(types[kind], data))
+            for (kind, jid, node), (expires, data) in self._entries.items()
+            if expires > now
+        ]
+
+    @asyncio.coroutine
+    def expire(self):
+        """
+        Remove all expired entries from the database.
+        """
+        now = time.time()
+        for key, (expires, _) in list(self._entries.items()):
+            if expires <= now:
+                del self._entries[key]
+        for key, entry in self._pending.items():
+            if entry is not None and entry[0] <= now:
+                self._pending[key] = None
+
+        yield from self._run_in_executor(self._delete_expired, now)
+
+    @asyncio.coroutine
+    def clear(self):
+        """
+        Remove all entries from the database.
+        """
+        self._entries.clear()
+        self._pending.clear()
+        yield from self._run_in_executor(self._delete_all)
+
+    @asyncio.coroutine
+    def flush(self):
+        """
+        Write all outstanding changes to the database.
+        """
+        batch, self._pending = self._pending, {}
+        if batch:
+            yield from self._write_batch_in_executor(batch)
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Write outstanding changes and close the database.
+        """
+        if self._writeback_task is not None:
+            self._writeback_task.cancel()
+            self._writeback_task = None
+        # the batch of a cancelled writeback may not have been written
+        batch = dict(self._writing)
+        batch.update(self._pending)
+        self._pending = {}
+        try:
+            if batch:
+                yield from self._write_batch_in_executor(batch)
+            yield from self._run_in_executor(self._db.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _key(type_, jid, node):
+        return _KINDS[type_], str(jid), node
+
+    def _queue_write(self, key, entry):
+        if entry is None:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = entry
+        self._pending[key] = entry
+        if self._writeback_task is None:
+            self._writeback_task = asyncio.ensure_future(self._writeback())
+
+    def _run_in_executor(self, func, *args):
+        return asyncio.get_event_loop().run_in_executor(
+            self._executor,
+            func,
+            *args
+        )
+
+    def _select_all(self, now):
+        return self._db.execute(
+            "SELECT kind, jid, node, expires, data FROM disco_cache"
+            " WHERE expires > ?",
+            (now,)
+        ).fetchall()
+
+    def _delete_expired(self, now):
+        with self._db:
+            self._db.execute(
+                "DELETE FROM disco_cache WHERE expires <= ?",
+                (now,)
+            )
+
+    def _delete_all(self):
+        with self._db:
+            self._db.execute("DELETE FROM disco_cache")
+
+    def _write_batch(self, batch):
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM disco_cache"
+                " WHERE kind = ? AND jid = ? AND node IS ?",
+                batch.keys()
+            )
+            self._db.executemany(
+                "INSERT INTO disco_cache (kind, jid, node, expires, data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    key + entry
+                    for key, entry in batch.items()
+                    if entry is not None
+                )
+            )
+
+    @asyncio.coroutine
+    def _write_batch_in_executor(self, batch):
+        self._writing.update(batch)
+        try:
+            yield from self._run_in_executor(self._write_batch, batch)
+        except Exception:
+            # keep the changes; newer changes of the same entries win
+            for key, entry in batch.items():
+                self._pending.setdefault(key, entry)
+            raise
+        finally:
+            for key, entry in batch.items():
+                if self._writing.get(key) is entry:
+                    del self._writing[key]
+
+    @asyncio.coroutine
+    def _writeback(self):
+        try:
+            while self._pending:
+                yield from asyncio.sleep(self.writeback_delay)
+                batch, self._pending = self._pending, {}
+                try:
+                    yield from self._write_batch_in_executor(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # the changes have been re-queued; they are written
+                    # together with the next change or on flush/close
+                    logger.error(
+                        "failed to write %d disco cache entries",
+                        len(batch),
+                        exc_info=True,
+                    )
+                    return
+        finally:
+            self._writeback_task = None
+
+    @staticmethod
+    def _parse(type_, data):
+        return aioxmpp.xml.read_single_xso(
+            io.BytesIO(data.encode("utf-8")),
+            type_,
+        )
@@ -27,6 +27,7 @@ import itertools
 import aioxmpp.cache
 import aioxmpp.callbacks
 import aioxmpp.errors as errors
+import aioxmpp.rsm
 import aioxmpp.service as service
 import aioxmpp.structs as structs
 import aioxmpp.stanza as stanza
@@ -501,6 +502,8 @@ class DiscoClient(service.Service):
 
     .. automethod:: query_items
 
+    .. automethod:: iter_items
+
     To prime the cache with information, the following methods can be used:
 
     .. automethod:: set_info_cache
@@ -515,6 +518,18 @@ class DiscoClient(service.Service):
     .. autoattribute:: items_cache_size
        :annotation: = 100
 
+    .. autoattribute:: info_cache_ttl
+       :annotation: = None
+
+    .. autoattribute:: items_cache_ttl
+       :annotation: = None
+
+    To keep results across reconnects and restarts, a persistent cache can be
+    attached:
+
+    .. autoattribute:: persistent_cache
+       :annotation: = None
+
     Usage example, assuming that you have a :class:`.node.Client` `client`::
 
       import aioxmpp.disco as disco
@@ -542,6 +557,8 @@ class DiscoClient(service.Service):
         self._info_pending.maxsize = 10000
         self._items_pending = aioxmpp.cache.LRUDict()
         self._items_pending.maxsize = 100
+        self._persistent_cache = None
+        self._persistent_warmup = None
 
         self.client.on_stream_destroyed.connect(
             self._clear_cache
@@ -576,6 +593,129 @@ class DiscoClient(service.Service):
     def items_cache_size(self, value):
         self._items_pending.maxsize = value
 
+    @property
+    def info_cache_ttl(self):
+        """
+        Time in seconds after which a result in the cache for
+        :meth:`query_info` is considered stale and queried again.
+
+        If :data:`None`, results are cached until the stream is destroyed.
+        Changing the value only affects results obtained afterwards.
+
+        .. versionadded:: 0.10
+        """
+        return self._info_pending.ttl
+
+    @info_cache_ttl.setter
+    def info_cache_ttl(self, value):
+        self._info_pending.ttl = value
+
+    @property
+    def items_cache_ttl(self):
+        """
+        Time in seconds after which a result in the cache for
+        :meth:`query_items` is considered stale and queried again.
+
+        If :data:`None`, results are cached until the stream is destroyed.
+        Changing the value only affects results obtained afterwards.
+
+        .. versionadded:: 0.10
+        """
+        return self._items_pending.ttl
+
+    @items_cache_ttl.setter
+    def items_cache_ttl(self, value):
+        self._items_pending.ttl = value
+
+    @property
+    def persistent_cache(self):
+        """
+        :class:`~aioxmpp.disco.PersistentCache` to use as second-level cache,
+        or :data:`None`.
+
+        When a cache is assigned, the in-memory caches are warmed in the
+        background with the unexpired entries loaded from it (see
+        :meth:`~aioxmpp.disco.PersistentCache.load`); queries issued before
+        that has finished may be sent out. :meth:`query_info` and
+        :meth:`query_items`
+        consult it before sending a query, and successful results of queries
+        are stored in it. It is not cleared when the stream is destroyed.
+
+        Entries of entities which announce :xep:`115` capabilities are
+        superseded by the verified information: when
+        :meth:`set_info_future` is called, the persisted entry for the entity
+        is discarded.
+
+        .. versionadded:: 0.10
+        """
+        return self._persistent_cache
+
+    @persistent_cache.setter
+    def persistent_cache(self, value):
+        if self._persistent_warmup is not None:
+            self._persistent_warmup.cancel()
+            self._persistent_warmup = None
+        self._persistent_cache = value
+        if value is None:
+            return
+
+        self._persistent_warmup = asyncio.ensure_future(
+            self._warm_from_persistent_cache(value)
+        )
+
+    @asyncio.coroutine
+    def _warm_from_persistent_cache(self, cache):
+        try:
+            entries = yield from cache.load()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.logger.warning("failed to load the persistent disco cache",
+                                exc_info=True)
+            return
+        finally:
+            if self._persistent_cache is cache:
+                self._persistent_warmup = None
+
+        if self._persistent_cache is not cache:
+            return
+
+        for jid, node, result in entries:
+            if isinstance(result, disco_xso.InfoQuery):
+                pending = self._info_pending
+            else:
+                pending = self._items_pending
+            key = jid, node
+            if key in pending:
+                continue
+            fut = asyncio.Future()
+            fut.set_result(result)
+            pending[key] = fut
+
+    @asyncio.coroutine
+    def _shutdown(self):
+        if self._persistent_warmup is not None:
+            self._persistent_warmup.cancel()
+            self._persistent_warmup = None
+        yield from super()._shutdown()
+
+    def _lookup_persistent(self, pending, type_, jid, node, store):
+        if self._persistent_cache is None:
+            raise KeyError((jid, node))
+        result = self._persistent_cache.lookup(type_, jid, node)
+        if store:
+            fut = asyncio.Future()
+            fut.set_result(result)
+            pending[jid, node] = fut
+        return result
+
+    def _persist_result(self, jid, node, task):
+        if self._persistent_cache is None or task.cancelled():
+            return
+        if task.exception() is not None:
+            return
+        self._persistent_cache.store(jid, node, task.result())
+
     def _clear_cache(self):
         for fut in self._info_pending.values():
             if not fut.done():
@@ -674,6 +814,16 @@ class DiscoClient(service.Service):
                 except asyncio.CancelledError:
                     pass
 
+            try:
+                return self._lookup_persistent(
+                    self._info_pending,
+                    disco_xso.InfoQuery,
+                    jid, node,
+                    not no_cache,
+                )
+            except KeyError:
+                pass
+
         request = asyncio.async(
             self.send_and_decode_info_query(jid, node)
         )
@@ -684,6 +834,14 @@ class DiscoClient(service.Service):
                 node
             )
         )
+        if not no_cache:
+            request.add_done_callback(
+                functools.partial(
+                    self._persist_result,
+                    jid,
+                    node,
+                )
+            )
 
         if not no_cache:
             self._info_pending[key] = request
@@ -743,12 +901,29 @@ class DiscoClient(service.Service):
                 except asyncio.CancelledError:
                     pass
 
+            try:
+                return self._lookup_persistent(
+                    self._items_pending,
+                    disco_xso.ItemsQuery,
+                    jid, node,
+                    True,
+                )
+            except KeyError:
+                pass
+
         request_iq = stanza.IQ(to=jid, type_=structs.IQType.GET)
         request_iq.payload = disco_xso.ItemsQuery(node=node)
 
         request = asyncio.async(
             self.client.send(request_iq)
         )
+        request.add_done_callback(
+            functools.partial(
+                self._persist_result,
+                jid,
+                node,
+            )
+        )
 
         self._items_pending[key] = request
         try:
@@ -774,6 +949,41 @@ class DiscoClient(service.Service):
 
         return result
 
+    @asyncio.coroutine
+    def _query_items_page(self, jid, node, rsm):
+        request_iq = stanza.IQ(to=jid, type_=structs.IQType.GET)
+        request_iq.payload = disco_xso.ItemsQuery(node=node)
+        request_iq.payload.rsm = rsm
+
+        response = yield from self.client.send(request_iq)
+        return list(response.items), response.rsm
+
+    def iter_items(self, jid, *, node=None, page_size=100):
+        """
+        Iterate over the items of the specified entity page by page.
+
+        :param jid: The entity to query.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: The node to query.
+        :type node: :class:`str` or :data:`None`
+        :param page_size: Number of items to request at once.
+        :type page_size: :class:`int`
+        :rtype: :class:`aioxmpp.rsm.ResultSetIterator`
+        :return: Iterator over the :class:`.xso.Item` objects.
+
+        In contrast to :meth:`query_items`, the items are requested in pages
+        using :xep:`59` and the result is not cached. This is useful for
+        entities with very large item lists, such as the node list of a
+        pubsub service. If the entity does not support :xep:`59`, all items
+        are returned with the first page.
+
+        .. versionadded:: 0.10
+        """
+        return aioxmpp.rsm.ResultSetIterator(
+            functools.partial(self._query_items_page, jid, node),
+            page_size=page_size,
+        )
+
     def set_info_cache(self, jid, node, info):
         """
         This is a wrapper around :meth:`set_info_future` which creates a future
@@ -811,8 +1021,15 @@ class DiscoClient(service.Service):
            uses `require_fresh`.
 
         .. versionadded:: 0.5
+
+        .. versionchanged:: 0.10
+
+           If a :attr:`persistent_cache` is set, its entry for the `jid` and
+           `node` combination is discarded.
         """
         self._info_pending[jid, node] = fut
+        if self._persistent_cache is not None:
+            self._persistent_cache.discard(disco_xso.InfoQuery, jid, node)
 
 
 class mount_as_node(service.Descriptor):
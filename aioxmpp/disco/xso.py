@@ -20,6 +20,7 @@
 #
 ########################################################################
 import aioxmpp.forms.xso as forms_xso
+import aioxmpp.rsm.xso as rsm_xso
 import aioxmpp.stanza as stanza
 import aioxmpp.xso as xso
 
@@ -293,6 +294,13 @@ class ItemsQuery(xso.XSO):
 
        The items at the addressed entity.
 
+    .. attribute:: rsm
+
+       :xep:`59` result set management information, used to page through
+       large item lists.
+
+       .. versionadded:: 0.10
+
     """
     TAG = (namespaces.xep0030_items, "query")
 
@@ -300,6 +308,8 @@ class ItemsQuery(xso.XSO):
 
     items = xso.ChildList([Item])
 
+    rsm = xso.Child([rsm_xso.ResultSetMetadata])
+
     def __init__(self, *, node=None, items=()):
         super().__init__()
         self.items.extend(items)
@@ -24,6 +24,7 @@ import pathlib
 import collections
 import urllib.parse
 
+import aioxmpp.cache
 import aioxmpp.hashes
 
 from .common import AbstractKey
@@ -168,6 +169,10 @@ class Implementation:
     def __init__(self, algorithms, **kwargs):
         super().__init__(**kwargs)
         self.__algorithms = algorithms
+        # hash input -> keys; the local hash input often flips between a few
+        # values when features are toggled
+        self.__keys_cache = aioxmpp.cache.LRUDict()
+        self.__keys_cache.maxsize = 4
 
     def extract_keys(self, presence):
         if presence.xep0390_caps is None:
@@ -188,5 +193,12 @@ class Implementation:
 
     def calculate_keys(self, query_response):
         input = _get_hash_input(query_response)
-        for algo in self.__algorithms:
-            yield Key(algo, _calculate_hash(algo, input))
+        try:
+            keys = self.__keys_cache[input]
+        except KeyError:
+            keys = tuple(
+                Key(algo, _calculate_hash(algo, input))
+                for algo in self.__algorithms
+            )
+            self.__keys_cache[input] = keys
+        return iter(keys)
@@ -23,10 +23,15 @@ import asyncio
 import collections
 import copy
 import functools
+import io
 import logging
 import os
+import pathlib
+import sqlite3
 import tempfile
+import threading
 
+import aioxmpp.cache
 import aioxmpp.callbacks
 import aioxmpp.disco as disco
 import aioxmpp.service
@@ -42,6 +47,121 @@ from . import caps115, caps390
 logger = logging.getLogger("aioxmpp.entitycaps")
 
 
+class IndexedDatabase:
+    """
+    Single-file database of entity capabilities information.
+
+    :param path: Path to the SQLite database file.
+    :type path: :class:`str` or :class:`pathlib.Path`
+
+    .. versionadded:: 0.10
+
+    The database stores the serialised :class:`~.disco.xso.InfoQuery` of each
+    known hash in one indexed table, keyed by the same relative path which is
+    used for the directory-based databases (see
+    :meth:`Cache.set_user_db_path`). Compared to the directory layout, this
+    avoids one file (and one ``open`` call) per hash, which matters when many
+    distinct hashes are looked up in a short time, e.g. when joining a large
+    MUC.
+
+    Instances can be used concurrently from the event loop thread and from
+    executor threads.
+
+    .. automethod:: lookup
+
+    .. automethod:: store_many
+
+    .. automethod:: import_directory
+
+    .. automethod:: close
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS caps ("
+                " key TEXT PRIMARY KEY,"
+                " data BLOB NOT NULL"
+                ")"
+            )
+
+    @staticmethod
+    def _key_to_str(key):
+        return pathlib.PurePath(key.path).as_posix()
+
+    def lookup(self, key):
+        """
+        Return the serialised entry for `key`.
+
+        :param key: Key of the entry.
+        :raises KeyError: if there is no entry for `key`.
+        :rtype: :class:`bytes`
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM caps WHERE key = ?",
+                (self._key_to_str(key),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return bytes(row[0])
+
+    def store_many(self, entries):
+        """
+        Store several serialised entries in a single transaction.
+
+        :param entries: Pairs of key and serialised entry.
+        :type entries: iterable of (key, :class:`bytes`) pairs
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO caps (key, data) VALUES (?, ?)",
+                (
+                    (self._key_to_str(key), data)
+                    for key, data in entries
+                )
+            )
+
+    def import_directory(self, path):
+        """
+        Import all entries from a directory-based database.
+
+        :param path: Root of the directory-based database.
+        :type path: :class:`pathlib.Path`
+        :return: The number of imported entries.
+        :rtype: :class:`int`
+
+        This can be used to migrate a user database previously set with
+        :meth:`Cache.set_user_db_path`. The files are not parsed, so invalid
+        files are imported as-is and only fail on lookup.
+        """
+        rows = []
+        for file_path in path.glob("**/*.xml"):
+            with file_path.open("rb") as f:
+                rows.append((
+                    file_path.relative_to(path).as_posix(),
+                    f.read(),
+                ))
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO caps (key, data) VALUES (?, ?)",
+                rows
+            )
+
+        return len(rows)
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._db.close()
+
+
 class Cache:
     """
     This provides a two-level cache for entity capabilities information. The
@@ -63,6 +183,14 @@ class Cache:
 
     .. automethod:: set_user_db_path
 
+    .. automethod:: set_user_db
+
+    .. autoattribute:: memory_overlay_size
+
+    .. autoattribute:: writeback_delay
+
+    .. automethod:: flush
+
     Queries (API intended for :class:`Service`):
 
     .. automethod:: create_query_future
@@ -72,11 +200,21 @@ class Cache:
     .. automethod:: lookup
     """
 
+    #: Time in seconds for which new entries are collected before they are
+    #: written to the database set with :meth:`set_user_db` in one batch.
+    #:
+    #: .. versionadded:: 0.10
+    writeback_delay = 1.0
+
     def __init__(self):
         self._lookup_cache = {}
-        self._memory_overlay = {}
+        self._memory_overlay = aioxmpp.cache.LRUDict()
+        self._memory_overlay.maxsize = 4096
         self._system_db_path = None
         self._user_db_path = None
+        self._user_db = None
+        self._pending_writes = {}
+        self._writeback_task = None
 
     def _erase_future(self, key, fut):
         try:
@@ -93,6 +231,40 @@ class Cache:
     def set_user_db_path(self, path):
         self._user_db_path = path
 
+    def set_user_db(self, db):
+        """
+        Use an :class:`IndexedDatabase` as user-level database.
+
+        :param db: The database to use or :data:`None`.
+        :type db: :class:`IndexedDatabase`
+
+        The indexed database is consulted before the directory set with
+        :meth:`set_user_db_path`. If it is set, new entries are written to it
+        in batches (see :attr:`writeback_delay`) instead of to the directory.
+        Entries which have not been written yet are lost unless :meth:`flush`
+        is called before the event loop stops; :class:`EntityCapsService`
+        does so when it is shut down.
+
+        .. versionadded:: 0.10
+        """
+        self._user_db = db
+
+    @property
+    def memory_overlay_size(self):
+        """
+        Maximum number of entries kept in memory.
+
+        Entries beyond this limit are evicted in least recently used order;
+        they are looked up in the databases again when needed.
+
+        .. versionadded:: 0.10
+        """
+        return self._memory_overlay.maxsize
+
+    @memory_overlay_size.setter
+    def memory_overlay_size(self, value):
+        self._memory_overlay.maxsize = value
+
     def lookup_in_database(self, key):
         try:
             result = self._memory_overlay[key]
@@ -116,6 +288,20 @@ class Cache:
                 with f:
                     return aioxmpp.xml.read_single_xso(f, disco.xso.InfoQuery)
 
+        if self._user_db is not None:
+            try:
+                data = self._user_db.lookup(key)
+            except KeyError:
+                pass
+            else:
+                logger.debug("indexed user db hit: %s", key)
+                result = aioxmpp.xml.read_single_xso(
+                    io.BytesIO(data),
+                    disco.xso.InfoQuery,
+                )
+                self._memory_overlay[key] = result
+                return result
+
         if self._user_db_path is not None:
             try:
                 f = (
@@ -186,13 +372,94 @@ class Cache:
         """
         copied_entry = copy.copy(entry)
         self._memory_overlay[key] = copied_entry
-        if self._user_db_path is not None:
+        if self._user_db is not None:
+            self._pending_writes[key] = entry.captured_events
+            if self._writeback_task is None:
+                self._writeback_task = asyncio.ensure_future(
+                    self._writeback()
+                )
+        elif self._user_db_path is not None:
             asyncio.async(asyncio.get_event_loop().run_in_executor(
                 None,
                 writeback,
                 self._user_db_path / key.path,
                 entry.captured_events))
 
+    def _writeback_done(self, batch, fut):
+        try:
+            fut.result()
+        except (Exception, asyncio.CancelledError):
+            logger.error(
+                "failed to write %d entity capabilities cache entries",
+                len(batch),
+                exc_info=True,
+            )
+            # entries added in the meantime are newer and take precedence
+            for key, captured_events in batch.items():
+                self._pending_writes.setdefault(key, captured_events)
+
+    def _write_batch(self, batch):
+        fut = asyncio.get_event_loop().run_in_executor(
+            None,
+            writeback_many,
+            self._user_db,
+            batch,
+        )
+        fut.add_done_callback(
+            functools.partial(self._writeback_done, batch)
+        )
+        return fut
+
+    @asyncio.coroutine
+    def flush(self):
+        """
+        Write all pending entries to the database set with
+        :meth:`set_user_db`.
+
+        :raises Exception: if writing to the database fails. The entries are
+            kept and written with the next batch.
+
+        This waits for a batch which is currently being written, and then
+        writes the remaining entries without waiting for
+        :attr:`writeback_delay`.
+
+        .. versionadded:: 0.10
+        """
+        task = self._writeback_task
+        if task is not None:
+            task.cancel()
+            yield from asyncio.wait([task])
+
+        batch = self._pending_writes
+        self._pending_writes = {}
+        if batch:
+            yield from self._write_batch(batch)
+
+    @asyncio.coroutine
+    def _writeback(self):
+        try:
+            while self._pending_writes:
+                yield from asyncio.sleep(self.writeback_delay)
+                batch = self._pending_writes
+                self._pending_writes = {}
+                if not batch:
+                    # written by flush() in the meantime
+                    continue
+                fut = self._write_batch(batch)
+                try:
+                    yield from asyncio.wait([fut])
+                except asyncio.CancelledError:
+                    # let the batch be written before terminating, so that
+                    # flush() can rely on it being done
+                    yield from asyncio.wait([fut])
+                    raise
+                if fut.cancelled() or fut.exception() is not None:
+                    # the batch has been re-queued by _writeback_done; it is
+                    # retried with the next call to add_cache_entry
+                    return
+        finally:
+            self._writeback_task = None
+
 
 class EntityCapsService(aioxmpp.service.Service):
     """
@@ -245,6 +512,30 @@ class EntityCapsService(aioxmpp.service.Service):
 
     .. autoattribute:: xep390_support
 
+    .. autoattribute:: rehash_delay
+
+    Resolution of unknown hashes:
+
+    Hashes which are not in the :attr:`cache` are resolved by querying one of
+    the entities which announced them. Only one query is made per hash at any
+    time; entities announcing a hash which is being resolved wait for that
+    query. The number of concurrent queries is limited globally, to avoid
+    sending hundreds of queries when a large MUC is joined.
+
+    While a hash is being resolved, further entities announcing it are
+    collected. When a query slot becomes available, an entity which has
+    answered a query of this service before is preferred over the entity
+    which announced the hash first. If the query fails, the next collected
+    entity is queried by the same resolver; only if all of them failed do
+    the waiting entities query themselves. A queued query which finds the
+    hash cached once it gets its slot is not sent.
+
+    .. autoattribute:: max_concurrent_queries
+
+    .. autoattribute:: queries_in_flight
+
+    .. autoattribute:: queries_queued
+
     .. versionchanged:: 0.8
 
        This class was formerly known as :class:`aioxmpp.entitycaps.Service`. It
@@ -264,9 +555,25 @@ class EntityCapsService(aioxmpp.service.Service):
 
     NODE = "http://aioxmpp.zombofant.net/"
 
+    #: Time in seconds to wait after a change of the local service discovery
+    #: information before the capability hashes are recalculated.
+    #:
+    #: All changes which happen in this time are coalesced, so that only one
+    #: recalculation and one emission of :meth:`on_ver_changed` happen per
+    #: burst of changes (for example, when many services with
+    #: :class:`~aioxmpp.disco.register_feature` descriptors are summoned). Each
+    #: change restarts the delay. With the default of zero, changes made
+    #: within the same event loop iteration are coalesced.
+    #:
+    #: .. versionadded:: 0.10
+    rehash_delay = 0
+
     on_ver_changed = aioxmpp.callbacks.Signal()
 
     def __init__(self, node, **kwargs):
+        # the features registered by this service fire on_info_changed during
+        # the initialisation of the base class
+        self._rehash_handle = None
         super().__init__(node, **kwargs)
 
         self.__current_keys = {}
@@ -283,6 +590,15 @@ class EntityCapsService(aioxmpp.service.Service):
         self.__active_hashsets = []
         self.__key_users = collections.Counter()
 
+        self._max_concurrent_queries = 8
+        self._queries_in_flight = 0
+        self._query_waiters = collections.deque()
+        # entities announcing a hash while the query for it is queued
+        self._query_candidates = {}
+        # entities which answered a query for a hash
+        self._responsive_peers = aioxmpp.cache.LRUDict()
+        self._responsive_peers.maxsize = 1024
+
     @property
     def xep115_support(self):
         """
@@ -352,29 +668,199 @@ class EntityCapsService(aioxmpp.service.Service):
     def cache(self):
         self._cache = Cache()
 
+    @property
+    def max_concurrent_queries(self):
+        """
+        Maximum number of :xep:`30` queries to resolve unknown hashes which
+        are in flight at the same time. Defaults to 8.
+
+        .. versionadded:: 0.10
+        """
+        return self._max_concurrent_queries
+
+    @max_concurrent_queries.setter
+    def max_concurrent_queries(self, value):
+        if value <= 0:
+            raise ValueError("max_concurrent_queries must be positive")
+        self._max_concurrent_queries = value
+        self._wake_query_waiters()
+
+    @property
+    def queries_in_flight(self):
+        """
+        Number of queries to resolve unknown hashes which are currently in
+        flight.
+
+        .. versionadded:: 0.10
+        """
+        return self._queries_in_flight
+
+    @property
+    def queries_queued(self):
+        """
+        Number of queries to resolve unknown hashes which are waiting for
+        a free slot (see :attr:`max_concurrent_queries`).
+
+        .. versionadded:: 0.10
+        """
+        return len(self._query_waiters)
+
+    def _wake_query_waiters(self):
+        free = self._max_concurrent_queries - self._queries_in_flight
+        while free > 0 and self._query_waiters:
+            fut = self._query_waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    @asyncio.coroutine
+    def _acquire_query_slot(self):
+        while self._queries_in_flight >= self._max_concurrent_queries:
+            fut = asyncio.Future()
+            self._query_waiters.append(fut)
+            try:
+                yield from fut
+            except asyncio.CancelledError:
+                try:
+                    self._query_waiters.remove(fut)
+                except ValueError:
+                    # we were woken up already; pass the slot on
+                    self._wake_query_waiters()
+                raise
+        self._queries_in_flight += 1
+
+    def _release_query_slot(self):
+        self._queries_in_flight -= 1
+        self._wake_query_waiters()
+
     @aioxmpp.service.depsignal(
         disco.DiscoServer,
         "on_info_changed")
     def _info_changed(self):
+        if self._rehash_handle is not None:
+            if not self.rehash_delay:
+                # already scheduled for this loop iteration
+                return
+            self._rehash_handle.cancel()
+
         self.logger.debug("info changed, scheduling re-calculation of version")
-        asyncio.get_event_loop().call_soon(
-            self.update_hash
-        )
+        if self.rehash_delay:
+            self._rehash_handle = asyncio.get_event_loop().call_later(
+                self.rehash_delay,
+                self.update_hash
+            )
+        else:
+            self._rehash_handle = asyncio.get_event_loop().call_soon(
+                self.update_hash
+            )
 
     @asyncio.coroutine
     def _shutdown(self):
+        if self._rehash_handle is not None:
+            self._rehash_handle.cancel()
+            self._rehash_handle = None
+        try:
+            yield from self._cache.flush()
+        except Exception:
+            # logged by the cache already; the entries are lost
+            pass
         for group in self.__current_keys.values():
             for key in group:
                 self.disco_server.unmount_node(key.node)
 
+    def _pick_query_target(self, jid, candidates, tried=()):
+        options = [
+            candidate
+            for candidate in [jid] + list(candidates)
+            if candidate not in tried
+        ]
+        for candidate in options:
+            if candidate in self._responsive_peers:
+                return candidate
+        if options:
+            return options[0]
+        return None
+
+    def _pending_query(self, key, fut):
+        other = self.cache._lookup_cache.get(key)
+        if other is None or other is fut or other.done():
+            return None
+        return other
+
     @asyncio.coroutine
     def query_and_cache(self, jid, key, fut):
-        data = yield from self.disco_client.query_info(
-            jid,
-            node=key.node,
-            require_fresh=True,
-            no_cache=True,  # the caps node is never queried by apps
-        )
+        candidates = self._query_candidates.setdefault(key, [])
+        tried = set()
+        try:
+            while True:
+                other = self._pending_query(key, fut)
+                if other is not None:
+                    # another query for the hash has been started while we
+                    # were waiting; use its result instead of querying
+                    try:
+                        data = yield from other
+                    except ValueError:
+                        pass
+                    else:
+                        if not fut.done():
+                            fut.set_result(data)
+                        return data
+
+                yield from self._acquire_query_slot()
+                try:
+                    # the entry may have been cached while we were waiting
+                    # for the slot
+                    try:
+                        data = self.cache.lookup_in_database(key)
+                    except KeyError:
+                        pass
+                    else:
+                        if not fut.done():
+                            fut.set_result(data)
+                        return data
+
+                    if self._pending_query(key, fut) is not None:
+                        continue
+
+                    target = self._pick_query_target(jid, candidates, tried)
+                    tried.add(target)
+                    try:
+                        data = yield from self.disco_client.query_info(
+                            target,
+                            node=key.node,
+                            require_fresh=True,
+                            # the caps node is never queried by apps
+                            no_cache=True,
+                        )
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        if self._pick_query_target(
+                                jid, candidates, tried) is None:
+                            raise
+                        self.logger.debug(
+                            "query for %s at %s failed, trying next entity",
+                            key, target,
+                            exc_info=True,
+                        )
+                        continue
+                finally:
+                    self._release_query_slot()
+
+                self._responsive_peers[target] = True
+                break
+        except (Exception, asyncio.CancelledError) as exc:
+            # let entities waiting for this hash fall back to querying
+            # themselves (see Cache.lookup); this includes cancellation, as
+            # the future would otherwise block lookups for this hash forever
+            if not fut.done():
+                fut.set_exception(
+                    ValueError("query failed: {!r}".format(exc))
+                )
+            raise
+        finally:
+            if self._query_candidates.get(key) is candidates:
+                del self._query_candidates[key]
 
         try:
             if key.verify(data):
@@ -390,6 +876,10 @@ class EntityCapsService(aioxmpp.service.Service):
     @asyncio.coroutine
     def lookup_info(self, jid, keys):
         for key in keys:
+            candidates = self._query_candidates.get(key)
+            if candidates is not None:
+                candidates.append(jid)
+
             try:
                 info = yield from self.cache.lookup(key)
             except KeyError:
@@ -478,6 +968,7 @@ class EntityCapsService(aioxmpp.service.Service):
         return True
 
     def update_hash(self):
+        self._rehash_handle = None
         node = disco.StaticNode.clone(self.disco_server)
         info = node.as_info_xso()
 
@@ -516,3 +1007,21 @@ def writeback(path, captured_events):
             os.unlink(tmpf.name)
             raise
         os.replace(tmpf.name, str(path))
+
+
+def serialize_events(captured_events):
+    buf = io.BytesIO()
+    generator = aioxmpp.xml.XMPPXMLGenerator(
+        buf,
+        short_empty_elements=True)
+    generator.startDocument()
+    aioxmpp.xso.events_to_sax(captured_events, generator)
+    generator.endDocument()
+    return buf.getvalue()
+
+
+def writeback_many(db, captured_events_by_key):
+    db.store_many(
+        (key, serialize_events(captured_events))
+        for key, captured_events in captured_events_by_key.items()
+    )
@@ -0,0 +1,68 @@
+########################################################################
+# File name: __init__.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+"""
+:mod:`~aioxmpp.mam` -- Message Archive Management (:xep:`313`)
+##############################################################
+
+Message Archive Management allows an entity to retrieve messages from an
+archive, such as the archive which the server keeps for an account or the
+archive of a multi-user chat room. This subpackage provides a client for
+querying archives.
+
+.. versionadded:: 0.10
+
+Service
+=======
+
+.. currentmodule:: aioxmpp
+
+.. autoclass:: MAMClient
+
+.. currentmodule:: aioxmpp.mam
+
+.. autoclass:: ArchiveStream()
+
+.. autodata:: PageStats
+
+.. currentmodule:: aioxmpp.mam.xso
+.. module:: aioxmpp.mam.xso
+
+XSOs
+====
+
+.. attribute:: aioxmpp.Message.xep0313_result
+
+   On a message carrying an archived message, this holds the
+   :class:`~.mam.xso.Result` XSO.
+
+.. autoclass:: Query
+
+.. autoclass:: Fin
+
+.. autoclass:: Result
+
+"""
+from .service import (  # NOQA
+    ArchiveStream,
+    MAMClient,
+    PageStats,
+)
@@ -0,0 +1,408 @@
+########################################################################
+# File name: service.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import base64
+import collections
+import datetime
+import functools
+import random
+
+import aioxmpp.callbacks
+import aioxmpp.forms
+import aioxmpp.rsm
+import aioxmpp.service
+import aioxmpp.xso
+
+from aioxmpp.utils import namespaces
+
+from . import xso as mam_xso
+
+
+#: Statistics about a single page retrieved from an archive.
+#:
+#: .. attribute:: archive
+#:
+#:    The archive which was queried (:data:`None` for the own archive).
+#:
+#: .. attribute:: queryid
+#:
+#:    The :attr:`~.xso.Query.queryid` used for the page.
+#:
+#: .. attribute:: count
+#:
+#:    The number of results on the page.
+#:
+#: .. attribute:: elapsed
+#:
+#:    Time in seconds between sending the query and receiving the final
+#:    response.
+PageStats = collections.namedtuple(
+    "PageStats",
+    [
+        "archive",
+        "queryid",
+        "count",
+        "elapsed",
+    ]
+)
+
+
+def _make_filter_form(with_, start, end):
+    if with_ is None and start is None and end is None:
+        return None
+
+    data = aioxmpp.forms.Data(
+        aioxmpp.forms.DataType.SUBMIT,
+    )
+
+    data.fields.append(
+        aioxmpp.forms.Field(
+            type_=aioxmpp.forms.FieldType.HIDDEN,
+            var="FORM_TYPE",
+            values=[namespaces.xep0313_mam],
+        )
+    )
+
+    if with_ is not None:
+        data.fields.append(
+            aioxmpp.forms.Field(
+                type_=aioxmpp.forms.FieldType.JID_SINGLE,
+                var="with",
+                values=[str(with_)],
+            )
+        )
+
+    datetime_type = aioxmpp.xso.DateTime()
+    for var, value in (("start", start), ("end", end)):
+        if value is None:
+            continue
+        data.fields.append(
+            aioxmpp.forms.Field(
+                type_=aioxmpp.forms.FieldType.TEXT_SINGLE,
+                var=var,
+                values=[datetime_type.format(value)],
+            )
+        )
+
+    return data
+
+
+class ArchiveStream:
+    """
+    Stream the results of several archive queries in order, while fetching
+    them concurrently.
+
+    :param iterators: The result sets to combine.
+    :type iterators: :class:`~collections.abc.Iterable` of
+        :class:`aioxmpp.rsm.ResultSetIterator`
+    :param max_buffered_pages: Number of pages to buffer per result set.
+    :type max_buffered_pages: :class:`int`
+
+    Each result set is fetched page by page in the background, holding at most
+    `max_buffered_pages` pages until they are consumed. The results are
+    returned in the order of the `iterators`: all results of the first result
+    set, then all of the second, and so on.
+
+    Instances are created by :meth:`MAMClient.fetch_range`; the interface is
+    the same as the one of :class:`aioxmpp.rsm.ResultSetIterator`.
+
+    The background fetches start as soon as the stream is created. They only
+    stop when all result sets have been consumed, when an error occurs, or
+    when :meth:`close` is called. If the stream may be abandoned early, call
+    :meth:`close` or use it as asynchronous context manager, which closes it
+    on exit::
+
+        async with mam.fetch_range(start, end) as stream:
+            async for result in stream:
+                ...
+
+    .. automethod:: get_page
+
+    .. automethod:: close
+    """
+
+    def __init__(self, iterators, *, max_buffered_pages=4):
+        if max_buffered_pages < 1:
+            raise ValueError("max_buffered_pages must be positive")
+
+        self._iterators = list(iterators)
+        self._queues = []
+        self._tasks = []
+        for iterator in self._iterators:
+            queue = asyncio.Queue(maxsize=max_buffered_pages)
+            self._queues.append(queue)
+            self._tasks.append(asyncio.ensure_future(
+                self._pump(iterator, queue)
+            ))
+        self._items = collections.deque()
+
+    @asyncio.coroutine
+    def _pump(self, iterator, queue):
+        try:
+            while True:
+                page = yield from iterator.get_page()
+                yield from queue.put(page)
+                if not page:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            yield from queue.put(exc)
+
+    @asyncio.coroutine
+    def get_page(self):
+        """
+        Return the next page of results.
+
+        :rtype: :class:`list` of :class:`~.xso.Result`
+        :return: The next non-empty page of results, or an empty list if all
+            result sets have been consumed.
+        :raises aioxmpp.errors.XMPPError: as returned by the archive
+
+        If an error occurs, the stream is closed.
+        """
+        while self._queues:
+            page = yield from self._queues[0].get()
+            if isinstance(page, Exception):
+                self.close()
+                raise page
+            if page:
+                return page
+            del self._queues[0]
+            del self._tasks[0]
+            del self._iterators[0]
+
+        return []
+
+    def close(self):
+        """
+        Stop fetching and release all buffered pages.
+        """
+        for task in self._tasks:
+            task.cancel()
+        for iterator in self._iterators:
+            iterator.close()
+        self._tasks.clear()
+        self._iterators.clear()
+        self._queues.clear()
+        self._items.clear()
+
+    @asyncio.coroutine
+    def __aenter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __aexit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if not self._items:
+            self._items.extend((yield from self.get_page()))
+            if not self._items:
+                raise StopAsyncIteration
+        return self._items.popleft()
+
+
+class MAMClient(aioxmpp.service.Service):
+    """
+    Query message archives (:xep:`313`).
+
+    Results are returned as :class:`~.xso.Result` objects, in the order the
+    archive returns them (oldest first). The archived message is available at
+    ``result.forwarded.stanza`` and the time it was archived at
+    ``result.forwarded.delay.stamp``.
+
+    Results are only accepted from the archive which was queried; results for
+    the own archive must come from the bare JID of the account (or carry no
+    sender).
+
+    .. automethod:: iter_archive
+
+    .. automethod:: fetch_range
+
+    .. signal:: on_page_fetched(stats)
+
+        Fires when a page of results has been received.
+
+        `stats` is a :class:`PageStats` tuple with the size of the page and
+        the time it took to retrieve it. This can be used to measure the
+        throughput of an archive synchronisation.
+
+    .. versionadded:: 0.10
+    """
+
+    on_page_fetched = aioxmpp.callbacks.Signal()
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self._queries = {}
+
+    def _is_archive(self, archive, from_):
+        if archive is None:
+            return from_ is None or from_ == self.client.local_jid.bare()
+        return from_ == archive
+
+    @aioxmpp.service.inbound_message_filter
+    def _filter_inbound_message(self, msg):
+        result = msg.xep0313_result
+        if result is None:
+            return msg
+
+        try:
+            archive, results = self._queries[result.queryid]
+        except KeyError:
+            return msg
+
+        if not self._is_archive(archive, msg.from_):
+            return msg
+
+        results.append(result)
+        return None
+
+    @asyncio.coroutine
+    def _query_page(self, archive, node, form, rsm):
+        queryid = base64.b64encode(
+            random.getrandbits(96).to_bytes(12, "little")
+        ).decode("ascii")
+
+        query = mam_xso.Query(queryid=queryid, form=form, rsm=rsm)
+        query.node = node
+
+        iq = aioxmpp.IQ(
+            type_=aioxmpp.IQType.SET,
+            to=archive,
+            payload=query,
+        )
+
+        results = []
+        self._queries[queryid] = archive, results
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        try:
+            fin = yield from self.client.send(iq)
+        finally:
+            del self._queries[queryid]
+
+        self.on_page_fetched(PageStats(
+            archive,
+            queryid,
+            len(results),
+            loop.time() - start_time,
+        ))
+
+        if fin is None or fin.complete:
+            return results, None
+        return results, fin.rsm
+
+    def iter_archive(self, archive=None, *,
+                     with_=None, start=None, end=None, node=None,
+                     page_size=100):
+        """
+        Iterate over the messages in an archive.
+
+        :param archive: The archive to query, or :data:`None` to query the
+            archive of the account.
+        :type archive: :class:`aioxmpp.JID` or :data:`None`
+        :param with_: Only return messages exchanged with this entity.
+        :type with_: :class:`aioxmpp.JID` or :data:`None`
+        :param start: Only return messages archived at or after this time.
+        :type start: :class:`datetime.datetime` or :data:`None`
+        :param end: Only return messages archived at or before this time.
+        :type end: :class:`datetime.datetime` or :data:`None`
+        :param node: The pubsub node to query.
+        :type node: :class:`str` or :data:`None`
+        :param page_size: Number of messages to request at once.
+        :type page_size: :class:`int`
+        :rtype: :class:`aioxmpp.rsm.ResultSetIterator`
+        :return: Iterator over the :class:`~.xso.Result` objects.
+
+        The archive is queried page by page using :xep:`59`, requesting the
+        next page while the current one is processed.
+        """
+        return aioxmpp.rsm.ResultSetIterator(
+            functools.partial(
+                self._query_page,
+                archive,
+                node,
+                _make_filter_form(with_, start, end),
+            ),
+            page_size=page_size,
+        )
+
+    def fetch_range(self, start, end, archive=None, *,
+                    with_=None, node=None,
+                    parallelism=4, page_size=100, max_buffered_pages=4):
+        """
+        Retrieve the messages archived in a time range using concurrent
+        queries.
+
+        :param start: Start of the time range (inclusive).
+        :type start: :class:`datetime.datetime`
+        :param end: End of the time range (inclusive).
+        :type end: :class:`datetime.datetime`
+        :param parallelism: Number of queries to run concurrently.
+        :type parallelism: :class:`int`
+        :param max_buffered_pages: Number of pages to buffer per query.
+        :type max_buffered_pages: :class:`int`
+        :rtype: :class:`ArchiveStream`
+        :return: Stream over the :class:`~.xso.Result` objects, in order.
+
+        The time range is split into `parallelism` slices of equal length,
+        each of which is paged through by a separate query as described in
+        :meth:`iter_archive`. The results are merged in order, so that
+        retrieving a long time range is limited by the bandwidth instead of
+        the round-trip time of the individual page requests.
+
+        The remaining arguments are the same as for :meth:`iter_archive`.
+
+        The queries are started immediately. The returned stream must be
+        closed (see :class:`ArchiveStream`) unless it is consumed until the
+        end.
+        """
+        if parallelism < 1:
+            raise ValueError("parallelism must be positive")
+        if end <= start:
+            raise ValueError("end must be after start")
+
+        step = (end - start) / parallelism
+        bounds = [start + step * i for i in range(parallelism)] + [end]
+
+        iterators = []
+        for slice_start, slice_end in zip(bounds, bounds[1:]):
+            if slice_end is not end:
+                # the end of a range is inclusive; avoid returning messages
+                # at the boundary twice
+                slice_end -= datetime.timedelta(microseconds=1)
+            iterators.append(self.iter_archive(
+                archive,
+                with_=with_,
+                start=slice_start,
+                end=slice_end,
+                node=node,
+                page_size=page_size,
+            ))
+
+        return ArchiveStream(iterators, max_buffered_pages=max_buffered_pages)
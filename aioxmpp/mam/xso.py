@@ -0,0 +1,151 @@
+########################################################################
+# File name: xso.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import aioxmpp.forms.xso as forms_xso
+import aioxmpp.rsm.xso as rsm_xso
+import aioxmpp.xso as xso
+
+from aioxmpp.utils import namespaces
+
+from ..misc import Forwarded
+from ..stanza import Message, IQ
+
+
+namespaces.xep0313_mam = "urn:xmpp:mam:2"
+
+
+@IQ.as_payload_class
+class Query(xso.XSO):
+    """
+    Query an archive for messages.
+
+    :param queryid: Identifier to tag the results with.
+    :type queryid: :class:`str` or :data:`None`
+    :param form: Filter for the query.
+    :type form: :class:`aioxmpp.forms.Data` or :data:`None`
+    :param rsm: Range of the results to return.
+    :type rsm: :class:`aioxmpp.rsm.xso.ResultSetMetadata` or :data:`None`
+
+    .. attribute:: queryid
+
+       Identifier which the archive uses to tag the :class:`Result` messages
+       belonging to this query.
+
+    .. attribute:: node
+
+       The pubsub node to query, or :data:`None` to query a message archive.
+
+    .. attribute:: form
+
+       A :class:`aioxmpp.forms.Data` submit form with the filter criteria.
+
+    .. attribute:: rsm
+
+       The :class:`aioxmpp.rsm.xso.ResultSetMetadata` selecting the page of
+       results.
+    """
+
+    TAG = (namespaces.xep0313_mam, "query")
+
+    queryid = xso.Attr(
+        "queryid",
+        default=None,
+    )
+
+    node = xso.Attr(
+        "node",
+        default=None,
+    )
+
+    form = xso.Child([forms_xso.Data])
+
+    rsm = xso.Child([rsm_xso.ResultSetMetadata])
+
+    def __init__(self, *, queryid=None, form=None, rsm=None):
+        super().__init__()
+        self.queryid = queryid
+        self.form = form
+        self.rsm = rsm
+
+
+@IQ.as_payload_class
+class Fin(xso.XSO):
+    """
+    Final response of an archive to a :class:`Query`.
+
+    .. attribute:: complete
+
+       Whether the last page of the results has been returned.
+
+    .. attribute:: rsm
+
+       The :class:`aioxmpp.rsm.xso.ResultSetMetadata` describing the returned
+       page.
+    """
+
+    TAG = (namespaces.xep0313_mam, "fin")
+
+    complete = xso.Attr(
+        "complete",
+        type_=xso.Bool(),
+        default=False,
+    )
+
+    rsm = xso.Child([rsm_xso.ResultSetMetadata])
+
+
+class Result(xso.XSO):
+    """
+    A single archived message, as sent by the archive in response to a
+    :class:`Query`.
+
+    :class:`Result` XSOs are available at
+    :attr:`aioxmpp.Message.xep0313_result`.
+
+    .. attribute:: queryid
+
+       The :attr:`Query.queryid` of the query this result belongs to.
+
+    .. attribute:: id_
+
+       The archive-assigned unique ID of the message.
+
+    .. attribute:: forwarded
+
+       The :class:`~.misc.Forwarded` object holding the archived message and
+       the time it was archived.
+    """
+
+    TAG = (namespaces.xep0313_mam, "result")
+
+    queryid = xso.Attr(
+        "queryid",
+        default=None,
+    )
+
+    id_ = xso.Attr(
+        "id",
+    )
+
+    forwarded = xso.Child([Forwarded])
+
+
+Message.xep0313_result = xso.Child([Result])
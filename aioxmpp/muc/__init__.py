@@ -59,6 +59,8 @@ The service returns :class:`Room` objects which are used to track joined MUCs:
 
 .. autoclass:: RoomState
 
+.. autoclass:: HistoryStream
+
 .. autoclass:: LeaveMode
 
 Inside rooms, there are occupants:
@@ -119,7 +121,14 @@ Owner namespace
 .. autoclass:: DestroyRequest
 
 """
-from .service import MUCClient, Occupant, Room, LeaveMode, RoomState  # NOQA
+from .service import (  # NOQA
+    MUCClient,
+    Occupant,
+    Room,
+    LeaveMode,
+    RoomState,
+    HistoryStream,
+)
 from . import xso  # NOQA
 from .xso import (  # NOQA
     ConfigurationForm
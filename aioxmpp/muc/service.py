@@ -20,7 +20,10 @@
 #
 ########################################################################
 import asyncio
+import collections
+import collections.abc
 import functools
+import itertools
 import uuid
 
 from datetime import datetime, timedelta
@@ -171,7 +174,9 @@ class Occupant(aioxmpp.im.conversation.AbstractConversationMember):
         self.role = role
         self._direct_jid = jid
         if jid is None:
-            self._uid = b"urn:uuid:" + uuid.uuid4().bytes
+            # generated lazily; most Occupant instances created from presence
+            # stanzas are only used for comparison and thrown away
+            self._uid = None
         else:
             self._set_uid_from_direct_jid(self._direct_jid)
 
@@ -210,6 +215,8 @@ class Occupant(aioxmpp.im.conversation.AbstractConversationMember):
                 Documentation of the attribute on the base class, with
                 additional information on semantics.
         """
+        if self._uid is None:
+            self._uid = b"urn:uuid:" + uuid.uuid4().bytes
         return self._uid
 
     @classmethod
@@ -251,6 +258,8 @@ class Occupant(aioxmpp.im.conversation.AbstractConversationMember):
         self._direct_jid = other.direct_jid or self._direct_jid
 
     def __repr__(self):
+        # do not use the uid property here: it would generate (and thus fix)
+        # a random uid as a side effect of calling repr()
         return "<{}.{} occupantjid={!r} uid={!r} jid={!r}>".format(
             type(self).__module__,
             type(self).__qualname__,
@@ -260,6 +269,296 @@ class Occupant(aioxmpp.im.conversation.AbstractConversationMember):
         )
 
 
+class _OccupantIndex:
+    """
+    Bookkeeping of the occupants of a room.
+
+    Occupants are primarily keyed by their occupant JID, in the order in which
+    they were added. Secondary indices by nickname, bare real JID, role and
+    affiliation are maintained; :meth:`reindex` must be called after any of
+    those attributes of an indexed occupant changed.
+    """
+
+    def __init__(self):
+        self._by_occupant_jid = {}
+        self._by_nick = {}
+        self._by_direct_jid = {}
+        self._by_role = {}
+        self._by_affiliation = {}
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._by_occupant_jid)
+
+    def __iter__(self):
+        return iter(self._by_occupant_jid.values())
+
+    def __contains__(self, occupant):
+        return occupant in self._keys
+
+    def get(self, occupant_jid, default=None):
+        return self._by_occupant_jid.get(occupant_jid, default)
+
+    def by_nick(self, nick):
+        return self._by_nick.get(nick)
+
+    @staticmethod
+    def _make_keys(occupant):
+        direct_jid = occupant.direct_jid
+        if direct_jid is not None:
+            direct_jid = direct_jid.bare()
+        return (
+            occupant.conversation_jid,
+            direct_jid,
+            occupant.role,
+            occupant.affiliation,
+        )
+
+    @staticmethod
+    def _add_to_bucket(index, key, occupant):
+        index.setdefault(key, {})[occupant] = None
+
+    @staticmethod
+    def _remove_from_bucket(index, key, occupant):
+        bucket = index[key]
+        del bucket[occupant]
+        if not bucket:
+            del index[key]
+
+    def _add_secondary(self, occupant, keys):
+        _, direct_jid, role, affiliation = keys
+        if direct_jid is not None:
+            self._add_to_bucket(self._by_direct_jid, direct_jid, occupant)
+        self._add_to_bucket(self._by_role, role, occupant)
+        self._add_to_bucket(self._by_affiliation, affiliation, occupant)
+
+    def _remove_secondary(self, occupant, keys):
+        _, direct_jid, role, affiliation = keys
+        if direct_jid is not None:
+            self._remove_from_bucket(self._by_direct_jid, direct_jid, occupant)
+        self._remove_from_bucket(self._by_role, role, occupant)
+        self._remove_from_bucket(self._by_affiliation, affiliation, occupant)
+
+    def add(self, occupant):
+        keys = self._make_keys(occupant)
+        self._keys[occupant] = keys
+        self._by_occupant_jid[keys[0]] = occupant
+        self._by_nick[keys[0].resource] = occupant
+        self._add_secondary(occupant, keys)
+
+    def remove(self, occupant):
+        keys = self._keys.pop(occupant)
+        del self._by_occupant_jid[keys[0]]
+        del self._by_nick[keys[0].resource]
+        self._remove_secondary(occupant, keys)
+
+    def reindex(self, occupant):
+        old_keys = self._keys[occupant]
+        new_keys = self._make_keys(occupant)
+        if old_keys == new_keys:
+            return
+
+        if old_keys[0] != new_keys[0]:
+            del self._by_occupant_jid[old_keys[0]]
+            del self._by_nick[old_keys[0].resource]
+            self._by_occupant_jid[new_keys[0]] = occupant
+            self._by_nick[new_keys[0].resource] = occupant
+        self._remove_secondary(occupant, old_keys)
+        self._add_secondary(occupant, new_keys)
+        self._keys[occupant] = new_keys
+
+    def by_direct_jid(self, jid):
+        return list(self._by_direct_jid.get(jid.bare(), ()))
+
+    def by_role(self, role):
+        return list(self._by_role.get(role, ()))
+
+    def by_affiliation(self, affiliation):
+        return list(self._by_affiliation.get(affiliation, ()))
+
+
+class _MemberList(collections.abc.Sequence):
+    """
+    Read-only, live view on the members of a :class:`Room`.
+
+    The local occupant, if known, is always the first item.
+    """
+
+    __slots__ = ("_room",)
+
+    def __init__(self, room):
+        self._room = room
+
+    def __len__(self):
+        room = self._room
+        return len(room._occupants) + (room._this_occupant is not None)
+
+    def __iter__(self):
+        room = self._room
+        if room._this_occupant is not None:
+            yield room._this_occupant
+        yield from room._occupants
+
+    def __contains__(self, member):
+        room = self._room
+        return (member is room._this_occupant and member is not None or
+                member in room._occupants)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("member index out of range")
+
+        return next(itertools.islice(iter(self), index, None))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, _MemberList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "<members of {!r}: {!r}>".format(
+            self._room.jid,
+            list(self),
+        )
+
+
+class HistoryStream:
+    """
+    Consumer for the history replayed by a MUC service on join.
+
+    Instances are obtained from :meth:`Room.muc_history_stream`. While a
+    stream is attached to a :class:`Room`, history messages are not emitted
+    via :meth:`Room.on_message`; instead, they are buffered in the stream
+    and handed out in batches of up to `batch_size` messages.
+
+    The stream ends when the history replay is over (that is, when the room
+    enters :attr:`RoomState.ACTIVE`) or when the room is suspended or
+    disconnected.
+
+    .. warning::
+
+       There is no backpressure. The MUC service sends the history at its own
+       pace and a slow consumer does not slow it down. If more than
+       `max_buffered` messages are buffered, the oldest messages are
+       **dropped** and only counted in :attr:`dropped`. Pass
+       ``max_buffered=None`` to buffer all messages instead, at the cost of
+       unbounded memory use.
+
+    A stream supports a single consumer: only one coroutine may wait in
+    :meth:`get_batch` at any time.
+
+    On Python 3.5 and newer, the stream can be consumed with
+    ``async for``::
+
+        async for batch in room.muc_history_stream():
+            for message in batch:
+                ...
+
+    Otherwise, :meth:`get_batch` is used until it returns an empty list.
+
+    .. automethod:: get_batch
+
+    .. autoattribute:: done
+
+    .. attribute:: dropped
+
+       The number of messages which were discarded because more than
+       `max_buffered` messages were buffered.
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, *, batch_size=100, max_buffered=1000, since=None):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        if max_buffered is not None and max_buffered < batch_size:
+            raise ValueError("max_buffered must not be less than batch_size")
+
+        self._batch_size = batch_size
+        self._max_buffered = max_buffered
+        self._since = since
+        self._buffer = collections.deque()
+        self._waiter = None
+        self._done = False
+        self.dropped = 0
+
+    @property
+    def done(self):
+        """
+        True if no more messages will be added to the stream. There may still
+        be buffered messages.
+        """
+        return self._done
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _feed(self, message):
+        if self._since is not None and message.xep0203_delay:
+            if message.xep0203_delay[0].stamp < self._since:
+                return
+
+        if (self._max_buffered is not None and
+                len(self._buffer) >= self._max_buffered):
+            self._buffer.popleft()
+            self.dropped += 1
+
+        self._buffer.append(message)
+        if len(self._buffer) >= self._batch_size:
+            self._wake()
+
+    def _close(self):
+        self._done = True
+        self._wake()
+
+    @asyncio.coroutine
+    def get_batch(self):
+        """
+        Return the next batch of history messages.
+
+        :rtype: :class:`list` of :class:`aioxmpp.Message`
+        :return: Up to `batch_size` messages, oldest first. An empty list is
+            returned once the stream has ended and all messages have been
+            handed out.
+        :raises RuntimeError: if another coroutine is already waiting for a
+            batch.
+
+        This waits until `batch_size` messages are buffered or the stream
+        ends, whichever happens first.
+        """
+        if self._waiter is not None:
+            raise RuntimeError(
+                "another coroutine is already waiting for a batch"
+            )
+
+        while len(self._buffer) < self._batch_size and not self._done:
+            self._waiter = asyncio.Future()
+            try:
+                yield from self._waiter
+            finally:
+                self._waiter = None
+
+        n = min(self._batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(n)]
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        batch = yield from self.get_batch()
+        if not batch:
+            raise StopAsyncIteration
+        return batch
+
+
 class RoomState(Enum):
     """
     Enumeration which describes the state a :class:`~.muc.Room` is in.
@@ -321,7 +620,15 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
 
     .. autoattribute:: members
 
-    These properties are specific to MUC:
+    These properties and methods are specific to MUC:
+
+    .. automethod:: muc_get_occupant
+
+    .. automethod:: muc_get_occupants_by_jid
+
+    .. automethod:: muc_get_occupants_by_role
+
+    .. automethod:: muc_get_occupants_by_affiliation
 
     .. autoattribute:: muc_active
 
@@ -333,6 +640,8 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
 
     .. autoattribute:: muc_subject_setter
 
+    .. automethod:: muc_history_stream
+
     .. attribute:: muc_autorejoin
 
        A boolean flag indicating whether this MUC is supposed to be
@@ -345,6 +654,26 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
        :data:`None`, this can be cleared after :meth:`on_enter` has been
        emitted.
 
+    .. attribute:: muc_defer_initial_joins
+
+       A boolean flag indicating whether :meth:`on_join` is emitted for the
+       occupants already in the room only after the join has completed.
+
+       When joining a room, the server first sends the presence of all other
+       occupants and then the presence of the local user. By default,
+       :meth:`on_join` is emitted for each of those occupants as their
+       presence arrives, that is, before :meth:`on_enter`. If this flag is
+       true, the occupants are only collected until the presence of the local
+       user arrives; :meth:`on_join` is then emitted for all of them after
+       :meth:`on_enter`. Changes to those occupants which happen in the
+       meantime are applied without emitting signals.
+
+       This makes joining very large rooms cheaper and guarantees that
+       :attr:`members` is complete when :meth:`on_join` is emitted for the
+       initial occupants.
+
+       .. versionadded:: 0.10
+
     The following methods and properties provide interaction with the MUC
     itself:
 
@@ -627,7 +956,8 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
     def __init__(self, service, mucjid):
         super().__init__(service)
         self._mucjid = mucjid
-        self._occupant_info = {}
+        self._occupants = _OccupantIndex()
+        self._deferred_joins = {}
         self._subject = aioxmpp.structs.LanguageMap()
         self._subject_setter = None
         self._joined = False
@@ -638,8 +968,10 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
         self._tracking_by_body = {}
         self._state = RoomState.JOIN_PRESENCE
         self._history_replay_occupants = {}
+        self._history_stream = None
         self.muc_autorejoin = False
         self.muc_password = None
+        self.muc_defer_initial_joins = False
 
     @property
     def service(self):
@@ -717,16 +1049,92 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
     @property
     def members(self):
         """
-        A copy of the list of occupants. The local user is always the first
-        item in the list, unless the :meth:`on_enter` has not fired yet.
+        A read-only sequence of the occupants. The local user is always the
+        first item in the sequence, unless the :meth:`on_enter` has not fired
+        yet.
+
+        .. versionchanged:: 0.10
+
+           This is now a live view on the occupants instead of a copied list.
+           Indexing other than at the first position takes linear time; use
+           :func:`list` to obtain a copy if the occupants need to be iterated
+           while they may change.
         """
+        return _MemberList(self)
 
-        if self._this_occupant is not None:
-            items = [self._this_occupant]
-        else:
-            items = []
-        items += list(self._occupant_info.values())
-        return items
+    def muc_get_occupant(self, nick):
+        """
+        Return the occupant using the nickname `nick`.
+
+        :param nick: The nickname to look up.
+        :type nick: :class:`str`
+        :return: The occupant using the nickname or :data:`None`.
+        :rtype: :class:`Occupant`
+
+        The lookup takes constant time. `nick` is compared exactly against
+        the :attr:`Occupant.nick` of the occupants; it is not normalised.
+
+        .. versionadded:: 0.10
+        """
+        if (self._this_occupant is not None and
+                self._this_occupant.nick == nick):
+            return self._this_occupant
+        return self._occupants.by_nick(nick)
+
+    def _with_self(self, occupants, predicate):
+        if self._this_occupant is not None and predicate(self._this_occupant):
+            occupants.insert(0, self._this_occupant)
+        return occupants
+
+    def muc_get_occupants_by_jid(self, jid):
+        """
+        Return the occupants whose real JID has the bare JID of `jid`.
+
+        :param jid: The real JID to look up.
+        :type jid: :class:`aioxmpp.JID`
+        :rtype: :class:`list` of :class:`Occupant`
+
+        Only occupants whose real JID is known (see
+        :attr:`Occupant.direct_jid`) can be found.
+
+        .. versionadded:: 0.10
+        """
+        bare = jid.bare()
+        return self._with_self(
+            self._occupants.by_direct_jid(bare),
+            lambda occupant: (occupant.direct_jid is not None and
+                              occupant.direct_jid.bare() == bare),
+        )
+
+    def muc_get_occupants_by_role(self, role):
+        """
+        Return the occupants which currently have the given `role`.
+
+        :param role: The role to look up, e.g. ``"moderator"``.
+        :type role: :class:`str`
+        :rtype: :class:`list` of :class:`Occupant`
+
+        .. versionadded:: 0.10
+        """
+        return self._with_self(
+            self._occupants.by_role(role),
+            lambda occupant: occupant.role == role,
+        )
+
+    def muc_get_occupants_by_affiliation(self, affiliation):
+        """
+        Return the occupants which currently have the given `affiliation`.
+
+        :param affiliation: The affiliation to look up, e.g. ``"owner"``.
+        :type affiliation: :class:`str`
+        :rtype: :class:`list` of :class:`Occupant`
+
+        .. versionadded:: 0.10
+        """
+        return self._with_self(
+            self._occupants.by_affiliation(affiliation),
+            lambda occupant: occupant.affiliation == affiliation,
+        )
 
     @property
     def features(self):
@@ -746,15 +1154,74 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
             aioxmpp.im.conversation.ConversationFeature.SET_NICK,
         }
 
+    def muc_history_stream(self, *, batch_size=100, max_buffered=1000,
+                           since=None):
+        """
+        Consume the history replay of the room in batches.
+
+        :param batch_size: Maximum number of messages per batch.
+        :type batch_size: :class:`int`
+        :param max_buffered: Maximum number of messages to buffer, or
+            :data:`None` for no limit.
+        :type max_buffered: :class:`int`
+        :param since: Discard history messages sent before this point in
+            time.
+        :type since: :class:`datetime.datetime`
+        :raises RuntimeError: if a history stream is already attached.
+        :rtype: :class:`HistoryStream`
+
+        The returned stream receives the history messages replayed by the
+        MUC service during the current join. Those messages are then not
+        emitted via :meth:`on_message` and do not take part in the matching
+        of message trackers. Other messages, including the subject at the end
+        of the replay, are handled as usual.
+
+        To receive the whole history, the stream must be obtained before the
+        event loop is given the chance to process the join, for example right
+        after :meth:`.MUCClient.join` returned. If the replay is already over,
+        the returned stream is empty.
+
+        The MUC service delivers the history without any flow control. To
+        keep memory use bounded, at most `max_buffered` messages are kept in
+        the stream; if the consumer does not keep up, the oldest messages are
+        discarded and counted in :attr:`HistoryStream.dropped`.
+
+        `since` is compared against the :xep:`203` delay stamp of the
+        messages, which is a naive :class:`datetime.datetime` in UTC. To
+        limit the amount of history the service sends in the first place,
+        use the `history` argument of :meth:`.MUCClient.join`.
+
+        .. versionadded:: 0.10
+        """
+        if self._history_stream is not None:
+            raise RuntimeError("a history stream is already attached")
+
+        stream = HistoryStream(batch_size=batch_size,
+                               max_buffered=max_buffered,
+                               since=since)
+        if self._state in (RoomState.JOIN_PRESENCE, RoomState.HISTORY):
+            self._history_stream = stream
+        else:
+            stream._close()
+        return stream
+
+    def _close_history_stream(self):
+        if self._history_stream is not None:
+            self._history_stream._close()
+            self._history_stream = None
+
     def _enter_active_state(self):
         self._state = RoomState.ACTIVE
         self._history_replay_occupants.clear()
+        self._close_history_stream()
 
     def _suspend(self):
         self.on_muc_suspend()
         self._active = False
         self._state = RoomState.DISCONNECTED
         self._history_replay_occupants.clear()
+        self._deferred_joins.clear()
+        self._close_history_stream()
 
     def _disconnect(self):
         if not self._joined:
@@ -766,10 +1233,13 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
         self._active = False
         self._state = RoomState.DISCONNECTED
         self._history_replay_occupants.clear()
+        self._deferred_joins.clear()
+        self._close_history_stream()
 
     def _resume(self):
         self._this_occupant = None
-        self._occupant_info = {}
+        self._occupants = _OccupantIndex()
+        self._deferred_joins.clear()
         self._active = False
         self._state = RoomState.JOIN_PRESENCE
         self.on_muc_resume()
@@ -844,6 +1314,12 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
             )
             self._enter_active_state()
 
+        if (self._history_stream is not None and
+                self._state == RoomState.HISTORY and
+                not sent and message.body):
+            self._history_stream._feed(message)
+            return
+
         if not sent:
             if self._match_tracker(message):
                 return
@@ -852,7 +1328,7 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
                 self._this_occupant._conversation_jid == message.from_):
             occupant = self._this_occupant
         else:
-            occupant = self._occupant_info.get(message.from_, None)
+            occupant = self._occupants.get(message.from_)
 
             if self._state == RoomState.HISTORY and not sent:
                 if (message.xep0045_muc_user and
@@ -989,6 +1465,10 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
 
         if to_emit:
             existing.update(info)
+            # handlers must see the occupant under its new role and
+            # affiliation in the indices
+            if existing in self._occupants:
+                self._occupants.reindex(existing)
             for signal, args, kwargs in to_emit:
                 signal(*args, **kwargs)
 
@@ -1014,6 +1494,7 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
             self._state = RoomState.HISTORY
             self.on_muc_enter(stanza, info)
             self.on_enter()
+            self._flush_deferred_joins()
             return
 
         existing = self._this_occupant
@@ -1071,9 +1552,8 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
             return
 
         info = Occupant.from_presence(stanza, False)
-        try:
-            existing = self._occupant_info[info.conversation_jid]
-        except KeyError:
+        existing = self._occupants.get(info.conversation_jid)
+        if existing is None:
             if stanza.type_ == aioxmpp.structs.PresenceType.UNAVAILABLE:
                 self._service.logger.debug(
                     "received unavailable presence from unknown occupant %r."
@@ -1081,28 +1561,61 @@ class Room(aioxmpp.im.conversation.AbstractConversation):
                     stanza.from_,
                 )
                 return
-            self._occupant_info[info.conversation_jid] = info
-            self.on_join(info)
+            self._occupants.add(info)
+            if self.muc_defer_initial_joins and not self._active:
+                self._deferred_joins[info] = None
+            else:
+                self.on_join(info)
+            return
+
+        if existing in self._deferred_joins:
+            self._update_deferred_occupant(stanza, info, existing)
             return
 
         mode, data = self._diff_presence(stanza, info, existing)
         if mode == _OccupantDiffClass.NICK_CHANGED:
             new_nick, = data
             old_nick = existing.nick
-            del self._occupant_info[existing.conversation_jid]
             existing._conversation_jid = existing.conversation_jid.replace(
                 resource=new_nick
             )
-            self._occupant_info[existing.conversation_jid] = existing
+            self._occupants.reindex(existing)
             self.on_nick_changed(existing, old_nick, new_nick)
         elif mode == _OccupantDiffClass.LEFT:
             mode, actor, reason = data
             existing.update(info)
+            self._occupants.reindex(existing)
             self.on_leave(existing,
                           muc_leave_mode=mode,
                           muc_actor=actor,
                           muc_reason=reason)
-            del self._occupant_info[existing.conversation_jid]
+            self._occupants.remove(existing)
+        else:
+            self._occupants.reindex(existing)
+
+    def _update_deferred_occupant(self, stanza, info, existing):
+        # the on_join of this occupant has not been emitted yet, so changes
+        # are applied silently
+        if not info.presence_state.available:
+            if 303 in stanza.xep0045_muc_user.status_codes:
+                existing._conversation_jid = \
+                    existing.conversation_jid.replace(
+                        resource=stanza.xep0045_muc_user.items[0].nick
+                    )
+                self._occupants.reindex(existing)
+            else:
+                self._occupants.remove(existing)
+                del self._deferred_joins[existing]
+            return
+
+        existing.update(info)
+        self._occupants.reindex(existing)
+
+    def _flush_deferred_joins(self):
+        deferred = list(self._deferred_joins)
+        self._deferred_joins.clear()
+        for occupant in deferred:
+            self.on_join(occupant)
 
     def send_message(self, msg):
         """
@@ -53,6 +53,11 @@ Connecting streams low-level
 
 .. autofunction:: connect_xmlstream
 
+Running many clients
+====================
+
+.. autoclass:: ClientPool
+
 Utilities
 =========
 
@@ -60,8 +65,12 @@ Utilities
 
 """
 import asyncio
+import collections
 import contextlib
+import functools
 import logging
+import random
+import time
 import warnings
 
 from datetime import timedelta
@@ -232,9 +241,27 @@ def discover_connectors(
     return options
 
 
+@contextlib.contextmanager
+def _record_timing(timings, step):
+    """
+    Store the wall-clock duration of the context body under `step` in
+    `timings`, if `timings` is not :data:`None`.
+    """
+    if timings is None:
+        yield
+        return
+
+    t0 = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[step] = time.monotonic() - t0
+
+
 @asyncio.coroutine
 def _try_options(options, exceptions,
-                 jid, metadata, negotiation_timeout, loop, logger):
+                 jid, metadata, negotiation_timeout, loop, logger,
+                 timings=None):
     """
     Helper function for :func:`connect_xmlstream`.
     """
@@ -243,6 +270,7 @@ def _try_options(options, exceptions,
             "domain %s: trying to connect to %r:%s using %r",
             jid.domain, host, port, conn
         )
+        t0 = time.monotonic()
         try:
             transport, xmlstream, features = yield from conn.connect(
                 loop,
@@ -260,6 +288,9 @@ def _try_options(options, exceptions,
             exceptions.append(exc)
             continue
 
+        if timings is not None:
+            timings["connect"] = time.monotonic() - t0
+
         logger.debug(
             "domain %s: connection succeeded using %r",
             jid.domain,
@@ -267,14 +298,15 @@ def _try_options(options, exceptions,
         )
 
         try:
-            features = yield from security_layer.negotiate_sasl(
-                transport,
-                xmlstream,
-                metadata.sasl_providers,
-                negotiation_timeout,
-                jid,
-                features,
-            )
+            with _record_timing(timings, "sasl"):
+                features = yield from security_layer.negotiate_sasl(
+                    transport,
+                    xmlstream,
+                    metadata.sasl_providers,
+                    negotiation_timeout,
+                    jid,
+                    features,
+                )
         except errors.SASLUnavailable as exc:
             protocol.send_stream_error_and_close(
                 xmlstream,
@@ -303,7 +335,9 @@ def connect_xmlstream(
         negotiation_timeout=60.,
         override_peer=[],
         loop=None,
-        logger=logger):
+        logger=logger,
+        discover=None,
+        timings=None):
     """
     Prepare and connect a :class:`aioxmpp.protocol.XMLStream` to a server
     responsible for the given `jid` and authenticate against that server using
@@ -323,6 +357,11 @@ def connect_xmlstream(
     :type loop: :class:`asyncio.BaseEventLoop`
     :param logger: Logger to use (defaults to module-wide logger)
     :type logger: :class:`logging.Logger`
+    :param discover: Coroutine function to use instead of
+                     :func:`discover_connectors`
+    :type discover: coroutine function
+    :param timings: Mapping to record the duration of the individual steps in
+    :type timings: :class:`collections.abc.MutableMapping`
     :raises ValueError: if the domain from the `jid` announces that XMPP is not
                         supported at all.
     :raises aioxmpp.errors.TLSFailure: if all connection attempts fail and one
@@ -340,6 +379,17 @@ def connect_xmlstream(
     discovery of connection options is made. Only if all of them fail,
     automatic discovery of connection options is performed.
 
+    If `discover` is given, it is used instead of :func:`discover_connectors`
+    to find the connection options for the domain. It is called with the same
+    arguments as :func:`discover_connectors`. :class:`ClientPool` uses this to
+    share discovery results among clients.
+
+    If `timings` is given, the durations (in seconds) of the steps of the
+    connection attempt are stored in it: ``"discover"`` for the discovery of
+    connection options (if needed), ``"connect"`` for establishing the
+    transport and TLS (including STARTTLS) with the option which succeeded
+    and ``"sasl"`` for the SASL authentication.
+
     `loop` may be a :class:`asyncio.BaseEventLoop` to use. Defaults to the
     current event loop.
 
@@ -370,8 +420,13 @@ def connect_xmlstream(
        The explicit raising of TLS errors has been introduced. Before, TLS
        errors were treated like any other connection error, possibly masking
        configuration problems.
+
+    .. versionchanged:: 0.10
+
+       The `discover` and `timings` arguments were added.
     """
     loop = asyncio.get_event_loop() if loop is None else loop
+    discover = discover or discover_connectors
 
     options = list(override_peer)
 
@@ -381,20 +436,23 @@ def connect_xmlstream(
         options,
         exceptions,
         jid, metadata, negotiation_timeout, loop, logger,
+        timings=timings,
     )
     if result is not None:
         return result
 
-    options = list((yield from discover_connectors(
-        jid.domain,
-        loop=loop,
-        logger=logger,
-    )))
+    with _record_timing(timings, "discover"):
+        options = list((yield from discover(
+            jid.domain,
+            loop=loop,
+            logger=logger,
+        )))
 
     result = yield from _try_options(
         options,
         exceptions,
         jid, metadata, negotiation_timeout, loop, logger,
+        timings=timings,
     )
     if result is not None:
         return result
@@ -546,6 +604,30 @@ class Client:
     .. autoattribute:: resumption_timeout
         :annotation: = None
 
+    .. attribute:: pipelined_negotiation
+       :annotation: = False
+
+       If true, independent stream negotiation steps are pipelined instead of
+       waiting for the reply to each request before sending the next one:
+
+       * The legacy session request (if needed) is sent right after the
+         resource binding request, and the Stream Management ``<enable/>`` is
+         sent as soon as those requests have been written to the stream,
+         without waiting for their replies.
+       * The coroutines connected to :meth:`before_stream_established` (such
+         as those of :class:`aioxmpp.RosterClient`, :class:`aioxmpp.
+         PresenceServer` or :class:`aioxmpp.CarbonsClient`) are run
+         concurrently (see
+         :meth:`~aioxmpp.callbacks.SyncAdHocSignal.fire_concurrently`), so
+         that their requests go out in one batch.
+
+       This reduces the number of round trips between authentication and
+       :meth:`on_stream_established` to about two. The requests are still
+       written in the same order, so a conforming server processes them in
+       the same order as without pipelining.
+
+       .. versionadded:: 0.10
+
     Connection information:
 
     .. autoattribute:: established
@@ -561,6 +643,8 @@ class Client:
 
     .. autoattribute:: local_jid
 
+    .. autoattribute:: negotiation_timings
+
     .. attribute:: stream
 
        The :class:`~aioxmpp.stream.StanzaStream` instance used by the node.
@@ -576,6 +660,12 @@ class Client:
        when :attr:`before_stream_established` fires, the information is
        up-to-date.
 
+    Resuming streams across process restarts:
+
+    .. automethod:: export_sm_state_as_json
+
+    .. automethod:: import_sm_state_from_json
+
     Sending stanzas:
 
     .. automethod:: send
@@ -606,6 +696,19 @@ class Client:
        The backoff time is capped to :attr:`backoff_cap`, to avoid having
        unrealistically high values.
 
+    .. attribute:: backoff_jitter
+       :annotation: = 0
+
+       Fraction by which the backoff time is randomly shortened before each
+       reconnect attempt. With the default of 0, the backoff is deterministic.
+       With a value of 0.5, the actual wait time is chosen uniformly between
+       half and the full backoff time.
+
+       Jitter prevents many clients which lost their connections at the same
+       time from reconnecting in lock-step.
+
+       .. versionadded:: 0.10
+
     Signals:
 
     .. signal:: on_failure(err)
@@ -682,6 +785,8 @@ class Client:
 
     Miscellaneous:
 
+    .. autoattribute:: pool
+
     .. attribute:: logger
 
        The :class:`logging.Logger` instance which is used by the
@@ -734,6 +839,7 @@ class Client:
         self._nattempt = 0
 
         self._services = {}
+        self._pool = None
 
         self.stream_features = None
 
@@ -741,10 +847,13 @@ class Client:
         self.backoff_start = timedelta(seconds=1)
         self.backoff_factor = 1.2
         self.backoff_cap = timedelta(seconds=60)
+        self.backoff_jitter = 0
         self.override_peer = list(override_peer)
         self.established_event = asyncio.Event()
         self._max_initial_attempts = max_initial_attempts
         self._resumption_timeout = None
+        self.pipelined_negotiation = False
+        self._negotiation_timings = collections.OrderedDict()
 
         self.on_stopped.logger = self.logger.getChild("on_stopped")
         self.on_failure.logger = self.logger.getChild("on_failure")
@@ -836,19 +945,142 @@ class Client:
             return False
         return True
 
+    @contextlib.contextmanager
+    def _timed(self, step):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._negotiation_timings[step] = time.monotonic() - t0
+
+    @asyncio.coroutine
+    def _timed_coro(self, step, coro):
+        with self._timed(step):
+            return (yield from coro)
+
+    def _make_sent_future(self):
+        """
+        Return a future and an `on_state_change` callback for a
+        :class:`~.StanzaToken`. The future completes when the token leaves the
+        :attr:`~.StanzaState.ACTIVE` state.
+        """
+        fut = asyncio.Future(loop=self._loop)
+
+        def on_state_change(token, state):
+            if state != stream.StanzaState.ACTIVE and not fut.done():
+                fut.set_result(None)
+
+        return fut, on_state_change
+
     @asyncio.coroutine
-    def _negotiate_legacy_session(self):
+    def _negotiate_legacy_session(self, on_state_change=None):
         self.logger.debug(
             "remote server announces support for legacy sessions"
         )
         yield from self.stream._send_immediately(
             stanza.IQ(type_=structs.IQType.SET,
-                      payload=rfc3921.Session())
+                      payload=rfc3921.Session()),
+            on_state_change=on_state_change,
         )
         self.logger.debug(
             "legacy session negotiated (upgrade your server!)"
         )
 
+    @asyncio.coroutine
+    def _start_sm(self):
+        self.logger.debug("attempting to start stream management")
+        try:
+            yield from self.stream.start_sm(
+                resumption_timeout=self._resumption_timeout
+            )
+        except errors.StreamNegotiationFailure:
+            self.logger.debug("stream management failed to start")
+        else:
+            self.logger.debug("stream management started")
+
+    @asyncio.coroutine
+    def _negotiate_sequential(self, server_can_do_sm, legacy_session):
+        self.logger.debug("binding to resource")
+        with self._timed("bind"):
+            yield from self._bind()
+
+        if server_can_do_sm:
+            with self._timed("sm_enable"):
+                yield from self._start_sm()
+
+        if legacy_session:
+            with self._timed("legacy_session"):
+                yield from self._negotiate_legacy_session()
+
+    @asyncio.coroutine
+    def _wait_until_sent(self, pairs):
+        """
+        Wait until the request of each ``(sent_future, task)`` pair has been
+        sent or its task has finished.
+
+        If a task fails (possibly before its request was queued at all), its
+        exception is re-raised.
+        """
+        pending = list(pairs)
+        while pending:
+            yield from asyncio.wait(
+                [aw for pair in pending for aw in pair],
+                return_when=asyncio.FIRST_COMPLETED,
+                loop=self._loop,
+            )
+            still_pending = []
+            for fut, task in pending:
+                if task.done():
+                    task.result()
+                elif not fut.done():
+                    still_pending.append((fut, task))
+            pending = still_pending
+
+    @asyncio.coroutine
+    def _negotiate_pipelined(self, server_can_do_sm, legacy_session):
+        self.logger.debug("binding to resource (pipelined)")
+        sent = []
+        tasks = []
+
+        fut, on_state_change = self._make_sent_future()
+        sent.append(fut)
+        tasks.append(asyncio.ensure_future(
+            self._timed_coro(
+                "bind",
+                self._bind(on_state_change=on_state_change),
+            ),
+            loop=self._loop,
+        ))
+
+        if legacy_session:
+            fut, on_state_change = self._make_sent_future()
+            sent.append(fut)
+            tasks.append(asyncio.ensure_future(
+                self._timed_coro(
+                    "legacy_session",
+                    self._negotiate_legacy_session(
+                        on_state_change=on_state_change,
+                    ),
+                ),
+                loop=self._loop,
+            ))
+
+        try:
+            if server_can_do_sm:
+                # the <enable/> bypasses the stanza queue; it must not
+                # overtake the requests above, but it need not wait for the
+                # replies
+                yield from self._wait_until_sent(zip(sent, tasks))
+                tasks.append(asyncio.ensure_future(
+                    self._timed_coro("sm_enable", self._start_sm()),
+                    loop=self._loop,
+                ))
+
+            yield from asyncio.gather(*tasks, loop=self._loop)
+        finally:
+            for task in tasks:
+                task.cancel()
+
     @asyncio.coroutine
     def _negotiate_stream(self, xmlstream, features):
         server_can_do_sm = True
@@ -864,9 +1096,16 @@ class Client:
                           server_can_do_sm)
 
         if self.stream.sm_enabled:
-            resumed = yield from self._try_resume_stream_management(
-                xmlstream, features)
+            with self._timed("sm_resume"):
+                resumed = yield from self._try_resume_stream_management(
+                    xmlstream, features)
             if resumed:
+                if not self.established_event.is_set():
+                    # the stream was imported from another process; the
+                    # session state on the server is intact, so
+                    # before_stream_established is skipped
+                    self.established_event.set()
+                    self.on_stream_established()
                 return features, resumed
         else:
             resumed = False
@@ -874,41 +1113,42 @@ class Client:
         self.stream_features = features
         self.stream.start(xmlstream)
 
-        if not resumed:
-            self.logger.debug("binding to resource")
-            yield from self._bind()
-
-        if server_can_do_sm:
-            self.logger.debug("attempting to start stream management")
-            try:
-                yield from self.stream.start_sm(
-                    resumption_timeout=self._resumption_timeout
-                )
-            except errors.StreamNegotiationFailure:
-                self.logger.debug("stream management failed to start")
-            self.logger.debug("stream management started")
-
         try:
             features[rfc3921.SessionFeature]
         except KeyError:
-            pass  # yay
+            legacy_session = False  # yay
         else:
-            yield from self._negotiate_legacy_session()
+            legacy_session = True
+
+        if self.pipelined_negotiation:
+            yield from self._negotiate_pipelined(server_can_do_sm,
+                                                 legacy_session)
+        else:
+            yield from self._negotiate_sequential(server_can_do_sm,
+                                                  legacy_session)
 
         self.established_event.set()
 
-        yield from self.before_stream_established()
+        with self._timed("before_stream_established"):
+            if self.pipelined_negotiation:
+                yield from \
+                    self.before_stream_established.fire_concurrently()
+            else:
+                yield from self.before_stream_established()
 
         self.on_stream_established()
 
         return features, resumed
 
     @asyncio.coroutine
-    def _bind(self):
+    def _bind(self, on_state_change=None):
         iq = stanza.IQ(type_=structs.IQType.SET)
         iq.payload = rfc6120.Bind(resource=self._local_jid.resource)
         try:
-            result = yield from self.stream._send_immediately(iq)
+            result = yield from self.stream._send_immediately(
+                iq,
+                on_state_change=on_state_change,
+            )
         except errors.XMPPError as exc:
             raise errors.StreamNegotiationFailure(
                 "Resource binding failed: {}".format(exc)
@@ -921,6 +1161,7 @@ class Client:
     @asyncio.coroutine
     def _main_impl(self):
         failure_future = self._failure_future
+        self._negotiation_timings = collections.OrderedDict()
 
         override_peer = []
         if self.stream.sm_enabled:
@@ -933,14 +1174,20 @@ class Client:
                 ))
         override_peer += self.override_peer
 
+        if self._pool is not None:
+            connect = self._pool.connect_xmlstream
+        else:
+            connect = connect_xmlstream
+
         tls_transport, xmlstream, features = \
-            yield from connect_xmlstream(
+            yield from connect(
                 self._local_jid,
                 self._security_layer,
                 negotiation_timeout=self.negotiation_timeout.total_seconds(),
                 override_peer=override_peer,
                 loop=self._loop,
-                logger=self.logger)
+                logger=self.logger,
+                timings=self._negotiation_timings)
 
         self._had_connection = True
 
@@ -1001,9 +1248,14 @@ class Client:
 
                     if self._backoff_time is None:
                         self._backoff_time = self.backoff_start.total_seconds()
+                    backoff_time = self._backoff_time
+                    if self.backoff_jitter:
+                        backoff_time *= 1 - random.uniform(
+                            0, self.backoff_jitter
+                        )
                     self.logger.debug("re-trying after %.1f seconds",
-                                      self._backoff_time)
-                    yield from asyncio.sleep(self._backoff_time)
+                                      backoff_time)
+                    yield from asyncio.sleep(backoff_time)
                     self._backoff_time *= self.backoff_factor
                     if self._backoff_time > self.backoff_cap.total_seconds():
                         self._backoff_time = self.backoff_cap.total_seconds()
@@ -1060,6 +1312,8 @@ class Client:
                 }
             )
             self._services[class_] = instance
+            if self._pool is not None:
+                self._pool._setup_service(instance)
             return instance
 
     def summon(self, class_):
@@ -1103,6 +1357,18 @@ class Client:
         """
         return self._local_jid
 
+    @property
+    def pool(self):
+        """
+        The :class:`ClientPool` the client belongs to or :data:`None`.
+
+        Use :meth:`ClientPool.add_client` and :meth:`ClientPool.remove_client`
+        to change the pool of a client.
+
+        .. versionadded:: 0.10
+        """
+        return self._pool
+
     @property
     def running(self):
         """
@@ -1118,6 +1384,25 @@ class Client:
         """
         return self.established_event.is_set()
 
+    @property
+    def negotiation_timings(self):
+        """
+        Durations of the steps of the most recent stream negotiation.
+
+        This is a :class:`collections.OrderedDict` mapping step names to the
+        wall-clock time in seconds the step took, in the order in which the
+        steps finished. It is replaced when a new connection attempt starts.
+        The possible steps are those recorded by :func:`connect_xmlstream`
+        (``"discover"``, ``"connect"``, ``"sasl"``), followed by
+        ``"sm_resume"`` when resumption is attempted or ``"bind"``,
+        ``"legacy_session"`` and ``"sm_enable"`` (which overlap if
+        :attr:`pipelined_negotiation` is enabled), and finally
+        ``"before_stream_established"``.
+
+        .. versionadded:: 0.10
+        """
+        return self._negotiation_timings
+
     @property
     def resumption_timeout(self):
         """
@@ -1155,6 +1440,78 @@ class Client:
             )
         self._resumption_timeout = value
 
+    def export_sm_state_as_json(self):
+        """
+        Export the state required to resume the current stream in a different
+        process into a :mod:`json`-compatible dictionary and return that
+        dictionary.
+
+        :raises RuntimeError: if Stream Management is not enabled or the
+            stream is not resumable.
+
+        The dictionary contains the bound :attr:`local_jid` and the result of
+        :meth:`.StanzaStream.export_sm_state_as_json`. It can be stored in a
+        file or any other storage and passed to
+        :meth:`import_sm_state_from_json` of a new :class:`Client` for the
+        same account.
+
+        To allow the server to keep the session, the connection must not be
+        closed gracefully after exporting: terminate the process (or let the
+        connection drop) instead of calling :meth:`stop`, which closes the
+        stream. The new client must connect within the resumption timeout of
+        the server (see :attr:`resumption_timeout`).
+
+        .. warning::
+
+           The exported state allows to take over the XMPP session. Treat it
+           with the same care as credentials.
+
+        .. versionadded:: 0.10
+        """
+        return {
+            "local_jid": str(self._local_jid),
+            "stream": self.stream.export_sm_state_as_json(),
+        }
+
+    def import_sm_state_from_json(self, data):
+        """
+        Restore the state exported by :meth:`export_sm_state_as_json`.
+
+        :param data: The exported state.
+        :type data: :class:`dict`
+        :raises RuntimeError: if the client is running.
+        :raises ValueError: if the exported state belongs to a different
+            account.
+
+        This must be called before :meth:`start`. The client then attempts
+        to resume the exported stream instead of negotiating a new one. If
+        resumption succeeds, :attr:`local_jid` is the JID bound by the
+        exported stream and :meth:`on_stream_established` is emitted *without*
+        :meth:`before_stream_established`, so services do not re-request
+        state from the server (such as the roster) or re-send the initial
+        presence. The state of services needs to be restored by the
+        application (for example via
+        :meth:`aioxmpp.RosterClient.import_from_json`).
+
+        If resumption fails, the stream is negotiated as usual.
+
+        .. versionadded:: 0.10
+        """
+        if self.running:
+            raise RuntimeError("cannot import state while running")
+
+        local_jid = structs.JID.fromstr(data["local_jid"])
+        if local_jid.bare() != self._local_jid.bare():
+            raise ValueError(
+                "state was exported for a different account ({})".format(
+                    local_jid.bare()
+                )
+            )
+
+        self.stream.import_sm_state_from_json(data["stream"])
+        self._local_jid = local_jid
+        self.stream.local_jid = local_jid.bare()
+
     def connected(self, *, presence=structs.PresenceState(False), **kwargs):
         """
         Return a :class:`.node.UseConnected` context manager which does not
@@ -1648,3 +2005,274 @@ class UseConnected:
             # we don’t want to re-raise that; the stream is dead, goal
             # achieved.
             pass
+
+
+class ClientPool:
+    """
+    Share connection resources among many :class:`Client` instances.
+
+    :param max_concurrent_connects: Maximum number of connection attempts which
+        may be in progress at the same time.
+    :type max_concurrent_connects: positive :class:`int`
+    :param dns_cache_ttl: Time for which the connection options discovered for
+        a domain are re-used.
+    :type dns_cache_ttl: :class:`datetime.timedelta`
+    :param backoff_jitter: Value for :attr:`Client.backoff_jitter` of clients
+        added to the pool.
+    :type backoff_jitter: :class:`float` between 0 and 1
+    :param loop: asyncio event loop to use (defaults to current)
+    :type loop: :class:`asyncio.BaseEventLoop`
+    :param logger: Logger to use instead of the default logger
+    :type logger: :class:`logging.Logger` or :data:`None`
+
+    Each :class:`Client` normally resolves, connects and negotiates its stream
+    on its own. When a single process runs a large number of clients, this
+    causes redundant DNS queries and, after a network outage, a thundering herd
+    of simultaneous reconnects. Clients added to a pool instead:
+
+    * share the results of :func:`discover_connectors` per domain for
+      `dns_cache_ttl`; concurrent discoveries for the same domain are
+      coalesced into a single lookup,
+    * are limited to `max_concurrent_connects` simultaneous attempts of
+      :func:`connect_xmlstream` (which includes TLS and SASL negotiation),
+    * spread their reconnects using jittered backoff (see
+      :attr:`Client.backoff_jitter`) and
+    * share the :class:`aioxmpp.entitycaps.Cache` in :attr:`entitycaps_cache`
+      among their :class:`aioxmpp.EntityCapsService` instances and
+    * share the :class:`~.security_layer.TLSSessionCache` in
+      :attr:`tls_session_cache` to resume TLS sessions on reconnects, unless
+      their :class:`~.security_layer.SecurityLayer` already has a
+      :attr:`~.security_layer.SecurityLayer.tls_session_cache`.
+
+    Disco results which are not protected by a capability hash are not shared,
+    since the response of a peer may depend on which account is asking.
+
+    Managing clients:
+
+    .. automethod:: make_client
+
+    .. automethod:: add_client
+
+    .. automethod:: remove_client
+
+    .. autoattribute:: clients
+
+    Shared resources:
+
+    .. attribute:: entitycaps_cache
+
+       The :class:`aioxmpp.entitycaps.Cache` shared among the clients.
+
+    .. attribute:: tls_session_cache
+
+       The :class:`~.security_layer.TLSSessionCache` shared among the clients.
+       Sessions are keyed by the trust configuration of the security layer
+       (see :meth:`~.security_layer.TLSSessionCache.make_key`), so a client
+       never resumes a session which was verified by a differently configured
+       client.
+
+    .. autoattribute:: connecting
+
+    .. automethod:: discover_connectors
+
+    .. automethod:: flush_dns_cache
+
+    .. automethod:: connect_xmlstream
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, *,
+                 max_concurrent_connects=16,
+                 dns_cache_ttl=timedelta(minutes=5),
+                 backoff_jitter=0.5,
+                 loop=None,
+                 logger=None):
+        super().__init__()
+        if max_concurrent_connects < 1:
+            raise ValueError("max_concurrent_connects must be positive")
+        if not 0 <= backoff_jitter <= 1:
+            raise ValueError("backoff_jitter must be between 0 and 1")
+
+        # avoid an import cycle: entitycaps depends on modules which import
+        # this module
+        import aioxmpp.entitycaps
+
+        self._loop = loop or asyncio.get_event_loop()
+        self.logger = (logger or
+                       logging.getLogger(".".join([
+                           type(self).__module__,
+                           type(self).__qualname__,
+                       ])))
+        self._connect_semaphore = asyncio.Semaphore(
+            max_concurrent_connects,
+            loop=self._loop,
+        )
+        self._connecting = 0
+        self._dns_cache_ttl = dns_cache_ttl
+        self._dns_cache = {}
+        self._backoff_jitter = backoff_jitter
+        self._clients = set()
+        self.entitycaps_cache = aioxmpp.entitycaps.Cache()
+        self.tls_session_cache = security_layer.TLSSessionCache()
+
+    @property
+    def clients(self):
+        """
+        The clients currently in the pool, as :class:`frozenset`.
+        """
+        return frozenset(self._clients)
+
+    @property
+    def connecting(self):
+        """
+        The number of connection attempts currently in progress.
+        """
+        return self._connecting
+
+    def _setup_service(self, instance):
+        import aioxmpp.entitycaps
+        if isinstance(instance, aioxmpp.entitycaps.EntityCapsService):
+            instance.cache = self.entitycaps_cache
+
+    def add_client(self, client):
+        """
+        Add an existing client to the pool.
+
+        :param client: The client to add.
+        :type client: :class:`Client`
+        :raises ValueError: if the client already belongs to a different pool.
+
+        The :attr:`Client.backoff_jitter` of the client is set to the value
+        configured for the pool, and services which have already been summoned
+        on the client are connected to the shared resources. If the security
+        layer of the client has no TLS session cache, it is replaced by a copy
+        which uses :attr:`tls_session_cache`.
+        """
+        if client._pool is self:
+            return
+        if client._pool is not None:
+            raise ValueError("client already belongs to a different pool")
+
+        client._pool = self
+        client.backoff_jitter = self._backoff_jitter
+        if (isinstance(client._security_layer,
+                       security_layer.SecurityLayer) and
+                client._security_layer.tls_session_cache is None):
+            client._security_layer = client._security_layer._replace(
+                tls_session_cache=self.tls_session_cache,
+            )
+        self._clients.add(client)
+        for instance in client._services.values():
+            self._setup_service(instance)
+
+    def remove_client(self, client):
+        """
+        Remove a client from the pool.
+
+        :param client: The client to remove.
+        :type client: :class:`Client`
+        :raises KeyError: if the client is not in the pool.
+
+        Services of the client keep using the shared resources they have been
+        connected to. New connection attempts of the client do not use the
+        pool anymore.
+        """
+        self._clients.remove(client)
+        client._pool = None
+
+    def make_client(self, local_jid, security_layer, *,
+                    client_class=Client, **kwargs):
+        """
+        Create a new client and add it to the pool.
+
+        :param local_jid: Jabber ID to connect as
+        :type local_jid: :class:`~aioxmpp.JID`
+        :param security_layer: Configuration for authentication and TLS
+        :type security_layer: :class:`~aioxmpp.SecurityLayer`
+        :param client_class: The class to instantiate.
+        :type client_class: :class:`Client` or subclass
+        :return: The new client.
+
+        Further keyword arguments are passed to the `client_class`. The event
+        loop of the pool is used unless `loop` is given explicitly.
+        """
+        kwargs.setdefault("loop", self._loop)
+        client = client_class(local_jid, security_layer, **kwargs)
+        self.add_client(client)
+        return client
+
+    def flush_dns_cache(self):
+        """
+        Discard all cached discovery results.
+        """
+        self._dns_cache.clear()
+
+    def _discovery_done(self, domain, fut):
+        try:
+            _, current = self._dns_cache[domain]
+        except KeyError:
+            return
+        if current is not fut:
+            return
+
+        if fut.cancelled() or fut.exception() is not None:
+            del self._dns_cache[domain]
+            return
+
+        self._dns_cache[domain] = (
+            self._loop.time() + self._dns_cache_ttl.total_seconds(),
+            fut,
+        )
+
+    @asyncio.coroutine
+    def discover_connectors(self, domain, loop=None, logger=logger):
+        """
+        Discover the connection options for a domain, using the cache.
+
+        This coroutine has the same signature and semantics as
+        :func:`discover_connectors`. Successful results are cached for the
+        configured time-to-live; failures are not cached. If a discovery for
+        the same domain is already in progress, its result is awaited instead
+        of starting another one.
+        """
+        try:
+            expires_at, fut = self._dns_cache[domain]
+        except KeyError:
+            pass
+        else:
+            if expires_at is None or expires_at > self._loop.time():
+                return list((yield from asyncio.shield(fut,
+                                                       loop=self._loop)))
+            del self._dns_cache[domain]
+
+        fut = asyncio.ensure_future(
+            discover_connectors(domain, loop=loop, logger=logger),
+            loop=self._loop,
+        )
+        self._dns_cache[domain] = (None, fut)
+        fut.add_done_callback(
+            functools.partial(self._discovery_done, domain)
+        )
+        return list((yield from asyncio.shield(fut, loop=self._loop)))
+
+    @asyncio.coroutine
+    def connect_xmlstream(self, jid, metadata, **kwargs):
+        """
+        Connect an XML stream, bounded by the connection limit of the pool.
+
+        The arguments are passed to :func:`connect_xmlstream`, with
+        :meth:`discover_connectors` of the pool used for discovery. If the
+        maximum number of concurrent connection attempts is reached, this
+        coroutine waits until another attempt has finished.
+        """
+        with (yield from self._connect_semaphore):
+            self._connecting += 1
+            try:
+                return (yield from connect_xmlstream(
+                    jid, metadata,
+                    discover=self.discover_connectors,
+                    **kwargs
+                ))
+            finally:
+                self._connecting -= 1
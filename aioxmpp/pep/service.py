@@ -68,6 +68,7 @@ class PEPClient(service.Service):
         self._disco_server = self.dependencies[aioxmpp.DiscoServer]
 
         self._pep_node_claims = weakref.WeakValueDictionary()
+        self._node_signal_tokens = {}
 
     def is_claimed(self, node):
         """
@@ -131,10 +132,22 @@ class PEPClient(service.Service):
 
         self._pep_node_claims[node_namespace] = registered_node
 
+        # the connection may still exist if a previous claim for the node was
+        # garbage collected without being closed
+        if node_namespace not in self._node_signal_tokens:
+            signal = self._pubsub.node_signal(node_namespace)
+            self._node_signal_tokens[node_namespace] = signal.connect(
+                self._handle_node_notification
+            )
+
         return registered_node
 
     def _unclaim(self, node_namespace):
         self._pep_node_claims.pop(node_namespace)
+        token = self._node_signal_tokens.pop(node_namespace, None)
+        if token is not None:
+            self._pubsub.node_signal(node_namespace).disconnect(token)
+            self._pubsub.release_node_signal(node_namespace)
 
     @asyncio.coroutine
     def available(self):
@@ -158,7 +171,11 @@ class PEPClient(service.Service):
         if not (yield from self.available()):
             raise RuntimeError("server does not support PEP")
 
-    @service.depsignal(aioxmpp.PubSubClient, "on_item_published")
+    def _handle_node_notification(self, jid, node, items, retracts, *,
+                                  message=None):
+        for item in items:
+            self._handle_pubsub_publish(jid, node, item, message=message)
+
     def _handle_pubsub_publish(self, jid, node, item, *, message=None):
         try:
             registered_node = self._pep_node_claims[node]
@@ -20,6 +20,8 @@
 #
 ########################################################################
 import asyncio
+import bisect
+import itertools
 import numbers
 
 import aioxmpp.callbacks
@@ -28,6 +30,94 @@ import aioxmpp.structs
 import aioxmpp.xso.model
 
 
+class _CompactPresence:
+    """
+    The parts of an available presence stanza which are kept by the
+    :class:`PresenceClient` if it does not retain full stanzas.
+    """
+
+    __slots__ = ("from_", "show", "status", "priority",
+                 "xep0115_caps", "xep0390_caps")
+
+    def __init__(self, st):
+        self.from_ = st.from_
+        self.show = st.show
+        self.status = dict(st.status) or None
+        self.priority = st.priority
+        self.xep0115_caps = getattr(st, "xep0115_caps", None)
+        self.xep0390_caps = getattr(st, "xep0390_caps", None)
+
+    def to_stanza(self):
+        st = aioxmpp.Presence(
+            type_=aioxmpp.structs.PresenceType.AVAILABLE,
+            show=self.show,
+            from_=self.from_,
+        )
+        if self.status:
+            st.status.update(self.status)
+        st.priority = self.priority
+        if self.xep0115_caps is not None:
+            st.xep0115_caps = self.xep0115_caps
+        if self.xep0390_caps is not None:
+            st.xep0390_caps = self.xep0390_caps
+        return st
+
+
+def _expand(stored):
+    if isinstance(stored, _CompactPresence):
+        return stored.to_stanza()
+    return stored
+
+
+class _ResourceIndex:
+    """
+    Resources of a bare JID, ordered by availability.
+
+    The entries are kept sorted by presence show, priority and the sequence
+    number at which the resource became available. The most available
+    resource is thus always the last entry.
+    """
+
+    __slots__ = ("_keys", "_sorted")
+
+    def __init__(self):
+        self._keys = {}
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, resource, show, priority, seq):
+        try:
+            old_key = self._keys[resource]
+        except KeyError:
+            pass
+        else:
+            seq = old_key[2]
+            self._remove_key(old_key)
+
+        key = (show, priority, seq, resource)
+        self._keys[resource] = key
+        bisect.insort(self._sorted, key)
+
+    def remove(self, resource):
+        try:
+            key = self._keys.pop(resource)
+        except KeyError:
+            return
+        self._remove_key(key)
+
+    def _remove_key(self, key):
+        i = bisect.bisect_left(self._sorted, key)
+        del self._sorted[i]
+
+    def best(self):
+        try:
+            return self._sorted[-1][3]
+        except IndexError:
+            return None
+
+
 class PresenceClient(aioxmpp.service.Service):
     """
     The presence service tracks all incoming presence information (this does
@@ -55,6 +145,8 @@ class PresenceClient(aioxmpp.service.Service):
 
     .. automethod:: get_stanza
 
+    .. autoattribute:: retain_stanzas
+
     On presence changes of peers, signals are emitted:
 
     .. signal:: on_bare_available(stanza)
@@ -115,10 +207,27 @@ class PresenceClient(aioxmpp.service.Service):
     on_changed = aioxmpp.callbacks.Signal()
     on_unavailable = aioxmpp.callbacks.Signal()
 
+    #: If true (the default), the full presence stanzas are kept and returned
+    #: by the query methods.
+    #:
+    #: If false, only the presence state, status, priority and entity
+    #: capabilities of available presences are kept, which uses considerably
+    #: less memory when tracking many peers. The query methods then return
+    #: newly constructed :class:`aioxmpp.Presence` stanzas with only that
+    #: information; other payloads (such as :xep:`153` avatar hashes) are not
+    #: included. The signals always receive the original stanzas.
+    #:
+    #: Changing the value only affects presences received afterwards.
+    #:
+    #: .. versionadded:: 0.10
+    retain_stanzas = True
+
     def __init__(self, client, **kwargs):
         super().__init__(client, **kwargs)
 
         self._presences = {}
+        self._indices = {}
+        self._seq = itertools.count()
 
     def get_most_available_stanza(self, peer_jid):
         """
@@ -132,18 +241,27 @@ class PresenceClient(aioxmpp.service.Service):
                  :data:`None` if there is no available resource.
 
         The "most available" resource is the one whose presence state orderest
-        highest according to :class:`~aioxmpp.PresenceState`.
+        highest according to :class:`~aioxmpp.PresenceState`. Among resources
+        with the same presence state, the one with the highest priority wins;
+        if that is also equal, the resource which became available last is
+        returned.
 
         If there is no available resource for a given `peer_jid`, :data:`None`
         is returned.
+
+        The lookup takes constant time; the ordering of the resources is
+        maintained as presences arrive.
+
+        .. versionchanged:: 0.10
+
+           The priority of the resources is taken into account.
         """
-        presences = sorted(
-            self.get_peer_resources(peer_jid).items(),
-            key=lambda item: aioxmpp.structs.PresenceState.from_stanza(item[1])
-        )
-        if not presences:
+        try:
+            index = self._indices[peer_jid]
+        except KeyError:
             return None
-        return presences[-1][1]
+
+        return _expand(self._presences[peer_jid][index.best()])
 
     def get_peer_resources(self, peer_jid):
         """
@@ -155,11 +273,14 @@ class PresenceClient(aioxmpp.service.Service):
         returned mapping is empty.
         """
         try:
-            d = dict(self._presences[peer_jid])
-            d.pop(None, None)
-            return d
+            resources = self._presences[peer_jid]
         except KeyError:
             return {}
+        return {
+            resource: _expand(stored)
+            for resource, stored in resources.items()
+            if resource is not None
+        }
 
     def get_stanza(self, peer_jid):
         """
@@ -171,7 +292,9 @@ class PresenceClient(aioxmpp.service.Service):
         is returned.
         """
         try:
-            return self._presences[peer_jid.bare()][peer_jid.resource]
+            return _expand(
+                self._presences[peer_jid.bare()][peer_jid.resource]
+            )
         except KeyError:
             pass
         try:
@@ -203,6 +326,10 @@ class PresenceClient(aioxmpp.service.Service):
                 if len(dest_dict) == 1:
                     self.on_bare_unavailable(st)
                 del dest_dict[resource]
+                index = self._indices[bare]
+                index.remove(resource)
+                if not index:
+                    del self._indices[bare]
         elif st.type_ == aioxmpp.structs.PresenceType.ERROR:
             try:
                 dest_dict = self._presences[bare]
@@ -214,12 +341,21 @@ class PresenceClient(aioxmpp.service.Service):
                                         st)
                 self.on_bare_unavailable(st)
             self._presences[bare] = {None: st}
+            self._indices.pop(bare, None)
         else:
             dest_dict = self._presences.setdefault(bare, {})
             dest_dict.pop(None, None)
             bare_became_available = not dest_dict
             resource_became_available = resource not in dest_dict
-            dest_dict[resource] = st
+            if self.retain_stanzas:
+                dest_dict[resource] = st
+            else:
+                dest_dict[resource] = _CompactPresence(st)
+
+            if resource is not None:
+                self._indices.setdefault(bare, _ResourceIndex()).update(
+                    resource, st.show, st.priority, next(self._seq),
+                )
 
             if bare_became_available:
                 self.on_bare_available(st)
@@ -20,9 +20,13 @@
 #
 ########################################################################
 import asyncio
+import copy
+import functools
 
+import aioxmpp.cache
 import aioxmpp.callbacks
 import aioxmpp.disco
+import aioxmpp.rsm
 import aioxmpp.service
 import aioxmpp.stanza
 import aioxmpp.structs
@@ -65,7 +69,9 @@ class PubSubClient(aioxmpp.service.Service):
 
           notify
           publish
+          publish_many
           retract
+          retract_many
 
     Owner use cases:
        .. autosummary::
@@ -87,6 +93,8 @@ class PubSubClient(aioxmpp.service.Service):
 
     .. automethod:: get_subscriptions
 
+    .. automethod:: iter_subscriptions
+
     .. automethod:: subscribe
 
     .. automethod:: unsubscribe
@@ -105,14 +113,20 @@ class PubSubClient(aioxmpp.service.Service):
 
     .. automethod:: get_items_by_id
 
+    .. automethod:: iter_items
+
     Publishing and retracting items:
 
     .. automethod:: notify
 
     .. automethod:: publish
 
+    .. automethod:: publish_many
+
     .. automethod:: retract
 
+    .. automethod:: retract_many
+
     Manage nodes:
 
     .. automethod:: change_node_affiliations
@@ -125,6 +139,8 @@ class PubSubClient(aioxmpp.service.Service):
 
     .. automethod:: get_nodes
 
+    .. automethod:: iter_nodes
+
     .. automethod:: get_node_affiliations
 
     .. automethod:: get_node_subscriptions
@@ -143,6 +159,41 @@ class PubSubClient(aioxmpp.service.Service):
 
     .. autosignal:: on_subscription_update(jid, node, state, *, subid=None, message=None)
 
+    Listening to specific nodes:
+
+    .. automethod:: node_signal
+
+    .. automethod:: release_node_signal
+
+    Caching of items:
+
+    If enabled by setting :attr:`item_cache_size` to a positive value, item
+    payloads received in notifications are kept in a size-bounded cache which
+    is keyed by the service address, node name and item ID. Retraction, purge
+    and deletion notifications remove the affected entries, and the whole
+    cache is cleared when the stream is destroyed (as notifications may have
+    been missed in the meantime).
+
+    :meth:`get_items_by_id` only requests the items which are not in the
+    cache. Items returned by :meth:`get_items` and :meth:`get_items_by_id`
+    are added to the cache if notifications have been received from the node
+    before, since only those entries are kept up to date.
+
+    .. warning::
+
+       The cache may return items which do not exist on the service anymore.
+       Services do not send notifications for all ways an item can be
+       removed; most notably, items evicted from a node because it exceeds
+       its ``max_items`` limit are dropped silently. Only enable the cache if
+       the application can cope with such stale items (for example, because
+       it only asks for item IDs it has just been notified about).
+
+    The payloads are copied when they are added to the cache and when they
+    are returned from it, so modifying them does not affect the cache.
+
+    .. autoattribute:: item_cache_size
+       :annotation: = 0
+
     .. versionchanged:: 0.8
 
        This class was formerly known as :class:`aioxmpp.pubsub.Service`. It
@@ -216,6 +267,137 @@ class PubSubClient(aioxmpp.service.Service):
     def __init__(self, client, **kwargs):
         super().__init__(client, **kwargs)
         self._disco = self.dependencies[aioxmpp.DiscoClient]
+        self._item_cache = aioxmpp.cache.LRUDict()
+        self._item_cache_size = 0
+        self._notifying_nodes = set()
+        self._node_signals = {}
+
+    def node_signal(self, node, *, jid=None):
+        """
+        Return the signal for notifications about `node`.
+
+        :param node: Name of the node.
+        :type node: :class:`str`
+        :param jid: Address of the PubSub service, or :data:`None` to receive
+            notifications about `node` from any service.
+        :type jid: :class:`aioxmpp.JID` or :data:`None`
+        :rtype: :class:`aioxmpp.callbacks.AdHocSignal`
+
+        The returned signal fires once per notification message with the
+        arguments ``(jid, node, items, retracts, *, message)``: `items` is the
+        list of :class:`~.xso.EventItem` objects published to the node and
+        `retracts` the list of IDs of items retracted from it (either may be
+        empty). Signals for a specific `jid` fire before the signal for any
+        service.
+
+        Compared to :meth:`on_item_published` and :meth:`on_item_retracted`,
+        listeners are only called for the nodes they are interested in and
+        only once for notifications carrying several items. This matters for
+        clients which receive many :xep:`163` notifications for nodes they do
+        not handle (each contact of a large roster may send them).
+
+        For :xep:`163`, the node name is the namespace of the payload, so
+        passing the namespace as `node` with ``jid=None`` listens for the
+        payload of that namespace from all contacts.
+
+        The signal is created on first use and kept until it is released with
+        :meth:`release_node_signal`; use
+        :meth:`~aioxmpp.callbacks.AdHocSignal.connect` and
+        :meth:`~aioxmpp.callbacks.AdHocSignal.disconnect` to manage listeners.
+
+        .. versionadded:: 0.10
+        """
+        key = jid, node
+        try:
+            return self._node_signals[key]
+        except KeyError:
+            signal = aioxmpp.callbacks.AdHocSignal()
+            signal.logger = self.logger
+            self._node_signals[key] = signal
+            return signal
+
+    def release_node_signal(self, node, *, jid=None):
+        """
+        Drop the signal for notifications about `node` if it is unused.
+
+        :param node: Name of the node.
+        :type node: :class:`str`
+        :param jid: Address of the PubSub service, or :data:`None`.
+        :type jid: :class:`aioxmpp.JID` or :data:`None`
+
+        If no listeners are connected to the signal returned by
+        :meth:`node_signal` for the same arguments, the signal is dropped and
+        does not fire anymore; the next call to :meth:`node_signal` creates a
+        new signal. If listeners are connected, this does nothing.
+
+        Call this after disconnecting from a node signal which is not needed
+        anymore, so that signals for nodes which are not of interest do not
+        accumulate.
+
+        .. versionadded:: 0.10
+        """
+        key = jid, node
+        signal = self._node_signals.get(key)
+        if signal is not None and not signal._connections:
+            del self._node_signals[key]
+
+    def _emit_node_signals(self, jid, groups, message):
+        signals = self._node_signals
+        for node, (items, retracts) in groups.items():
+            signal = signals.get((jid, node))
+            if signal is not None:
+                signal(jid, node, items, retracts, message=message)
+            signal = signals.get((None, node))
+            if signal is not None:
+                signal(jid, node, items, retracts, message=message)
+
+    @property
+    def item_cache_size(self):
+        """
+        Maximum number of item payloads kept in the item cache.
+
+        The cache is disabled if this is zero, which is the default. See
+        above for the caveats of enabling it.
+
+        .. versionadded:: 0.10
+        """
+        return self._item_cache_size
+
+    @item_cache_size.setter
+    def item_cache_size(self, value):
+        if value < 0:
+            raise ValueError("item_cache_size must not be negative")
+        if value == 0:
+            self._item_cache.clear()
+            self._notifying_nodes.clear()
+        else:
+            self._item_cache.maxsize = value
+        self._item_cache_size = value
+
+    def _cache_item(self, jid, node, id_, payload):
+        if id_ is None or not self._item_cache_size:
+            return
+        key = jid, node, id_
+        if payload is None:
+            self._item_cache.pop(key, None)
+        else:
+            self._item_cache[key] = copy.deepcopy(payload)
+
+    def _cache_fetched_items(self, jid, node, items):
+        if (jid, node) not in self._notifying_nodes:
+            return
+        for item in items:
+            self._cache_item(jid, node, item.id_, item.registered_payload)
+
+    def _invalidate_node(self, jid, node):
+        for key in [key for key in self._item_cache
+                    if key[0] == jid and key[1] == node]:
+            del self._item_cache[key]
+
+    @aioxmpp.service.depsignal(aioxmpp.Client, "on_stream_destroyed")
+    def _clear_item_cache(self):
+        self._item_cache.clear()
+        self._notifying_nodes.clear()
 
     @aioxmpp.service.inbound_message_filter
     def filter_inbound_message(self, msg):
@@ -223,23 +405,44 @@ class PubSubClient(aioxmpp.service.Service):
                 msg.xep0060_event.payload is not None):
             payload = msg.xep0060_event.payload
             if isinstance(payload, pubsub_xso.EventItems):
+                jid = msg.from_
+                payload_node = payload.node
+                # items and retractions grouped by node, for node_signal
+                groups = {} if self._node_signals else None
                 for item in payload.items:
-                    node = item.node or payload.node
+                    node = item.node or payload_node
+                    if self._item_cache_size:
+                        self._notifying_nodes.add((jid, node))
+                        self._cache_item(jid, node, item.id_,
+                                         item.registered_payload)
                     self.on_item_published(
-                        msg.from_,
+                        jid,
                         node,
                         item,
                         message=msg,
                     )
+                    if groups is not None:
+                        groups.setdefault(node, ([], []))[0].append(item)
                 for retract in payload.retracts:
-                    node = payload.node
+                    self._item_cache.pop((jid, payload_node, retract.id_),
+                                         None)
                     self.on_item_retracted(
-                        msg.from_,
-                        node,
+                        jid,
+                        payload_node,
                         retract.id_,
                         message=msg,
                     )
+                    if groups is not None:
+                        groups.setdefault(payload_node, ([], []))[1].append(
+                            retract.id_
+                        )
+                if groups:
+                    self._emit_node_signals(jid, groups, msg)
+            elif isinstance(payload, pubsub_xso.EventPurge):
+                self._invalidate_node(msg.from_, payload.node)
             elif isinstance(payload, pubsub_xso.EventDelete):
+                self._invalidate_node(msg.from_, payload.node)
+                self._notifying_nodes.discard((msg.from_, payload.node))
                 self.on_node_deleted(
                     msg.from_,
                     payload.node,
@@ -531,7 +734,9 @@ class PubSubClient(aioxmpp.service.Service):
             pubsub_xso.Items(node, max_items=max_items)
         )
 
-        return (yield from self.client.send(iq))
+        response = yield from self.client.send(iq)
+        self._cache_fetched_items(jid, node, response.payload.items)
+        return response
 
     @asyncio.coroutine
     def get_items_by_id(self, jid, node, ids):
@@ -555,22 +760,107 @@ class PubSubClient(aioxmpp.service.Service):
 
         Return the :class:`.xso.Request` object, which has a
         :class:`~.xso.Items` :attr:`~.xso.Request.payload`.
+
+        .. versionchanged:: 0.10
+
+           If the item cache is enabled (see above), items found in it are
+           not requested from the service. If all items are cached, no
+           request is sent and a :class:`.xso.Request` is constructed
+           locally.
         """
 
+        ids = list(ids)
+        if not ids:
+            raise ValueError("ids must not be empty")
+
+        cached = {}
+        missing = []
+        for id_ in ids:
+            try:
+                cached[id_] = self._item_cache[jid, node, id_]
+            except KeyError:
+                missing.append(id_)
+
+        if missing:
+            iq = aioxmpp.stanza.IQ(to=jid, type_=aioxmpp.structs.IQType.GET)
+            iq.payload = pubsub_xso.Request(
+                pubsub_xso.Items(node)
+            )
+
+            iq.payload.payload.items = [
+                pubsub_xso.Item(id_)
+                for id_ in missing
+            ]
+
+            response = yield from self.client.send(iq)
+            self._cache_fetched_items(jid, node, response.payload.items)
+            if not cached:
+                return response
+        else:
+            response = pubsub_xso.Request(
+                pubsub_xso.Items(node)
+            )
+
+        fetched = {
+            item.id_: item
+            for item in response.payload.items
+        }
+
+        items = []
+        for id_ in ids:
+            try:
+                payload = cached[id_]
+            except KeyError:
+                try:
+                    items.append(fetched[id_])
+                except KeyError:
+                    pass
+                continue
+            item = pubsub_xso.Item(id_)
+            item.registered_payload = copy.deepcopy(payload)
+            items.append(item)
+
+        response.payload.items[:] = items
+        return response
+
+    @asyncio.coroutine
+    def _get_items_page(self, jid, node, rsm):
         iq = aioxmpp.stanza.IQ(to=jid, type_=aioxmpp.structs.IQType.GET)
         iq.payload = pubsub_xso.Request(
             pubsub_xso.Items(node)
         )
+        iq.payload.rsm = rsm
 
-        iq.payload.payload.items = [
-            pubsub_xso.Item(id_)
-            for id_ in ids
-        ]
+        response = yield from self.client.send(iq)
+        return list(response.payload.items), response.rsm
 
-        if not iq.payload.payload.items:
-            raise ValueError("ids must not be empty")
+    def iter_items(self, jid, node, *, page_size=100):
+        """
+        Iterate over the items of a node page by page.
 
-        return (yield from self.client.send(iq))
+        :param jid: Address of the PubSub service.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: Name of the PubSub node to query.
+        :type node: :class:`str`
+        :param page_size: Number of items to request at once.
+        :type page_size: :class:`int`
+        :rtype: :class:`aioxmpp.rsm.ResultSetIterator`
+        :return: Iterator over the :class:`~.xso.Item` objects of the node.
+
+        The items are requested in pages of `page_size` items using
+        :xep:`59`; the next page is requested while the current one is
+        consumed. This avoids holding the complete contents of large nodes in
+        memory. Errors returned by the service are raised from the iterator.
+
+        If the service does not support :xep:`59` for item retrieval, the
+        first page contains all the items the service is willing to return.
+
+        .. versionadded:: 0.10
+        """
+        return aioxmpp.rsm.ResultSetIterator(
+            functools.partial(self._get_items_page, jid, node),
+            page_size=page_size,
+        )
 
     @asyncio.coroutine
     def get_subscriptions(self, jid, node=None):
@@ -597,6 +887,40 @@ class PubSubClient(aioxmpp.service.Service):
         response = yield from self.client.send(iq)
         return response.payload
 
+    @asyncio.coroutine
+    def _get_subscriptions_page(self, jid, node, rsm):
+        iq = aioxmpp.stanza.IQ(to=jid, type_=aioxmpp.structs.IQType.GET)
+        iq.payload = pubsub_xso.Request(
+            pubsub_xso.Subscriptions(node=node)
+        )
+        iq.payload.rsm = rsm
+
+        response = yield from self.client.send(iq)
+        return list(response.payload.subscriptions), response.rsm
+
+    def iter_subscriptions(self, jid, node=None, *, page_size=100):
+        """
+        Iterate over the subscriptions of the local entity page by page.
+
+        :param jid: Address of the PubSub service.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: Name of the PubSub node to query.
+        :type node: :class:`str`
+        :param page_size: Number of subscriptions to request at once.
+        :type page_size: :class:`int`
+        :rtype: :class:`aioxmpp.rsm.ResultSetIterator`
+        :return: Iterator over the :class:`~.xso.Subscription` objects.
+
+        This is the paged equivalent of :meth:`get_subscriptions`; see
+        :meth:`iter_items` for the semantics of paging.
+
+        .. versionadded:: 0.10
+        """
+        return aioxmpp.rsm.ResultSetIterator(
+            functools.partial(self._get_subscriptions_page, jid, node),
+            page_size=page_size,
+        )
+
     @asyncio.coroutine
     def publish(self, jid, node, payload, *, id_=None):
         """
@@ -643,7 +967,9 @@ class PubSubClient(aioxmpp.service.Service):
         response = yield from self.client.send(iq)
 
         if response is not None and response.payload.item is not None:
-            return response.payload.item.id_ or id_
+            id_ = response.payload.item.id_ or id_
+
+        self._item_cache.pop((jid, node, id_), None)
         return id_
 
     @asyncio.coroutine
@@ -698,6 +1024,105 @@ class PubSubClient(aioxmpp.service.Service):
 
         yield from self.client.send(iq)
 
+        self._item_cache.pop((jid, node, id_), None)
+
+    @asyncio.coroutine
+    def _pipeline(self, coroutine_function, args_iterable, window):
+        if window < 1:
+            raise ValueError("window must be positive")
+
+        semaphore = asyncio.Semaphore(window)
+
+        @asyncio.coroutine
+        def run_one(args):
+            try:
+                return (yield from coroutine_function(*args))
+            finally:
+                semaphore.release()
+
+        tasks = []
+        try:
+            for args in args_iterable:
+                yield from semaphore.acquire()
+                tasks.append(asyncio.ensure_future(run_one(args)))
+            return (yield from asyncio.gather(*tasks, return_exceptions=True))
+        except:  # NOQA
+            for task in tasks:
+                task.cancel()
+            raise
+
+    @asyncio.coroutine
+    def publish_many(self, jid, node, items, *, window=16):
+        """
+        Publish many items to a node, pipelining the requests.
+
+        :param jid: Address of the PubSub service.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: Name of the PubSub node to publish to.
+        :type node: :class:`str`
+        :param items: The items to publish.
+        :type items: :class:`~collections.abc.Iterable` of pairs of
+            :class:`str` (or :data:`None`) and :class:`aioxmpp.xso.XSO`
+        :param window: Maximum number of requests awaiting a reply at the
+            same time.
+        :type window: :class:`int`
+        :return: The result for each item, in the order of `items`.
+        :rtype: :class:`list`
+
+        Each element of `items` is a pair of the item ID (or :data:`None` to
+        let the server assign an ID) and the payload, which are passed to
+        :meth:`publish`. Instead of waiting for the reply to each request
+        before sending the next, up to `window` requests are sent ahead.
+        `items` is consumed lazily, so it may be a generator producing a large
+        number of items.
+
+        The element of the returned list for an item is the item ID (as
+        returned by :meth:`publish`) if the item was published, or the
+        exception (for example :class:`aioxmpp.errors.XMPPError`) if
+        publishing the item failed. A failure does not abort the publication
+        of the other items.
+
+        .. versionadded:: 0.10
+        """
+        return (yield from self._pipeline(
+            lambda id_, payload: self.publish(jid, node, payload, id_=id_),
+            items,
+            window,
+        ))
+
+    @asyncio.coroutine
+    def retract_many(self, jid, node, ids, *, notify=False, window=16):
+        """
+        Retract many items from a node, pipelining the requests.
+
+        :param jid: Address of the PubSub service.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: Name of the PubSub node to retract the items from.
+        :type node: :class:`str`
+        :param ids: The IDs of the items to retract.
+        :type ids: :class:`~collections.abc.Iterable` of :class:`str`
+        :param notify: Flag indicating whether subscribers shall be notified
+            about the retractions.
+        :type notify: :class:`bool`
+        :param window: Maximum number of requests awaiting a reply at the
+            same time.
+        :type window: :class:`int`
+        :return: The result for each ID, in the order of `ids`.
+        :rtype: :class:`list`
+
+        Each item is retracted with :meth:`retract`, pipelining the requests
+        as described in :meth:`publish_many`. The element of the returned list
+        for an ID is :data:`None` if the item was retracted or the exception
+        if retracting it failed.
+
+        .. versionadded:: 0.10
+        """
+        return (yield from self._pipeline(
+            lambda id_: self.retract(jid, node, id_, notify=notify),
+            ((id_,) for id_ in ids),
+            window,
+        ))
+
     @asyncio.coroutine
     def create(self, jid, node=None):
         """
@@ -765,6 +1190,9 @@ class PubSubClient(aioxmpp.service.Service):
 
         yield from self.client.send(iq)
 
+        self._invalidate_node(jid, node)
+        self._notifying_nodes.discard((jid, node))
+
     @asyncio.coroutine
     def get_nodes(self, jid, node=None):
         """
@@ -807,6 +1235,44 @@ class PubSubClient(aioxmpp.service.Service):
 
         return result
 
+    @asyncio.coroutine
+    def _get_nodes_page(self, jid, node, rsm):
+        iq = aioxmpp.stanza.IQ(to=jid, type_=aioxmpp.structs.IQType.GET)
+        iq.payload = aioxmpp.disco.xso.ItemsQuery(node=node)
+        iq.payload.rsm = rsm
+
+        response = yield from self.client.send(iq)
+        return [
+            (item.node, item.name)
+            for item in response.items
+            if item.jid == jid
+        ], response.rsm
+
+    def iter_nodes(self, jid, node=None, *, page_size=100):
+        """
+        Iterate over the nodes at a service or collection node page by page.
+
+        :param jid: Address of the PubSub service.
+        :type jid: :class:`aioxmpp.JID`
+        :param node: Name of the collection node to query
+        :type node: :class:`str` or :data:`None`
+        :param page_size: Number of nodes to request at once.
+        :type page_size: :class:`int`
+        :rtype: :class:`aioxmpp.rsm.ResultSetIterator`
+        :return: Iterator over tuples consisting of the node name and its
+            description.
+
+        This is the paged equivalent of :meth:`get_nodes`; see
+        :meth:`iter_items` for the semantics of paging. The results are not
+        cached by the :class:`~.DiscoClient`.
+
+        .. versionadded:: 0.10
+        """
+        return aioxmpp.rsm.ResultSetIterator(
+            functools.partial(self._get_nodes_page, jid, node),
+            page_size=page_size,
+        )
+
     @asyncio.coroutine
     def get_node_affiliations(self, jid, node):
         """
@@ -959,3 +1425,5 @@ class PubSubClient(aioxmpp.service.Service):
         )
 
         yield from self.client.send(iq)
+
+        self._invalidate_node(jid, node)
@@ -20,6 +20,7 @@
 #
 ########################################################################
 import aioxmpp.forms
+import aioxmpp.rsm.xso
 import aioxmpp.stanza
 import aioxmpp.xso as xso
 
@@ -473,6 +474,14 @@ class Request(xso.XSO):
        available here. If they are used without another payload, the
        :attr:`payload` attribute is :data:`None`.
 
+    .. attribute:: rsm
+
+       :xep:`59` result set management information, used to page through
+       results (for example of :class:`Items` or :class:`Subscriptions`
+       requests).
+
+       .. versionadded:: 0.10
+
     """
     TAG = (namespaces.xep0060, "pubsub")
 
@@ -497,6 +506,10 @@ class Request(xso.XSO):
         Configure,
     ])
 
+    rsm = xso.Child([
+        aioxmpp.rsm.xso.ResultSetMetadata,
+    ])
+
     def __init__(self, payload=None):
         super().__init__()
         self.payload = payload
@@ -21,6 +21,7 @@
 ########################################################################
 import asyncio
 import logging
+import sys
 
 import aioxmpp.service
 
@@ -92,7 +93,17 @@ class Item:
 
        Do not confuse this with the XSO :class:`.xso.Item`.
 
+    .. versionchanged:: 0.10
+
+       :class:`Item` uses :attr:`__slots__` and group names are interned, to
+       reduce the memory used by large rosters. Arbitrary attributes can no
+       longer be set on instances.
+
     """
+
+    __slots__ = ("jid", "subscription", "approved", "ask", "name", "groups",
+                 "__weakref__")
+
     def __init__(self, jid, *,
                  approved=False,
                  ask=None,
@@ -105,7 +116,7 @@ class Item:
         self.approved = approved
         self.ask = ask
         self.name = name
-        self.groups = set(groups)
+        self.groups = {sys.intern(group) for group in groups}
 
     def update_from_xso_item(self, xso_item):
         """
@@ -118,7 +129,7 @@ class Item:
         self.approved = xso_item.approved
         self.ask = xso_item.ask
         self.name = xso_item.name
-        self.groups = {group.name for group in xso_item.groups}
+        self.groups = {sys.intern(group.name) for group in xso_item.groups}
 
     @classmethod
     def from_xso_item(cls, xso_item):
@@ -167,7 +178,7 @@ class Item:
         self.approved = bool(data.get("approved", False))
         self.ask = data.get("ask", None)
         self.name = data.get("name", None)
-        self.groups = set(data.get("groups", []))
+        self.groups = {sys.intern(group) for group in data.get("groups", [])}
 
 
 class RosterClient(aioxmpp.service.Service):
@@ -311,6 +322,19 @@ class RosterClient(aioxmpp.service.Service):
 
         .. versionadded:: 0.9
 
+    .. signal:: on_roster_reloaded()
+
+        Fires when the whole roster has been replaced by a full roster from
+        the server without firing the per-entry signals above (see
+        :attr:`bulk_load_initial_roster`).
+
+        :attr:`items` and :attr:`groups` are up-to-date when the signal fires.
+        Listeners should re-read them completely.
+
+        .. versionadded:: 0.10
+
+    .. autoattribute:: bulk_load_initial_roster
+
     Modifying roster contents:
 
     .. automethod:: set_entry
@@ -374,6 +398,11 @@ class RosterClient(aioxmpp.service.Service):
     services won’t delete roster contents between two connections on the same
     :class:`.Client` instance.
 
+    Alternatively, a :class:`~aioxmpp.roster.RosterStore` can be attached,
+    which persists the roster incrementally:
+
+    .. autoattribute:: store
+
     .. versionchanged:: 0.8
 
        This class was formerly known as :class:`aioxmpp.roster.Service`. It
@@ -396,6 +425,8 @@ class RosterClient(aioxmpp.service.Service):
     on_group_added = callbacks.Signal()
     on_group_removed = callbacks.Signal()
 
+    on_roster_reloaded = callbacks.Signal()
+
     on_subscribed = callbacks.Signal()
     on_subscribe = callbacks.Signal()
     on_unsubscribed = callbacks.Signal()
@@ -413,6 +444,43 @@ class RosterClient(aioxmpp.service.Service):
         self.items = {}
         self.groups = {}
         self.version = None
+        self._store = None
+
+    #: If true, a full roster sent by the server in reply to the initial
+    #: roster request replaces :attr:`items` and :attr:`groups` without
+    #: diffing and without firing the per-entry signals. Instead,
+    #: :meth:`on_roster_reloaded` fires once. :class:`Item` instances of
+    #: entries which are still in the roster are kept.
+    #:
+    #: This is considerably faster for large rosters.
+    #:
+    #: .. versionadded:: 0.10
+    bulk_load_initial_roster = False
+
+    @property
+    def store(self):
+        """
+        The :class:`~aioxmpp.roster.RosterStore` used to persist the roster,
+        or :data:`None`.
+
+        When a store is assigned, the roster is replaced with the contents of
+        the store, as with :meth:`import_from_json`; so it must be assigned
+        **before** connecting. Afterwards, each roster push is appended to the
+        store, and a snapshot is written when a full roster is received and
+        whenever the store asks for one.
+
+        .. versionadded:: 0.10
+        """
+        return self._store
+
+    @store.setter
+    def store(self, value):
+        self._store = value
+        if value is not None:
+            self.import_from_json(value.load())
+
+    def _write_snapshot(self):
+        self._store.write_snapshot(self.export_as_json())
 
     def _update_entry(self, xso_item):
         try:
@@ -480,8 +548,10 @@ class RosterClient(aioxmpp.service.Service):
         request = iq.payload
 
         with (yield from self.__roster_lock):
+            changes = {}
             for item in request.items:
                 if item.subscription == "remove":
+                    changes[str(item.jid)] = None
                     try:
                         old_item = self.items.pop(item.jid)
                     except KeyError:
@@ -491,9 +561,16 @@ class RosterClient(aioxmpp.service.Service):
                         self.on_entry_removed(old_item)
                 else:
                     self._update_entry(item)
+                    changes[str(item.jid)] = \
+                        self.items[item.jid].export_as_json()
 
             self.version = request.ver
 
+            if self._store is not None:
+                self._store.append(self.version, changes)
+                if self._store.needs_snapshot:
+                    self._write_snapshot()
+
     @aioxmpp.dispatcher.presence_handler(
         aioxmpp.structs.PresenceType.SUBSCRIBE,
         None)
@@ -555,6 +632,14 @@ class RosterClient(aioxmpp.service.Service):
             self.version = response.ver
             logger.debug("roster update received (new ver = %s)", self.version)
 
+            if self.bulk_load_initial_roster:
+                self._bulk_load(response.items)
+                if self._store is not None:
+                    self._write_snapshot()
+                self.on_roster_reloaded()
+                self.on_initial_roster_received()
+                return True
+
             actual_jids = {item.jid for item in response.items}
             known_jids = set(self.items.keys())
 
@@ -570,9 +655,33 @@ class RosterClient(aioxmpp.service.Service):
             for item in response.items:
                 self._update_entry(item)
 
+            if self._store is not None:
+                self._write_snapshot()
+
             self.on_initial_roster_received()
             return True
 
+    def _bulk_load(self, xso_items):
+        items = {}
+        groups = {}
+        for xso_item in xso_items:
+            item = self.items.get(xso_item.jid)
+            if item is None:
+                item = Item.from_xso_item(xso_item)
+            else:
+                item.update_from_xso_item(xso_item)
+            items[xso_item.jid] = item
+            for group in item.groups:
+                try:
+                    groups[group].add(item)
+                except KeyError:
+                    groups[group] = {item}
+
+        self.items.clear()
+        self.items.update(items)
+        self.groups.clear()
+        self.groups.update(groups)
+
     def export_as_json(self):
         """
         Export the whole roster as currently stored on the client side into a
@@ -0,0 +1,199 @@
+########################################################################
+# File name: store.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import json
+import logging
+import os
+import pathlib
+import tempfile
+
+import aioxmpp.utils
+
+
+logger = logging.getLogger(__name__)
+
+
+class RosterStore:
+    """
+    Persistent on-disk storage for a roster.
+
+    :param path: Directory in which the roster files are kept.
+    :type path: :class:`pathlib.Path`
+    :param snapshot_interval: Number of logged pushes after which a new
+        snapshot should be written.
+    :type snapshot_interval: :class:`int`
+
+    .. versionadded:: 0.10
+
+    The store consists of a snapshot in the format of
+    :meth:`.RosterClient.export_as_json` and an append-only log of the
+    changes made by roster pushes since that snapshot. Appending a push costs
+    one short write, independent of the size of the roster; the full roster
+    is only written when a snapshot is taken.
+
+    The store is meant to be assigned to :attr:`.RosterClient.store`, which
+    takes care of calling the methods below.
+
+    .. automethod:: load
+
+    .. automethod:: append
+
+    .. autoattribute:: needs_snapshot
+
+    .. automethod:: write_snapshot
+
+    .. automethod:: clear
+    """
+
+    SNAPSHOT_NAME = "roster.json"
+    LOG_NAME = "roster.log"
+
+    def __init__(self, path, *, snapshot_interval=1000):
+        super().__init__()
+        self._path = pathlib.Path(path)
+        self._snapshot_interval = snapshot_interval
+        self._log_entries = 0
+
+    @property
+    def _snapshot_path(self):
+        return self._path / self.SNAPSHOT_NAME
+
+    @property
+    def _log_path(self):
+        return self._path / self.LOG_NAME
+
+    def load(self):
+        """
+        Load the roster from the snapshot and replay the log.
+
+        :return: The stored roster, in the format of
+            :meth:`.RosterClient.export_as_json`.
+        :rtype: :class:`dict`
+
+        A truncated last entry in the log (from a crash while appending) is
+        ignored; in that case, a new snapshot is written.
+        """
+        try:
+            with self._snapshot_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+
+        items = data.setdefault("items", {})
+        data.setdefault("ver", None)
+
+        self._log_entries = 0
+        try:
+            f = self._log_path.open("r", encoding="utf-8")
+        except FileNotFoundError:
+            return data
+
+        corrupt = False
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("ignoring corrupt roster log entry")
+                    corrupt = True
+                    break
+                self._log_entries += 1
+                for jid, item in entry["items"].items():
+                    if item is None:
+                        items.pop(jid, None)
+                    else:
+                        items[jid] = item
+                data["ver"] = entry["ver"]
+
+        if corrupt:
+            # start over with a clean log, so that new entries are not
+            # appended after the corrupt one
+            self.write_snapshot(data)
+
+        return data
+
+    def append(self, ver, changes):
+        """
+        Append a change to the log.
+
+        :param ver: The roster version after the change.
+        :type ver: :class:`str` or :data:`None`
+        :param changes: The changed entries.
+        :type changes: :class:`dict` mapping :class:`str` to :class:`dict` or
+            :data:`None`
+
+        `changes` maps the string representation of bare JIDs to the new data
+        of the entry (as returned by :meth:`.Item.export_as_json`) or to
+        :data:`None` if the entry was removed.
+        """
+        aioxmpp.utils.mkdir_exist_ok(self._path)
+        line = json.dumps({"ver": ver, "items": changes})
+        with self._log_path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        self._log_entries += 1
+
+    @property
+    def needs_snapshot(self):
+        """
+        True if the number of log entries since the last snapshot has reached
+        the `snapshot_interval`.
+        """
+        return self._log_entries >= self._snapshot_interval
+
+    def write_snapshot(self, data):
+        """
+        Replace the snapshot with `data` and truncate the log.
+
+        :param data: The roster, in the format of
+            :meth:`.RosterClient.export_as_json`.
+        :type data: :class:`dict`
+
+        The snapshot is replaced atomically. If the process is interrupted
+        before the log is truncated, replaying the log on top of the new
+        snapshot yields the same entries, as each log entry contains the full
+        data of the changed entries.
+        """
+        aioxmpp.utils.mkdir_exist_ok(self._path)
+        with tempfile.NamedTemporaryFile(mode="w",
+                                         encoding="utf-8",
+                                         dir=str(self._path),
+                                         delete=False) as tmpf:
+            try:
+                json.dump(data, tmpf)
+            except:  # NOQA
+                os.unlink(tmpf.name)
+                raise
+        os.replace(tmpf.name, str(self._snapshot_path))
+
+        with self._log_path.open("w", encoding="utf-8"):
+            pass
+        self._log_entries = 0
+
+    def clear(self):
+        """
+        Remove the snapshot and the log.
+        """
+        for path in [self._snapshot_path, self._log_path]:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._log_entries = 0
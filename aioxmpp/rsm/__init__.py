@@ -45,4 +45,13 @@ XSO
 .. autoclass:: First
 
 .. autoclass:: Last
+
+.. currentmodule:: aioxmpp.rsm
+
+Paging
+======
+
+.. autoclass:: ResultSetIterator
 """
+
+from .iterator import ResultSetIterator  # NOQA
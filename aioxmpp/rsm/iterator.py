@@ -0,0 +1,151 @@
+########################################################################
+# File name: iterator.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import collections
+
+from .xso import ResultSetMetadata
+
+
+class ResultSetIterator:
+    """
+    Iterate over a result set which is retrieved in pages via :xep:`59`.
+
+    :param fetch_page: Coroutine function which retrieves a page.
+    :param page_size: Number of items to request per page.
+    :type page_size: :class:`int`
+    :param prefetch: Whether to request the next page while the current page
+        is being consumed.
+    :type prefetch: :class:`bool`
+
+    `fetch_page` is called with a :class:`~.xso.ResultSetMetadata` request
+    and must return a tuple of the list of items on the page and the
+    :class:`~.xso.ResultSetMetadata` of the response (or :data:`None` if the
+    response did not carry any). It may filter or transform the items.
+
+    Only the page being consumed and, if `prefetch` is true, the page after it
+    are held in memory. The iteration ends when the peer indicates that there
+    are no more items, or if it does not support :xep:`59` (in that case, the
+    single response is assumed to contain the complete result).
+
+    On Python 3.5 and newer, the items can be iterated with ``async for``.
+    Otherwise, :meth:`get_page` is used until it returns an empty list.
+
+    .. automethod:: get_page
+
+    .. automethod:: close
+
+    .. attribute:: count
+
+       The total number of items in the result set as announced by the peer,
+       or :data:`None` if it has not been announced (yet).
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, fetch_page, *, page_size=100, prefetch=True):
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+
+        self._fetch_page = fetch_page
+        self._page_size = page_size
+        self._prefetch = prefetch
+        self._request = ResultSetMetadata.limit(page_size)
+        self._last = None
+        self._next_task = None
+        self._items = collections.deque()
+        self._done = False
+        self.count = None
+
+    def _start_fetch(self):
+        self._next_task = asyncio.ensure_future(
+            self._fetch_page(self._request)
+        )
+
+    def _process_response(self, rsm):
+        if rsm is None or rsm.last is None:
+            self._done = True
+            return
+
+        if rsm.count is not None:
+            self.count = rsm.count
+
+        if rsm.last.value == self._last:
+            # the peer ignored our request to move forward; stop instead of
+            # looping forever
+            self._done = True
+            return
+
+        self._last = rsm.last.value
+        self._request = rsm.next_page(self._page_size)
+
+    @asyncio.coroutine
+    def get_page(self):
+        """
+        Return the next page of items.
+
+        :rtype: :class:`list`
+        :return: The next non-empty page of items, or an empty list if the
+            iteration has ended.
+        :raises aioxmpp.errors.XMPPError: as returned by the peer
+
+        If an error occurs, the iteration ends.
+        """
+        while not self._done:
+            if self._next_task is None:
+                self._start_fetch()
+            task, self._next_task = self._next_task, None
+
+            try:
+                items, rsm = yield from task
+            except:  # NOQA
+                self.close()
+                raise
+
+            self._process_response(rsm)
+            if not self._done and self._prefetch:
+                self._start_fetch()
+
+            if items:
+                return items
+
+        return []
+
+    def close(self):
+        """
+        End the iteration and cancel a pending page request.
+        """
+        self._done = True
+        self._items.clear()
+        if self._next_task is not None:
+            self._next_task.cancel()
+            self._next_task = None
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if not self._items:
+            self._items.extend((yield from self.get_page()))
+            if not self._items:
+                raise StopAsyncIteration
+        return self._items.popleft()
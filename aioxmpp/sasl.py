@@ -31,19 +31,49 @@ It provides an XMPP adaptor for :mod:`aiosasl`.
 
 .. autoclass:: SASLXMPPInterface
 
+Cached SCRAM key derivation
+===========================
+
+The expensive part of SCRAM (:rfc:`5802`) is the PBKDF2 run which derives the
+salted password from the plaintext password. As long as the server keeps the
+salt and the iteration count, the result of that run is the same on each
+authentication. The following classes allow to avoid the repeated derivation
+(for example when reconnecting often or when running many clients in one
+process) and to move the derivation out of the event loop thread.
+
+.. autoclass:: CachingSCRAM
+
+.. autoclass:: SCRAMKeyCache
+
+.. autoclass:: AbstractSCRAMKeyStore
+
+.. autoclass:: SCRAMKeys
+
 The XSOs for SASL authentication can be found in :mod:`aioxmpp.nonza`.
 
 """
 
+import abc
 import asyncio
+import base64
+import collections
+import functools
+import hashlib
+import hmac
 import logging
+import os
+import random
+import time
 
 import aiosasl
 
 from . import protocol, nonza
+from .cache import LRUDict
 
 logger = logging.getLogger(__name__)
 
+_system_random = random.SystemRandom()
+
 
 class SASLXMPPInterface(aiosasl.SASLInterface):
     def __init__(self, xmlstream):
@@ -109,3 +139,390 @@ class SASLXMPPInterface(aiosasl.SASLInterface):
                 text="unexpected non-failure after abort: "
                 "{}".format(self._state)
             )
+
+
+#: The keys derived from a password for SCRAM authentication.
+#:
+#: .. attribute:: client_key
+#:
+#:    The SCRAM ``ClientKey``, as :class:`bytes`.
+#:
+#: .. attribute:: server_key
+#:
+#:    The SCRAM ``ServerKey``, as :class:`bytes`.
+#:
+#: .. versionadded:: 0.10
+SCRAMKeys = collections.namedtuple(
+    "SCRAMKeys",
+    [
+        "client_key",
+        "server_key",
+    ]
+)
+
+
+def _derive_scram_keys(hashfun_name, password, salt, iteration_count):
+    hashfun_factory = functools.partial(hashlib.new, hashfun_name)
+
+    salted_password = aiosasl.pbkdf2(
+        hashfun_name,
+        password,
+        salt,
+        iteration_count)
+
+    return SCRAMKeys(
+        hmac.new(salted_password, b"Client Key", hashfun_factory).digest(),
+        hmac.new(salted_password, b"Server Key", hashfun_factory).digest(),
+    )
+
+
+class AbstractSCRAMKeyStore(metaclass=abc.ABCMeta):
+    """
+    Interface for persistent (secure) storage backing a :class:`SCRAMKeyCache`.
+
+    The keys passed to the methods are tuples ``(jid, mechanism, tag, salt,
+    iteration_count)``, with `jid` being a bare :class:`aioxmpp.JID`,
+    `mechanism` the SASL mechanism name (such as ``"SCRAM-SHA-1"``), `tag` the
+    :class:`bytes` with which :class:`SCRAMKeyCache` binds the entry to the
+    password (see there), `salt` the salt as :class:`bytes` and
+    `iteration_count` an :class:`int`.
+
+    .. warning::
+
+       The stored :class:`SCRAMKeys` are sufficient to authenticate as the
+       user against the server which issued the salt. Implementations must
+       protect them like they would protect the password.
+
+    .. automethod:: load
+
+    .. automethod:: save
+
+    .. automethod:: forget
+
+    .. versionadded:: 0.10
+    """
+
+    @abc.abstractmethod
+    def load(self, key):
+        """
+        Return the :class:`SCRAMKeys` stored for `key` or :data:`None`.
+        """
+
+    @abc.abstractmethod
+    def save(self, key, keys):
+        """
+        Store the :class:`SCRAMKeys` `keys` for `key`.
+        """
+
+    @abc.abstractmethod
+    def forget(self, jid):
+        """
+        Remove all keys stored for the bare `jid`.
+        """
+
+
+class SCRAMKeyCache:
+    """
+    Cache for the keys derived during SCRAM authentication.
+
+    :param store: Optional persistent storage for the keys.
+    :type store: :class:`AbstractSCRAMKeyStore`
+    :param maxsize: Maximum number of entries to hold in memory.
+    :type maxsize: :class:`int`
+    :param secret: Key for the password tags of the entries.
+    :type secret: :class:`bytes` or :data:`None`
+
+    The keys are indexed by the bare JID, the SASL mechanism, the password, the
+    salt and the iteration count; if the server changes either of them, the
+    cached keys are not used anymore. Only keys which have led to a successful
+    authentication (including verification of the server signature) are put
+    into the cache.
+
+    The password is not stored; instead, the entries are tagged with a HMAC of
+    the SASLprepped password keyed with `secret`. Thus, looking up the keys
+    with a different password does not find them. If `secret` is :data:`None`,
+    a random secret is generated, which means that entries written to `store`
+    by a different :class:`SCRAMKeyCache` instance are never found.
+
+    If `store` is given, keys missing from the in-memory cache are looked up in
+    the store and new keys are also written to the store. To make use of the
+    stored keys across restarts, pass the same `secret` each time. The secret
+    should not be kept next to the store: together with the store, it allows
+    to test password guesses without running the key derivation.
+
+    The cache can be shared among any number of :class:`CachingSCRAM` instances
+    (and thus, :class:`aioxmpp.security_layer.PasswordSASLProvider` instances).
+
+    .. autoattribute:: maxsize
+
+    .. automethod:: get
+
+    .. automethod:: put
+
+    .. automethod:: invalidate
+
+    .. automethod:: clear
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, *, store=None, maxsize=128, secret=None):
+        super().__init__()
+        if secret is None:
+            secret = os.urandom(32)
+        self._secret = secret
+        self._store = store
+        self._keys = LRUDict()
+        self._keys.maxsize = maxsize
+
+    @property
+    def maxsize(self):
+        """
+        Maximum number of entries held in memory. Least recently used entries
+        are discarded first. This does not affect the store.
+        """
+        return self._keys.maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        self._keys.maxsize = value
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _make_key(self, jid, mechanism, password, salt, iteration_count):
+        if isinstance(password, str):
+            password = aiosasl.saslprep(password).encode("utf8")
+        tag = hmac.new(self._secret, password, hashlib.sha256).digest()
+        return jid.bare(), mechanism, tag, salt, iteration_count
+
+    def get(self, jid, mechanism, password, salt, iteration_count):
+        """
+        Return the :class:`SCRAMKeys` for the given parameters or :data:`None`
+        if no keys are cached.
+
+        `password` is either a :class:`str`, which is SASLprepped, or the
+        SASLprepped and UTF-8 encoded password as :class:`bytes`.
+        """
+        key = self._make_key(jid, mechanism, password, salt, iteration_count)
+        try:
+            return self._keys[key]
+        except KeyError:
+            pass
+
+        if self._store is None:
+            return None
+
+        keys = self._store.load(key)
+        if keys is not None:
+            keys = SCRAMKeys(*keys)
+            self._keys[key] = keys
+        return keys
+
+    def put(self, jid, mechanism, password, salt, iteration_count, keys):
+        """
+        Cache the :class:`SCRAMKeys` `keys` for the given parameters.
+
+        `password` is interpreted like for :meth:`get`.
+        """
+        key = self._make_key(jid, mechanism, password, salt, iteration_count)
+        self._keys[key] = keys
+        if self._store is not None:
+            self._store.save(key, keys)
+
+    def invalidate(self, jid):
+        """
+        Remove all keys cached for the bare `jid`, also from the store.
+
+        This should be called when the password for `jid` changes.
+        """
+        jid = jid.bare()
+        for key in [key for key in self._keys if key[0] == jid]:
+            del self._keys[key]
+        if self._store is not None:
+            self._store.forget(jid)
+
+    def clear(self):
+        """
+        Remove all keys from the in-memory cache. The store is not modified.
+        """
+        self._keys.clear()
+
+
+class CachingSCRAM(aiosasl.SCRAM):
+    """
+    The SCRAM (non-PLUS) SASL mechanism with cached key derivation.
+
+    :param credential_provider: Coroutine returning a ``(user, password)``
+                                tuple, like for :class:`aiosasl.SCRAM`.
+    :param jid: The JID which is authenticating; required if `key_cache` is
+                given.
+    :type jid: :class:`aioxmpp.JID`
+    :param key_cache: Cache to look up and store derived keys.
+    :type key_cache: :class:`SCRAMKeyCache` or :data:`None`
+    :param executor: Executor to run the key derivation in.
+    :type executor: :class:`concurrent.futures.Executor`
+    :param loop: Event loop to use.
+
+    This behaves like :class:`aiosasl.SCRAM`, with two differences:
+
+    * If the keys for the password and the salt and iteration count sent by
+      the server are found in `key_cache`, the PBKDF2 derivation is skipped.
+      After a successful authentication, the derived keys are stored in the
+      cache.
+    * Otherwise, the PBKDF2 derivation is run in `executor` (the default
+      executor of the loop if :data:`None`) using
+      :meth:`asyncio.BaseEventLoop.run_in_executor`, so that it does not block
+      the event loop.
+
+    .. attribute:: used_cached_keys
+
+       Whether the last call to :meth:`authenticate` used keys from the cache.
+       If an authentication with cached keys fails, the keys are likely stale
+       (e.g. because the password was changed without changing the salt) and
+       the cache should be invalidated for the JID.
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, credential_provider, *,
+                 jid=None,
+                 key_cache=None,
+                 executor=None,
+                 loop=None):
+        super().__init__(credential_provider)
+        if key_cache is not None and jid is None:
+            raise ValueError("jid is required when using a key cache")
+        self._jid = jid
+        self._key_cache = key_cache
+        self._executor = executor
+        self._loop = loop
+        self.used_cached_keys = False
+
+    @asyncio.coroutine
+    def _get_keys(self, mechanism, hashfun_name, password, salt,
+                  iteration_count):
+        if self._key_cache is not None:
+            keys = self._key_cache.get(self._jid, mechanism, password,
+                                       salt, iteration_count)
+            if keys is not None:
+                logger.debug("using cached SCRAM keys")
+                self.used_cached_keys = True
+                return keys
+
+        loop = self._loop
+        if loop is None:
+            loop = asyncio.get_event_loop()
+
+        t0 = time.monotonic()
+        keys = yield from loop.run_in_executor(
+            self._executor,
+            functools.partial(
+                _derive_scram_keys,
+                hashfun_name,
+                password,
+                salt,
+                iteration_count,
+            )
+        )
+        logger.debug("pbkdf2 timing: %f seconds", time.monotonic() - t0)
+        return keys
+
+    @asyncio.coroutine
+    def authenticate(self, sm, token):
+        mechanism, hashfun_name, = token
+        logger.info("attempting %s mechanism (using %s hashfun)",
+                    mechanism,
+                    hashfun_name)
+        self.used_cached_keys = False
+        # this follows aiosasl.SCRAM.authenticate, with the key derivation
+        # replaced
+
+        hashfun_factory = functools.partial(hashlib.new, hashfun_name)
+        digest_size = hashfun_factory().digest_size
+
+        # we don’t support channel binding
+        gs2_header = b"n,,"
+        username, password = yield from self._credential_provider()
+        username = aiosasl.saslprep(username).encode("utf8")
+        password = aiosasl.saslprep(password).encode("utf8")
+
+        our_nonce = base64.b64encode(_system_random.getrandbits(
+            self.nonce_length * 8
+        ).to_bytes(
+            self.nonce_length, "little"
+        ))
+
+        auth_message = b"n=" + username + b",r=" + our_nonce
+        _, payload = yield from sm.initiate(
+            mechanism,
+            gs2_header + auth_message)
+
+        auth_message += b"," + payload
+
+        payload = dict(self.parse_message(payload))
+
+        try:
+            iteration_count = int(payload[b"i"])
+            nonce = payload[b"r"]
+            salt = base64.b64decode(payload[b"s"])
+        except (ValueError, KeyError):
+            yield from sm.abort()
+            raise aiosasl.SASLFailure(
+                None,
+                text="malformed server message: {!r}".format(payload))
+
+        if not nonce.startswith(our_nonce):
+            yield from sm.abort()
+            raise aiosasl.SASLFailure(
+                None,
+                text="server nonce doesn't fit our nonce")
+
+        keys = yield from self._get_keys(mechanism, hashfun_name, password,
+                                         salt, iteration_count)
+
+        stored_key = hashfun_factory(keys.client_key).digest()
+
+        reply = b"c=" + base64.b64encode(gs2_header) + b",r=" + nonce
+
+        auth_message += b"," + reply
+
+        client_proof = (
+            int.from_bytes(
+                hmac.new(
+                    stored_key,
+                    auth_message,
+                    hashfun_factory).digest(),
+                "big") ^
+            int.from_bytes(keys.client_key, "big")).to_bytes(digest_size,
+                                                             "big")
+
+        try:
+            state, payload = yield from sm.response(
+                reply + b",p=" + base64.b64encode(client_proof)
+            )
+        except aiosasl.SASLFailure as err:
+            raise err.promote_to_authentication_failure() from None
+
+        if state != "success":
+            raise aiosasl.SASLFailure(
+                "malformed-request",
+                text="SCRAM protocol violation")
+
+        server_signature = hmac.new(
+            keys.server_key,
+            auth_message,
+            hashfun_factory).digest()
+
+        payload = dict(self.parse_message(payload))
+
+        if base64.b64decode(payload[b"v"]) != server_signature:
+            raise aiosasl.SASLFailure(
+                None,
+                "authentication successful, but server signature invalid")
+
+        if self._key_cache is not None and not self.used_cached_keys:
+            self._key_cache.put(self._jid, mechanism, password,
+                                salt, iteration_count, keys)
+
+        return True
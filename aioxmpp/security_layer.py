@@ -38,10 +38,18 @@ for example using :class:`aioxmpp.Client`.
 
 .. autofunction:: tls_with_password_based_authentication(password_provider, [ssl_context_factory], [max_auth_attempts=3])
 
-.. autoclass:: SecurityLayer(ssl_context_factory, certificate_verifier_factory, tls_required, sasl_providers)
+.. autoclass:: SecurityLayer(ssl_context_factory, \
+                             certificate_verifier_factory, \
+                             tls_required, sasl_providers, \
+                             tls_session_cache=None)
 
 .. autofunction:: negotiate_sasl
 
+TLS session resumption
+======================
+
+.. autoclass:: TLSSessionCache
+
 Certificate verifiers
 =====================
 
@@ -119,8 +127,10 @@ import base64
 import collections
 import enum
 import functools
+import hmac
 import logging
 import ssl
+import weakref
 
 import pyasn1
 import pyasn1.codec.der.decoder
@@ -132,6 +142,7 @@ import OpenSSL.SSL
 import aiosasl
 
 from . import errors, sasl, nonza, xso, protocol
+from .cache import LRUDict
 from .utils import namespaces
 
 
@@ -917,9 +928,30 @@ class PasswordSASLProvider(SASLProvider):
     the authentication process is also aborted. In both cases, an
     :class:`aiosasl.AuthenticationFailure` error will be raised.
 
+    :param scram_key_cache: Cache for the keys derived during SCRAM
+                            authentication.
+    :type scram_key_cache: :class:`aioxmpp.sasl.SCRAMKeyCache` or
+                           :data:`None`
+    :param executor: Executor to run the SCRAM key derivation in.
+    :type executor: :class:`concurrent.futures.Executor`
+
     The SASL mechanisms used depend on whether TLS has been negotiated
-    successfully before. In any case, :class:`aiosasl.SCRAM` is used. If TLS has
-    been negotiated, :class:`aiosasl.PLAIN` is also supported.
+    successfully before. In any case, SCRAM is used (via
+    :class:`aioxmpp.sasl.CachingSCRAM`, which runs the key derivation in
+    `executor` or the default executor of the event loop). If TLS has been
+    negotiated, :class:`aiosasl.PLAIN` is also supported.
+
+    If `scram_key_cache` is given, the keys derived from the password are
+    cached there and the expensive derivation is skipped on subsequent
+    authentications with the same password, salt and iteration count. If an
+    authentication with cached keys fails, the keys for the JID are
+    invalidated and the authentication is retried with freshly derived keys
+    and the same password. This retry counts against `max_auth_attempts`.
+
+    .. versionchanged:: 0.10
+
+       The `scram_key_cache` and `executor` arguments were added. The SCRAM
+       key derivation does not block the event loop anymore.
 
     .. seealso::
 
@@ -928,10 +960,26 @@ class PasswordSASLProvider(SASLProvider):
     """
 
     def __init__(self, password_provider, *,
-                 max_auth_attempts=3, **kwargs):
+                 max_auth_attempts=3,
+                 scram_key_cache=None,
+                 executor=None,
+                 **kwargs):
         super().__init__(**kwargs)
         self._password_provider = password_provider
         self._max_auth_attempts = max_auth_attempts
+        self._scram_key_cache = scram_key_cache
+        self._executor = executor
+
+    def _make_mechanism(self, mechanism_class, credential_provider,
+                        client_jid):
+        if mechanism_class is sasl.CachingSCRAM:
+            return mechanism_class(
+                credential_provider,
+                jid=client_jid,
+                key_cache=self._scram_key_cache,
+                executor=self._executor,
+            )
+        return mechanism_class(credential_provider)
 
     @asyncio.coroutine
     def execute(self,
@@ -962,7 +1010,7 @@ class PasswordSASLProvider(SASLProvider):
             return client_jid.localpart, password
 
         classes = [
-            aiosasl.SCRAM
+            sasl.CachingSCRAM
         ]
         if tls_transport is not None:
             classes.append(aiosasl.PLAIN)
@@ -975,9 +1023,12 @@ class PasswordSASLProvider(SASLProvider):
             if mechanism_class is None:
                 return False
 
-            mechanism = mechanism_class(credential_provider)
+            mechanism = self._make_mechanism(mechanism_class,
+                                             credential_provider,
+                                             client_jid)
             last_auth_error = None
-            for nattempt in range(self._max_auth_attempts):
+            nattempt = 0
+            while nattempt < self._max_auth_attempts:
                 try:
                     mechanism_worked = yield from self._execute(
                         intf, mechanism, token)
@@ -986,8 +1037,14 @@ class PasswordSASLProvider(SASLProvider):
                         # immediately re-raise
                         raise
                     last_auth_error = err
-                    # allow the user to re-try
-                    cached_credentials = None
+                    if getattr(mechanism, "used_cached_keys", False):
+                        # the cached keys may be stale; retry with the same
+                        # password, but derive the keys from scratch
+                        self._scram_key_cache.invalidate(client_jid)
+                    else:
+                        # allow the user to re-try
+                        cached_credentials = None
+                    nattempt += 1
                     continue
                 else:
                     break
@@ -1059,6 +1116,238 @@ if not hasattr(aiosasl, "ANONYMOUS"):
     AnonymousSASLProvider = None  # NOQA
 
 
+class TLSSessionCache:
+    """
+    Remember TLS sessions to resume them on later connections.
+
+    :param maxsize: Maximum number of sessions to keep.
+    :type maxsize: positive :class:`int` or :data:`None`
+
+    Sessions are keyed by the ``(domain, host, port)`` of the connection and
+    the trust configuration of the :class:`SecurityLayer` used for it (see
+    :meth:`make_key`). A TLS session is stored by the connectors (see
+    :mod:`aioxmpp.connector`) after TLS has been established and the stream
+    features have been received over it, i.e. after the certificate of the peer
+    has passed verification. On the next connection to the same
+    ``(domain, host, port)`` with the same trust configuration, the session is
+    offered to the server.
+
+    If the server accepts the session, the handshake is abbreviated: no
+    certificates are exchanged and the certificate verification (including
+    the :meth:`CertificateVerifier.post_handshake` hook) is skipped, since the
+    peer has proven possession of the secrets negotiated during the original,
+    verified handshake. If the server declines, a full handshake including
+    verification takes place as usual.
+
+    Whether the session has been resumed is determined by comparing the
+    master key of the connection with the master key of the offered session
+    (see :meth:`was_resumed`). Only a server which knows the secrets of the
+    offered session can complete a handshake with the same master key.
+
+    .. note::
+
+       If the trust configuration changes (for example because a pin is removed
+       from a pin store), :meth:`clear` the cache to force full verification on
+       the next connections.
+
+    The cache can be shared among any number of :class:`SecurityLayer`
+    instances. :class:`aioxmpp.node.ClientPool` shares a single cache among
+    all clients in the pool. Sessions are only resumed by security layers
+    which use the same
+    :attr:`~SecurityLayer.ssl_context_factory` and
+    :attr:`~SecurityLayer.certificate_verifier_factory` objects as the one
+    which negotiated the session.
+
+    .. autoattribute:: maxsize
+
+    .. automethod:: make_key
+
+    .. automethod:: setup_context
+
+    .. automethod:: wrap_post_handshake
+
+    .. automethod:: store
+
+    .. automethod:: discard
+
+    .. automethod:: clear
+
+    .. automethod:: was_resumed
+
+    .. versionadded:: 0.10
+    """
+
+    def __init__(self, *, maxsize=1024):
+        super().__init__()
+        # (session, master key) tuples by key
+        self._sessions = LRUDict()
+        self._sessions.maxsize = maxsize
+        # master key of the offered session by connection
+        self._offered = weakref.WeakKeyDictionary()
+
+    @property
+    def maxsize(self):
+        """
+        Maximum number of sessions to keep. Least recently used sessions are
+        discarded first.
+        """
+        return self._sessions.maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        self._sessions.maxsize = value
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @staticmethod
+    def make_key(metadata, domain, host, port):
+        """
+        Return the key for sessions of a connection.
+
+        :param metadata: The security layer used for the connection.
+        :type metadata: :class:`SecurityLayer`
+        :param domain: The domain of the XMPP service.
+        :param host: The host connected to.
+        :param port: The port connected to.
+
+        The key includes the
+        :attr:`~SecurityLayer.ssl_context_factory` and the
+        :attr:`~SecurityLayer.certificate_verifier_factory` of `metadata`,
+        since skipping the verification on resumption is only sound if the
+        session was verified with the same trust configuration.
+        """
+        return (
+            domain, host, port,
+            metadata.ssl_context_factory,
+            metadata.certificate_verifier_factory,
+        )
+
+    def setup_context(self, ctx, key):
+        """
+        Prepare a :class:`OpenSSL.SSL.Context` to offer the stored session.
+
+        :param ctx: The context used for the connection.
+        :type ctx: :class:`OpenSSL.SSL.Context`
+        :param key: The key of the connection (see :meth:`make_key`).
+
+        The session stored for `key` at the time the handshake starts is set on
+        the connection created from `ctx`. If no session is stored, a full
+        handshake takes place.
+        """
+        def info_callback(conn, where, ret):
+            if not where & OpenSSL.SSL.SSL_CB_HANDSHAKE_START:
+                return
+            if conn.get_session() is not None:
+                # renegotiation or session already set
+                return
+            try:
+                session, master_key = self._sessions[key]
+            except KeyError:
+                return
+            try:
+                conn.set_session(session)
+            except OpenSSL.SSL.Error:
+                logger.debug("failed to offer TLS session for %r", key,
+                             exc_info=True)
+                self.discard(key)
+            else:
+                logger.debug("offering TLS session for %r", key)
+                self._offered[conn] = master_key
+
+        ctx.set_info_callback(info_callback)
+
+    def was_resumed(self, transport):
+        """
+        Return whether the TLS session of `transport` has been resumed.
+
+        :param transport: A transport over which TLS has been negotiated.
+        :type transport: :class:`aioopenssl.STARTTLSTransport`
+        :rtype: :class:`bool`
+
+        The session has been resumed if a session was offered by the context
+        set up with :meth:`setup_context` and the master key of the connection
+        equals the master key of the offered session. This must be called
+        before any data is received after the handshake: with TLS 1.3, new
+        session tickets replace the session of the connection, after which
+        :data:`False` is returned.
+        """
+        ssl_object = transport.get_extra_info("ssl_object")
+        if ssl_object is None:
+            return False
+        try:
+            offered = self._offered[ssl_object]
+        except KeyError:
+            return False
+        try:
+            master_key = ssl_object.master_key()
+        except OpenSSL.SSL.Error:
+            return False
+        return hmac.compare_digest(master_key, offered)
+
+    def wrap_post_handshake(self, post_handshake):
+        """
+        Wrap a post handshake coroutine function of a
+        :class:`CertificateVerifier`.
+
+        :param post_handshake: The post handshake callback to wrap.
+        :type post_handshake: coroutine function
+        :return: Coroutine function to use as post handshake callback.
+
+        The returned coroutine function skips `post_handshake` if the session
+        has been resumed and calls it otherwise.
+        """
+        @asyncio.coroutine
+        def wrapped(transport):
+            if self.was_resumed(transport):
+                logger.debug("TLS session resumed, re-using previous "
+                             "certificate verification result")
+                return
+            yield from post_handshake(transport)
+        return wrapped
+
+    def store(self, key, transport):
+        """
+        Store the TLS session of a transport.
+
+        :param key: The key of the connection (see :meth:`make_key`).
+        :param transport: The transport over which TLS has been negotiated
+            and verified.
+        :type transport: :class:`aioopenssl.STARTTLSTransport`
+
+        If no TLS session is available on the `transport`, any session stored
+        for `key` is discarded.
+        """
+        ssl_object = transport.get_extra_info("ssl_object")
+        session = None
+        if ssl_object is not None:
+            session = ssl_object.get_session()
+
+        if session is not None:
+            try:
+                master_key = ssl_object.master_key()
+            except OpenSSL.SSL.Error:
+                session = None
+
+        if session is None:
+            self.discard(key)
+            return
+
+        self._sessions[key] = session, master_key
+
+    def discard(self, key):
+        """
+        Discard the session stored for `key`, if any.
+        """
+        self._sessions.pop(key, None)
+
+    def clear(self):
+        """
+        Discard all stored sessions.
+        """
+        self._sessions.clear()
+
+
 class SecurityLayer(collections.namedtuple(
         "SecurityLayer",
         [
@@ -1066,6 +1355,7 @@ class SecurityLayer(collections.namedtuple(
             "certificate_verifier_factory",
             "tls_required",
             "sasl_providers",
+            "tls_session_cache",
         ])):
     """
     A security layer defines the security properties used for an XML stream.
@@ -1116,8 +1406,27 @@ class SecurityLayer(collections.namedtuple(
        A sequence of :class:`SASLProvider` instances. As SASL providers are
        stateless, it is not necessary to create new providers for each
        connection.
+
+    .. attribute:: tls_session_cache
+
+       A :class:`TLSSessionCache` used to resume TLS sessions on reconnects or
+       :data:`None` to always perform full TLS handshakes. This argument is
+       optional and defaults to :data:`None`.
+
+       .. versionadded:: 0.10
     """
 
+    def __new__(cls, ssl_context_factory, certificate_verifier_factory,
+                tls_required, sasl_providers, tls_session_cache=None):
+        return super().__new__(
+            cls,
+            ssl_context_factory,
+            certificate_verifier_factory,
+            tls_required,
+            sasl_providers,
+            tls_session_cache,
+        )
+
 
 def default_verify_callback(conn, x509, errno, errdepth, returncode):
     return errno == 0
@@ -1305,7 +1614,8 @@ def make(
         pin_type=PinType.PUBLIC_KEY,
         post_handshake_deferred_failure=None,
         anonymous=False,
-        no_verify=False):
+        no_verify=False,
+        tls_session_cache=None):
     """
     Construct a :class:`SecurityLayer`. Depending on the arguments passed,
     different features are enabled or disabled.
@@ -1333,6 +1643,8 @@ def make(
         **strongly discouraged** outside controlled test environments. See
         below for alternatives.
     :type no_verify: :class:`bool`
+    :param tls_session_cache: Cache for resuming TLS sessions.
+    :type tls_session_cache: :class:`TLSSessionCache` or :data:`None`
     :raise RuntimeError: if `anonymous` is a :class:`str` and the version of
         :mod:`aiosasl` in use does not provide :class:`aiosasl.ANONYMOUS`
     :return: A new :class:`SecurityLayer` instance configured as per the
@@ -1396,12 +1708,20 @@ def make(
        the ANONYMOUS SASL mechanism in the XMPP context) into account before
        using `anonymous`.
 
+    `tls_session_cache` is used as
+    :attr:`~SecurityLayer.tls_session_cache` of the result. Pass a
+    :class:`TLSSessionCache` to resume TLS sessions on reconnects.
+
     The versaility and simplicity of use of this function make (pun intended)
     it the preferred way to construct :class:`SecurityLayer` instances.
 
     .. versionadded:: 0.8
 
        Support for SASL ANONYMOUS was added.
+
+    .. versionadded:: 0.10
+
+       The `tls_session_cache` argument.
     """
 
     if isinstance(password_provider, str):
@@ -1461,4 +1781,5 @@ def make(
         certificate_verifier_factory,
         True,
         tuple(sasl_providers),
+        tls_session_cache,
     )
@@ -79,6 +79,7 @@ Exceptions
 import asyncio
 import contextlib
 import functools
+import io
 import logging
 import warnings
 
@@ -95,6 +96,8 @@ from . import (
     protocol,
     structs,
     ping,
+    xml,
+    xso,
 )
 
 from .utils import namespaces
@@ -352,6 +355,11 @@ class StanzaToken:
     __iter__ = __await__
 
 
+# marker which is put into the incoming queue when stream management has been
+# enabled; see StanzaStream.start_sm
+_sm_inbound_ctr_reset = object()
+
+
 class StanzaStream:
     """
     A stanza stream. This is the next layer of abstraction above the XMPP XML
@@ -625,6 +633,12 @@ class StanzaStream:
 
     .. autoattribute:: sm_resumable
 
+    Persisting stream management state:
+
+    .. automethod:: export_sm_state_as_json
+
+    .. automethod:: import_sm_state_from_json
+
     Miscellaneous:
 
     .. autoattribute:: local_jid
@@ -1041,7 +1055,13 @@ class StanzaStream:
         stanza_obj, exc = queue_entry
 
         # first, handle SM stream objects
-        if isinstance(stanza_obj, nonza.SMAcknowledgement):
+        if stanza_obj is _sm_inbound_ctr_reset:
+            # stanzas which were received before SM was enabled, but
+            # processed after it, must not be counted
+            if self._sm_enabled:
+                self._sm_inbound_ctr = 0
+            return
+        elif isinstance(stanza_obj, nonza.SMAcknowledgement):
             self._logger.debug("received SM ack: %r", stanza_obj)
             if not self._sm_enabled:
                 self._logger.warning("received SM ack, but SM not enabled")
@@ -2085,6 +2105,12 @@ class StanzaStream:
             self._sm_max = response.max_
             self._sm_location = response.location
             self._ping_send_opportunistic = True
+            # the broker may still have to process stanzas received before
+            # the <enabled/>, for example when the bind request was pipelined
+            # with the <enable/>. The marker must be queued here, while the
+            # <enabled/> is being parsed: stanzas following it in the same
+            # chunk are queued before start_sm resumes and must be counted.
+            self._incoming_queue.put_nowait((_sm_inbound_ctr_reset, None))
 
             self._logger.info("SM started: resumable=%s, stream id=%r",
                               self._sm_resumable,
@@ -2249,6 +2275,116 @@ class StanzaStream:
             raise RuntimeError("Stream Management not enabled")
         return self._sm_resumable
 
+    def export_sm_state_as_json(self):
+        """
+        Export the stream management state into a :mod:`json`-compatible
+        dictionary and return that dictionary.
+
+        :raises RuntimeError: if stream management is not enabled or the
+            stream is not resumable.
+
+        The dictionary contains the SM-ID, the counters, the location and
+        ``max`` announced by the server as well as the serialised stanzas
+        which have not been acknowledged by the server yet. It can be passed
+        to :meth:`import_sm_state_from_json` of a :class:`StanzaStream` in a
+        different process, which can then :meth:`resume_sm` the stream.
+
+        Stanzas which have not been sent yet are not part of the exported
+        state.
+
+        .. warning::
+
+           The exported state allows to take over the XMPP session. Treat it
+           with the same care as credentials.
+
+        .. versionadded:: 0.10
+        """
+        if not self.sm_enabled:
+            raise RuntimeError("Stream Management not enabled")
+        if not self.sm_resumable:
+            raise RuntimeError("stream is not resumable")
+
+        if self._sm_location is not None:
+            location = xso.ConnectionLocation().format(self._sm_location)
+        else:
+            location = None
+
+        return {
+            "id": self._sm_id,
+            "inbound_ctr": self._sm_inbound_ctr,
+            "outbound_base": self._sm_outbound_base,
+            "max": self._sm_max,
+            "location": location,
+            "unacked": [
+                xml.serialize_single_xso(token.stanza)
+                for token in self._sm_unacked_list
+            ],
+        }
+
+    def import_sm_state_from_json(self, data):
+        """
+        Restore stream management state from the
+        :meth:`export_sm_state_as_json`-compatible dictionary in `data`.
+
+        :raises RuntimeError: if the stream is running or stream management
+            is already enabled.
+        :return: The tokens of the restored unacknowledged stanzas.
+        :rtype: :class:`list` of :class:`StanzaToken`
+
+        Afterwards, stream management is enabled (but the stream is not
+        running) and :meth:`resume_sm` can be used to resume the stream. The
+        unacknowledged stanzas are re-sent on resumption, unless the server
+        acknowledges them.
+
+        .. versionadded:: 0.10
+        """
+        if self.running:
+            raise RuntimeError("Cannot import Stream Management state while"
+                               " StanzaStream is running")
+        if self.sm_enabled:
+            raise RuntimeError("Stream Management already enabled")
+
+        def parse_stanza(serialised):
+            result = None
+
+            def cb(instance):
+                nonlocal result
+                result = instance
+
+            xml.read_xso(
+                io.BytesIO(serialised.encode("utf-8")),
+                {
+                    stanza.IQ: cb,
+                    stanza.Message: cb,
+                    stanza.Presence: cb,
+                }
+            )
+            return result
+
+        tokens = []
+        for serialised in data.get("unacked", []):
+            token = StanzaToken(parse_stanza(serialised))
+            token._set_state(StanzaState.SENT)
+            tokens.append(token)
+
+        location = data.get("location")
+        if location is not None:
+            location = xso.ConnectionLocation().parse(location)
+
+        self._sm_outbound_base = data["outbound_base"]
+        self._sm_inbound_ctr = data["inbound_ctr"]
+        self._sm_unacked_list = tokens
+        self._sm_id = data["id"]
+        self._sm_resumable = True
+        self._sm_max = data.get("max")
+        self._sm_location = location
+        self._sm_enabled = True
+
+        self._logger.info("imported SM state: stream id=%r, %d unacked",
+                          self._sm_id, len(tokens))
+
+        return list(tokens)
+
     def _resume_sm(self, remote_ctr):
         """
         Version of :meth:`resume_sm` which can be used during slow start.
@@ -2447,13 +2583,17 @@ class StanzaStream:
         yield from self._enqueue(stanza)
 
     @asyncio.coroutine
-    def _send_immediately(self, stanza, *, timeout=None, cb=None):
+    def _send_immediately(self, stanza, *, timeout=None, cb=None,
+                          on_state_change=None):
         """
         Send a stanza without waiting for the stream to be ready to send
         stanzas.
 
         This is only useful from within :class:`aioxmpp.node.Client` before
         the stream is fully established.
+
+        `on_state_change` is passed to the :class:`StanzaToken`; it allows to
+        find out when the stanza has been sent without waiting for the reply.
         """
         stanza.autoset_id()
         self._logger.debug("sending %r and waiting for it to be sent",
@@ -2464,7 +2604,7 @@ class StanzaStream:
                 raise ValueError(
                     "cb not supported with non-IQ non-request stanzas"
                 )
-            yield from self._enqueue(stanza)
+            yield from self._enqueue(stanza, on_state_change=on_state_change)
             return
 
         # we use the long way with a custom listener instead of a future here
@@ -2536,7 +2676,7 @@ class StanzaStream:
         )
 
         try:
-            yield from self._enqueue(stanza)
+            yield from self._enqueue(stanza, on_state_change=on_state_change)
         except Exception:
             listener.cancel()
             raise
@@ -20,8 +20,11 @@
 #
 ########################################################################
 import asyncio
+import functools
+import hashlib
 
 import aioxmpp
+import aioxmpp.cache
 import aioxmpp.xso as xso
 import aioxmpp.service as service
 
@@ -37,23 +40,199 @@ class VCardService(service.Service):
     .. automethod:: get_vcard
 
     .. automethod:: set_vcard
+
+    Caching:
+
+    Concurrent calls to :meth:`get_vcard` for the same JID share a single
+    request. In addition, results can be kept in a cache, which is disabled
+    by default:
+
+    .. autoattribute:: cache_size
+
+    .. autoattribute:: cache_ttl
+
+    .. automethod:: handle_photo_hash
+
+    .. automethod:: invalidate_vcard
+
+    The cache is cleared when the stream is destroyed.
+
+    .. versionchanged:: 0.10
+
+       Added request deduplication and the optional cache.
     """
 
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self._pending = {}
+        # values are lists [vcard, photo_hash], where photo_hash is computed
+        # lazily by handle_photo_hash
+        self._cache = aioxmpp.cache.LRUDict()
+        self._cache_enabled = False
+
+    @property
+    def cache_size(self):
+        """
+        Maximum number of vCards of other entities to keep in the cache.
+
+        If set to ``0`` (the default), results are not cached. Reducing the
+        value purges overhanging entries immediately.
+
+        .. versionadded:: 0.10
+        """
+        if not self._cache_enabled:
+            return 0
+        return self._cache.maxsize
+
+    @cache_size.setter
+    def cache_size(self, value):
+        if value is not None and value < 0:
+            raise ValueError("cache_size must be non-negative integer or None")
+        if value == 0:
+            self._cache_enabled = False
+            self._cache.clear()
+        else:
+            self._cache_enabled = True
+            self._cache.maxsize = value
+
+    @property
+    def cache_ttl(self):
+        """
+        Time in seconds after which a cached vCard is considered stale and
+        queried again.
+
+        If :data:`None` (the default), cached vCards are kept until they are
+        invalidated or the stream is destroyed. Changing the value only
+        affects results obtained afterwards.
+
+        .. versionadded:: 0.10
+        """
+        return self._cache.ttl
+
+    @cache_ttl.setter
+    def cache_ttl(self, value):
+        self._cache.ttl = value
+
+    def invalidate_vcard(self, jid):
+        """
+        Remove the vCard of `jid` from the cache.
+
+        :param jid: the entity whose vCard to drop.
+
+        .. versionadded:: 0.10
+        """
+        self._cache.pop(jid, None)
+
+    @staticmethod
+    def _photo_hash(vcard):
+        photo = vcard.get_photo_data()
+        if photo is None:
+            return ""
+        return hashlib.sha1(photo).hexdigest()
+
+    def handle_photo_hash(self, jid, photo_hash):
+        """
+        Invalidate the cached vCard of `jid` if it does not match the
+        avatar hash `photo_hash`.
+
+        :param jid: the entity which advertised the hash.
+        :param photo_hash: the hex SHA-1 hash of the avatar advertised by
+            `jid` as per :xep:`153`, or the empty string if `jid` advertises
+            that it has no avatar.
+        :type photo_hash: :class:`str`
+
+        This is called by :class:`aioxmpp.AvatarService` for every presence
+        with avatar hash it receives. The hash of the photo of the cached
+        vCard is calculated the first time it is needed and remembered
+        afterwards.
+
+        .. versionadded:: 0.10
+        """
+        try:
+            entry = self._cache[jid]
+        except KeyError:
+            return
+
+        if entry[1] is None:
+            entry[1] = self._photo_hash(entry[0])
+
+        if entry[1] != photo_hash.lower():
+            self.logger.debug("vCard photo of %s changed, invalidating",
+                              jid)
+            del self._cache[jid]
+
+    @service.depsignal(aioxmpp.Client, "on_stream_destroyed")
+    def _clear_cache(self):
+        self._cache.clear()
+
     @asyncio.coroutine
-    def get_vcard(self, jid=None):
+    def get_vcard(self, jid=None, *, require_fresh=False):
         """
         Get the vCard stored for the jid `jid`. If `jid` is
         :data:`None` get the vCard of the connected entity.
 
         :param jid: the object to retrieve.
+        :param require_fresh: bypass the cache and send a new request.
+        :type require_fresh: :class:`bool`
         :returns: the stored vCard.
 
         We mask a :class:`XMPPCancelError` in case it is
         ``feature-not-implemented`` or ``item-not-found`` and return
         an empty vCard, since this can be understood to be semantically
         equivalent.
+
+        If a request for the vCard of `jid` is already in progress, its
+        result is returned instead of sending another request. If the cache
+        is enabled (see :attr:`cache_size`) and holds a vCard for `jid`, it
+        is returned without sending a request, unless `require_fresh` is
+        true. The vCard returned by a fresh request is put into the cache
+        either way.
+
+        vCards of other entities may thus be shared between callers and must
+        not be modified. The vCard of the connected entity (`jid` being
+        :data:`None`) is never shared or cached, as it is usually retrieved
+        in order to modify it and pass it to :meth:`set_vcard`.
+
+        .. versionchanged:: 0.10
+
+           Requests are deduplicated and the result may be taken from the
+           cache. The `require_fresh` argument was added.
         """
+        if jid is None:
+            return (yield from self._get_vcard(jid))
+
+        if not require_fresh:
+            try:
+                return self._cache[jid][0]
+            except KeyError:
+                pass
 
+            try:
+                request = self._pending[jid]
+            except KeyError:
+                pass
+            else:
+                return (yield from asyncio.shield(request))
+
+        request = asyncio.ensure_future(self._get_vcard(jid))
+        self._pending[jid] = request
+        request.add_done_callback(
+            functools.partial(self._request_done, jid)
+        )
+        return (yield from asyncio.shield(request))
+
+    def _request_done(self, jid, fut):
+        if self._pending.get(jid) is fut:
+            del self._pending[jid]
+
+        if fut.cancelled() or fut.exception() is not None:
+            return
+
+        if self._cache_enabled:
+            self._cache[jid] = [fut.result(), None]
+
+    @asyncio.coroutine
+    def _get_vcard(self, jid):
         iq = aioxmpp.IQ(
             type_=aioxmpp.IQType.GET,
             to=jid,
@@ -92,4 +271,7 @@ class VCardService(service.Service):
             type_=aioxmpp.IQType.SET,
             payload=vcard,
         )
-        yield from self.client.send(iq)
+        try:
+            yield from self.client.send(iq)
+        finally:
+            self.invalidate_vcard(self.client.local_jid.bare())
@@ -0,0 +1,77 @@
+########################################################################
+# File name: test_blocking.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import unittest
+import unittest.mock
+
+import aioxmpp
+import aioxmpp.blocking.service as blocking_service
+import aioxmpp.blocking.xso as blocking_xso
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import make_connected_client, run_coroutine
+
+
+class TestBlockingClient(unittest.TestCase):
+    KEY = "aioxmpp.blocking", "BlockingClient"
+
+    # size of the blocklist and number of pushes/lookups per run
+    N = 5000
+    PUSHES = 500
+    LOOKUPS = 2000
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = aioxmpp.JID.fromstr("romeo@montague.lit/foo")
+        self.s = blocking_service.BlockingClient(self.cc, dependencies={
+            aioxmpp.DiscoClient: unittest.mock.Mock(),
+        })
+        self.s._blocklist = set(
+            aioxmpp.JID.fromstr("spam{}@spam.example".format(i))
+            for i in range(self.N)
+        )
+
+    def _push(self, cls, i):
+        cmd = cls()
+        cmd.items[:] = [aioxmpp.JID.fromstr("new{}@spam.example".format(i))]
+        return aioxmpp.IQ(type_=aioxmpp.IQType.SET, payload=cmd)
+
+    @times(3)
+    def test_block_push(self):
+        pushes = [self._push(blocking_xso.BlockCommand, i)
+                  for i in range(self.PUSHES)]
+        with timed() as t:
+            for iq in pushes:
+                run_coroutine(self.s.handle_block_push(iq))
+        record(self.KEY + ("block_push_5k",),
+               t.elapsed / self.PUSHES, "s")
+
+    @times(3)
+    def test_is_blocked(self):
+        jids = [
+            aioxmpp.JID.fromstr("user{}@other.example/res".format(i))
+            for i in range(self.LOOKUPS)
+        ]
+        with timed() as t:
+            for jid in jids:
+                self.s.is_blocked(jid)
+        record(self.KEY + ("is_blocked_5k",),
+               t.elapsed / self.LOOKUPS, "s")
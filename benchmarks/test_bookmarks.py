@@ -0,0 +1,116 @@
+########################################################################
+# File name: test_bookmarks.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import copy
+import unittest
+import unittest.mock
+
+import aioxmpp
+import aioxmpp.bookmarks
+import aioxmpp.private_xml
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import make_connected_client, run_coroutine
+
+
+class PrivateXMLStore:
+    """
+    Stand-in for the private XML storage of a server which answers every
+    request after a fixed round trip time.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.storage = aioxmpp.bookmarks.Storage()
+
+    @asyncio.coroutine
+    def get_private_xml(self, xso):
+        yield from asyncio.sleep(self.latency)
+        return aioxmpp.private_xml.Query(copy.deepcopy(self.storage))
+
+    @asyncio.coroutine
+    def set_private_xml(self, xso):
+        yield from asyncio.sleep(self.latency)
+        self.storage = copy.deepcopy(xso)
+
+
+class TestBookmarkClient(unittest.TestCase):
+    KEY = "aioxmpp.bookmarks", "BookmarkClient"
+
+    # number of bookmarks, number of modified bookmarks and simulated round
+    # trip time of the server
+    N = 200
+    MODIFIED = 10
+    LATENCY = 0.005
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.private_xml = PrivateXMLStore(self.LATENCY)
+        self.s = aioxmpp.bookmarks.BookmarkClient(self.cc, dependencies={
+            aioxmpp.private_xml.PrivateXMLService: self.private_xml,
+        })
+        self.bookmarks = [
+            aioxmpp.bookmarks.Conference(
+                "room {}".format(i),
+                aioxmpp.JID.fromstr("room{}@muc.example".format(i)),
+                nick="romeo",
+                autojoin=True,
+            )
+            for i in range(self.N)
+        ]
+        self.private_xml.storage.bookmarks[:] = self.bookmarks
+
+    def _renamed(self):
+        result = []
+        for bookmark in self.bookmarks[:self.MODIFIED]:
+            renamed = copy.copy(bookmark)
+            renamed.name += " (renamed)"
+            result.append((bookmark, renamed))
+        return result
+
+    @times(5)
+    def test_diff_200(self):
+        self.s._diff_emit_update(list(self.bookmarks))
+        changed = [copy.copy(bookmark) for bookmark in self.bookmarks]
+        for bookmark in changed[::10]:
+            bookmark.autojoin = False
+        with timed() as t:
+            self.s._diff_emit_update(changed)
+        record(self.KEY + ("diff_200",), t.elapsed, "s")
+
+    @times(3)
+    def test_update_sequential(self):
+        run_coroutine(self.s.sync())
+        with timed() as t:
+            for old, new in self._renamed():
+                run_coroutine(self.s.update_bookmark(old, new), timeout=60)
+        record(self.KEY + ("update_10_of_200_sequential",), t.elapsed, "s")
+
+    @times(3)
+    def test_update_transaction(self):
+        run_coroutine(self.s.sync())
+        tx = aioxmpp.bookmarks.BookmarkTransaction()
+        for old, new in self._renamed():
+            tx.update_bookmark(old, new)
+        with timed() as t:
+            run_coroutine(self.s.apply_transaction(tx), timeout=60)
+        record(self.KEY + ("update_10_of_200_transaction",), t.elapsed, "s")
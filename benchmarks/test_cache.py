@@ -27,16 +27,69 @@ import aioxmpp.cache
 
 from aioxmpp.benchtest import times, timed, record
 
+
+class _Node:
+    __slots__ = ("prev", "next_", "key", "value")
+
+
+class LinkedListLRUDict:
+    """
+    Reference copy of the linked-list based :class:`aioxmpp.cache.LRUDict`
+    implementation used up to version 0.9, kept for comparison.
+    """
+
+    def __init__(self):
+        self._links = {}
+        self._root = _Node()
+        self._root.prev = self._root
+        self._root.next_ = self._root
+        self.maxsize = 1
+
+    def _purge(self):
+        while len(self._links) > self.maxsize:
+            link = self._root.prev
+            link.next_.prev = link.prev
+            link.prev.next_ = link.next_
+            del self._links[link.key]
+
+    def __setitem__(self, key, value):
+        try:
+            self._links[key].value = value
+        except KeyError:
+            link = _Node()
+            link.key = key
+            link.value = value
+            self._links[key] = link
+            link.next_ = self._root.next_
+            link.next_.prev = link
+            link.prev = self._root
+            self._root.next_ = link
+            self._purge()
+
+    def __getitem__(self, key):
+        link = self._links[key]
+        link.next_.prev = link.prev
+        link.prev.next_ = link.next_
+        link.next_ = self._root.next_
+        link.next_.prev = link
+        link.prev = self._root
+        self._root.next_ = link
+        return link.value
+
+
 class TestLRUDict(unittest.TestCase):
     KEY = "aioxmpp.cache", "LRUDict"
 
+    def _make_dict(self):
+        return aioxmpp.cache.LRUDict()
+
     @times(1000)
     def test_random_access(self):
         key = self.KEY + ("random_access",)
 
         N = 1000
 
-        lru_dict = aioxmpp.cache.LRUDict()
+        lru_dict = self._make_dict()
         lru_dict.maxsize = N
         keys = [object() for i in range(N)]
         for i in range(N):
@@ -54,7 +107,7 @@ class TestLRUDict(unittest.TestCase):
 
         N = 1000
 
-        lru_dict = aioxmpp.cache.LRUDict()
+        lru_dict = self._make_dict()
         lru_dict.maxsize = N
         keys = [object() for i in range(N)]
         for i in range(N):
@@ -65,3 +118,20 @@ class TestLRUDict(unittest.TestCase):
                 lru_dict[object()] = object()
 
         record(key, t.elapsed, "s")
+
+
+class TestLinkedListLRUDict(TestLRUDict):
+    KEY = "aioxmpp.cache", "LinkedListLRUDict"
+
+    def _make_dict(self):
+        return LinkedListLRUDict()
+
+
+class TestLRUDictWithTTLAndWeight(TestLRUDict):
+    KEY = "aioxmpp.cache", "LRUDict+ttl+weight"
+
+    def _make_dict(self):
+        result = aioxmpp.cache.LRUDict()
+        result.ttl = 3600
+        result.weight_func = lambda value: 1
+        return result
@@ -0,0 +1,83 @@
+########################################################################
+# File name: test_entitycaps.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import unittest
+import unittest.mock
+
+import aioxmpp.disco as disco
+import aioxmpp.entitycaps.service as entitycaps_service
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import make_connected_client, run_coroutine
+
+
+class TestEntityCapsService(unittest.TestCase):
+    KEY = "aioxmpp.entitycaps", "EntityCapsService"
+
+    def _register_features(self, key, n, *, yield_between):
+        cc = make_connected_client()
+        disco_server = disco.DiscoServer(cc)
+        s = entitycaps_service.EntityCapsService(
+            cc,
+            dependencies={
+                disco.DiscoClient: unittest.mock.Mock(),
+                disco.DiscoServer: disco_server,
+            }
+        )
+        run_coroutine(asyncio.sleep(0))
+
+        ver_changes = 0
+
+        def on_ver_changed():
+            nonlocal ver_changes
+            ver_changes += 1
+
+        s.on_ver_changed.connect(on_ver_changed)
+
+        with timed() as t:
+            for i in range(n):
+                disco_server.register_feature(
+                    "urn:example:feature:{}".format(i)
+                )
+                if yield_between:
+                    run_coroutine(asyncio.sleep(0))
+            run_coroutine(asyncio.sleep(0))
+
+        record(key, t.elapsed, "s")
+        record(key[:-1] + (key[-1] + "_ver_changes",), ver_changes, "")
+
+    @times(100)
+    def test_startup_burst(self):
+        # all features are registered in one go, as when summoning services
+        # with register_feature descriptors
+        self._register_features(
+            self.KEY + ("startup_burst",), 100,
+            yield_between=False,
+        )
+
+    @times(100)
+    def test_startup_per_iteration(self):
+        # a rehash per feature, as without coalescing
+        self._register_features(
+            self.KEY + ("startup_per_iteration",), 100,
+            yield_between=True,
+        )
@@ -0,0 +1,75 @@
+########################################################################
+# File name: test_mam.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import unittest
+import unittest.mock
+
+from datetime import timedelta
+
+import aioxmpp
+import aioxmpp.mam.service as mam_service
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import make_connected_client, run_coroutine
+
+from tests.mam.test_service import FakeArchive, TEST_START, collect
+
+
+class TestMAMClient(unittest.TestCase):
+    KEY = "aioxmpp.mam", "MAMClient"
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = aioxmpp.JID.fromstr("romeo@montague.lit/foo")
+        self.s = mam_service.MAMClient(self.cc)
+        # one week of messages, one every five minutes, 50 ms round trip time
+        self.archive = FakeArchive(
+            self.s,
+            7 * 24 * 12,
+            interval=timedelta(minutes=5),
+            latency=0.05,
+        )
+        self.cc.send = unittest.mock.Mock(side_effect=self.archive.send)
+
+    def _fetch(self, key, stream):
+        with timed() as t:
+            results = run_coroutine(collect(stream), timeout=60)
+        self.assertEqual(len(results), len(self.archive.messages))
+        record(key, t.elapsed, "s")
+
+    @times(3)
+    def test_week_serial(self):
+        self._fetch(
+            self.KEY + ("week_serial",),
+            self.s.iter_archive(page_size=100),
+        )
+
+    @times(3)
+    def test_week_parallel_8(self):
+        self._fetch(
+            self.KEY + ("week_parallel_8",),
+            self.s.fetch_range(
+                TEST_START,
+                TEST_START + timedelta(days=7),
+                parallelism=8,
+                page_size=100,
+            ),
+        )
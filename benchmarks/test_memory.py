@@ -0,0 +1,104 @@
+########################################################################
+# File name: test_memory.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import gc
+import tracemalloc
+import unittest
+
+import aioxmpp
+import aioxmpp.dispatcher
+import aioxmpp.presence.service as presence_service
+import aioxmpp.roster.service as roster_service
+
+from aioxmpp.benchtest import times, record
+from aioxmpp.testutils import make_connected_client
+
+
+def measure(f):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = f()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+class TestRosterItem(unittest.TestCase):
+    KEY = "aioxmpp.roster", "Item"
+
+    @times(3)
+    def test_memory_per_item(self):
+        n = 20000
+        groups = ("Friends", "Work", "Family")
+
+        def make():
+            return [
+                roster_service.Item(
+                    aioxmpp.JID("user{}".format(i), "example.com", None),
+                    subscription="both",
+                    name="User {}".format(i),
+                    # distinct string objects, as received from the wire
+                    groups=("".join(groups[i % len(groups)]),),
+                )
+                for i in range(n)
+            ]
+
+        _, used = measure(make)
+        record(self.KEY + ("memory_per_item",), used / n, "B")
+
+
+class TestPresenceClient(unittest.TestCase):
+    KEY = "aioxmpp.presence", "PresenceClient"
+
+    def _fill(self, key, retain_stanzas):
+        n = 2000
+        cc = make_connected_client()
+        s = presence_service.PresenceClient(cc, dependencies={
+            aioxmpp.dispatcher.SimplePresenceDispatcher:
+                aioxmpp.dispatcher.SimplePresenceDispatcher(cc),
+        })
+        s.retain_stanzas = retain_stanzas
+
+        def fill():
+            for i in range(n):
+                st = aioxmpp.Presence(
+                    type_=aioxmpp.PresenceType.AVAILABLE,
+                    show=aioxmpp.PresenceShow.AWAY,
+                    from_=aioxmpp.JID("user{}".format(i), "example.com",
+                                      "res"),
+                )
+                st.status[None] = "away"
+                s.handle_presence(st)
+
+        _, used = measure(fill)
+        record(key, used / n, "B")
+
+    @times(3)
+    def test_memory_per_presence_retained(self):
+        self._fill(self.KEY + ("memory_per_presence_retained",), True)
+
+    @times(3)
+    def test_memory_per_presence_compact(self):
+        self._fill(self.KEY + ("memory_per_presence_compact",), False)
@@ -0,0 +1,171 @@
+########################################################################
+# File name: test_muc.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import logging
+import unittest
+import unittest.mock
+
+import aioxmpp
+import aioxmpp.im.dispatcher as im_dispatcher
+import aioxmpp.misc
+import aioxmpp.muc.service as muc_service
+import aioxmpp.muc.xso as muc_xso
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import run_coroutine
+
+
+TEST_MUC_JID = aioxmpp.JID.fromstr("coven@chat.shakespeare.lit")
+
+
+def make_presences(n):
+    result = []
+    for i in range(n):
+        presence = aioxmpp.Presence(
+            type_=aioxmpp.PresenceType.AVAILABLE,
+            from_=TEST_MUC_JID.replace(resource="witch{}".format(i)),
+        )
+        presence.xep0045_muc_user = muc_xso.UserExt(
+            items=[
+                muc_xso.UserItem(
+                    affiliation="member",
+                    role="participant",
+                    jid=aioxmpp.JID("witch{}".format(i),
+                                    "shakespeare.lit",
+                                    "broom"),
+                ),
+            ]
+        )
+        result.append(presence)
+
+    presence = aioxmpp.Presence(
+        type_=aioxmpp.PresenceType.AVAILABLE,
+        from_=TEST_MUC_JID.replace(resource="thirdwitch"),
+    )
+    presence.xep0045_muc_user = muc_xso.UserExt(
+        status_codes={110},
+        items=[
+            muc_xso.UserItem(affiliation="member", role="participant"),
+        ]
+    )
+    result.append(presence)
+    return result
+
+
+def make_history(n):
+    result = []
+    for i in range(n):
+        message = aioxmpp.Message(
+            type_=aioxmpp.MessageType.GROUPCHAT,
+            from_=TEST_MUC_JID.replace(resource="witch{}".format(i % 100)),
+            id_="history{}".format(i),
+        )
+        message.body[None] = "message {}".format(i)
+        message.xep0203_delay.append(aioxmpp.misc.Delay())
+        message.xep0045_muc_user = muc_xso.UserExt()
+        result.append(message)
+
+    subject = aioxmpp.Message(
+        type_=aioxmpp.MessageType.GROUPCHAT,
+        from_=TEST_MUC_JID.replace(resource="firstwitch"),
+    )
+    subject.subject[None] = "Toil and trouble"
+    subject.xep0045_muc_user = muc_xso.UserExt()
+    result.append(subject)
+    return result
+
+
+class TestRoom(unittest.TestCase):
+    KEY = "aioxmpp.muc", "Room"
+
+    def _join(self, key, n, *, defer):
+        presences = make_presences(n)
+        service = unittest.mock.Mock()
+        service.logger = logging.getLogger(__name__)
+        room = muc_service.Room(service, TEST_MUC_JID)
+        room.muc_defer_initial_joins = defer
+        room.on_join.connect(lambda member, **kwargs: None)
+
+        with timed() as t:
+            for presence in presences:
+                room._inbound_muc_user_presence(presence)
+
+        record(key, t.elapsed, "s")
+        return room
+
+    @times(5)
+    def test_join_5000(self):
+        self._join(self.KEY + ("join_5000",), 5000, defer=False)
+
+    @times(5)
+    def test_join_5000_deferred(self):
+        self._join(self.KEY + ("join_5000_deferred",), 5000, defer=True)
+
+    @times(5)
+    def test_presence_update_5000(self):
+        room = self._join(self.KEY + ("join_5000_update",), 5000,
+                          defer=False)
+        presences = make_presences(5000)[:-1]
+
+        with timed() as t:
+            for presence in presences:
+                room._inbound_muc_user_presence(presence)
+
+        record(self.KEY + ("presence_update_5000",), t.elapsed, "s")
+
+    @times(5)
+    def test_lookup_by_nick(self):
+        room = self._join(self.KEY + ("join_5000_lookup",), 5000,
+                          defer=False)
+
+        with timed() as t:
+            for i in range(5000):
+                room.muc_get_occupant("witch{}".format(i))
+
+        record(self.KEY + ("lookup_by_nick_5000",), t.elapsed, "s")
+
+    def _join_with_history(self, key, n, *, stream):
+        room = self._join(key[:-1] + (key[-1] + "_join",), 100, defer=False)
+        room.on_message.connect(lambda *args, **kwargs: None)
+        history = make_history(n)
+
+        if stream:
+            history_stream = room.muc_history_stream(max_buffered=None)
+
+        with timed() as t:
+            for message in history:
+                room._handle_message(message, message.from_, False,
+                                     im_dispatcher.MessageSource.STREAM)
+            if stream:
+                while run_coroutine(history_stream.get_batch()):
+                    pass
+
+        record(key, t.elapsed, "s")
+
+    @times(5)
+    def test_history_10000_on_message(self):
+        self._join_with_history(self.KEY + ("history_10000_on_message",),
+                                10000, stream=False)
+
+    @times(5)
+    def test_history_10000_stream(self):
+        self._join_with_history(self.KEY + ("history_10000_stream",),
+                                10000, stream=True)
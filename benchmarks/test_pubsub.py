@@ -0,0 +1,157 @@
+########################################################################
+# File name: test_pubsub.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import unittest
+import unittest.mock
+
+import aioxmpp
+import aioxmpp.pubsub.service as pubsub_service
+import aioxmpp.pubsub.xso as pubsub_xso
+import aioxmpp.xso
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import make_connected_client, run_coroutine
+
+
+TEST_SERVICE = aioxmpp.JID.fromstr("pubsub.example")
+
+
+@pubsub_xso.as_payload_class
+class Payload(aioxmpp.xso.XSO):
+    TAG = "aioxmpp.benchmarks.test_pubsub", "payload"
+
+
+class TestPubSubClient(unittest.TestCase):
+    KEY = "aioxmpp.pubsub", "PubSubClient"
+
+    # number of items and simulated round trip time of the service
+    N = 200
+    LATENCY = 0.01
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = aioxmpp.JID.fromstr("romeo@montague.lit/foo")
+        self.s = pubsub_service.PubSubClient(self.cc, dependencies={
+            aioxmpp.DiscoClient: unittest.mock.Mock(),
+        })
+        self.cc.send = unittest.mock.Mock(side_effect=self._respond)
+
+    @asyncio.coroutine
+    def _respond(self, iq):
+        # stand-in for a pubsub service which answers every request after a
+        # fixed round trip time
+        yield from asyncio.sleep(self.LATENCY)
+        return None
+
+    def _items(self):
+        return [("item{}".format(i), Payload()) for i in range(self.N)]
+
+    @times(3)
+    def test_publish_sequential(self):
+        @asyncio.coroutine
+        def publish_all(items):
+            for id_, payload in items:
+                yield from self.s.publish(TEST_SERVICE, "feed", payload,
+                                          id_=id_)
+
+        items = self._items()
+        with timed() as t:
+            run_coroutine(publish_all(items), timeout=60)
+        record(self.KEY + ("publish_200_sequential",),
+               self.N / t.elapsed, "items/s")
+
+    @times(3)
+    def test_publish_many(self):
+        items = self._items()
+        with timed() as t:
+            run_coroutine(self.s.publish_many(TEST_SERVICE, "feed", items,
+                                              window=32),
+                          timeout=60)
+        record(self.KEY + ("publish_200_many_window_32",),
+               self.N / t.elapsed, "items/s")
+
+    @times(3)
+    def test_retract_many(self):
+        ids = ["item{}".format(i) for i in range(self.N)]
+        with timed() as t:
+            run_coroutine(self.s.retract_many(TEST_SERVICE, "feed", ids,
+                                              window=32),
+                          timeout=60)
+        record(self.KEY + ("retract_200_many_window_32",),
+               self.N / t.elapsed, "items/s")
+
+
+class TestNotificationDispatch(unittest.TestCase):
+    KEY = "aioxmpp.pubsub", "PubSubClient"
+
+    NODES = ["urn:xmpp:mood", "urn:xmpp:tune", "urn:xmpp:avatar:metadata",
+             "urn:xmpp:geoloc", "http://jabber.org/protocol/nick"]
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.s = pubsub_service.PubSubClient(self.cc, dependencies={
+            aioxmpp.DiscoClient: unittest.mock.Mock(),
+        })
+        # 2000 contacts sending notifications for five PEP nodes, of which
+        # only one is of interest
+        self.messages = []
+        for i in range(2000):
+            for node in self.NODES:
+                msg = aioxmpp.Message(
+                    type_=aioxmpp.MessageType.HEADLINE,
+                    from_=aioxmpp.JID("contact{}".format(i), "example", None),
+                )
+                msg.xep0060_event = pubsub_xso.Event(
+                    pubsub_xso.EventItems(
+                        node,
+                        items=[pubsub_xso.EventItem(Payload(), id_="current")],
+                    )
+                )
+                self.messages.append(msg)
+        self.received = []
+
+    def _dispatch(self):
+        with timed() as t:
+            for msg in self.messages:
+                self.s.filter_inbound_message(msg)
+        return t.elapsed
+
+    @times(5)
+    def test_dispatch_via_on_item_published(self):
+        def on_item_published(jid, node, item, **kwargs):
+            if node == "urn:xmpp:mood":
+                self.received.append(item)
+
+        self.s.on_item_published.connect(on_item_published)
+        elapsed = self._dispatch()
+        record(self.KEY + ("notifications_10000_on_item_published",),
+               elapsed, "s")
+
+    @times(5)
+    def test_dispatch_via_node_signal(self):
+        def on_mood(jid, node, items, retracts, **kwargs):
+            self.received.extend(items)
+
+        self.s.node_signal("urn:xmpp:mood").connect(on_mood)
+        elapsed = self._dispatch()
+        record(self.KEY + ("notifications_10000_node_signal",),
+               elapsed, "s")
@@ -0,0 +1,84 @@
+########################################################################
+# File name: test_vcard.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import unittest
+import unittest.mock
+
+import aioxmpp
+import aioxmpp.vcard
+import aioxmpp.vcard.xso as vcard_xso
+
+from aioxmpp.benchtest import times, timed, record
+from aioxmpp.testutils import make_connected_client, run_coroutine
+
+
+class TestVCardService(unittest.TestCase):
+    KEY = "aioxmpp.vcard", "VCardService"
+
+    # number of contacts, lookups per contact and simulated round trip time
+    CONTACTS = 50
+    LOOKUPS = 4
+    LATENCY = 0.01
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = aioxmpp.JID.fromstr("romeo@montague.lit/foo")
+        self.s = aioxmpp.vcard.VCardService(self.cc)
+        self.cc.send = unittest.mock.Mock(side_effect=self._respond)
+        self.jids = [
+            aioxmpp.JID.fromstr("contact{}@example.com".format(i))
+            for i in range(self.CONTACTS)
+        ]
+
+    @asyncio.coroutine
+    def _respond(self, iq):
+        yield from asyncio.sleep(self.LATENCY)
+        vcard = vcard_xso.VCard()
+        vcard.set_photo_data("image/png", b"\x00" * 4096)
+        return vcard
+
+    def _lookups(self):
+        # several UI elements asking for the same vCards at once
+        return asyncio.gather(*[
+            self.s.get_vcard(jid)
+            for _ in range(self.LOOKUPS)
+            for jid in self.jids
+        ])
+
+    def _run(self, name):
+        self.cc.send.reset_mock()
+        self.s._clear_cache()
+        with timed() as t:
+            run_coroutine(self._lookups(), timeout=60)
+            run_coroutine(self._lookups(), timeout=60)
+        record(self.KEY + (name,), t.elapsed, "s")
+        record(self.KEY + (name + "_iqs",), len(self.cc.send.mock_calls),
+               "IQs")
+
+    @times(3)
+    def test_get_vcard_uncached(self):
+        self._run("get_vcard_200x2_uncached")
+
+    @times(3)
+    def test_get_vcard_cached(self):
+        self.s.cache_size = 1000
+        self._run("get_vcard_200x2_cached")
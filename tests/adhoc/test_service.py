@@ -19,18 +19,18 @@
 # <http://www.gnu.org/licenses/>.
 #
 ########################################################################
+import asyncio
 import contextlib
 import random
 import unittest
 import unittest.mock
 
-from datetime import timedelta
-
 import aioxmpp.service
 
 import aioxmpp.adhoc.service as adhoc_service
 import aioxmpp.adhoc.xso as adhoc_xso
 import aioxmpp.disco
+import aioxmpp.forms
 
 from aioxmpp.utils import namespaces
 
@@ -1203,47 +1203,505 @@ class TestClientSession(unittest.TestCase):
         )
 
 
-# class TestServerSession(unittest.TestCase):
-#     def setUp(self):
-#         self.cc = make_connected_client()
-#         self.s = self.cc.stream
-#         self.sessionid = "testsessionid"
-#         self.ss = adhoc_service.ServerSession(
-#             self.s,
-#             sessionid=self.sessionid
-#         )
+class TestStatefulCommands(unittest.TestCase):
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = TEST_LOCAL_JID
+        self.disco_service = unittest.mock.Mock()
+        self.s = adhoc_service.AdHocServer(
+            self.cc,
+            dependencies={
+                aioxmpp.disco.DiscoServer: self.disco_service,
+            }
+        )
+        self.disco_service.reset_mock()
+        self.steps = []
+
+    def tearDown(self):
+        self.s._close_sessions()
+        run_coroutine(asyncio.sleep(0))
+        del self.s
+
+    def _request(self, node="node", *,
+                 sessionid=None,
+                 action=adhoc_xso.ActionType.EXECUTE,
+                 payload=[],
+                 from_=TEST_PEER_JID):
+        return aioxmpp.IQ(
+            type_=aioxmpp.IQType.SET,
+            from_=from_,
+            to=TEST_LOCAL_JID,
+            payload=adhoc_xso.Command(
+                node,
+                action=action,
+                sessionid=sessionid,
+                payload=payload,
+            )
+        )
+
+    @asyncio.coroutine
+    def _two_step_handler(self, session):
+        self.steps.append(session)
+        action, payload = yield from session.reply(
+            aioxmpp.forms.Data(aioxmpp.forms.DataType.FORM),
+            adhoc_xso.CommandStatus.EXECUTING,
+        )
+        self.steps.append((action, payload))
+        result = yield from session.reply(
+            [],
+            adhoc_xso.CommandStatus.COMPLETED,
+        )
+        self.steps.append(result)
+
+    def _register(self, handler=None, node="node", **kwargs):
+        self.s.register_stateful_command(
+            node,
+            "Command name",
+            handler or self._two_step_handler,
+            **kwargs
+        )
+
+    def test_session_uses_system_entropy_for_sessionid(self):
+        self.assertIsInstance(
+            adhoc_service._rng,
+            random.SystemRandom,
+        )
+
+        with unittest.mock.patch("aioxmpp.adhoc.service._rng") as rng:
+            rng.getrandbits.return_value = 1234
+
+            session = adhoc_service.ServerSession(
+                self.s,
+                "node",
+                TEST_PEER_JID,
+                unittest.mock.sentinel.request,
+            )
+
+        rng.getrandbits.assert_called_once_with(64)
+
+        self.assertEqual(session.sessionid, "0gQAAAAAAAA")
+        self.assertEqual(session.node, "node")
+        self.assertEqual(session.peer_jid, TEST_PEER_JID)
+        self.assertEqual(session.first_request,
+                         unittest.mock.sentinel.request)
+
+    def test_defaults(self):
+        self.assertEqual(self.s.max_sessions, 256)
+        self.assertEqual(self.s.max_sessions_per_peer, 16)
+        self.assertEqual(self.s.session_timeout, 60)
+        self.assertIsNone(self.s.executor)
+
+    def test_register_stateful_command_registers_at_disco_service(self):
+        with contextlib.ExitStack() as stack:
+            CommandEntry = stack.enter_context(unittest.mock.patch(
+                "aioxmpp.adhoc.service.CommandEntry"
+            ))
+
+            self._register(is_allowed=unittest.mock.sentinel.is_allowed)
+
+        CommandEntry.assert_called_once_with(
+            "Command name",
+            self._two_step_handler,
+            is_allowed=unittest.mock.sentinel.is_allowed,
+            features={namespaces.xep0004_data},
+            stateful=True,
+        )
+
+        self.disco_service.mount_node.assert_called_once_with(
+            "node",
+            CommandEntry(),
+        )
+
+    def test_multi_step_flow(self):
+        self._register()
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+
+        self.assertEqual(response.status, adhoc_xso.CommandStatus.EXECUTING)
+        self.assertEqual(response.node, "node")
+        self.assertIsInstance(response.first_payload, aioxmpp.forms.Data)
+        self.assertSetEqual(
+            response.actions.allowed_actions,
+            {
+                adhoc_xso.ActionType.EXECUTE,
+                adhoc_xso.ActionType.CANCEL,
+                adhoc_xso.ActionType.NEXT,
+                adhoc_xso.ActionType.COMPLETE,
+            }
+        )
+        self.assertEqual(response.actions.execute,
+                         adhoc_xso.ActionType.NEXT)
+
+        session, = self.steps
+        self.assertEqual(response.sessionid, session.sessionid)
+        self.assertEqual(session.peer_jid, TEST_PEER_JID)
+        self.assertIsInstance(session.first_request, adhoc_xso.Command)
+
+        form = aioxmpp.forms.Data(aioxmpp.forms.DataType.SUBMIT)
+        response = run_coroutine(self.s._handle_command(self._request(
+            sessionid=session.sessionid,
+            action=adhoc_xso.ActionType.COMPLETE,
+            payload=[form],
+        )))
+
+        self.assertEqual(response.status, adhoc_xso.CommandStatus.COMPLETED)
+        self.assertEqual(response.sessionid, session.sessionid)
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertSequenceEqual(
+            self.steps,
+            [
+                session,
+                (adhoc_xso.ActionType.COMPLETE, [form]),
+                None,
+            ]
+        )
+        self.assertFalse(self.s._sessions)
+        self.assertFalse(self.s._peer_load)
+
+    def test_execute_maps_to_default_action(self):
+        self._register()
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+        run_coroutine(self.s._handle_command(self._request(
+            sessionid=response.sessionid,
+        )))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(self.steps[1], (adhoc_xso.ActionType.NEXT, []))
+
+    def test_reply_rejects_default_action_not_in_actions(self):
+        @asyncio.coroutine
+        def handler(session):
+            yield from session.reply(
+                [],
+                adhoc_xso.CommandStatus.EXECUTING,
+                actions={adhoc_xso.ActionType.COMPLETE},
+            )
+
+        self._register(handler)
+
+        with self.assertRaises(ValueError):
+            run_coroutine(self.s._handle_command(self._request()))
+
+        self.assertFalse(self.s._sessions)
+
+    def test_reply_after_final_reply_raises(self):
+        exc = None
+
+        @asyncio.coroutine
+        def handler(session):
+            nonlocal exc
+            yield from session.reply([], adhoc_xso.CommandStatus.COMPLETED)
+            try:
+                yield from session.reply(
+                    [],
+                    adhoc_xso.CommandStatus.EXECUTING,
+                )
+            except RuntimeError as e:
+                exc = e
+
+        self._register(handler)
+
+        run_coroutine(self.s._handle_command(self._request()))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertIsInstance(exc, RuntimeError)
+
+    def test_disallowed_action_is_rejected_without_waking_handler(self):
+        self._register()
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+
+        with self.assertRaises(aioxmpp.errors.XMPPModifyError) as ctx:
+            run_coroutine(self.s._handle_command(self._request(
+                sessionid=response.sessionid,
+                action=adhoc_xso.ActionType.PREV,
+            )))
+
+        self.assertIsInstance(ctx.exception.application_defined_condition,
+                              adhoc_xso.BadAction)
+        self.assertEqual(len(self.steps), 1)
+        self.assertIn(response.sessionid, self.s._sessions)
+
+    def test_cancel_raises_in_handler_and_confirms(self):
+        exc = None
+
+        @asyncio.coroutine
+        def handler(session):
+            nonlocal exc
+            try:
+                yield from session.reply(
+                    [],
+                    adhoc_xso.CommandStatus.EXECUTING,
+                )
+            except adhoc_service.ClientCancelledError as e:
+                exc = e
+
+        self._register(handler)
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+        response = run_coroutine(self.s._handle_command(self._request(
+            sessionid=response.sessionid,
+            action=adhoc_xso.ActionType.CANCEL,
+        )))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(response.status, adhoc_xso.CommandStatus.CANCELED)
+        self.assertIsInstance(exc, adhoc_service.ClientCancelledError)
+        self.assertFalse(self.s._sessions)
+        self.assertFalse(self.s._peer_load)
+
+    def test_unknown_sessionid_is_rejected(self):
+        self._register()
+
+        with self.assertRaises(aioxmpp.errors.XMPPModifyError) as ctx:
+            run_coroutine(self.s._handle_command(self._request(
+                sessionid="foo",
+            )))
+
+        self.assertIsInstance(ctx.exception.application_defined_condition,
+                              adhoc_xso.BadSessionID)
+
+    def test_session_of_other_peer_is_rejected(self):
+        self._register()
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+
+        with self.assertRaises(aioxmpp.errors.XMPPModifyError) as ctx:
+            run_coroutine(self.s._handle_command(self._request(
+                sessionid=response.sessionid,
+                from_=TEST_PEER_JID.replace(resource="other"),
+            )))
+
+        self.assertIsInstance(ctx.exception.application_defined_condition,
+                              adhoc_xso.BadSessionID)
+        self.assertEqual(len(self.steps), 1)
+
+    def test_idle_session_expires(self):
+        exc = None
+
+        @asyncio.coroutine
+        def handler(session):
+            nonlocal exc
+            try:
+                yield from session.reply(
+                    [],
+                    adhoc_xso.CommandStatus.EXECUTING,
+                )
+            except TimeoutError as e:
+                exc = e
+
+        self.s.session_timeout = 0.01
+        self._register(handler)
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+        self.assertIsNotNone(self.s._idle_timer)
+
+        run_coroutine(asyncio.sleep(0.05))
+
+        self.assertIsInstance(exc, TimeoutError)
+        self.assertFalse(self.s._sessions)
+        self.assertFalse(self.s._idle)
+        self.assertIsNone(self.s._idle_timer)
+
+        with self.assertRaises(aioxmpp.errors.XMPPCancelError) as ctx:
+            run_coroutine(self.s._handle_command(self._request(
+                sessionid=response.sessionid,
+            )))
+
+        self.assertIsInstance(ctx.exception.application_defined_condition,
+                              adhoc_xso.SessionExpired)
+
+    def test_lowering_session_timeout_expires_new_sessions_first(self):
+        self.s.session_timeout = 10
+        self._register()
+
+        response1 = run_coroutine(self.s._handle_command(self._request(
+            from_=TEST_PEER_JID.replace(localpart="peer1"),
+        )))
+
+        self.s.session_timeout = 0.01
+        response2 = run_coroutine(self.s._handle_command(self._request(
+            from_=TEST_PEER_JID.replace(localpart="peer2"),
+        )))
+
+        run_coroutine(asyncio.sleep(0.05))
+
+        self.assertIn(response2.sessionid, self.s._expired_sessionids)
+        self.assertNotIn(response1.sessionid, self.s._expired_sessionids)
+        self.assertIn(response1.sessionid, self.s._sessions)
+        self.assertIsNotNone(self.s._idle_timer)
+
+        self.s._close_sessions()
+        run_coroutine(asyncio.sleep(0))
+
+    def test_raising_session_timeout_keeps_earlier_deadline_armed(self):
+        self.s.session_timeout = 0.01
+        self._register()
+
+        response1 = run_coroutine(self.s._handle_command(self._request(
+            from_=TEST_PEER_JID.replace(localpart="peer1"),
+        )))
+
+        self.s.session_timeout = 10
+        response2 = run_coroutine(self.s._handle_command(self._request(
+            from_=TEST_PEER_JID.replace(localpart="peer2"),
+        )))
+
+        run_coroutine(asyncio.sleep(0.05))
+
+        self.assertIn(response1.sessionid, self.s._expired_sessionids)
+        self.assertIn(response2.sessionid, self.s._sessions)
+
+        self.s._close_sessions()
+        run_coroutine(asyncio.sleep(0))
+
+    def test_active_session_does_not_expire(self):
+        self.s.session_timeout = 0.01
+        self._register()
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+        run_coroutine(self.s._handle_command(self._request(
+            sessionid=response.sessionid,
+        )))
+        run_coroutine(asyncio.sleep(0.05))
+
+        self.assertNotIn(response.sessionid, self.s._expired_sessionids)
+
+    def test_max_sessions(self):
+        self.s.max_sessions = 2
+        self._register()
+
+        for i in range(2):
+            run_coroutine(self.s._handle_command(self._request(
+                from_=TEST_PEER_JID.replace(localpart="peer{}".format(i)),
+            )))
+
+        with self.assertRaises(aioxmpp.errors.XMPPWaitError) as ctx:
+            run_coroutine(self.s._handle_command(self._request()))
+
+        self.assertEqual(
+            ctx.exception.condition,
+            (namespaces.stanzas, "resource-constraint"),
+        )
+        self.assertEqual(len(self.steps), 2)
+
+    def test_max_sessions_per_peer_uses_bare_jid(self):
+        self.s.max_sessions_per_peer = 2
+        self._register()
+
+        for i in range(2):
+            run_coroutine(self.s._handle_command(self._request(
+                from_=TEST_PEER_JID.replace(resource="r{}".format(i)),
+            )))
+
+        with self.assertRaises(aioxmpp.errors.XMPPWaitError):
+            run_coroutine(self.s._handle_command(self._request()))
+
+        run_coroutine(self.s._handle_command(self._request(
+            from_=TEST_PEER_JID.replace(localpart="other"),
+        )))
+        self.assertEqual(len(self.steps), 3)
+
+    def test_max_sessions_per_peer_counts_stateless_requests(self):
+        self.s.max_sessions_per_peer = 1
+        self._register()
+
+        release = asyncio.Event()
+
+        @asyncio.coroutine
+        def stateless_handler(stanza):
+            yield from release.wait()
+            return adhoc_xso.Command(
+                "stateless",
+                status=adhoc_xso.CommandStatus.COMPLETED,
+            )
+
+        self.s.register_stateless_command(
+            "stateless",
+            "Stateless",
+            stateless_handler,
+        )
+
+        task = asyncio.ensure_future(
+            self.s._handle_command(self._request("stateless"))
+        )
+        run_coroutine(asyncio.sleep(0))
 
-#     def tearDown(self):
-#         del self.ss
-#         del self.sessionid
-#         del self.s
-#         del self.cc
+        with self.assertRaises(aioxmpp.errors.XMPPWaitError):
+            run_coroutine(self.s._handle_command(self._request()))
 
-#     def test_init_uses_system_entropy(self):
-#         self.assertIsInstance(
-#             adhoc_service._rng,
-#             random.SystemRandom,
-#         )
+        release.set()
+        run_coroutine(task)
+        self.assertFalse(self.s._peer_load)
 
-#         with unittest.mock.patch("aioxmpp.adhoc.service._rng") as rng:
-#             rng.getrandbits.return_value = 1234
+        run_coroutine(self.s._handle_command(self._request()))
+        self.assertEqual(len(self.steps), 1)
+
+    def test_handler_exception_is_reraised(self):
+        exc = aioxmpp.errors.XMPPModifyError(
+            (namespaces.stanzas, "bad-request"),
+        )
+
+        @asyncio.coroutine
+        def handler(session):
+            raise exc
+
+        self._register(handler)
+
+        with self.assertRaises(aioxmpp.errors.XMPPModifyError) as ctx:
+            run_coroutine(self.s._handle_command(self._request()))
+
+        self.assertIs(ctx.exception, exc)
+        self.assertFalse(self.s._sessions)
+        self.assertFalse(self.s._peer_load)
+
+    def test_handler_returning_completes_session(self):
+        @asyncio.coroutine
+        def handler(session):
+            pass
+
+        self._register(handler)
+
+        response = run_coroutine(self.s._handle_command(self._request()))
+
+        self.assertEqual(response.status, adhoc_xso.CommandStatus.COMPLETED)
+        self.assertFalse(self.s._sessions)
+
+    def test_run_in_executor_uses_executor(self):
+        executor = unittest.mock.Mock()
+        self.s.executor = executor
+
+        with unittest.mock.patch.object(
+                asyncio.get_event_loop(),
+                "run_in_executor",
+                new=CoroutineMock()) as run_in_executor:
+            run_in_executor.return_value = unittest.mock.sentinel.result
+
+            session = adhoc_service.ServerSession(
+                self.s,
+                "node",
+                TEST_PEER_JID,
+                unittest.mock.sentinel.request,
+            )
+            result = run_coroutine(session.run_in_executor(max, 1, 2))
 
-#             self.ss = adhoc_service.ServerSession(
-#                 self.s,
-#                 TEST_PEER_JID,
-#             )
+        self.assertEqual(result, unittest.mock.sentinel.result)
+        (used_executor, func), _ = run_in_executor.call_args
+        self.assertIs(used_executor, executor)
+        self.assertEqual(func(), 2)
 
-#         rng.getrandbits.assert_called_once_with(64)
+    def test_stream_destroyed_closes_sessions(self):
+        self._register()
 
-#         self.assertEqual(
-#             self.ss.sessionid,
-#             "0gQAAAAAAAA"
-#         )
+        run_coroutine(self.s._handle_command(self._request()))
+        session, = self.steps
 
-#     def test_init(self):
-#         self.assertEqual(self.ss.sessionid, self.sessionid)
-#         self.assertEqual(self.ss.timeout, timedelta(seconds=60))
+        self.s._close_sessions()
+        run_coroutine(asyncio.sleep(0))
 
-#     def test_reply_raises_if_handle_has_not_been_called(self):
-#         with self.assertRaises(RuntimeError):
-#             pass
+        self.assertTrue(session._task.cancelled())
+        self.assertFalse(self.s._sessions)
+        self.assertFalse(self.s._peer_load)
+        self.assertIsNone(self.s._idle_timer)
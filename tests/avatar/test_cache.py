@@ -0,0 +1,244 @@
+########################################################################
+# File name: test_cache.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import hashlib
+import pathlib
+import tempfile
+import unittest
+
+import aioxmpp.avatar
+import aioxmpp.avatar.cache as avatar_cache
+
+from aioxmpp.testutils import run_coroutine
+
+
+def make_image(i, size=100):
+    data = bytes([i % 256]) * size
+    return hashlib.sha1(data).hexdigest(), data
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.c = avatar_cache.ImageCache(max_bytes=250)
+
+    def test_is_exported(self):
+        self.assertIs(aioxmpp.avatar.ImageCache, avatar_cache.ImageCache)
+
+    def test_defaults(self):
+        c = avatar_cache.ImageCache()
+        self.assertEqual(c.max_bytes, 4*1024*1024)
+        self.assertIsNone(c.directory)
+
+    def test_get_raises_KeyError_for_unknown(self):
+        id_, _ = make_image(1)
+        with self.assertRaises(KeyError):
+            self.c.get(id_)
+
+    def test_put_and_get(self):
+        id_, data = make_image(1)
+        self.assertTrue(self.c.put(id_, data))
+        self.assertEqual(self.c.get(id_), data)
+        self.assertEqual(self.c.get(id_.upper()), data)
+
+    def test_put_rejects_mismatching_data(self):
+        id_, _ = make_image(1)
+        self.assertFalse(self.c.put(id_, b"other data"))
+        with self.assertRaises(KeyError):
+            self.c.get(id_)
+
+    def test_memory_is_limited_by_bytes(self):
+        images = [make_image(i) for i in range(3)]
+        for id_, data in images:
+            self.c.put(id_, data)
+
+        with self.assertRaises(KeyError):
+            self.c.get(images[0][0])
+        self.assertEqual(self.c.get(images[1][0]), images[1][1])
+        self.assertEqual(self.c.get(images[2][0]), images[2][1])
+
+    def test_max_bytes_setter(self):
+        images = [make_image(i) for i in range(2)]
+        for id_, data in images:
+            self.c.put(id_, data)
+
+        self.c.max_bytes = 100
+
+        with self.assertRaises(KeyError):
+            self.c.get(images[0][0])
+        self.assertEqual(self.c.get(images[1][0]), images[1][1])
+
+    def test_clear(self):
+        id_, data = make_image(1)
+        self.c.put(id_, data)
+        self.c.clear()
+        with self.assertRaises(KeyError):
+            self.c.get(id_)
+
+    def test_fetch_retrieves_and_stores(self):
+        id_, data = make_image(1)
+        fetch = unittest.mock.Mock()
+
+        @asyncio.coroutine
+        def fetch_func():
+            fetch()
+            return data
+
+        self.assertEqual(run_coroutine(self.c.fetch(id_, fetch_func)), data)
+        self.assertEqual(run_coroutine(self.c.fetch(id_, fetch_func)), data)
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_fetch_coalesces_concurrent_requests(self):
+        id_, data = make_image(1)
+        fut = asyncio.Future()
+        fetch_func = unittest.mock.Mock(side_effect=lambda: fut)
+
+        task1 = asyncio.ensure_future(self.c.fetch(id_, fetch_func))
+        task2 = asyncio.ensure_future(self.c.fetch(id_.upper(), fetch_func))
+        run_coroutine(asyncio.sleep(0))
+
+        fut.set_result(data)
+
+        self.assertEqual(run_coroutine(task1), data)
+        self.assertEqual(run_coroutine(task2), data)
+        fetch_func.assert_called_once_with()
+
+    def test_fetch_survives_cancellation_of_one_caller(self):
+        id_, data = make_image(1)
+        fut = asyncio.Future()
+        fetch_func = unittest.mock.Mock(side_effect=lambda: fut)
+
+        task1 = asyncio.ensure_future(self.c.fetch(id_, fetch_func))
+        task2 = asyncio.ensure_future(self.c.fetch(id_, fetch_func))
+        run_coroutine(asyncio.sleep(0))
+
+        task1.cancel()
+        run_coroutine(asyncio.sleep(0))
+        fut.set_result(data)
+
+        self.assertEqual(run_coroutine(task2), data)
+        self.assertTrue(task1.cancelled())
+
+    def test_fetch_propagates_errors_and_retries(self):
+        id_, data = make_image(1)
+        results = [RuntimeError("foo"), data]
+
+        @asyncio.coroutine
+        def fetch_func():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with self.assertRaisesRegex(RuntimeError, "foo"):
+            run_coroutine(self.c.fetch(id_, fetch_func))
+
+        self.assertEqual(run_coroutine(self.c.fetch(id_, fetch_func)), data)
+        self.assertEqual(results, [])
+
+    def test_fetch_does_not_cache_mismatching_data(self):
+        id_, _ = make_image(1)
+
+        @asyncio.coroutine
+        def fetch_func():
+            return b"other data"
+
+        self.assertEqual(run_coroutine(self.c.fetch(id_, fetch_func)),
+                         b"other data")
+        with self.assertRaises(KeyError):
+            self.c.get(id_)
+
+
+class TestImageCacheOnDisk(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmpdir.name) / "avatars"
+        self.c = avatar_cache.ImageCache(max_bytes=100,
+                                         directory=self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_creates_directory(self):
+        self.assertEqual(self.c.directory, self.path)
+        self.assertTrue(self.path.is_dir())
+
+    def test_put_writes_file(self):
+        id_, data = make_image(1)
+        self.c.put(id_, data)
+
+        with (self.path / id_).open("rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_get_reads_back_evicted_images(self):
+        images = [make_image(i) for i in range(2)]
+        for id_, data in images:
+            self.c.put(id_, data)
+
+        self.assertEqual(self.c.get(images[0][0]), images[0][1])
+
+    def test_survives_restart(self):
+        id_, data = make_image(1)
+        self.c.put(id_, data)
+
+        c = avatar_cache.ImageCache(directory=self.path)
+        self.assertEqual(c.get(id_), data)
+
+    def test_discards_corrupt_files(self):
+        id_, data = make_image(1)
+        with (self.path / id_).open("wb") as f:
+            f.write(b"garbage")
+
+        with self.assertRaises(KeyError):
+            self.c.get(id_)
+
+        self.assertFalse((self.path / id_).exists())
+
+    def test_rejects_path_traversal(self):
+        victim = pathlib.Path(self.tmpdir.name) / "victim"
+        with victim.open("wb") as f:
+            f.write(b"precious")
+
+        for id_ in ["../victim", "..%2fvictim", "/etc/passwd",
+                    "a" * 39, "a" * 41, "g" * 40]:
+            with self.assertRaises(KeyError):
+                self.c.get(id_)
+            self.assertFalse(self.c.put(id_, b"precious"))
+
+        self.assertTrue(victim.exists())
+        self.assertEqual(list(self.path.iterdir()), [])
+
+    def test_fetch_bypasses_cache_for_invalid_id(self):
+        calls = []
+
+        @asyncio.coroutine
+        def fetch_func():
+            calls.append(None)
+            return b"data"
+
+        for i in range(2):
+            self.assertEqual(
+                run_coroutine(self.c.fetch("../victim", fetch_func)),
+                b"data",
+            )
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(list(self.path.iterdir()), [])
@@ -419,6 +419,16 @@ class TestAvatarService(unittest.TestCase):
             []
         )
 
+    def test_handle_notify_passes_photo_hash_to_vcard(self):
+        stanza = aioxmpp.Presence()
+        stanza.xep0153_x = avatar_xso.VCardTempUpdate("1234")
+
+        with unittest.mock.patch.object(self.vcard,
+                                        "handle_photo_hash") as handle:
+            self.s._handle_on_available(TEST_JID1, stanza)
+
+            handle.assert_called_once_with(TEST_JID1.bare(), "1234")
+
     def test_trigger_rehash(self):
         mock_handler = unittest.mock.Mock()
         self.s.on_metadata_changed.connect(mock_handler)
@@ -948,6 +958,111 @@ class TestAvatarService(unittest.TestCase):
                 ]
             )
 
+    def test_image_cache(self):
+        self.assertIsInstance(self.s.image_cache, aioxmpp.avatar.ImageCache)
+        self.assertIsNone(self.s.image_cache.directory)
+
+        cache = aioxmpp.avatar.ImageCache()
+        self.s.image_cache = cache
+        self.assertIs(self.s.image_cache, cache)
+
+    def test_get_avatar_metadata_coalesces_concurrent_requests(self):
+        aset = avatar_service.AvatarSet()
+        aset.add_avatar_image("image/png", image_bytes=TEST_IMAGE)
+
+        items = pubsub_xso.Items(
+            namespaces.xep0084_metadata,
+        )
+        item = pubsub_xso.Item(id_=aset.png_id)
+        item.registered_payload = aset.metadata
+        items.items.append(item)
+
+        pubsub_result = pubsub_xso.Request(items)
+        fut = asyncio.Future()
+
+        with unittest.mock.patch.object(
+                self.pubsub, "get_items",
+                new=unittest.mock.Mock(side_effect=lambda *a, **kw: fut)):
+            task1 = asyncio.ensure_future(
+                self.s.get_avatar_metadata(TEST_JID1)
+            )
+            task2 = asyncio.ensure_future(
+                self.s.get_avatar_metadata(TEST_JID1)
+            )
+            run_coroutine(asyncio.sleep(0))
+
+            fut.set_result(pubsub_result)
+
+            descriptors1 = run_coroutine(task1)
+            descriptors2 = run_coroutine(task2)
+
+            self.assertEqual(self.pubsub.get_items.call_count, 1)
+
+        self.assertEqual(len(descriptors1), 1)
+        self.assertIs(descriptors1, descriptors2)
+
+    def test_get_avatar_metadata_does_not_coalesce_different_jids(self):
+        with unittest.mock.patch.object(self.pubsub, "get_items",
+                                        new=CoroutineMock()):
+            self.pubsub.get_items.return_value = pubsub_xso.Request(
+                pubsub_xso.Items(namespaces.xep0084_metadata)
+            )
+            with unittest.mock.patch.object(self.vcard, "get_vcard",
+                                            new=CoroutineMock()):
+                vcard_mock = unittest.mock.Mock()
+                vcard_mock.get_photo_data.return_value = None
+                self.vcard.get_vcard.return_value = vcard_mock
+
+                run_coroutine(asyncio.gather(
+                    self.s.get_avatar_metadata(TEST_JID1),
+                    self.s.get_avatar_metadata(TEST_JID2),
+                ))
+
+            self.assertEqual(self.pubsub.get_items.call_count, 2)
+
+    def test_descriptors_share_image_cache(self):
+        aset = avatar_service.AvatarSet()
+        aset.add_avatar_image("image/png", image_bytes=TEST_IMAGE)
+
+        items = pubsub_xso.Items(
+            namespaces.xep0084_metadata,
+        )
+        item = pubsub_xso.Item(id_=aset.png_id)
+        item.registered_payload = aset.metadata
+        items.items.append(item)
+
+        data_items = pubsub_xso.Items(namespaces.xep0084_data)
+        data_item = pubsub_xso.Item(id_=TEST_IMAGE_SHA1)
+        data_item.registered_payload = avatar_xso.Data(TEST_IMAGE)
+        data_items.items.append(data_item)
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(unittest.mock.patch.object(
+                self.pubsub, "get_items",
+                new=CoroutineMock()))
+            self.pubsub.get_items.return_value = pubsub_xso.Request(items)
+            stack.enter_context(unittest.mock.patch.object(
+                self.pubsub, "get_items_by_id",
+                new=CoroutineMock()))
+            self.pubsub.get_items_by_id.return_value = \
+                pubsub_xso.Request(data_items)
+
+            descriptor1, = run_coroutine(
+                self.s.get_avatar_metadata(TEST_JID1)
+            )
+            descriptor2, = run_coroutine(
+                self.s.get_avatar_metadata(TEST_JID2)
+            )
+
+            self.assertEqual(run_coroutine(descriptor1.get_image_bytes()),
+                             TEST_IMAGE)
+            self.assertEqual(run_coroutine(descriptor2.get_image_bytes()),
+                             TEST_IMAGE)
+
+            self.assertEqual(self.pubsub.get_items_by_id.call_count, 1)
+
+        self.assertEqual(self.s.image_cache.get(TEST_IMAGE_SHA1), TEST_IMAGE)
+
     def test_get_avatar_metadata_with_require_fresh_does_not_crash(self):
         aset = avatar_service.AvatarSet()
         aset.add_avatar_image("image/png", image_bytes=TEST_IMAGE)
@@ -1245,6 +1360,56 @@ class TestAvatarDescriptors(unittest.TestCase):
             )
             self.assertEqual(res, TEST_IMAGE)
 
+    def test_pep_get_image_bytes_uses_image_cache(self):
+        cache = aioxmpp.avatar.ImageCache()
+        descriptor = avatar_service.PubsubAvatarDescriptor(
+            TEST_JID1,
+            TEST_IMAGE_SHA1.upper(),
+            mime_type="image/png",
+            nbytes=len(TEST_IMAGE),
+            pubsub=self.pubsub,
+            image_cache=cache,
+        )
+
+        items = pubsub_xso.Items(
+            namespaces.xep0084_data,
+        )
+        item = pubsub_xso.Item(id_=TEST_IMAGE_SHA1)
+        item.registered_payload = avatar_xso.Data(TEST_IMAGE)
+        items.items.append(item)
+
+        with unittest.mock.patch.object(self.pubsub, "get_items_by_id",
+                                        new=CoroutineMock()):
+            self.pubsub.get_items_by_id.return_value = \
+                pubsub_xso.Request(items)
+
+            self.assertEqual(run_coroutine(descriptor.get_image_bytes()),
+                             TEST_IMAGE)
+            self.assertEqual(run_coroutine(descriptor.get_image_bytes()),
+                             TEST_IMAGE)
+
+            self.assertEqual(self.pubsub.get_items_by_id.call_count, 1)
+
+        self.assertEqual(cache.get(TEST_IMAGE_SHA1), TEST_IMAGE)
+
+    def test_vcard_get_image_bytes_uses_image_cache(self):
+        cache = aioxmpp.avatar.ImageCache()
+        cache.put(TEST_IMAGE_SHA1, TEST_IMAGE)
+
+        descriptor = avatar_service.VCardAvatarDescriptor(
+            TEST_JID1,
+            TEST_IMAGE_SHA1.upper(),
+            vcard=self.vcard,
+            image_cache=cache,
+        )
+
+        with unittest.mock.patch.object(self.vcard, "get_vcard",
+                                        new=CoroutineMock()):
+            self.assertEqual(run_coroutine(descriptor.get_image_bytes()),
+                             TEST_IMAGE)
+
+            self.vcard.get_vcard.assert_not_called()
+
     def test_HttpAvatarDescriptor(self):
         descriptor = avatar_service.HttpAvatarDescriptor(
             TEST_JID1,
@@ -369,7 +369,7 @@ class TestBlockingClient(unittest.TestCase):
             handle_unblock
         )
 
-        self.s._blocklist = frozenset([TEST_JID1])
+        self.s._blocklist = set([TEST_JID1])
 
         block = blocking_xso.BlockCommand()
         block.items[:] = [TEST_JID2]
@@ -413,7 +413,7 @@ class TestBlockingClient(unittest.TestCase):
             handle_unblock
         )
 
-        self.s._blocklist = frozenset([TEST_JID1, TEST_JID2])
+        self.s._blocklist = set([TEST_JID1, TEST_JID2])
 
         block = blocking_xso.UnblockCommand()
         block.items[:] = [TEST_JID2]
@@ -452,7 +452,7 @@ class TestBlockingClient(unittest.TestCase):
             handle_unblock
         )
 
-        self.s._blocklist = frozenset([TEST_JID1, TEST_JID2])
+        self.s._blocklist = set([TEST_JID1, TEST_JID2])
 
         block = blocking_xso.UnblockCommand()
         iq = aioxmpp.IQ(
@@ -472,3 +472,192 @@ class TestBlockingClient(unittest.TestCase):
         )
 
         handle_block.assert_not_called()
+
+    def test_handle_block_push_updates_in_place(self):
+        blocklist = set([TEST_JID1])
+        self.s._blocklist = blocklist
+
+        block = blocking_xso.BlockCommand()
+        block.items[:] = [TEST_JID2]
+        iq = aioxmpp.IQ(
+            type_=aioxmpp.IQType.SET,
+            payload=block,
+        )
+
+        run_coroutine(self.s.handle_block_push(iq))
+
+        self.assertIs(self.s._blocklist, blocklist)
+        self.assertEqual(blocklist, {TEST_JID1, TEST_JID2})
+
+    def test_handle_unblock_push_updates_in_place(self):
+        blocklist = set([TEST_JID1, TEST_JID2])
+        self.s._blocklist = blocklist
+
+        unblock = blocking_xso.UnblockCommand()
+        unblock.items[:] = [TEST_JID2]
+        iq = aioxmpp.IQ(
+            type_=aioxmpp.IQType.SET,
+            payload=unblock,
+        )
+
+        run_coroutine(self.s.handle_unblock_push(iq))
+
+        self.assertIs(self.s._blocklist, blocklist)
+        self.assertEqual(blocklist, {TEST_JID1})
+
+    def test_blocklist_is_None_initially(self):
+        self.assertIsNone(self.s.blocklist)
+
+    def test_blocklist_is_live_read_only_view(self):
+        self.s._blocklist = set([TEST_JID1])
+        view = self.s.blocklist
+
+        self.assertEqual(view, frozenset([TEST_JID1]))
+        self.assertIn(TEST_JID1, view)
+        self.assertEqual(len(view), 1)
+
+        self.s._blocklist.add(TEST_JID2)
+        self.assertCountEqual(view, [TEST_JID1, TEST_JID2])
+
+        self.assertEqual(view - {TEST_JID1}, frozenset([TEST_JID2]))
+
+        with self.assertRaises(AttributeError):
+            view.add(TEST_JID3)
+
+    def test_is_blocked_without_blocklist(self):
+        self.assertFalse(self.s.is_blocked(TEST_JID1))
+
+    def test_is_blocked_full_jid(self):
+        self.s._blocklist = set([TEST_JID1])
+
+        self.assertTrue(self.s.is_blocked(TEST_JID1))
+        self.assertFalse(self.s.is_blocked(TEST_JID1.bare()))
+        self.assertFalse(self.s.is_blocked(TEST_JID1.replace(resource="x")))
+        self.assertFalse(self.s.is_blocked(TEST_JID2))
+
+    def test_is_blocked_bare_jid(self):
+        self.s._blocklist = set([TEST_JID1.bare()])
+
+        self.assertTrue(self.s.is_blocked(TEST_JID1))
+        self.assertTrue(self.s.is_blocked(TEST_JID1.bare()))
+        self.assertTrue(self.s.is_blocked(TEST_JID1.replace(resource="x")))
+        self.assertFalse(self.s.is_blocked(TEST_JID2))
+        self.assertFalse(self.s.is_blocked(
+            aioxmpp.JID.fromstr("bar.example")
+        ))
+
+    def test_is_blocked_domain(self):
+        self.s._blocklist = set([aioxmpp.JID.fromstr("bar.example")])
+
+        self.assertTrue(self.s.is_blocked(TEST_JID1))
+        self.assertTrue(self.s.is_blocked(TEST_JID2.bare()))
+        self.assertTrue(self.s.is_blocked(
+            aioxmpp.JID.fromstr("bar.example/res")
+        ))
+        self.assertTrue(self.s.is_blocked(
+            aioxmpp.JID.fromstr("bar.example")
+        ))
+        self.assertFalse(self.s.is_blocked(
+            aioxmpp.JID.fromstr("foo@other.example")
+        ))
+
+    def test_is_blocked_domain_resource(self):
+        jid = aioxmpp.JID.fromstr("bar.example/res")
+        self.s._blocklist = set([jid])
+
+        self.assertTrue(self.s.is_blocked(jid))
+        self.assertFalse(self.s.is_blocked(jid.bare()))
+        self.assertFalse(self.s.is_blocked(TEST_JID1))
+
+    def test_filters_are_registered(self):
+        self.assertTrue(service.is_inbound_message_filter(
+            blocking.BlockingClient._filter_inbound_message,
+        ))
+        self.assertTrue(service.is_inbound_presence_filter(
+            blocking.BlockingClient._filter_inbound_presence,
+        ))
+
+    def test_filters_pass_everything_by_default(self):
+        self.assertFalse(self.s.drop_blocked_stanzas)
+        self.s._blocklist = set([TEST_JID1])
+
+        msg = aioxmpp.Message(type_=aioxmpp.MessageType.CHAT,
+                              from_=TEST_JID1)
+        pres = aioxmpp.Presence(from_=TEST_JID1)
+
+        self.assertIs(self.s._filter_inbound_message(msg), msg)
+        self.assertIs(self.s._filter_inbound_presence(pres), pres)
+
+    def test_filters_drop_blocked_stanzas_if_enabled(self):
+        self.s.drop_blocked_stanzas = True
+        self.s._blocklist = set([TEST_JID1.bare()])
+
+        msg = aioxmpp.Message(type_=aioxmpp.MessageType.CHAT,
+                              from_=TEST_JID1)
+        pres = aioxmpp.Presence(from_=TEST_JID1)
+        self.assertIsNone(self.s._filter_inbound_message(msg))
+        self.assertIsNone(self.s._filter_inbound_presence(pres))
+
+        msg = aioxmpp.Message(type_=aioxmpp.MessageType.CHAT,
+                              from_=TEST_JID2)
+        pres = aioxmpp.Presence(from_=TEST_JID2)
+        self.assertIs(self.s._filter_inbound_message(msg), msg)
+        self.assertIs(self.s._filter_inbound_presence(pres), pres)
+
+        msg = aioxmpp.Message(type_=aioxmpp.MessageType.CHAT)
+        self.assertIs(self.s._filter_inbound_message(msg), msg)
+
+    def _run_chunked(self, method, jids, chunk_size):
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                unittest.mock.patch.object(
+                    self.s, "_check_for_blocking",
+                    new=CoroutineMock()
+                )
+            )
+
+            stack.enter_context(
+                unittest.mock.patch.object(
+                    self.cc, "send",
+                    new=CoroutineMock()
+                )
+            )
+
+            run_coroutine(method(jids, chunk_size=chunk_size))
+
+            return [
+                list(arg.payload.items)
+                for _, (arg,), _ in self.cc.send.mock_calls
+            ]
+
+    def test_block_jids_chunked(self):
+        jids = [TEST_JID1, TEST_JID2, TEST_JID3]
+
+        chunks = self._run_chunked(self.s.block_jids, jids, 2)
+
+        self.assertEqual(chunks, [[TEST_JID1, TEST_JID2], [TEST_JID3]])
+
+    def test_unblock_jids_chunked(self):
+        jids = [TEST_JID1, TEST_JID2, TEST_JID3]
+
+        chunks = self._run_chunked(self.s.unblock_jids, jids, 1)
+
+        self.assertEqual(chunks, [[TEST_JID1], [TEST_JID2], [TEST_JID3]])
+
+    def test_block_jids_chunked_sends_commands(self):
+        with unittest.mock.patch.object(self.s, "_check_for_blocking",
+                                        new=CoroutineMock()), \
+                unittest.mock.patch.object(self.cc, "send",
+                                           new=CoroutineMock()):
+            run_coroutine(self.s.block_jids([TEST_JID1, TEST_JID2],
+                                            chunk_size=1))
+
+            for _, (arg,), _ in self.cc.send.mock_calls:
+                self.assertIsInstance(arg, aioxmpp.IQ)
+                self.assertEqual(arg.type_, aioxmpp.IQType.SET)
+                self.assertIsInstance(arg.payload, blocking_xso.BlockCommand)
+
+    def test_chunk_size_must_be_positive(self):
+        for method in [self.s.block_jids, self.s.unblock_jids]:
+            with self.assertRaisesRegex(ValueError, "chunk_size"):
+                self._run_chunked(method, [TEST_JID1], 0)
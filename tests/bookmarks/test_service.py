@@ -32,6 +32,7 @@ import aioxmpp.private_xml
 import aioxmpp.xso
 
 import aioxmpp.bookmarks
+import aioxmpp.bookmarks.service as bookmark_service
 
 from aioxmpp.testutils import (
     make_connected_client,
@@ -139,6 +140,105 @@ class TestPrivateXMLSimulator(unittest.TestCase):
         self.assertEqual(results[4].text, "foo")
 
 
+class TestBookmarkStore(unittest.TestCase):
+
+    def setUp(self):
+        self.c1 = aioxmpp.bookmarks.Conference("a", TEST_JID1, nick="x")
+        self.c2 = aioxmpp.bookmarks.Conference("b", TEST_JID1, nick="y")
+        self.c3 = aioxmpp.bookmarks.Conference("a", TEST_JID2, nick="x")
+        self.u1 = aioxmpp.bookmarks.URL("a", "http://foo.bar/")
+        self.store = bookmark_service._BookmarkStore(
+            [self.c1, self.u1, self.c2, self.c1]
+        )
+
+    def test_iteration_preserves_order(self):
+        self.assertSequenceEqual(
+            list(self.store),
+            [self.c1, self.u1, self.c2, self.c1],
+        )
+        self.assertEqual(len(self.store), 4)
+
+    def test_contains_and_count(self):
+        self.assertIn(self.c2, self.store)
+        self.assertNotIn(self.c3, self.store)
+        self.assertEqual(self.store.count(self.c1), 2)
+        self.assertEqual(self.store.count(self.c3), 0)
+
+    def test_lookup(self):
+        self.assertSequenceEqual(
+            self.store.lookup(aioxmpp.bookmarks.Conference, TEST_JID1),
+            [self.c1, self.c2, self.c1],
+        )
+        self.assertSequenceEqual(
+            self.store.lookup(aioxmpp.bookmarks.URL, "http://foo.bar/"),
+            [self.u1],
+        )
+        self.assertSequenceEqual(
+            self.store.lookup(aioxmpp.bookmarks.URL, str(TEST_JID1)),
+            [],
+        )
+
+    def test_remove_removes_first_occurence(self):
+        self.assertTrue(self.store.remove(self.c1))
+        self.assertSequenceEqual(
+            list(self.store),
+            [self.u1, self.c2, self.c1],
+        )
+        self.assertEqual(len(self.store), 3)
+        self.assertFalse(self.store.remove(self.c3))
+
+    def test_remove_drops_empty_groups(self):
+        self.store.remove(self.u1)
+        self.assertNotIn((aioxmpp.bookmarks.URL, "http://foo.bar/"),
+                         self.store.keys())
+
+    def test_replace_keeps_position(self):
+        self.assertTrue(self.store.replace(self.c2, self.c3))
+        self.assertSequenceEqual(
+            list(self.store),
+            [self.c1, self.u1, self.c3, self.c1],
+        )
+        self.assertSequenceEqual(
+            self.store.lookup(aioxmpp.bookmarks.Conference, TEST_JID2),
+            [self.c3],
+        )
+        self.assertFalse(self.store.replace(self.c2, self.c3))
+
+    def test_replace_reindexes_in_list_order(self):
+        self.store.replace(self.u1, self.c2)
+        self.assertTrue(self.store.remove(self.c2))
+        self.assertSequenceEqual(
+            list(self.store),
+            [self.c1, self.c2, self.c1],
+        )
+
+
+class TestBookmarkTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.tx = aioxmpp.bookmarks.BookmarkTransaction()
+        self.b1 = aioxmpp.bookmarks.URL("a", "http://foo.bar/")
+        self.b2 = aioxmpp.bookmarks.URL("b", "http://foo.bar/")
+
+    def test_len(self):
+        self.assertEqual(len(self.tx), 0)
+        self.tx.add_bookmark(self.b1)
+        self.tx.discard_bookmark(self.b2)
+        self.assertEqual(len(self.tx), 2)
+
+    def test_rejects_bookmark_mentioned_twice(self):
+        self.tx.add_bookmark(self.b1)
+        with self.assertRaisesRegex(ValueError, "already part"):
+            self.tx.discard_bookmark(copy.copy(self.b1))
+        with self.assertRaises(ValueError):
+            self.tx.update_bookmark(self.b2, self.b1)
+        self.assertEqual(len(self.tx), 1)
+
+    def test_update_may_mention_equal_bookmarks(self):
+        self.tx.update_bookmark(self.b1, copy.copy(self.b1))
+        self.assertEqual(len(self.tx), 1)
+
+
 class TestBookmarkClient(unittest.TestCase):
 
     def test_is_service(self):
@@ -685,3 +785,175 @@ class TestBookmarkClient(unittest.TestCase):
                 run_coroutine(self.s.update_bookmark(to_change, changed))
 
             self.assertCountEqual(bookmark_list, self.s._bookmark_cache)
+
+    def _store(self, bookmarks):
+        storage = aioxmpp.bookmarks.Storage()
+        storage.bookmarks[:] = bookmarks
+        self.private_xml.stored[storage.TAG[0]] = storage
+
+    def _stored(self):
+        return list(run_coroutine(
+            self.private_xml.get_private_xml(aioxmpp.bookmarks.Storage())
+        ).registered_payload.bookmarks)
+
+    def test_apply_transaction_writes_once(self):
+        keep = aioxmpp.bookmarks.URL("keep", "http://keep/")
+        remove = aioxmpp.bookmarks.URL("remove", "http://remove/")
+        old = aioxmpp.bookmarks.Conference("old", TEST_JID1, nick="x")
+        new = aioxmpp.bookmarks.Conference("new", TEST_JID1, nick="x")
+        added = aioxmpp.bookmarks.Conference("added", TEST_JID2)
+        self._store([keep, remove, old])
+        run_coroutine(self.s.sync())
+        self.connect_mocks()
+
+        tx = aioxmpp.bookmarks.BookmarkTransaction()
+        tx.add_bookmark(added)
+        tx.discard_bookmark(remove)
+        tx.update_bookmark(old, new)
+
+        with unittest.mock.patch.object(
+                self.s, "_set_bookmarks",
+                wraps=self.s._set_bookmarks) as set_bookmarks:
+            run_coroutine(self.s.apply_transaction(tx))
+
+        self.assertEqual(len(set_bookmarks.mock_calls), 1)
+        self.assertSequenceEqual(self._stored(), [keep, new, added])
+
+        self.on_added.assert_called_once_with(added)
+        self.on_removed.assert_called_once_with(remove)
+        self.on_changed.assert_called_once_with(old, new)
+
+    def test_apply_transaction_skips_write_if_unchanged(self):
+        bookmark = aioxmpp.bookmarks.URL("An URL", "http://foo.bar/")
+        self._store([bookmark])
+
+        tx = aioxmpp.bookmarks.BookmarkTransaction()
+        tx.add_bookmark(bookmark)
+        tx.discard_bookmark(aioxmpp.bookmarks.URL("other", "http://x/"))
+
+        with unittest.mock.patch.object(
+                self.s, "_set_bookmarks",
+                new=CoroutineMock()) as set_bookmarks:
+            run_coroutine(self.s.apply_transaction(tx))
+
+        set_bookmarks.assert_not_called()
+        self.assertCountEqual(self.s._bookmark_cache, [bookmark])
+
+    def test_apply_transaction_retries_unsatisfied(self):
+        self.private_xml.delay = 3
+        self.connect_mocks()
+        b1 = aioxmpp.bookmarks.URL("a", "http://a/")
+        b2 = aioxmpp.bookmarks.URL("b", "http://b/")
+
+        tx = aioxmpp.bookmarks.BookmarkTransaction()
+        tx.add_bookmark(b1)
+        tx.add_bookmark(b2)
+        run_coroutine(self.s.apply_transaction(tx))
+
+        self.assertSequenceEqual(self._stored(), [b1, b2])
+        self.assertCountEqual(
+            [call[1][0] for call in self.on_added.mock_calls],
+            [b1, b2],
+        )
+
+    def test_apply_transaction_retries_only_pending_operations(self):
+        b1 = aioxmpp.bookmarks.URL("a", "http://a/")
+        b2 = aioxmpp.bookmarks.URL("b", "http://b/")
+
+        set_bookmarks = self.s._set_bookmarks
+        calls = []
+
+        @asyncio.coroutine
+        def racy_set_bookmarks(bookmarks):
+            calls.append(list(bookmarks))
+            if len(calls) == 1:
+                # a concurrent writer drops b2 again
+                bookmarks = [b1]
+            yield from set_bookmarks(bookmarks)
+
+        tx = aioxmpp.bookmarks.BookmarkTransaction()
+        tx.add_bookmark(b1)
+        tx.add_bookmark(b2)
+
+        with unittest.mock.patch.object(self.s, "_set_bookmarks",
+                                        new=racy_set_bookmarks):
+            run_coroutine(self.s.apply_transaction(tx))
+
+        self.assertSequenceEqual(calls, [[b1, b2], [b1, b2]])
+        self.assertSequenceEqual(self._stored(), [b1, b2])
+
+    def test_apply_transaction_raises_after_max_retries(self):
+        self.private_xml.delay = 3
+        tx = aioxmpp.bookmarks.BookmarkTransaction()
+        tx.add_bookmark(aioxmpp.bookmarks.URL("a", "http://a/"))
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self.assertRaisesRegex(
+                RuntimeError,
+                "Could not apply bookmark transaction",
+            ))
+            diff_emit_update = stack.enter_context(
+                unittest.mock.patch.object(self.s, "_diff_emit_update")
+            )
+            run_coroutine(self.s.apply_transaction(tx, max_retries=2))
+
+        self.assertEqual(len(diff_emit_update.mock_calls), 1)
+
+    def test_lookup_bookmarks(self):
+        c1 = aioxmpp.bookmarks.Conference("a", TEST_JID1, nick="x")
+        c2 = aioxmpp.bookmarks.Conference("b", TEST_JID1, nick="y")
+        u1 = aioxmpp.bookmarks.URL("a", "http://foo.bar/")
+
+        self.assertSequenceEqual(
+            self.s.lookup_bookmarks(aioxmpp.bookmarks.Conference, TEST_JID1),
+            [],
+        )
+
+        self._store([c1, u1, c2])
+        run_coroutine(self.s.sync())
+
+        self.assertSequenceEqual(
+            self.s.lookup_bookmarks(aioxmpp.bookmarks.Conference, TEST_JID1),
+            [c1, c2],
+        )
+        self.assertSequenceEqual(
+            self.s.lookup_bookmarks(aioxmpp.bookmarks.URL, "http://foo.bar/"),
+            [u1],
+        )
+
+    def test_diff_emit_update_cancels_unchanged_duplicates(self):
+        def conf(name, nick):
+            return aioxmpp.bookmarks.Conference(name, TEST_JID1, nick=nick)
+
+        old = [conf("a", "x"), conf("a", "x"), conf("b", "y"), conf("c", "z")]
+        new = [conf("c", "z"), conf("a", "x"), conf("b", "w"),
+               conf("d", "v")]
+
+        self.s._diff_emit_update(old)
+        self.connect_mocks()
+        self.s._diff_emit_update(new)
+
+        reconstructed = list(old)
+        for _, (added,), _ in self.on_added.mock_calls:
+            reconstructed.append(added)
+        for _, (removed,), _ in self.on_removed.mock_calls:
+            reconstructed.remove(removed)
+        for _, (old_entry, new_entry), _ in self.on_changed.mock_calls:
+            reconstructed.remove(old_entry)
+            reconstructed.append(new_entry)
+
+        self.assertCountEqual(reconstructed, new)
+        self.assertEqual(
+            len(self.on_added.mock_calls) +
+            len(self.on_removed.mock_calls) +
+            len(self.on_changed.mock_calls),
+            2,
+        )
+
+    def test_cancel_unchanged_handles_unhashable_secondary(self):
+        old = [unittest.mock.Mock(secondary=[1])]
+        new = [unittest.mock.Mock(secondary=[2])]
+        self.assertEqual(
+            aioxmpp.bookmarks.BookmarkClient._cancel_unchanged(old, new),
+            (old, new),
+        )
@@ -0,0 +1,263 @@
+########################################################################
+# File name: test_cache.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import contextlib
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+import aioxmpp.disco.cache as disco_cache
+import aioxmpp.disco.xso as disco_xso
+import aioxmpp.structs as structs
+
+from aioxmpp.testutils import run_coroutine
+
+
+TEST_JID = structs.JID.fromstr("component.example")
+
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "disco.sqlite")
+        self.c = disco_cache.PersistentCache(
+            self.path,
+            info_ttl=100,
+            items_ttl=10,
+        )
+
+        self.info = disco_xso.InfoQuery(
+            identities=[
+                disco_xso.Identity(category="conference", type_="text"),
+            ],
+            features=["http://jabber.org/protocol/muc"],
+        )
+        self.items = disco_xso.ItemsQuery(
+            items=[
+                disco_xso.Item(
+                    jid=structs.JID.fromstr("room@component.example")
+                ),
+            ]
+        )
+
+    def tearDown(self):
+        run_coroutine(self.c.close())
+        self.tmpdir.cleanup()
+
+    def test_lookup_raises_KeyError_for_unknown_entity(self):
+        with self.assertRaises(KeyError):
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+
+    def test_store_and_lookup(self):
+        self.c.store(TEST_JID, None, self.info)
+        self.c.store(TEST_JID, "node", self.items)
+
+        info = self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+        self.assertIsInstance(info, disco_xso.InfoQuery)
+        self.assertSetEqual(
+            set(info.features),
+            {"http://jabber.org/protocol/muc"},
+        )
+
+        with self.assertRaises(KeyError):
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, "node")
+
+        with self.assertRaises(KeyError):
+            self.c.lookup(disco_xso.ItemsQuery, TEST_JID, None)
+
+        items = self.c.lookup(disco_xso.ItemsQuery, TEST_JID, "node")
+        self.assertEqual(
+            [item.jid for item in items.items],
+            [structs.JID.fromstr("room@component.example")],
+        )
+
+    def test_store_replaces_entry(self):
+        self.c.store(TEST_JID, None, self.info)
+        self.c.store(TEST_JID, None, disco_xso.InfoQuery(features=["foo"]))
+
+        info = self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+        self.assertSetEqual(set(info.features), {"foo"})
+        self.assertEqual(len(run_coroutine(self.c.load())), 1)
+
+    def test_entries_expire(self):
+        with unittest.mock.patch("aioxmpp.disco.cache.time.time") as time:
+            time.return_value = 1000
+            self.c.store(TEST_JID, None, self.info)
+            self.c.store(TEST_JID, None, self.items)
+
+            time.return_value = 1050
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+            with self.assertRaises(KeyError):
+                self.c.lookup(disco_xso.ItemsQuery, TEST_JID, None)
+            self.assertEqual(len(run_coroutine(self.c.load())), 1)
+
+            time.return_value = 1100
+            with self.assertRaises(KeyError):
+                self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+
+    def test_discard(self):
+        self.c.store(TEST_JID, None, self.info)
+        self.c.store(TEST_JID, None, self.items)
+
+        self.c.discard(disco_xso.InfoQuery, TEST_JID, None)
+
+        with self.assertRaises(KeyError):
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+        self.c.lookup(disco_xso.ItemsQuery, TEST_JID, None)
+
+    def test_entries_survive_reopening(self):
+        self.c.store(TEST_JID, "node", self.info)
+        run_coroutine(self.c.close())
+
+        self.c = disco_cache.PersistentCache(self.path)
+        with self.assertRaises(KeyError):
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, "node")
+
+        (jid, node, info), = run_coroutine(self.c.load())
+
+        self.assertEqual(jid, TEST_JID)
+        self.assertEqual(node, "node")
+        self.assertIsInstance(info, disco_xso.InfoQuery)
+        self.assertIsInstance(
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, "node"),
+            disco_xso.InfoQuery,
+        )
+
+    def test_load_does_not_override_newer_changes(self):
+        self.c.store(TEST_JID, None, self.info)
+        self.c.store(TEST_JID, "node", self.info)
+        run_coroutine(self.c.close())
+
+        self.c = disco_cache.PersistentCache(self.path)
+        self.c.store(TEST_JID, None, disco_xso.InfoQuery(features=["foo"]))
+        self.c.discard(disco_xso.InfoQuery, TEST_JID, "node")
+
+        (jid, node, info), = run_coroutine(self.c.load())
+        self.assertIsNone(node)
+        self.assertSetEqual(set(info.features), {"foo"})
+        with self.assertRaises(KeyError):
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, "node")
+
+    def test_database_is_not_accessed_from_the_loop_thread(self):
+        threads = set()
+
+        def wrap(name):
+            orig = getattr(self.c, name)
+
+            def wrapper(*args):
+                threads.add(threading.current_thread())
+                return orig(*args)
+            return wrapper
+
+        with contextlib.ExitStack() as stack:
+            for name in ["_select_all", "_delete_expired", "_delete_all",
+                         "_write_batch"]:
+                stack.enter_context(unittest.mock.patch.object(
+                    self.c, name, new=wrap(name)
+                ))
+            self.c.store(TEST_JID, None, self.info)
+            run_coroutine(self.c.flush())
+            run_coroutine(self.c.load())
+            run_coroutine(self.c.expire())
+            run_coroutine(self.c.clear())
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_expire_and_clear(self):
+        with unittest.mock.patch("aioxmpp.disco.cache.time.time") as time:
+            time.return_value = 1000
+            self.c.store(TEST_JID, None, self.info)
+            self.c.store(TEST_JID, None, self.items)
+
+            time.return_value = 1050
+            run_coroutine(self.c.expire())
+            with self.assertRaises(KeyError):
+                self.c.lookup(disco_xso.ItemsQuery, TEST_JID, None)
+
+            time.return_value = 0
+            self.assertEqual(len(run_coroutine(self.c.load())), 1)
+
+            run_coroutine(self.c.clear())
+            self.assertEqual(run_coroutine(self.c.load()), [])
+            with self.assertRaises(KeyError):
+                self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+
+    def _count_rows(self):
+        db = sqlite3.connect(self.path)
+        try:
+            return db.execute("SELECT COUNT(*) FROM disco_cache").fetchone()[0]
+        finally:
+            db.close()
+
+    def test_writes_are_deferred_and_batched(self):
+        self.c.writeback_delay = 0.01
+        with unittest.mock.patch.object(
+                self.c, "_write_batch",
+                wraps=self.c._write_batch) as write_batch:
+            for i in range(10):
+                self.c.store(TEST_JID, str(i), self.info)
+            self.c.discard(disco_xso.InfoQuery, TEST_JID, "0")
+
+            self.assertEqual(self._count_rows(), 0)
+            self.c.lookup(disco_xso.InfoQuery, TEST_JID, "1")
+            with self.assertRaises(KeyError):
+                self.c.lookup(disco_xso.InfoQuery, TEST_JID, "0")
+            self.assertEqual(len(run_coroutine(self.c.load())), 9)
+
+            run_coroutine(asyncio.sleep(0.05))
+
+        write_batch.assert_called_once_with(unittest.mock.ANY)
+        self.assertEqual(self._count_rows(), 9)
+        self.assertIsNone(self.c._writeback_task)
+
+    def test_flush(self):
+        self.c.store(TEST_JID, None, self.info)
+        run_coroutine(self.c.flush())
+        self.assertEqual(self._count_rows(), 1)
+
+    def test_failed_writeback_is_logged_and_requeued(self):
+        self.c.writeback_delay = 0
+        self.c.store(TEST_JID, None, self.info)
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(unittest.mock.patch.object(
+                self.c, "_write_batch",
+                side_effect=sqlite3.OperationalError("disk I/O error"),
+            ))
+            logger = stack.enter_context(unittest.mock.patch(
+                "aioxmpp.disco.cache.logger"
+            ))
+            run_coroutine(asyncio.sleep(0.01))
+
+        logger.error.assert_called_once_with(
+            unittest.mock.ANY, 1, exc_info=True,
+        )
+        self.assertIsNone(self.c._writeback_task)
+        self.c.lookup(disco_xso.InfoQuery, TEST_JID, None)
+
+        self.c.store(TEST_JID, "node", self.info)
+        run_coroutine(asyncio.sleep(0.01))
+        self.assertEqual(self._count_rows(), 2)
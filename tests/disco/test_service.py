@@ -30,6 +30,8 @@ import aioxmpp.disco.xso as disco_xso
 import aioxmpp.stanza as stanza
 import aioxmpp.structs as structs
 import aioxmpp.errors as errors
+import aioxmpp.rsm
+import aioxmpp.rsm.xso
 
 from aioxmpp.utils import namespaces
 
@@ -1088,6 +1090,74 @@ class TestDiscoClient(unittest.TestCase):
             self.s.items_cache_size,
         )
 
+    def test_info_cache_ttl(self):
+        self.assertIsNone(self.s.info_cache_ttl)
+
+        self.s.info_cache_ttl = 300
+
+        self.assertEqual(self.s.info_cache_ttl, 300)
+        self.assertEqual(self.s._info_pending.ttl, 300)
+
+    def test_items_cache_ttl(self):
+        self.assertIsNone(self.s.items_cache_ttl)
+
+        self.s.items_cache_ttl = 300
+
+        self.assertEqual(self.s.items_cache_ttl, 300)
+        self.assertEqual(self.s._items_pending.ttl, 300)
+
+    def test_query_info_requeries_after_ttl(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        self.s.info_cache_ttl = 10
+
+        with contextlib.ExitStack() as stack:
+            send_and_decode = stack.enter_context(unittest.mock.patch.object(
+                self.s,
+                "send_and_decode_info_query",
+                new=CoroutineMock()))
+            send_and_decode.return_value = {}
+
+            monotonic = stack.enter_context(unittest.mock.patch(
+                "aioxmpp.cache.time.monotonic"
+            ))
+            monotonic.return_value = 100
+
+            run_coroutine(self.s.query_info(to))
+            run_coroutine(self.s.query_info(to))
+            self.assertEqual(len(send_and_decode.mock_calls), 1)
+
+            monotonic.return_value = 111
+
+            run_coroutine(self.s.query_info(to))
+            self.assertEqual(len(send_and_decode.mock_calls), 2)
+
+    def test_stream_destruction_after_ttl_elapsed(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        self.s.info_cache_ttl = 10
+        self.s.items_cache_ttl = 10
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(unittest.mock.patch.object(
+                self.s,
+                "send_and_decode_info_query",
+                new=CoroutineMock(return_value={})))
+            self.cc.send.return_value = disco_xso.ItemsQuery()
+
+            monotonic = stack.enter_context(unittest.mock.patch(
+                "aioxmpp.cache.time.monotonic"
+            ))
+            monotonic.return_value = 100
+
+            run_coroutine(self.s.query_info(to))
+            run_coroutine(self.s.query_items(to))
+
+            monotonic.return_value = 111
+
+            self.cc.on_stream_destroyed()
+
+        self.assertEqual(len(self.s._info_pending), 0)
+        self.assertEqual(len(self.s._items_pending), 0)
+
     def test_query_info(self):
         to = structs.JID.fromstr("user@foo.example/res1")
         response = {}
@@ -1477,6 +1547,231 @@ class TestDiscoClient(unittest.TestCase):
         self.assertFalse(request_iq.payload.items)
         self.assertIsNone(request_iq.payload.node)
 
+    def test_iter_items_pages_with_rsm(self):
+        to = structs.JID.fromstr("pubsub.foo.example")
+
+        def make_page(nodes, last):
+            page = disco_xso.ItemsQuery(items=[
+                disco_xso.Item(to, node=node)
+                for node in nodes
+            ])
+            if last is not None:
+                page.rsm = aioxmpp.rsm.xso.ResultSetMetadata()
+                page.rsm.last = aioxmpp.rsm.xso.Last()
+                page.rsm.last.value = last
+            return page
+
+        self.cc.send.side_effect = [
+            make_page(["a", "b"], "b"),
+            make_page(["c"], "c"),
+            make_page([], None),
+        ]
+
+        it = self.s.iter_items(to, node="x", page_size=2)
+        self.assertIsInstance(it, aioxmpp.rsm.ResultSetIterator)
+
+        first = run_coroutine(it.get_page())
+        second = run_coroutine(it.get_page())
+        self.assertEqual([item.node for item in first], ["a", "b"])
+        self.assertEqual([item.node for item in second], ["c"])
+        self.assertEqual(run_coroutine(it.get_page()), [])
+
+        self.assertEqual(3, len(self.cc.send.mock_calls))
+        requests = [call[1][0] for call in self.cc.send.mock_calls]
+        for request_iq in requests:
+            self.assertEqual(request_iq.to, to)
+            self.assertEqual(request_iq.type_, structs.IQType.GET)
+            self.assertIsInstance(request_iq.payload, disco_xso.ItemsQuery)
+            self.assertEqual(request_iq.payload.node, "x")
+            self.assertEqual(request_iq.payload.rsm.max_, 2)
+
+        self.assertIsNone(requests[0].payload.rsm.after)
+        self.assertEqual(requests[1].payload.rsm.after.value, "b")
+        self.assertEqual(requests[2].payload.rsm.after.value, "c")
+
+    def test_iter_items_does_not_touch_cache(self):
+        to = structs.JID.fromstr("pubsub.foo.example")
+        self.cc.send.return_value = disco_xso.ItemsQuery()
+
+        run_coroutine(self.s.iter_items(to).get_page())
+        run_coroutine(self.s.query_items(to))
+
+        self.assertEqual(2, len(self.cc.send.mock_calls))
+
+    def test_persistent_cache_defaults_to_None(self):
+        self.assertIsNone(self.s.persistent_cache)
+
+    def test_setting_persistent_cache_warms_memory_cache(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        info = disco_xso.InfoQuery()
+        items = disco_xso.ItemsQuery()
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = [
+            (to, None, info),
+            (to, "node", items),
+        ]
+        self.s.persistent_cache = pc
+
+        self.assertIs(self.s.persistent_cache, pc)
+        pc.load.assert_not_called()
+        run_coroutine(asyncio.sleep(0))
+        pc.load.assert_called_once_with()
+        self.assertIs(run_coroutine(self.s.query_info(to)), info)
+        self.assertIs(run_coroutine(self.s.query_items(to, node="node")),
+                      items)
+        self.cc.send.assert_not_called()
+        pc.lookup.assert_not_called()
+
+    def test_warming_does_not_override_newer_results(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        info = disco_xso.InfoQuery()
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = [(to, None, disco_xso.InfoQuery())]
+        self.s.persistent_cache = pc
+
+        fut = asyncio.Future()
+        fut.set_result(info)
+        self.s.set_info_future(to, None, fut)
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertIs(run_coroutine(self.s.query_info(to)), info)
+
+    def test_replacing_persistent_cache_cancels_warming(self):
+        loaded = asyncio.Future()
+
+        pc1 = unittest.mock.Mock()
+        pc1.load.return_value = loaded
+        self.s.persistent_cache = pc1
+        run_coroutine(asyncio.sleep(0))
+        pc1.load.assert_called_once_with()
+
+        pc2 = unittest.mock.Mock()
+        pc2.load = CoroutineMock()
+        pc2.load.return_value = []
+        self.s.persistent_cache = pc2
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(loaded.cancelled())
+        pc2.load.assert_called_once_with()
+
+    def test_failed_warming_is_logged(self):
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.side_effect = RuntimeError()
+
+        with unittest.mock.patch.object(self.s, "logger") as logger:
+            self.s.persistent_cache = pc
+            run_coroutine(asyncio.sleep(0))
+
+        logger.warning.assert_called_once_with(
+            unittest.mock.ANY, exc_info=True,
+        )
+        self.assertIsNone(self.s._persistent_warmup)
+
+    def test_shutdown_cancels_warming(self):
+        loaded = asyncio.Future()
+        pc = unittest.mock.Mock()
+        pc.load.return_value = loaded
+        self.s.persistent_cache = pc
+        run_coroutine(asyncio.sleep(0))
+
+        run_coroutine(self.s.shutdown())
+        self.assertTrue(loaded.cancelled())
+
+    def test_query_info_consults_persistent_cache(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        info = disco_xso.InfoQuery()
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = []
+        pc.lookup.return_value = info
+        self.s.persistent_cache = pc
+
+        self.assertIs(run_coroutine(self.s.query_info(to, node="foo")), info)
+        pc.lookup.assert_called_once_with(disco_xso.InfoQuery, to, "foo")
+
+        # subsequent queries are served from memory
+        self.assertIs(run_coroutine(self.s.query_info(to, node="foo")), info)
+        pc.lookup.assert_called_once_with(disco_xso.InfoQuery, to, "foo")
+        self.cc.send.assert_not_called()
+
+    def test_query_items_consults_persistent_cache(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        items = disco_xso.ItemsQuery()
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = []
+        pc.lookup.return_value = items
+        self.s.persistent_cache = pc
+
+        self.assertIs(run_coroutine(self.s.query_items(to)), items)
+        pc.lookup.assert_called_once_with(disco_xso.ItemsQuery, to, None)
+        self.cc.send.assert_not_called()
+
+    def test_query_results_are_persisted(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+        info = disco_xso.InfoQuery()
+        items = disco_xso.ItemsQuery()
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = []
+        pc.lookup.side_effect = KeyError()
+        self.s.persistent_cache = pc
+
+        self.cc.send.return_value = info
+        run_coroutine(self.s.query_info(to))
+        self.cc.send.return_value = items
+        run_coroutine(self.s.query_items(to, node="foo"))
+
+        self.assertSequenceEqual(
+            pc.store.mock_calls,
+            [
+                unittest.mock.call(to, None, info),
+                unittest.mock.call(to, "foo", items),
+            ]
+        )
+
+    def test_failed_and_uncached_queries_are_not_persisted(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = []
+        pc.lookup.side_effect = KeyError()
+        self.s.persistent_cache = pc
+
+        self.cc.send.side_effect = errors.XMPPCancelError(
+            (namespaces.stanzas, "feature-not-implemented")
+        )
+        with self.assertRaises(errors.XMPPCancelError):
+            run_coroutine(self.s.query_info(to))
+
+        self.cc.send.side_effect = None
+        self.cc.send.return_value = disco_xso.InfoQuery()
+        run_coroutine(self.s.query_info(to, node="caps", no_cache=True))
+
+        pc.store.assert_not_called()
+
+    def test_set_info_future_discards_persisted_entry(self):
+        to = structs.JID.fromstr("user@foo.example/res1")
+
+        pc = unittest.mock.Mock()
+        pc.load = CoroutineMock()
+        pc.load.return_value = []
+        self.s.persistent_cache = pc
+
+        fut = asyncio.Future()
+        self.s.set_info_future(to, None, fut)
+
+        pc.discard.assert_called_once_with(disco_xso.InfoQuery, to, None)
+
     def test_query_items_with_node(self):
         to = structs.JID.fromstr("user@foo.example/res1")
         response = disco_xso.ItemsQuery()
@@ -23,6 +23,7 @@ import unittest
 
 import aioxmpp.disco.xso as disco_xso
 import aioxmpp.forms.xso as forms_xso
+import aioxmpp.rsm.xso as rsm_xso
 import aioxmpp.structs as structs
 import aioxmpp.stanza as stanza
 import aioxmpp.xso as xso
@@ -629,6 +630,16 @@ class TestItemsQuery(unittest.TestCase):
             set(disco_xso.ItemsQuery.items._classes)
         )
 
+    def test_rsm(self):
+        self.assertIsInstance(
+            disco_xso.ItemsQuery.rsm,
+            xso.Child
+        )
+        self.assertSetEqual(
+            {rsm_xso.ResultSetMetadata},
+            set(disco_xso.ItemsQuery.rsm._classes)
+        )
+
     def test_registered_at_IQ(self):
         self.assertIn(
             disco_xso.ItemsQuery.TAG,
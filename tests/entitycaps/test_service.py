@@ -28,6 +28,7 @@ import unittest
 import unittest.mock
 
 import aioxmpp.disco as disco
+import aioxmpp.errors
 import aioxmpp.service as service
 import aioxmpp.stanza as stanza
 import aioxmpp.structs as structs
@@ -488,6 +489,258 @@ class TestCache(unittest.TestCase):
 
             self.assertTrue((p / key.path).is_file())
 
+    def test_memory_overlay_is_bounded(self):
+        self.assertEqual(self.c.memory_overlay_size, 4096)
+        self.c.memory_overlay_size = 2
+
+        keys = [unittest.mock.Mock() for i in range(3)]
+        for key in keys:
+            self.c.add_cache_entry(key, disco.xso.InfoQuery())
+
+        with self.assertRaises(KeyError):
+            self.c.lookup_in_database(keys[0])
+
+        self.c.lookup_in_database(keys[1])
+        self.c.lookup_in_database(keys[2])
+
+    def test_indexed_user_db_used_in_lookup(self):
+        db = unittest.mock.Mock()
+        db.lookup.return_value = aioxmpp.xml.serialize_single_xso(
+            TEST_DB_ENTRY
+        ).encode("utf-8")
+        self.c.set_user_db(db)
+
+        key = unittest.mock.Mock()
+        result = self.c.lookup_in_database(key)
+
+        db.lookup.assert_called_once_with(key)
+        self.assertIsInstance(result, disco.xso.InfoQuery)
+        self.assertSetEqual(set(result.features), set(TEST_DB_ENTRY.features))
+
+        # the result is kept in the memory overlay
+        self.assertIs(self.c.lookup_in_database(key), result)
+        db.lookup.assert_called_once_with(key)
+
+    def test_indexed_user_db_miss_falls_back_to_user_db_path(self):
+        db = unittest.mock.Mock()
+        db.lookup.side_effect = KeyError()
+        self.c.set_user_db(db)
+
+        with self.assertRaises(KeyError):
+            self.c.lookup_in_database(unittest.mock.Mock())
+
+    def test_add_cache_entry_batches_writeback_to_indexed_user_db(self):
+        db = unittest.mock.Mock()
+        self.c.set_user_db(db)
+        self.c.writeback_delay = 0.01
+
+        entries = []
+        for i in range(3):
+            q = disco.xso.InfoQuery(features=["feature{}".format(i)])
+            q.captured_events = [
+                ("start", q.TAG[0], q.TAG[1], {}),
+                ("end",)
+            ]
+            entries.append((unittest.mock.Mock(), q))
+
+        p = unittest.mock.MagicMock()
+        self.c.set_user_db_path(p)
+
+        for key, q in entries:
+            self.c.add_cache_entry(key, q)
+
+        db.store_many.assert_not_called()
+
+        run_coroutine(asyncio.sleep(0.05))
+
+        db.store_many.assert_called_once_with(unittest.mock.ANY)
+        _, (stored, ), _ = db.store_many.mock_calls[0]
+        stored = list(stored)
+        self.assertSequenceEqual(
+            [key for key, _ in stored],
+            [key for key, _ in entries],
+        )
+        for _, data in stored:
+            self.assertIsInstance(
+                aioxmpp.xml.read_single_xso(io.BytesIO(data),
+                                            disco.xso.InfoQuery),
+                disco.xso.InfoQuery,
+            )
+
+        # no per-file writeback if an indexed database is used
+        p.__truediv__.assert_not_called()
+
+    def _make_entry(self, feature):
+        q = disco.xso.InfoQuery(features=[feature])
+        q.captured_events = [("start", q.TAG[0], q.TAG[1], {}), ("end",)]
+        return q
+
+    def test_flush_writes_pending_entries_without_delay(self):
+        db = unittest.mock.Mock()
+        self.c.set_user_db(db)
+        self.c.writeback_delay = 10
+
+        key = unittest.mock.Mock()
+        self.c.add_cache_entry(key, self._make_entry("feature"))
+        run_coroutine(self.c.flush())
+
+        db.store_many.assert_called_once_with(unittest.mock.ANY)
+        _, (stored, ), _ = db.store_many.mock_calls[0]
+        self.assertEqual([k for k, _ in stored], [key])
+        self.assertIsNone(self.c._writeback_task)
+        self.assertFalse(self.c._pending_writes)
+
+    def test_flush_waits_for_batch_being_written(self):
+        db = unittest.mock.Mock()
+        self.c.set_user_db(db)
+        self.c.writeback_delay = 0
+
+        key1 = unittest.mock.Mock()
+        key2 = unittest.mock.Mock()
+
+        self.c.add_cache_entry(key1, self._make_entry("feature1"))
+        # let the task start writing the first batch
+        run_coroutine(asyncio.sleep(0))
+        run_coroutine(asyncio.sleep(0))
+        self.c.add_cache_entry(key2, self._make_entry("feature2"))
+
+        run_coroutine(self.c.flush())
+
+        stored_keys = [
+            key
+            for _, (stored, ), _ in db.store_many.mock_calls
+            for key, _ in stored
+        ]
+        self.assertCountEqual(stored_keys, [key1, key2])
+        self.assertIsNone(self.c._writeback_task)
+
+    def test_flush_raises_and_keeps_entries_on_failure(self):
+        db = unittest.mock.Mock()
+        db.store_many.side_effect = OSError()
+        self.c.set_user_db(db)
+        self.c.writeback_delay = 10
+
+        key = unittest.mock.Mock()
+        self.c.add_cache_entry(key, self._make_entry("feature"))
+
+        with unittest.mock.patch.object(entitycaps_service, "logger"):
+            with self.assertRaises(OSError):
+                run_coroutine(self.c.flush())
+
+        self.assertIn(key, self.c._pending_writes)
+
+    def test_flush_without_pending_entries(self):
+        run_coroutine(self.c.flush())
+
+    def test_failed_writeback_is_logged_and_requeued(self):
+        db = unittest.mock.Mock()
+        db.store_many.side_effect = OSError()
+        self.c.set_user_db(db)
+        self.c.writeback_delay = 0.01
+
+        key1 = unittest.mock.Mock()
+        q1 = disco.xso.InfoQuery(features=["feature1"])
+        q1.captured_events = [("start", q1.TAG[0], q1.TAG[1], {}), ("end",)]
+
+        with unittest.mock.patch.object(
+                entitycaps_service, "logger") as logger:
+            self.c.add_cache_entry(key1, q1)
+            run_coroutine(asyncio.sleep(0.05))
+
+        db.store_many.assert_called_once_with(unittest.mock.ANY)
+        logger.error.assert_called_once_with(
+            unittest.mock.ANY, 1, exc_info=True,
+        )
+        self.assertIsNone(self.c._writeback_task)
+
+        db.store_many.side_effect = None
+        db.store_many.reset_mock()
+
+        key2 = unittest.mock.Mock()
+        q2 = disco.xso.InfoQuery(features=["feature2"])
+        q2.captured_events = [("start", q2.TAG[0], q2.TAG[1], {}), ("end",)]
+
+        self.c.add_cache_entry(key2, q2)
+        run_coroutine(asyncio.sleep(0.05))
+
+        db.store_many.assert_called_once_with(unittest.mock.ANY)
+        _, (stored, ), _ = db.store_many.mock_calls[0]
+        self.assertCountEqual(
+            [key for key, _ in stored],
+            [key1, key2],
+        )
+
+
+class TestIndexedDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmpdir.name)
+        self.db = entitycaps_service.IndexedDatabase(self.path / "caps.db")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_lookup_raises_KeyError_for_unknown_key(self):
+        key = unittest.mock.Mock()
+        key.path = pathlib.Path("hashes") / "foo.xml"
+        with self.assertRaises(KeyError):
+            self.db.lookup(key)
+
+    def test_store_many_and_lookup(self):
+        key1 = unittest.mock.Mock()
+        key1.path = pathlib.Path("hashes") / "foo.xml"
+        key2 = unittest.mock.Mock()
+        key2.path = pathlib.Path("caps2") / "bar.xml"
+
+        self.db.store_many([(key1, b"<foo/>"), (key2, b"<bar/>")])
+
+        self.assertEqual(self.db.lookup(key1), b"<foo/>")
+        self.assertEqual(self.db.lookup(key2), b"<bar/>")
+
+        self.db.store_many([(key1, b"<baz/>")])
+        self.assertEqual(self.db.lookup(key1), b"<baz/>")
+
+    def test_import_directory(self):
+        src = self.path / "userdb"
+        key1 = unittest.mock.Mock()
+        key1.path = pathlib.Path("hashes") / "foo.xml"
+        key2 = unittest.mock.Mock()
+        key2.path = pathlib.Path("caps2") / "sha-256" / "ab" / "cd" / "x.xml"
+
+        for key, data in [(key1, b"<foo/>"), (key2, b"<bar/>")]:
+            (src / key.path).parent.mkdir(parents=True, exist_ok=True)
+            with (src / key.path).open("wb") as f:
+                f.write(data)
+
+        self.assertEqual(self.db.import_directory(src), 2)
+
+        self.assertEqual(self.db.lookup(key1), b"<foo/>")
+        self.assertEqual(self.db.lookup(key2), b"<bar/>")
+
+    def test_cache_round_trip(self):
+        c = entitycaps_service.Cache()
+        c.set_user_db(self.db)
+        c.writeback_delay = 0
+
+        key = unittest.mock.Mock()
+        key.path = pathlib.Path("hashes") / "foo.xml"
+        q = disco.xso.InfoQuery(features=["foo"])
+        q.captured_events = [
+            ("start", q.TAG[0], q.TAG[1], {}),
+            ("start", q.TAG[0], "feature", {(None, "var"): "foo"}),
+            ("end",),
+            ("end",),
+        ]
+
+        c.add_cache_entry(key, q)
+        run_coroutine(asyncio.sleep(0.05))
+
+        c = entitycaps_service.Cache()
+        c.set_user_db(self.db)
+        result = c.lookup_in_database(key)
+        self.assertSetEqual(set(result.features), {"foo"})
+
 
 class TestService(unittest.TestCase):
     def setUp(self):
@@ -1131,6 +1384,313 @@ class TestService(unittest.TestCase):
 
         self.assertIs(result, unittest.mock.sentinel.query_result)
 
+    def test_max_concurrent_queries(self):
+        self.assertEqual(self.s.max_concurrent_queries, 8)
+        self.s.max_concurrent_queries = 2
+        self.assertEqual(self.s.max_concurrent_queries, 2)
+
+        with self.assertRaisesRegex(ValueError, "must be positive"):
+            self.s.max_concurrent_queries = 0
+
+    def test_query_and_cache_limits_concurrent_queries(self):
+        self.s.max_concurrent_queries = 2
+
+        responses = {}
+
+        @asyncio.coroutine
+        def query_info(jid, **kwargs):
+            fut = asyncio.Future()
+            responses[jid] = fut
+            return (yield from fut)
+
+        self.disco_client.query_info = unittest.mock.Mock(
+            side_effect=query_info
+        )
+
+        jids = [
+            structs.JID.fromstr("foo{}@bar.example/r1".format(i))
+            for i in range(3)
+        ]
+        tasks = []
+        for jid in jids:
+            key = unittest.mock.Mock()
+            key.verify.return_value = True
+            tasks.append(asyncio.ensure_future(
+                self.s.query_and_cache(jid, key, asyncio.Future())
+            ))
+
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(len(self.disco_client.query_info.mock_calls), 2)
+        self.assertEqual(self.s.queries_in_flight, 2)
+        self.assertEqual(self.s.queries_queued, 1)
+
+        responses[jids[0]].set_result(TEST_DB_ENTRY)
+        run_coroutine(asyncio.sleep(0))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(len(self.disco_client.query_info.mock_calls), 3)
+        self.assertIn(jids[2], responses)
+        self.assertEqual(self.s.queries_in_flight, 2)
+        self.assertEqual(self.s.queries_queued, 0)
+
+        responses[jids[1]].set_exception(RuntimeError())
+        responses[jids[2]].set_result(TEST_DB_ENTRY)
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(self.s.queries_in_flight, 0)
+        self.assertTrue(all(task.done() for task in tasks))
+        with self.assertRaises(RuntimeError):
+            tasks[1].result()
+
+    def test_query_and_cache_fails_future_with_ValueError_on_error(self):
+        self.disco_client.query_info.side_effect = RuntimeError()
+        fut = asyncio.Future()
+
+        with self.assertRaises(RuntimeError):
+            run_coroutine(self.s.query_and_cache(
+                TEST_FROM,
+                unittest.mock.Mock(),
+                fut,
+            ))
+
+        self.assertIsInstance(fut.exception(), ValueError)
+        self.assertEqual(self.s.queries_in_flight, 0)
+
+    def test_query_and_cache_fails_future_if_cancelled_while_queued(self):
+        self.s.max_concurrent_queries = 1
+        blocker = asyncio.Future()
+
+        @asyncio.coroutine
+        def query_info(jid, **kwargs):
+            return (yield from blocker)
+
+        self.disco_client.query_info = unittest.mock.Mock(
+            side_effect=query_info
+        )
+
+        first = asyncio.ensure_future(self.s.query_and_cache(
+            TEST_FROM, unittest.mock.Mock(), asyncio.Future(),
+        ))
+        key = unittest.mock.Mock()
+        fut = self.s.cache.create_query_future(key)
+        queued = asyncio.ensure_future(self.s.query_and_cache(
+            TEST_FROM, key, fut,
+        ))
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(self.s.queries_queued, 1)
+
+        queued.cancel()
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertIsInstance(fut.exception(), ValueError)
+        self.assertNotIn(key, self.s.cache._lookup_cache)
+        self.assertEqual(self.s.queries_queued, 0)
+        self.assertNotIn(key, self.s._query_candidates)
+
+        # lookups of the hash do not hang
+        with self.assertRaises(KeyError):
+            run_coroutine(self.s.cache.lookup(key))
+
+        first.cancel()
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(self.s.queries_in_flight, 0)
+
+    def test_query_and_cache_fails_future_if_cancelled_in_flight(self):
+        self.disco_client.query_info = CoroutineMock()
+        self.disco_client.query_info.side_effect = asyncio.CancelledError()
+        fut = asyncio.Future()
+
+        with self.assertRaises(asyncio.CancelledError):
+            run_coroutine(self.s.query_and_cache(
+                TEST_FROM,
+                unittest.mock.Mock(),
+                fut,
+            ))
+
+        self.assertIsInstance(fut.exception(), ValueError)
+        self.assertEqual(self.s.queries_in_flight, 0)
+
+    def test_queued_query_prefers_peer_which_answered_before(self):
+        self.s.max_concurrent_queries = 1
+        responsive = structs.JID.fromstr("responsive@bar.example/r1")
+        other = structs.JID.fromstr("other@bar.example/r1")
+        blocker = asyncio.Future()
+
+        @asyncio.coroutine
+        def query_info(jid, **kwargs):
+            if jid == TEST_FROM:
+                return (yield from blocker)
+            return TEST_DB_ENTRY
+
+        self.disco_client.query_info = unittest.mock.Mock(
+            side_effect=query_info
+        )
+
+        # responsive answers a query once
+        run_coroutine(self.s.query_and_cache(
+            responsive, unittest.mock.Mock(), asyncio.Future(),
+        ))
+
+        # occupy the only slot
+        blocking_key = unittest.mock.Mock()
+        blocking = asyncio.ensure_future(self.s.query_and_cache(
+            TEST_FROM, blocking_key, asyncio.Future(),
+        ))
+        run_coroutine(asyncio.sleep(0))
+
+        key = unittest.mock.Mock()
+        key.verify.return_value = True
+        tasks = [
+            asyncio.ensure_future(self.s.lookup_info(jid, [key]))
+            for jid in [other, responsive]
+        ]
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(self.s.queries_queued, 1)
+
+        blocker.set_result(TEST_DB_ENTRY)
+        run_coroutine(blocking)
+
+        for task in tasks:
+            self.assertIs(run_coroutine(task), TEST_DB_ENTRY)
+
+        self.assertEqual(
+            [call[1][0] for call in self.disco_client.query_info.mock_calls],
+            [responsive, TEST_FROM, responsive],
+        )
+        self.assertFalse(self.s._query_candidates)
+
+    def test_query_and_cache_retries_with_next_candidate(self):
+        other_jid = structs.JID.fromstr("other@bar.example/r1")
+        key = unittest.mock.Mock()
+        key.verify.return_value = True
+        first_response = asyncio.Future()
+
+        @asyncio.coroutine
+        def query_info(jid, **kwargs):
+            if jid == TEST_FROM:
+                return (yield from first_response)
+            return TEST_DB_ENTRY
+
+        self.disco_client.query_info = unittest.mock.Mock(
+            side_effect=query_info
+        )
+
+        first = asyncio.ensure_future(self.s.lookup_info(TEST_FROM, [key]))
+        run_coroutine(asyncio.sleep(0))
+        second = asyncio.ensure_future(self.s.lookup_info(other_jid, [key]))
+        run_coroutine(asyncio.sleep(0))
+
+        # the second entity waits for the first query
+        self.assertEqual(len(self.disco_client.query_info.mock_calls), 1)
+
+        first_response.set_exception(
+            aioxmpp.errors.XMPPCancelError(
+                (namespaces.stanzas, "service-unavailable")
+            )
+        )
+
+        # the first query is retried with the waiting entity, which then
+        # uses the result instead of querying itself
+        self.assertIs(run_coroutine(first), TEST_DB_ENTRY)
+        self.assertIs(run_coroutine(second), TEST_DB_ENTRY)
+
+        self.assertEqual(
+            [call[1][0] for call in self.disco_client.query_info.mock_calls],
+            [TEST_FROM, other_jid],
+        )
+        self.assertFalse(self.s._query_candidates)
+        self.assertSetEqual(
+            set(self.s.cache.lookup_in_database(key).features),
+            set(TEST_DB_ENTRY.features),
+        )
+
+    def test_failed_query_does_not_cause_redundant_queries(self):
+        waiting_jids = [
+            structs.JID.fromstr("other{}@bar.example/r1".format(i))
+            for i in range(5)
+        ]
+        key = unittest.mock.Mock()
+        key.verify.return_value = True
+        first_response = asyncio.Future()
+
+        @asyncio.coroutine
+        def query_info(jid, **kwargs):
+            if jid == TEST_FROM:
+                return (yield from first_response)
+            return TEST_DB_ENTRY
+
+        self.disco_client.query_info = unittest.mock.Mock(
+            side_effect=query_info
+        )
+
+        tasks = [asyncio.ensure_future(self.s.lookup_info(TEST_FROM, [key]))]
+        run_coroutine(asyncio.sleep(0))
+        tasks.extend(
+            asyncio.ensure_future(self.s.lookup_info(jid, [key]))
+            for jid in waiting_jids
+        )
+        run_coroutine(asyncio.sleep(0))
+
+        first_response.set_exception(RuntimeError())
+
+        for task in tasks:
+            self.assertIs(run_coroutine(task), TEST_DB_ENTRY)
+
+        # a single retry instead of one query per waiting entity
+        self.assertEqual(
+            [call[1][0] for call in self.disco_client.query_info.mock_calls],
+            [TEST_FROM, waiting_jids[0]],
+        )
+
+    def test_queued_query_uses_entry_cached_while_waiting(self):
+        self.s.max_concurrent_queries = 1
+        blocker = asyncio.Future()
+
+        @asyncio.coroutine
+        def query_info(jid, **kwargs):
+            return (yield from blocker)
+
+        self.disco_client.query_info = unittest.mock.Mock(
+            side_effect=query_info
+        )
+
+        key = unittest.mock.Mock()
+        key.verify.return_value = True
+        first = asyncio.ensure_future(self.s.query_and_cache(
+            TEST_FROM, key, asyncio.Future(),
+        ))
+        fut = asyncio.Future()
+        queued = asyncio.ensure_future(self.s.query_and_cache(
+            structs.JID.fromstr("other@bar.example/r1"), key, fut,
+        ))
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(self.s.queries_queued, 1)
+
+        blocker.set_result(TEST_DB_ENTRY)
+        run_coroutine(first)
+
+        result = run_coroutine(queued)
+        self.assertIs(fut.result(), result)
+        self.assertSetEqual(set(result.features), set(TEST_DB_ENTRY.features))
+        self.assertEqual(len(self.disco_client.query_info.mock_calls), 1)
+
+    def test_query_and_cache_raises_when_all_candidates_failed(self):
+        other_jid = structs.JID.fromstr("other@bar.example/r1")
+        self.disco_client.query_info.side_effect = RuntimeError()
+        key = unittest.mock.Mock()
+        fut = asyncio.Future()
+        self.s._query_candidates[key] = [other_jid]
+
+        with self.assertRaises(RuntimeError):
+            run_coroutine(self.s.query_and_cache(TEST_FROM, key, fut))
+
+        self.assertEqual(
+            [call[1][0] for call in self.disco_client.query_info.mock_calls],
+            [TEST_FROM, other_jid],
+        )
+        self.assertIsInstance(fut.exception(), ValueError)
+
     def test_update_hash(self):
         base = unittest.mock.Mock()
 
@@ -1824,6 +2384,77 @@ class TestService(unittest.TestCase):
             self.s.update_hash
         )
 
+    def test__info_changed_coalesces_changes(self):
+        with contextlib.ExitStack() as stack:
+            get_event_loop = stack.enter_context(unittest.mock.patch(
+                "asyncio.get_event_loop"
+            ))
+
+            self.s._info_changed()
+            self.s._info_changed()
+            self.s._info_changed()
+
+        get_event_loop().call_soon.assert_called_once_with(
+            self.s.update_hash
+        )
+
+    def test__info_changed_reschedules_after_update_hash(self):
+        with contextlib.ExitStack() as stack:
+            get_event_loop = stack.enter_context(unittest.mock.patch(
+                "asyncio.get_event_loop"
+            ))
+
+            self.s._info_changed()
+            self.s.update_hash()
+            self.s._info_changed()
+
+        self.assertEqual(len(get_event_loop().call_soon.mock_calls), 2)
+
+    def test__info_changed_debounces_with_rehash_delay(self):
+        self.s.rehash_delay = 0.5
+
+        with contextlib.ExitStack() as stack:
+            get_event_loop = stack.enter_context(unittest.mock.patch(
+                "asyncio.get_event_loop"
+            ))
+
+            self.s._info_changed()
+            handle = get_event_loop().call_later()
+            get_event_loop().call_later.reset_mock()
+
+            self.s._info_changed()
+
+        handle.cancel.assert_called_once_with()
+        get_event_loop().call_later.assert_called_once_with(
+            0.5,
+            self.s.update_hash,
+        )
+        get_event_loop().call_soon.assert_not_called()
+
+    def test_burst_of_feature_changes_emits_on_ver_changed_once(self):
+        disco_server = disco.DiscoServer(self.cc)
+        s = entitycaps_service.EntityCapsService(
+            self.cc,
+            dependencies={
+                disco.DiscoClient: self.disco_client,
+                disco.DiscoServer: disco_server,
+            }
+        )
+        run_coroutine(asyncio.sleep(0))
+
+        on_ver_changed = unittest.mock.Mock()
+        s.on_ver_changed.connect(on_ver_changed)
+
+        with unittest.mock.patch.object(
+                s, "update_hash",
+                wraps=s.update_hash) as update_hash:
+            for i in range(10):
+                disco_server.register_feature("urn:example:{}".format(i))
+            run_coroutine(asyncio.sleep(0))
+
+        update_hash.assert_called_once_with()
+        on_ver_changed.assert_called_once_with()
+
     def test_handle_outbound_presence_inserts_keys(self):
         base = unittest.mock.Mock()
         self.impl115.calculate_keys.return_value = iter([
@@ -1895,6 +2526,25 @@ class TestService(unittest.TestCase):
         self.s.handle_outbound_presence(presence)
         self.impl115.put_keys.assert_not_called()
 
+    def test_shutdown_flushes_cache(self):
+        c = unittest.mock.Mock()
+        c.flush = CoroutineMock()
+        self.s.cache = c
+
+        run_coroutine(self.s._shutdown())
+
+        c.flush.assert_called_once_with()
+
+    def test_shutdown_ignores_flush_errors(self):
+        c = unittest.mock.Mock()
+        c.flush = CoroutineMock()
+        c.flush.side_effect = OSError()
+        self.s.cache = c
+
+        run_coroutine(self.s._shutdown())
+
+        c.flush.assert_called_once_with()
+
 
 class Testwriteback(unittest.TestCase):
     def test_uses_tempfile_atomically_and_serialises_xso(self):
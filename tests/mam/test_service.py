@@ -0,0 +1,445 @@
+########################################################################
+# File name: test_service.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import unittest
+import unittest.mock
+
+from datetime import datetime, timedelta
+
+import aioxmpp
+import aioxmpp.errors
+import aioxmpp.forms
+import aioxmpp.misc
+import aioxmpp.mam.service as mam_service
+import aioxmpp.mam.xso as mam_xso
+import aioxmpp.rsm
+import aioxmpp.rsm.xso as rsm_xso
+import aioxmpp.service
+import aioxmpp.xso
+
+from aioxmpp.utils import namespaces
+
+from aioxmpp.testutils import (
+    make_connected_client,
+    run_coroutine,
+)
+
+
+TEST_JID = aioxmpp.JID.fromstr("romeo@montague.lit/foo")
+TEST_ARCHIVE = aioxmpp.JID.fromstr("coven@chat.shakespeare.lit")
+TEST_START = datetime(2017, 1, 1)
+
+
+class FakeArchive:
+    """
+    Answer :class:`~.mam_xso.Query` IQs from a list of messages, delivering
+    the results through the inbound message filter of the service.
+    """
+
+    def __init__(self, service, count, *,
+                 from_=None, interval=timedelta(minutes=1), latency=0):
+        self.service = service
+        self.from_ = from_
+        self.latency = latency
+        self.messages = [
+            (TEST_START + interval * i, "id{}".format(i))
+            for i in range(count)
+        ]
+        self.queries = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _filter(self, query):
+        fields = {}
+        if query.form is not None:
+            fields = {
+                field.var: field.values[0]
+                for field in query.form.fields
+            }
+        dt = aioxmpp.xso.DateTime()
+        result = self.messages
+        if "start" in fields:
+            start = dt.parse(fields["start"])
+            result = [m for m in result if m[0] >= start]
+        if "end" in fields:
+            end = dt.parse(fields["end"])
+            result = [m for m in result if m[0] <= end]
+        return result
+
+    def _make_message(self, queryid, stamp, id_):
+        msg = aioxmpp.Message(
+            type_=aioxmpp.MessageType.NORMAL,
+            from_=self.from_,
+        )
+        msg.xep0313_result = mam_xso.Result()
+        msg.xep0313_result.queryid = queryid
+        msg.xep0313_result.id_ = id_
+        msg.xep0313_result.forwarded = aioxmpp.misc.Forwarded()
+        msg.xep0313_result.forwarded.delay = aioxmpp.misc.Delay()
+        msg.xep0313_result.forwarded.delay.stamp = stamp
+        msg.xep0313_result.forwarded.stanza = aioxmpp.Message(
+            type_=aioxmpp.MessageType.CHAT,
+        )
+        return msg
+
+    @asyncio.coroutine
+    def send(self, iq):
+        query = iq.payload
+        self.queries.append(iq)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield from asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        matching = self._filter(query)
+        start = 0
+        if query.rsm is not None and query.rsm.after is not None:
+            start = [id_ for _, id_ in matching].index(
+                query.rsm.after.value
+            ) + 1
+        max_ = len(matching)
+        if query.rsm is not None and query.rsm.max_ is not None:
+            max_ = query.rsm.max_
+        page = matching[start:start+max_]
+
+        for stamp, id_ in page:
+            result = self.service._filter_inbound_message(
+                self._make_message(query.queryid, stamp, id_)
+            )
+            assert result is None
+
+        fin = mam_xso.Fin()
+        fin.complete = start + len(page) >= len(matching)
+        fin.rsm = rsm_xso.ResultSetMetadata()
+        fin.rsm.count = len(matching)
+        if page:
+            fin.rsm.first = rsm_xso.First()
+            fin.rsm.first.value = page[0][1]
+            fin.rsm.last = rsm_xso.Last()
+            fin.rsm.last.value = page[-1][1]
+        return fin
+
+
+@asyncio.coroutine
+def collect(stream):
+    result = []
+    while True:
+        page = yield from stream.get_page()
+        if not page:
+            return result
+        result.extend(page)
+
+
+class TestMAMClient(unittest.TestCase):
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = TEST_JID
+        self.s = mam_service.MAMClient(self.cc)
+        self.archive = FakeArchive(self.s, 25)
+        # CoroutineMock does not run coroutine side effects
+        self.cc.send = unittest.mock.Mock(side_effect=self.archive.send)
+
+    def tearDown(self):
+        del self.s
+        del self.cc
+
+    def test_is_service(self):
+        self.assertTrue(issubclass(
+            mam_service.MAMClient,
+            aioxmpp.service.Service,
+        ))
+
+    def test_exported(self):
+        self.assertIs(aioxmpp.MAMClient, mam_service.MAMClient)
+
+    def test_filter_passes_unrelated_messages(self):
+        msg = aioxmpp.Message(type_=aioxmpp.MessageType.CHAT)
+        self.assertIs(self.s._filter_inbound_message(msg), msg)
+
+    def test_filter_passes_results_of_unknown_queries(self):
+        msg = self.archive._make_message("foo", TEST_START, "id0")
+        self.assertIs(self.s._filter_inbound_message(msg), msg)
+
+    def test_filter_rejects_results_from_foreign_entity(self):
+        self.s._queries["foo"] = None, []
+        msg = self.archive._make_message("foo", TEST_START, "id0")
+        msg.from_ = TEST_ARCHIVE
+        self.assertIs(self.s._filter_inbound_message(msg), msg)
+        self.assertEqual(self.s._queries["foo"][1], [])
+
+        msg.from_ = TEST_JID.bare()
+        self.assertIsNone(self.s._filter_inbound_message(msg))
+        self.assertEqual(self.s._queries["foo"][1],
+                         [msg.xep0313_result])
+
+    def test_iter_archive_sends_query(self):
+        it = self.s.iter_archive(
+            TEST_ARCHIVE,
+            with_=TEST_JID.bare(),
+            start=TEST_START,
+            end=TEST_START + timedelta(hours=1),
+            node="foo",
+            page_size=10,
+        )
+        self.archive.from_ = TEST_ARCHIVE
+        self.assertIsInstance(it, aioxmpp.rsm.ResultSetIterator)
+        run_coroutine(it.get_page())
+        it.close()
+
+        iq = self.archive.queries[0]
+        self.assertEqual(iq.to, TEST_ARCHIVE)
+        self.assertEqual(iq.type_, aioxmpp.IQType.SET)
+        self.assertIsInstance(iq.payload, mam_xso.Query)
+        self.assertTrue(iq.payload.queryid)
+        self.assertEqual(iq.payload.node, "foo")
+        self.assertEqual(iq.payload.rsm.max_, 10)
+
+        form = iq.payload.form
+        self.assertEqual(form.type_, aioxmpp.forms.DataType.SUBMIT)
+        self.assertEqual(
+            [(field.var, field.type_, field.values[:])
+             for field in form.fields],
+            [
+                ("FORM_TYPE", aioxmpp.forms.FieldType.HIDDEN,
+                 [namespaces.xep0313_mam]),
+                ("with", aioxmpp.forms.FieldType.JID_SINGLE,
+                 [str(TEST_JID.bare())]),
+                ("start", aioxmpp.forms.FieldType.TEXT_SINGLE,
+                 ["2017-01-01T00:00:00"]),
+                ("end", aioxmpp.forms.FieldType.TEXT_SINGLE,
+                 ["2017-01-01T01:00:00"]),
+            ]
+        )
+
+    def test_iter_archive_without_filter_omits_form(self):
+        run_coroutine(self.s.iter_archive().get_page())
+        iq = self.archive.queries[0]
+        self.assertIsNone(iq.to)
+        self.assertIsNone(iq.payload.form)
+
+    def test_iter_archive_pages_through_archive(self):
+        it = self.s.iter_archive(page_size=10)
+        results = run_coroutine(collect(it))
+
+        self.assertEqual(
+            [result.id_ for result in results],
+            ["id{}".format(i) for i in range(25)],
+        )
+        # the last page is marked complete, no additional query is needed
+        self.assertEqual(len(self.archive.queries), 3)
+        self.assertFalse(self.s._queries)
+
+    def test_iter_archive_emits_page_stats(self):
+        stats = []
+        self.s.on_page_fetched.connect(stats.append)
+
+        run_coroutine(collect(self.s.iter_archive(page_size=10)))
+
+        self.assertEqual(len(stats), 3)
+        self.assertEqual([s.count for s in stats], [10, 10, 5])
+        for s, iq in zip(stats, self.archive.queries):
+            self.assertIsInstance(s, mam_service.PageStats)
+            self.assertIsNone(s.archive)
+            self.assertEqual(s.queryid, iq.payload.queryid)
+            self.assertGreaterEqual(s.elapsed, 0)
+
+    def test_iter_archive_unregisters_query_on_error(self):
+        exc = aioxmpp.errors.XMPPCancelError(
+            condition=(namespaces.stanzas, "feature-not-implemented"),
+        )
+        self.cc.send.side_effect = exc
+
+        with self.assertRaises(aioxmpp.errors.XMPPCancelError):
+            run_coroutine(self.s.iter_archive().get_page())
+
+        self.assertFalse(self.s._queries)
+
+    def test_fetch_range_validates_arguments(self):
+        with self.assertRaisesRegex(ValueError, "parallelism"):
+            self.s.fetch_range(TEST_START, TEST_START + timedelta(1),
+                               parallelism=0)
+
+        with self.assertRaisesRegex(ValueError, "end"):
+            self.s.fetch_range(TEST_START, TEST_START)
+
+    def test_fetch_range_splits_range(self):
+        stream = self.s.fetch_range(
+            TEST_START,
+            TEST_START + timedelta(minutes=24),
+            parallelism=3,
+            page_size=5,
+        )
+        self.assertIsInstance(stream, mam_service.ArchiveStream)
+        results = run_coroutine(collect(stream))
+
+        self.assertEqual(
+            [result.id_ for result in results],
+            ["id{}".format(i) for i in range(25)],
+        )
+
+        bounds = set()
+        for iq in self.archive.queries:
+            fields = {
+                field.var: field.values[0]
+                for field in iq.payload.form.fields
+            }
+            bounds.add((fields["start"], fields["end"]))
+
+        self.assertSetEqual(
+            bounds,
+            {
+                ("2017-01-01T00:00:00", "2017-01-01T00:07:59.999999"),
+                ("2017-01-01T00:08:00", "2017-01-01T00:15:59.999999"),
+                ("2017-01-01T00:16:00", "2017-01-01T00:24:00"),
+            }
+        )
+
+    def test_fetch_range_runs_queries_concurrently(self):
+        self.archive.latency = 0.01
+        stream = self.s.fetch_range(
+            TEST_START,
+            TEST_START + timedelta(minutes=24),
+            parallelism=4,
+            page_size=5,
+        )
+        run_coroutine(collect(stream))
+        self.assertEqual(self.archive.max_in_flight, 4)
+
+    def test_fetch_range_propagates_errors_in_order(self):
+        @asyncio.coroutine
+        def send(iq):
+            fields = {
+                field.var: field.values[0]
+                for field in iq.payload.form.fields
+            }
+            if fields["start"] != "2017-01-01T00:00:00":
+                raise aioxmpp.errors.XMPPCancelError(
+                    condition=(namespaces.stanzas, "item-not-found"),
+                )
+            return (yield from self.archive.send(iq))
+
+        self.cc.send.side_effect = send
+
+        stream = self.s.fetch_range(
+            TEST_START,
+            TEST_START + timedelta(minutes=24),
+            parallelism=2,
+            page_size=5,
+        )
+
+        results = []
+        with self.assertRaises(aioxmpp.errors.XMPPCancelError):
+            while True:
+                results.extend(run_coroutine(stream.get_page()))
+
+        self.assertEqual(
+            [result.id_ for result in results],
+            ["id{}".format(i) for i in range(12)],
+        )
+        self.assertEqual(run_coroutine(stream.get_page()), [])
+
+
+class TestArchiveStream(unittest.TestCase):
+    def _make_iterator(self, pages):
+        it = unittest.mock.Mock()
+        pages = list(pages) + [[]]
+
+        @asyncio.coroutine
+        def get_page():
+            return pages.pop(0)
+
+        it.get_page.side_effect = get_page
+        return it
+
+    def test_rejects_non_positive_buffer(self):
+        with self.assertRaisesRegex(ValueError, "max_buffered_pages"):
+            mam_service.ArchiveStream([], max_buffered_pages=0)
+
+    def test_merges_in_order(self):
+        stream = mam_service.ArchiveStream([
+            self._make_iterator([[1, 2], [3]]),
+            self._make_iterator([]),
+            self._make_iterator([[4], [5, 6]]),
+        ])
+
+        self.assertEqual(run_coroutine(collect(stream)), [1, 2, 3, 4, 5, 6])
+
+    def test_buffer_is_bounded(self):
+        it1 = self._make_iterator([[1]] * 10)
+        it2 = self._make_iterator([[2]] * 10)
+        stream = mam_service.ArchiveStream([it1, it2],
+                                           max_buffered_pages=2)
+        run_coroutine(asyncio.sleep(0.01))
+
+        # two pages in the queue, one more waiting to be put
+        self.assertEqual(it1.get_page.call_count, 3)
+        self.assertEqual(it2.get_page.call_count, 3)
+
+        stream.close()
+
+    def test_close_cancels_fetching(self):
+        it = unittest.mock.Mock()
+        fut = asyncio.Future()
+        it.get_page.side_effect = lambda: fut
+
+        stream = mam_service.ArchiveStream([it])
+        run_coroutine(asyncio.sleep(0))
+        stream.close()
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(fut.cancelled())
+        it.close.assert_called_once_with()
+        self.assertEqual(run_coroutine(stream.get_page()), [])
+
+    def test_context_manager_closes_stream(self):
+        it = unittest.mock.Mock()
+        fut = asyncio.Future()
+        it.get_page.side_effect = lambda: fut
+
+        stream = mam_service.ArchiveStream([it])
+        self.assertIs(run_coroutine(stream.__aenter__()), stream)
+        run_coroutine(stream.__aexit__(None, None, None))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(fut.cancelled())
+        it.close.assert_called_once_with()
+
+    def test_anext_yields_items(self):
+        stream = mam_service.ArchiveStream([
+            self._make_iterator([[1, 2]]),
+            self._make_iterator([[3]]),
+        ])
+
+        @asyncio.coroutine
+        def collect_items():
+            result = []
+            while True:
+                try:
+                    item = yield from stream.__anext__()
+                except StopAsyncIteration:
+                    return result
+                result.append(item)
+
+        self.assertIs(stream.__aiter__(), stream)
+        self.assertEqual(run_coroutine(collect_items()), [1, 2, 3])
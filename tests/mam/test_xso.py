@@ -0,0 +1,148 @@
+########################################################################
+# File name: test_xso.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import unittest
+
+import aioxmpp
+import aioxmpp.forms.xso as forms_xso
+import aioxmpp.mam.xso as mam_xso
+import aioxmpp.misc as misc_xso
+import aioxmpp.rsm.xso as rsm_xso
+import aioxmpp.xso as xso
+
+from aioxmpp.utils import namespaces
+
+
+class TestNamespaces(unittest.TestCase):
+    def test_mam(self):
+        self.assertEqual(
+            namespaces.xep0313_mam,
+            "urn:xmpp:mam:2"
+        )
+
+
+class TestQuery(unittest.TestCase):
+    def test_is_xso(self):
+        self.assertTrue(issubclass(mam_xso.Query, xso.XSO))
+
+    def test_tag(self):
+        self.assertEqual(
+            mam_xso.Query.TAG,
+            (namespaces.xep0313_mam, "query"),
+        )
+
+    def test_is_iq_payload(self):
+        self.assertIn(mam_xso.Query, aioxmpp.IQ.payload._classes)
+
+    def test_attributes(self):
+        self.assertIsInstance(mam_xso.Query.queryid, xso.Attr)
+        self.assertEqual(mam_xso.Query.queryid.tag, (None, "queryid"))
+        self.assertIsNone(mam_xso.Query.queryid.default)
+
+        self.assertIsInstance(mam_xso.Query.node, xso.Attr)
+        self.assertEqual(mam_xso.Query.node.tag, (None, "node"))
+        self.assertIsNone(mam_xso.Query.node.default)
+
+    def test_children(self):
+        self.assertIsInstance(mam_xso.Query.form, xso.Child)
+        self.assertSetEqual(
+            set(mam_xso.Query.form._classes),
+            {forms_xso.Data},
+        )
+
+        self.assertIsInstance(mam_xso.Query.rsm, xso.Child)
+        self.assertSetEqual(
+            set(mam_xso.Query.rsm._classes),
+            {rsm_xso.ResultSetMetadata},
+        )
+
+    def test_init(self):
+        query = mam_xso.Query()
+        self.assertIsNone(query.queryid)
+        self.assertIsNone(query.form)
+        self.assertIsNone(query.rsm)
+
+        form = forms_xso.Data(forms_xso.DataType.SUBMIT)
+        rsm = rsm_xso.ResultSetMetadata()
+        query = mam_xso.Query(queryid="foo", form=form, rsm=rsm)
+        self.assertEqual(query.queryid, "foo")
+        self.assertIs(query.form, form)
+        self.assertIs(query.rsm, rsm)
+
+
+class TestFin(unittest.TestCase):
+    def test_is_xso(self):
+        self.assertTrue(issubclass(mam_xso.Fin, xso.XSO))
+
+    def test_tag(self):
+        self.assertEqual(
+            mam_xso.Fin.TAG,
+            (namespaces.xep0313_mam, "fin"),
+        )
+
+    def test_is_iq_payload(self):
+        self.assertIn(mam_xso.Fin, aioxmpp.IQ.payload._classes)
+
+    def test_complete(self):
+        self.assertIsInstance(mam_xso.Fin.complete, xso.Attr)
+        self.assertEqual(mam_xso.Fin.complete.tag, (None, "complete"))
+        self.assertIsInstance(mam_xso.Fin.complete.type_, xso.Bool)
+        self.assertIs(mam_xso.Fin.complete.default, False)
+
+    def test_rsm(self):
+        self.assertIsInstance(mam_xso.Fin.rsm, xso.Child)
+        self.assertSetEqual(
+            set(mam_xso.Fin.rsm._classes),
+            {rsm_xso.ResultSetMetadata},
+        )
+
+
+class TestResult(unittest.TestCase):
+    def test_is_xso(self):
+        self.assertTrue(issubclass(mam_xso.Result, xso.XSO))
+
+    def test_tag(self):
+        self.assertEqual(
+            mam_xso.Result.TAG,
+            (namespaces.xep0313_mam, "result"),
+        )
+
+    def test_attributes(self):
+        self.assertIsInstance(mam_xso.Result.queryid, xso.Attr)
+        self.assertEqual(mam_xso.Result.queryid.tag, (None, "queryid"))
+        self.assertIsNone(mam_xso.Result.queryid.default)
+
+        self.assertIsInstance(mam_xso.Result.id_, xso.Attr)
+        self.assertEqual(mam_xso.Result.id_.tag, (None, "id"))
+
+    def test_forwarded(self):
+        self.assertIsInstance(mam_xso.Result.forwarded, xso.Child)
+        self.assertSetEqual(
+            set(mam_xso.Result.forwarded._classes),
+            {misc_xso.Forwarded},
+        )
+
+    def test_message_attribute(self):
+        self.assertIsInstance(aioxmpp.Message.xep0313_result, xso.Child)
+        self.assertSetEqual(
+            set(aioxmpp.Message.xep0313_result._classes),
+            {mam_xso.Result},
+        )
@@ -372,12 +372,18 @@ class TestOccupant(unittest.TestCase):
                 unittest.mock.sentinel.is_self,
             )
 
+            # the uid is generated lazily
+            uuid4.assert_not_called()
+
+            uid = occ.uid
+
         uuid4.assert_called_once_with()
 
         self.assertEqual(
             b"urn:uuid:" + uuid_sentinel.bytes,
-            occ.uid,
+            uid,
         )
+        self.assertEqual(uid, occ.uid)
 
     def test_uid_from_jid_if_jid_is_known(self):
         presence = aioxmpp.stanza.Presence(
@@ -512,6 +518,138 @@ class TestOccupant(unittest.TestCase):
 
         self.assertEqual(old_uid, occ.uid)
 
+    def test_repr_does_not_generate_uid(self):
+        presence = aioxmpp.stanza.Presence(
+            from_=TEST_MUC_JID.replace(resource="secondwitch"),
+        )
+
+        occ = muc_service.Occupant.from_presence(
+            presence,
+            unittest.mock.sentinel.is_self,
+        )
+
+        self.assertIn("uid=None", repr(occ))
+        self.assertIsNone(occ._uid)
+
+        uid = occ.uid
+        self.assertIn("uid={!r}".format(uid), repr(occ))
+
+
+class TestHistoryStream(unittest.TestCase):
+    def setUp(self):
+        self.s = muc_service.HistoryStream(batch_size=2, max_buffered=4)
+
+    def _make_message(self, stamp=None):
+        message = aioxmpp.Message(
+            from_=TEST_MUC_JID.replace(resource="firstwitch"),
+            type_=aioxmpp.MessageType.GROUPCHAT,
+        )
+        delay = aioxmpp.misc.Delay()
+        delay.stamp = stamp or datetime(2017, 1, 1)
+        message.xep0203_delay.append(delay)
+        message.body[None] = "foo"
+        return message
+
+    def test_init_validates_arguments(self):
+        with self.assertRaisesRegex(ValueError, "batch_size"):
+            muc_service.HistoryStream(batch_size=0)
+
+        with self.assertRaisesRegex(ValueError, "max_buffered"):
+            muc_service.HistoryStream(batch_size=10, max_buffered=5)
+
+    def test_get_batch_waits_for_full_batch(self):
+        msg1 = self._make_message()
+        msg2 = self._make_message()
+
+        task = asyncio.ensure_future(self.s.get_batch())
+        run_coroutine(asyncio.sleep(0))
+        self.assertFalse(task.done())
+
+        self.s._feed(msg1)
+        run_coroutine(asyncio.sleep(0))
+        self.assertFalse(task.done())
+
+        self.s._feed(msg2)
+        self.assertEqual(run_coroutine(task), [msg1, msg2])
+
+    def test_get_batch_rejects_concurrent_consumer(self):
+        msg1 = self._make_message()
+        msg2 = self._make_message()
+
+        task = asyncio.ensure_future(self.s.get_batch())
+        run_coroutine(asyncio.sleep(0))
+
+        with self.assertRaisesRegex(RuntimeError, "already waiting"):
+            run_coroutine(self.s.get_batch())
+
+        self.s._feed(msg1)
+        self.s._feed(msg2)
+        self.assertEqual(run_coroutine(task), [msg1, msg2])
+
+        # once the first consumer is done, a new call is fine
+        self.s._close()
+        self.assertEqual(run_coroutine(self.s.get_batch()), [])
+
+    def test_get_batch_returns_rest_on_close(self):
+        msgs = [self._make_message() for i in range(3)]
+        for msg in msgs:
+            self.s._feed(msg)
+
+        self.assertFalse(self.s.done)
+        self.assertEqual(run_coroutine(self.s.get_batch()), msgs[:2])
+
+        task = asyncio.ensure_future(self.s.get_batch())
+        run_coroutine(asyncio.sleep(0))
+        self.assertFalse(task.done())
+
+        self.s._close()
+        self.assertTrue(self.s.done)
+
+        self.assertEqual(run_coroutine(task), msgs[2:])
+        self.assertEqual(run_coroutine(self.s.get_batch()), [])
+
+    def test_drops_oldest_messages_beyond_max_buffered(self):
+        msgs = [self._make_message() for i in range(6)]
+        for msg in msgs:
+            self.s._feed(msg)
+        self.s._close()
+
+        self.assertEqual(self.s.dropped, 2)
+        self.assertEqual(run_coroutine(self.s.get_batch()), msgs[2:4])
+        self.assertEqual(run_coroutine(self.s.get_batch()), msgs[4:6])
+        self.assertEqual(run_coroutine(self.s.get_batch()), [])
+
+    def test_since_discards_older_messages(self):
+        s = muc_service.HistoryStream(batch_size=2,
+                                      since=datetime(2017, 1, 2))
+        old = self._make_message(datetime(2017, 1, 1))
+        new = self._make_message(datetime(2017, 1, 3))
+        s._feed(old)
+        s._feed(new)
+        s._close()
+
+        self.assertEqual(run_coroutine(s.get_batch()), [new])
+        self.assertEqual(s.dropped, 0)
+
+    def test_async_iteration(self):
+        msgs = [self._make_message() for i in range(3)]
+        for msg in msgs:
+            self.s._feed(msg)
+        self.s._close()
+
+        self.assertIs(self.s.__aiter__(), self.s)
+
+        @asyncio.coroutine
+        def collect():
+            batches = []
+            while True:
+                try:
+                    batches.append((yield from self.s.__anext__()))
+                except StopAsyncIteration:
+                    return batches
+
+        self.assertEqual(run_coroutine(collect()), [msgs[:2], msgs[2:]])
+
 
 class TestRoom(unittest.TestCase):
     def setUp(self):
@@ -2547,6 +2685,317 @@ class TestRoom(unittest.TestCase):
 
         self.assertIs(self.jmuc.members[0], self.jmuc.me)
 
+    def _occupant_presence(self, nick, *,
+                           type_=aioxmpp.structs.PresenceType.AVAILABLE,
+                           status_codes=set(),
+                           affiliation="member",
+                           role="participant",
+                           jid=None,
+                           new_nick=None):
+        presence = aioxmpp.stanza.Presence(
+            type_=type_,
+            from_=TEST_MUC_JID.replace(resource=nick)
+        )
+        presence.xep0045_muc_user = muc_xso.UserExt(
+            status_codes=status_codes,
+            items=[
+                muc_xso.UserItem(affiliation=affiliation,
+                                 role=role,
+                                 jid=jid,
+                                 nick=new_nick),
+            ]
+        )
+        return presence
+
+    def test_members_is_live_view(self):
+        members = self.jmuc.members
+        self.assertEqual(len(members), 0)
+        self.assertEqual(list(members), [])
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch")
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("secondwitch")
+        )
+
+        self.assertEqual(len(members), 2)
+        first, second = members
+        self.assertEqual(first.nick, "firstwitch")
+        self.assertEqual(second.nick, "secondwitch")
+        self.assertIs(members[1], second)
+        self.assertIs(members[-1], second)
+        self.assertEqual(members[:1], [first])
+        self.assertIn(first, members)
+        self.assertEqual(members, [first, second])
+
+        with self.assertRaises(IndexError):
+            members[2]
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("thirdwitch", status_codes={110})
+        )
+
+        self.assertEqual(len(members), 3)
+        self.assertIs(members[0], self.jmuc.me)
+        self.assertIn(self.jmuc.me, members)
+        self.assertEqual(list(members), [self.jmuc.me, first, second])
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "firstwitch",
+                type_=aioxmpp.structs.PresenceType.UNAVAILABLE,
+            )
+        )
+
+        self.assertEqual(list(members), [self.jmuc.me, second])
+        self.assertNotIn(first, members)
+
+    def test_members_removed_after_on_leave(self):
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch")
+        )
+        first, = self.jmuc.members
+
+        seen = []
+
+        def on_leave(member, **kwargs):
+            seen.append(list(self.jmuc.members))
+
+        self.jmuc.on_leave.connect(on_leave)
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "firstwitch",
+                type_=aioxmpp.structs.PresenceType.UNAVAILABLE,
+            )
+        )
+
+        self.base.on_leave.assert_called_once_with(
+            first,
+            muc_leave_mode=muc_service.LeaveMode.NORMAL,
+            muc_actor=None,
+            muc_reason=None,
+        )
+        self.assertEqual(seen, [[first]])
+        self.assertNotIn(first, self.jmuc.members)
+
+    def test_indices_updated_before_role_and_affiliation_signals(self):
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch")
+        )
+        first, = self.jmuc.members
+
+        seen = []
+
+        def on_changed(presence, member, **kwargs):
+            seen.append((
+                list(self.jmuc.muc_get_occupants_by_role("moderator")),
+                list(self.jmuc.muc_get_occupants_by_affiliation("admin")),
+            ))
+
+        self.jmuc.on_muc_role_changed.connect(on_changed)
+        self.jmuc.on_muc_affiliation_changed.connect(on_changed)
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch",
+                                    role="moderator",
+                                    affiliation="admin")
+        )
+
+        self.assertEqual(seen, [([first], [first])] * 2)
+
+    def test_muc_get_occupant(self):
+        self.assertIsNone(self.jmuc.muc_get_occupant("firstwitch"))
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch")
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("thirdwitch", status_codes={110})
+        )
+
+        first = self.jmuc.muc_get_occupant("firstwitch")
+        self.assertEqual(first.nick, "firstwitch")
+        self.assertIs(self.jmuc.muc_get_occupant("thirdwitch"),
+                      self.jmuc.me)
+        self.assertIsNone(self.jmuc.muc_get_occupant("secondwitch"))
+
+    def test_muc_get_occupant_follows_nick_change(self):
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch")
+        )
+        first = self.jmuc.muc_get_occupant("firstwitch")
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "firstwitch",
+                type_=aioxmpp.structs.PresenceType.UNAVAILABLE,
+                status_codes={303},
+                new_nick="oldwitch",
+            )
+        )
+
+        self.assertIsNone(self.jmuc.muc_get_occupant("firstwitch"))
+        self.assertIs(self.jmuc.muc_get_occupant("oldwitch"), first)
+
+    def test_muc_get_occupants_by_jid(self):
+        jid = aioxmpp.JID.fromstr("hag@shakespeare.lit")
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch",
+                                    jid=jid.replace(resource="a"))
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("secondwitch",
+                                    jid=jid.replace(resource="b"))
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "thirdwitch",
+                jid=aioxmpp.JID.fromstr("crone@shakespeare.lit/c"),
+            )
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("fourthwitch",
+                                    status_codes={110},
+                                    jid=jid.replace(resource="c"))
+        )
+
+        self.assertEqual(
+            [occupant.nick
+             for occupant in self.jmuc.muc_get_occupants_by_jid(jid)],
+            ["fourthwitch", "firstwitch", "secondwitch"],
+        )
+        self.assertEqual(
+            self.jmuc.muc_get_occupants_by_jid(
+                aioxmpp.JID.fromstr("nobody@shakespeare.lit")
+            ),
+            [],
+        )
+
+    def test_muc_get_occupants_by_role_and_affiliation(self):
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch",
+                                    affiliation="owner",
+                                    role="moderator")
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("secondwitch")
+        )
+        first = self.jmuc.muc_get_occupant("firstwitch")
+        second = self.jmuc.muc_get_occupant("secondwitch")
+
+        self.assertEqual(self.jmuc.muc_get_occupants_by_role("moderator"),
+                         [first])
+        self.assertEqual(self.jmuc.muc_get_occupants_by_role("participant"),
+                         [second])
+        self.assertEqual(self.jmuc.muc_get_occupants_by_affiliation("owner"),
+                         [first])
+        self.assertEqual(self.jmuc.muc_get_occupants_by_affiliation("admin"),
+                         [])
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("secondwitch",
+                                    affiliation="admin",
+                                    role="moderator")
+        )
+
+        self.assertEqual(self.jmuc.muc_get_occupants_by_role("moderator"),
+                         [first, second])
+        self.assertEqual(self.jmuc.muc_get_occupants_by_role("participant"),
+                         [])
+        self.assertEqual(self.jmuc.muc_get_occupants_by_affiliation("admin"),
+                         [second])
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "firstwitch",
+                type_=aioxmpp.structs.PresenceType.UNAVAILABLE,
+                affiliation="owner",
+                role="none",
+            )
+        )
+
+        self.assertEqual(self.jmuc.muc_get_occupants_by_role("moderator"),
+                         [second])
+        self.assertEqual(self.jmuc.muc_get_occupants_by_affiliation("owner"),
+                         [])
+
+    def test_muc_defer_initial_joins_defaults_to_false(self):
+        self.assertFalse(self.jmuc.muc_defer_initial_joins)
+
+    def test_muc_defer_initial_joins(self):
+        self.jmuc.muc_defer_initial_joins = True
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("firstwitch")
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("secondwitch")
+        )
+
+        self.base.on_join.assert_not_called()
+        self.assertEqual(len(self.jmuc.members), 2)
+        first, second = self.jmuc.members
+
+        # changes to not-yet-announced occupants are applied silently
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("secondwitch", role="moderator")
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("fleetingwitch")
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "fleetingwitch",
+                type_=aioxmpp.structs.PresenceType.UNAVAILABLE,
+            )
+        )
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence(
+                "firstwitch",
+                type_=aioxmpp.structs.PresenceType.UNAVAILABLE,
+                status_codes={303},
+                new_nick="oldwitch",
+            )
+        )
+
+        self.assertEqual(second.role, "moderator")
+        self.assertEqual(first.nick, "oldwitch")
+        self.base.on_muc_role_changed.assert_not_called()
+        self.base.on_nick_changed.assert_not_called()
+        self.base.on_leave.assert_not_called()
+
+        def on_join(member, **kwargs):
+            self.assertTrue(self.jmuc.muc_active)
+            self.assertEqual(len(self.jmuc.members), 3)
+
+        self.jmuc.on_join.connect(on_join)
+
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("thirdwitch", status_codes={110})
+        )
+
+        self.assertSequenceEqual(
+            [
+                call for call in self.base.mock_calls
+                if call[0] in ("on_enter", "on_join")
+            ],
+            [
+                unittest.mock.call.on_enter(),
+                unittest.mock.call.on_join(first),
+                unittest.mock.call.on_join(second),
+            ]
+        )
+
+        # after the join, on_join is emitted immediately again
+        self.jmuc._inbound_muc_user_presence(
+            self._occupant_presence("fourthwitch")
+        )
+        fourth = self.jmuc.muc_get_occupant("fourthwitch")
+        self.base.on_join.assert_called_with(fourth)
+
     def test_muc_request_voice(self):
         run_coroutine(self.jmuc.muc_request_voice())
 
@@ -3678,6 +4127,120 @@ class TestRoom(unittest.TestCase):
         self.assertEqual(self.jmuc.muc_state,
                          muc_service.RoomState.JOIN_PRESENCE)
 
+    def _enter_history_state(self):
+        presence = aioxmpp.stanza.Presence(
+            type_=aioxmpp.structs.PresenceType.AVAILABLE,
+            from_=TEST_MUC_JID.replace(resource="thirdwitch")
+        )
+        presence.xep0045_muc_user = muc_xso.UserExt(
+            items=[
+                muc_xso.UserItem(affiliation="member",
+                                 role="participant"),
+            ],
+            status_codes={110},
+        )
+        self.jmuc._inbound_muc_user_presence(presence)
+
+    def _history_message(self, id_=None):
+        message = aioxmpp.Message(
+            from_=TEST_MUC_JID.replace(resource="firstwitch"),
+            type_=aioxmpp.MessageType.GROUPCHAT,
+            id_=id_,
+        )
+        message.xep0203_delay.append(aioxmpp.misc.Delay())
+        message.xep0045_muc_user = muc_xso.UserExt()
+        message.body[None] = "foo"
+        return message
+
+    def test_muc_history_stream_receives_history(self):
+        stream = self.jmuc.muc_history_stream(batch_size=10)
+        self.assertIsInstance(stream, muc_service.HistoryStream)
+
+        self._enter_history_state()
+
+        msgs = [self._history_message() for i in range(3)]
+        for msg in msgs:
+            self.jmuc._handle_message(msg, msg.from_, False,
+                                      im_dispatcher.MessageSource.STREAM)
+
+        self.base.on_message.assert_not_called()
+        self.assertFalse(stream.done)
+
+        self.jmuc._handle_message(self.msg_end_of_history,
+                                  self.msg_end_of_history.from_,
+                                  False,
+                                  im_dispatcher.MessageSource.STREAM)
+
+        self.assertEqual(self.jmuc.muc_state,
+                         muc_service.RoomState.ACTIVE)
+        self.assertTrue(stream.done)
+        self.assertEqual(run_coroutine(stream.get_batch()), msgs)
+        self.assertEqual(run_coroutine(stream.get_batch()), [])
+
+        live = self._history_message()
+        live.xep0203_delay.clear()
+        self.jmuc._handle_message(live, live.from_, False,
+                                  im_dispatcher.MessageSource.STREAM)
+        self.base.on_message.assert_called_once_with(
+            live,
+            unittest.mock.ANY,
+            im_dispatcher.MessageSource.STREAM,
+            tracker=None,
+        )
+
+        # a new stream can be attached after the previous one ended
+        self.assertTrue(self.jmuc.muc_history_stream().done)
+
+    def test_muc_history_stream_skips_tracker_matching(self):
+        stream = self.jmuc.muc_history_stream()
+        self._enter_history_state()
+
+        msg = self._history_message(id_="foo")
+        with unittest.mock.patch.object(self.jmuc, "_match_tracker") as match:
+            self.jmuc._handle_message(msg, msg.from_, False,
+                                      im_dispatcher.MessageSource.STREAM)
+
+        match.assert_not_called()
+        stream._close()
+        self.assertEqual(run_coroutine(stream.get_batch()), [msg])
+
+    def test_muc_history_stream_rejects_second_stream(self):
+        self.jmuc.muc_history_stream()
+        with self.assertRaises(RuntimeError):
+            self.jmuc.muc_history_stream()
+
+    def test_muc_history_stream_is_empty_after_history(self):
+        self._enter_history_state()
+        self.jmuc._handle_message(self.msg_end_of_history,
+                                  self.msg_end_of_history.from_,
+                                  False,
+                                  im_dispatcher.MessageSource.STREAM)
+
+        stream = self.jmuc.muc_history_stream()
+        self.assertTrue(stream.done)
+        self.assertEqual(run_coroutine(stream.get_batch()), [])
+
+    def test_muc_history_stream_ends_on_suspend(self):
+        stream = self.jmuc.muc_history_stream()
+        self._enter_history_state()
+
+        msg = self._history_message()
+        self.jmuc._handle_message(msg, msg.from_, False,
+                                  im_dispatcher.MessageSource.STREAM)
+
+        self.jmuc._suspend()
+
+        self.assertTrue(stream.done)
+        self.assertEqual(run_coroutine(stream.get_batch()), [msg])
+
+    def test_muc_history_stream_ends_on_disconnect(self):
+        stream = self.jmuc.muc_history_stream()
+        self._enter_history_state()
+
+        self.jmuc._disconnect()
+
+        self.assertTrue(stream.done)
+
     def test_generate_transitional_occupant_objects_for_history(self):
         presence = aioxmpp.stanza.Presence(
             type_=aioxmpp.structs.PresenceType.AVAILABLE,
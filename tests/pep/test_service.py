@@ -41,6 +41,11 @@ TEST_FROM = aioxmpp.structs.JID.fromstr("foo@bar.example/baz")
 TEST_JID1 = aioxmpp.structs.JID.fromstr("bar@bar.example/baz")
 
 
+@pubsub_xso.as_payload_class
+class ExamplePayload(aioxmpp.xso.XSO):
+    TAG = "urn:example", "example"
+
+
 class TestPEPClient(unittest.TestCase):
 
     def setUp(self):
@@ -97,13 +102,78 @@ class TestPEPClient(unittest.TestCase):
             TEST_FROM.bare()
         )
 
-    def test_handle_pubsub_publish_is_depsignal_handler(self):
-        self.assertTrue(aioxmpp.service.is_depsignal_handler(
+    def test_handle_pubsub_publish_is_not_depsignal_handler(self):
+        self.assertFalse(aioxmpp.service.is_depsignal_handler(
             aioxmpp.PubSubClient,
             "on_item_published",
             self.s._handle_pubsub_publish
         ))
 
+    def _notify(self, node, payloads):
+        msg = aioxmpp.stanza.Message(
+            type_=aioxmpp.structs.MessageType.NORMAL,
+            from_=TEST_JID1,
+        )
+        msg.xep0060_event = pubsub_xso.Event(
+            pubsub_xso.EventItems(
+                node,
+                items=[
+                    pubsub_xso.EventItem(payload)
+                    for payload in payloads
+                ],
+            )
+        )
+        self.assertIsNone(self.pubsub.filter_inbound_message(msg))
+        return msg
+
+    def test_claim_receives_notifications_via_node_signal(self):
+        handler = unittest.mock.Mock()
+        handler.return_value = None
+        claim = self.s.claim_pep_node("urn:example")
+        claim.on_item_publish.connect(handler)
+
+        payload1 = ExamplePayload()
+        payload2 = ExamplePayload()
+        msg = self._notify("urn:example", [payload1, payload2])
+        self._notify("urn:example:other", [ExamplePayload()])
+
+        items = msg.xep0060_event.payload.items
+        self.assertSequenceEqual(
+            handler.mock_calls,
+            [
+                unittest.mock.call(TEST_JID1, "urn:example", items[0],
+                                   message=msg),
+                unittest.mock.call(TEST_JID1, "urn:example", items[1],
+                                   message=msg),
+            ]
+        )
+
+        claim.close()
+        handler.reset_mock()
+
+        self._notify("urn:example", [payload1])
+        handler.assert_not_called()
+
+    def test_close_releases_node_signal(self):
+        claim = self.s.claim_pep_node("urn:example")
+        self.assertIn((None, "urn:example"), self.pubsub._node_signals)
+
+        claim.close()
+
+        self.assertNotIn((None, "urn:example"), self.pubsub._node_signals)
+
+    def test_reclaim_after_gc_connects_once(self):
+        self.s.claim_pep_node("urn:example", register_feature=False)
+        gc.collect()
+
+        handler = unittest.mock.Mock()
+        handler.return_value = None
+        claim = self.s.claim_pep_node("urn:example", register_feature=False)
+        claim.on_item_publish.connect(handler)
+
+        self._notify("urn:example", [ExamplePayload()])
+        self.assertEqual(len(handler.mock_calls), 1)
+
     def test_publish(self):
         with contextlib.ExitStack() as stack:
             check_for_pep_mock = stack.enter_context(
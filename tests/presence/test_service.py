@@ -231,6 +231,220 @@ class TestPresenceClient(unittest.TestCase):
     def test_get_most_available_stanza_returns_None_for_unavailable_JID(self):
         self.assertIsNone(self.s.get_most_available_stanza(TEST_PEER_JID1))
 
+    def test_get_most_available_stanza_prefers_higher_priority(self):
+        stlow = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                from_=TEST_PEER_JID1.replace(resource="low"))
+        stlow.priority = -1
+        self.s.handle_presence(stlow)
+
+        sthigh = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                 from_=TEST_PEER_JID1.replace(resource="high"))
+        sthigh.priority = 10
+        self.s.handle_presence(sthigh)
+
+        stmid = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                from_=TEST_PEER_JID1.replace(resource="mid"))
+        stmid.priority = 5
+        self.s.handle_presence(stmid)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            sthigh
+        )
+
+    def test_get_most_available_stanza_state_beats_priority(self):
+        sthigh = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                 show=structs.PresenceShow.AWAY,
+                                 from_=TEST_PEER_JID1.replace(resource="high"))
+        sthigh.priority = 10
+        self.s.handle_presence(sthigh)
+
+        stlow = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                from_=TEST_PEER_JID1.replace(resource="low"))
+        self.s.handle_presence(stlow)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            stlow
+        )
+
+    def test_get_most_available_stanza_ties_keep_order_of_availability(self):
+        st1 = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                              from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st1)
+
+        st2 = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                              from_=TEST_PEER_JID1.replace(resource="bar"))
+        self.s.handle_presence(st2)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st2
+        )
+
+        # an update does not move the resource in the order
+        st1_new = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                  from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st1_new)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st2
+        )
+
+    def test_get_most_available_stanza_follows_updates(self):
+        st1 = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                              from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st1)
+
+        st2 = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                              show=structs.PresenceShow.AWAY,
+                              from_=TEST_PEER_JID1.replace(resource="bar"))
+        self.s.handle_presence(st2)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st1
+        )
+
+        st2_new = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                  show=structs.PresenceShow.CHAT,
+                                  from_=TEST_PEER_JID1.replace(resource="bar"))
+        self.s.handle_presence(st2_new)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st2_new
+        )
+
+        st1_new = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                  show=structs.PresenceShow.DND,
+                                  from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st1_new)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st1_new
+        )
+
+    def test_get_most_available_stanza_after_unavailable(self):
+        st1 = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                              from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st1)
+
+        st2 = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                              show=structs.PresenceShow.DND,
+                              from_=TEST_PEER_JID1.replace(resource="bar"))
+        self.s.handle_presence(st2)
+
+        self.s.handle_presence(
+            stanza.Presence(type_=structs.PresenceType.UNAVAILABLE,
+                            from_=TEST_PEER_JID1.replace(resource="bar"))
+        )
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st1
+        )
+
+        self.s.handle_presence(
+            stanza.Presence(type_=structs.PresenceType.UNAVAILABLE,
+                            from_=TEST_PEER_JID1.replace(resource="foo"))
+        )
+
+        self.assertIsNone(self.s.get_most_available_stanza(TEST_PEER_JID1))
+
+    def test_get_most_available_stanza_after_error(self):
+        st = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                             from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st)
+
+        self.s.handle_presence(
+            stanza.Presence(type_=structs.PresenceType.ERROR,
+                            from_=TEST_PEER_JID1)
+        )
+
+        self.assertIsNone(self.s.get_most_available_stanza(TEST_PEER_JID1))
+
+        st = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                             from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st)
+
+        self.assertIs(
+            self.s.get_most_available_stanza(TEST_PEER_JID1),
+            st
+        )
+
+    def test_retain_stanzas_defaults_to_true(self):
+        self.assertTrue(presence_service.PresenceClient.retain_stanzas)
+        self.assertTrue(self.s.retain_stanzas)
+
+    def test_compact_storage_without_retain_stanzas(self):
+        self.s.retain_stanzas = False
+
+        st = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                             show=structs.PresenceShow.AWAY,
+                             from_=TEST_PEER_JID1.replace(resource="foo"))
+        st.status[None] = "gone fishing"
+        st.priority = 10
+        self.s.handle_presence(st)
+
+        stored = self.s._presences[TEST_PEER_JID1]["foo"]
+        self.assertIsInstance(stored, presence_service._CompactPresence)
+        self.assertFalse(hasattr(stored, "__dict__"))
+
+        result = self.s.get_stanza(st.from_)
+        self.assertIsInstance(result, stanza.Presence)
+        self.assertIsNot(result, st)
+        self.assertEqual(result.type_, structs.PresenceType.AVAILABLE)
+        self.assertEqual(result.from_, st.from_)
+        self.assertEqual(result.show, structs.PresenceShow.AWAY)
+        self.assertEqual(result.status[None], "gone fishing")
+        self.assertEqual(result.priority, 10)
+
+        resources = self.s.get_peer_resources(TEST_PEER_JID1)
+        self.assertEqual(set(resources), {"foo"})
+        self.assertEqual(resources["foo"].show, structs.PresenceShow.AWAY)
+
+    def test_get_most_available_stanza_without_retain_stanzas(self):
+        self.s.retain_stanzas = False
+
+        staway = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                 show=structs.PresenceShow.AWAY,
+                                 from_=TEST_PEER_JID1.replace(resource="baz"))
+        self.s.handle_presence(staway)
+
+        stdnd = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                                show=structs.PresenceShow.DND,
+                                from_=TEST_PEER_JID1.replace(resource="bar"))
+        self.s.handle_presence(stdnd)
+
+        result = self.s.get_most_available_stanza(TEST_PEER_JID1)
+        self.assertEqual(result.from_, stdnd.from_)
+        self.assertEqual(result.show, structs.PresenceShow.DND)
+
+    def test_signals_receive_original_stanza_without_retain_stanzas(self):
+        self.s.retain_stanzas = False
+
+        base = unittest.mock.Mock()
+        base.bare.return_value = False
+        base.full.return_value = False
+
+        self.s.on_bare_available.connect(base.bare)
+        self.s.on_available.connect(base.full)
+
+        st = stanza.Presence(type_=structs.PresenceType.AVAILABLE,
+                             from_=TEST_PEER_JID1.replace(resource="foo"))
+        self.s.handle_presence(st)
+
+        self.assertSequenceEqual(
+            base.mock_calls,
+            [
+                unittest.mock.call.bare(st),
+                unittest.mock.call.full(st.from_, st),
+            ]
+        )
+
     def test_handle_presence_emits_available_signals(self):
         base = unittest.mock.Mock()
         base.bare.return_value = False
@@ -19,16 +19,23 @@
 # <http://www.gnu.org/licenses/>.
 #
 ########################################################################
+import asyncio
 import contextlib
 import unittest
 
+import aioxmpp.callbacks
 import aioxmpp.disco
+import aioxmpp.errors
+import aioxmpp.rsm
+import aioxmpp.rsm.xso as rsm_xso
 import aioxmpp.service
 import aioxmpp.stanza
 import aioxmpp.structs
 import aioxmpp.pubsub.service as pubsub_service
 import aioxmpp.pubsub.xso as pubsub_xso
 
+from aioxmpp.utils import namespaces
+
 from aioxmpp.testutils import (
     make_connected_client,
     CoroutineMock,
@@ -48,6 +55,13 @@ class SomePayload(aioxmpp.xso.XSO):
     TAG = "aioxmpp.tests.pubsub.test_service", "foo"
 
 
+def make_rsm(last):
+    rsm = rsm_xso.ResultSetMetadata()
+    rsm.last = rsm_xso.Last()
+    rsm.last.value = last
+    return rsm
+
+
 class TestService(unittest.TestCase):
     def test_is_service(self):
         self.assertTrue(issubclass(
@@ -920,6 +934,43 @@ class TestService(unittest.TestCase):
 
         self.assertEqual(result, response)
 
+    def test_iter_items(self):
+        def make_response(ids, last):
+            response = pubsub_xso.Request(
+                pubsub_xso.Items("foo")
+            )
+            response.payload.items[:] = [
+                pubsub_xso.Item(id_) for id_ in ids
+            ]
+            if last is not None:
+                response.rsm = make_rsm(last)
+            return response
+
+        self.cc.send.side_effect = [
+            make_response(["a", "b"], "b"),
+            make_response(["c"], None),
+        ]
+
+        it = self.s.iter_items(TEST_TO, "foo", page_size=2)
+        self.assertIsInstance(it, aioxmpp.rsm.ResultSetIterator)
+
+        pages = [
+            [item.id_ for item in run_coroutine(it.get_page())]
+            for i in range(3)
+        ]
+        self.assertEqual(pages, [["a", "b"], ["c"], []])
+
+        self.assertEqual(2, len(self.cc.send.mock_calls))
+        requests = [call[1][0].payload for call in self.cc.send.mock_calls]
+        for request in requests:
+            self.assertIsInstance(request.payload, pubsub_xso.Items)
+            self.assertEqual(request.payload.node, "foo")
+            self.assertIsNone(request.payload.max_items)
+            self.assertEqual(request.rsm.max_, 2)
+
+        self.assertIsNone(requests[0].rsm.after)
+        self.assertEqual(requests[1].rsm.after.value, "b")
+
     def test_get_items_max_items(self):
         response = pubsub_xso.Request()
         response.payload = unittest.mock.Mock()
@@ -1014,6 +1065,370 @@ class TestService(unittest.TestCase):
             len(self.cc.send.mock_calls)
         )
 
+    def _notify(self, node, items=(), retracts=(), *, from_=TEST_TO):
+        ev = pubsub_xso.Event(
+            pubsub_xso.EventItems(
+                node,
+                items=[
+                    pubsub_xso.EventItem(payload, id_=id_)
+                    for id_, payload in items
+                ],
+                retracts=[
+                    pubsub_xso.EventRetract(id_)
+                    for id_ in retracts
+                ],
+            )
+        )
+        msg = aioxmpp.stanza.Message(
+            type_=aioxmpp.structs.MessageType.NORMAL,
+            from_=from_,
+        )
+        msg.xep0060_event = ev
+        self.assertIsNone(self.s.filter_inbound_message(msg))
+
+    def _make_items_response(self, node, items):
+        response = pubsub_xso.Request(pubsub_xso.Items(node))
+        for id_, payload in items:
+            item = pubsub_xso.Item(id_)
+            item.registered_payload = payload
+            response.payload.items.append(item)
+        return response
+
+    def test_node_signal_returns_same_signal(self):
+        signal = self.s.node_signal("foo")
+        self.assertIsInstance(signal, aioxmpp.callbacks.AdHocSignal)
+        self.assertIs(self.s.node_signal("foo"), signal)
+        self.assertIsNot(self.s.node_signal("foo", jid=TEST_TO), signal)
+        self.assertIsNot(self.s.node_signal("bar"), signal)
+
+    def test_release_node_signal_drops_unused_signal(self):
+        signal = self.s.node_signal("foo")
+        token = signal.connect(unittest.mock.Mock())
+
+        self.s.release_node_signal("foo")
+        self.assertIs(self.s.node_signal("foo"), signal)
+
+        signal.disconnect(token)
+        self.s.release_node_signal("foo")
+        self.assertNotIn((None, "foo"), self.s._node_signals)
+        self.assertIsNot(self.s.node_signal("foo"), signal)
+
+        # releasing an unknown signal is fine
+        self.s.release_node_signal("bar", jid=TEST_TO)
+
+    def test_node_signal_receives_batched_notifications(self):
+        payload1 = SomePayload()
+        payload2 = SomePayload()
+
+        specific = unittest.mock.Mock()
+        specific.return_value = None
+        wildcard = unittest.mock.Mock()
+        wildcard.return_value = None
+        other = unittest.mock.Mock()
+        other.return_value = None
+
+        order = unittest.mock.Mock()
+        order.attach_mock(specific, "specific")
+        order.attach_mock(wildcard, "wildcard")
+
+        self.s.node_signal("foo", jid=TEST_TO).connect(specific)
+        self.s.node_signal("foo").connect(wildcard)
+        self.s.node_signal("bar").connect(other)
+        self.s.node_signal("foo", jid=TEST_JID1).connect(other)
+
+        ev = pubsub_xso.Event(
+            pubsub_xso.EventItems(
+                "foo",
+                items=[
+                    pubsub_xso.EventItem(payload1, id_="a"),
+                    pubsub_xso.EventItem(payload2, id_="b"),
+                ],
+                retracts=[pubsub_xso.EventRetract("c")],
+            )
+        )
+        msg = aioxmpp.stanza.Message(
+            type_=aioxmpp.structs.MessageType.NORMAL,
+            from_=TEST_TO,
+        )
+        msg.xep0060_event = ev
+
+        self.assertIsNone(self.s.filter_inbound_message(msg))
+
+        items = ev.payload.items
+        self.assertSequenceEqual(
+            order.mock_calls,
+            [
+                unittest.mock.call.specific(
+                    TEST_TO, "foo", items, ["c"], message=msg,
+                ),
+                unittest.mock.call.wildcard(
+                    TEST_TO, "foo", items, ["c"], message=msg,
+                ),
+            ]
+        )
+        other.assert_not_called()
+
+    def test_node_signal_groups_items_by_node(self):
+        listener = unittest.mock.Mock()
+        listener.return_value = None
+        self.s.node_signal("child").connect(listener)
+
+        item1 = pubsub_xso.EventItem(SomePayload(), id_="a")
+        item1.node = "child"
+        item2 = pubsub_xso.EventItem(SomePayload(), id_="b")
+
+        msg = aioxmpp.stanza.Message(
+            type_=aioxmpp.structs.MessageType.NORMAL,
+            from_=TEST_TO,
+        )
+        msg.xep0060_event = pubsub_xso.Event(
+            pubsub_xso.EventItems("collection", items=[item1, item2])
+        )
+        self.assertIsNone(self.s.filter_inbound_message(msg))
+
+        listener.assert_called_once_with(
+            TEST_TO, "child", [item1], [], message=msg,
+        )
+
+    def test_on_item_published_still_fires_with_node_signals(self):
+        published = unittest.mock.Mock()
+        published.return_value = None
+        self.s.on_item_published.connect(published)
+        self.s.node_signal("bar").connect(unittest.mock.Mock())
+
+        self._notify("foo", [("a", SomePayload())])
+
+        self.assertEqual(published.call_count, 1)
+
+    def test_item_cache_size(self):
+        self.assertEqual(self.s.item_cache_size, 0)
+        self.s.item_cache_size = 1024
+        self.assertEqual(self.s.item_cache_size, 1024)
+        self.s.item_cache_size = 2
+        self.assertEqual(self.s.item_cache_size, 2)
+
+        self._notify("foo", [
+            (str(i), SomePayload())
+            for i in range(3)
+        ])
+        self.assertEqual(len(self.s._item_cache), 2)
+
+    def test_get_items_by_id_uses_notified_items(self):
+        self.s.item_cache_size = 1024
+        payload1 = SomePayload()
+        payload2 = SomePayload()
+        self._notify("foo", [("a", payload1), ("b", payload2)])
+
+        result = run_coroutine(self.s.get_items_by_id(
+            TEST_TO,
+            node="foo",
+            ids=["b", "a"],
+        ))
+
+        self.cc.send.assert_not_called()
+        self.assertIsInstance(result, pubsub_xso.Request)
+        self.assertIsInstance(result.payload, pubsub_xso.Items)
+        self.assertEqual(result.payload.node, "foo")
+        self.assertEqual(
+            [item.id_ for item in result.payload.items],
+            ["b", "a"],
+        )
+        for item, payload in zip(result.payload.items, [payload2, payload1]):
+            self.assertIsInstance(item.registered_payload, SomePayload)
+            self.assertIsNot(item.registered_payload, payload)
+
+    def test_get_items_by_id_returns_copies_of_cached_items(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+
+        result1 = run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["a"]))
+        result2 = run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["a"]))
+
+        self.cc.send.assert_not_called()
+        self.assertIsNot(
+            result1.payload.items[0].registered_payload,
+            result2.payload.items[0].registered_payload,
+        )
+
+    def test_item_cache_is_disabled_by_default(self):
+        self._notify("foo", [("a", SomePayload())])
+        self.assertEqual(len(self.s._item_cache), 0)
+
+        self.cc.send.return_value = self._make_items_response(
+            "foo",
+            [("a", SomePayload())],
+        )
+
+        run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["a"]))
+        run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["a"]))
+
+        self.assertEqual(len(self.cc.send.mock_calls), 2)
+
+    def test_disabling_item_cache_clears_it(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+
+        self.s.item_cache_size = 0
+
+        self.assertEqual(len(self.s._item_cache), 0)
+        self.assertFalse(self.s._notifying_nodes)
+        self._notify("foo", [("b", SomePayload())])
+        self.assertEqual(len(self.s._item_cache), 0)
+
+    def test_notifying_nodes_not_tracked_while_cache_disabled(self):
+        for i in range(10):
+            self._notify("foo", [("a", SomePayload())],
+                         from_=TEST_TO.replace(localpart="u{}".format(i)))
+
+        self.assertFalse(self.s._notifying_nodes)
+
+    def test_item_cache_size_rejects_negative_values(self):
+        with self.assertRaises(ValueError):
+            self.s.item_cache_size = -1
+
+    def test_get_items_by_id_only_requests_missing_items(self):
+        self.s.item_cache_size = 1024
+        payload1 = SomePayload()
+        payload2 = SomePayload()
+        self._notify("foo", [("a", payload1)])
+
+        self.cc.send.return_value = self._make_items_response(
+            "foo",
+            [("b", payload2)],
+        )
+
+        result = run_coroutine(self.s.get_items_by_id(
+            TEST_TO,
+            node="foo",
+            ids=["a", "b", "c"],
+        ))
+
+        _, (request_iq, ), _ = self.cc.send.mock_calls[0]
+        self.assertEqual(
+            [item.id_ for item in request_iq.payload.payload.items],
+            ["b", "c"],
+        )
+
+        self.assertEqual(
+            [item.id_ for item in result.payload.items],
+            ["a", "b"],
+        )
+        self.assertIsInstance(result.payload.items[0].registered_payload,
+                              SomePayload)
+        self.assertIs(result.payload.items[1].registered_payload, payload2)
+
+        # the fetched item is cached now, as the node sends notifications
+        self.cc.send.reset_mock()
+        run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["b"]))
+        self.cc.send.assert_not_called()
+
+    def test_get_items_does_not_cache_items_of_unnotified_nodes(self):
+        self.s.item_cache_size = 1024
+        self.cc.send.return_value = self._make_items_response(
+            "foo",
+            [("a", SomePayload())],
+        )
+
+        run_coroutine(self.s.get_items(TEST_TO, "foo"))
+        run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["a"]))
+
+        self.assertEqual(len(self.cc.send.mock_calls), 2)
+
+    def test_get_items_caches_items_of_notified_nodes(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("x", SomePayload())])
+        self.cc.send.return_value = self._make_items_response(
+            "foo",
+            [("a", SomePayload())],
+        )
+
+        run_coroutine(self.s.get_items(TEST_TO, "foo"))
+        run_coroutine(self.s.get_items_by_id(TEST_TO, "foo", ["a"]))
+
+        self.assertEqual(len(self.cc.send.mock_calls), 1)
+
+    def test_notification_without_payload_invalidates_item(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+        self._notify("foo", [("a", None)])
+
+        self.assertNotIn((TEST_TO, "foo", "a"), self.s._item_cache)
+
+    def test_retraction_invalidates_item(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload()), ("b", SomePayload())])
+        self._notify("foo", retracts=["a"])
+
+        self.assertNotIn((TEST_TO, "foo", "a"), self.s._item_cache)
+        self.assertIn((TEST_TO, "foo", "b"), self.s._item_cache)
+
+    def test_purge_notification_invalidates_node(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+        self._notify("bar", [("a", SomePayload())])
+
+        purge = pubsub_xso.EventPurge()
+        purge.node = "foo"
+        msg = aioxmpp.stanza.Message(
+            type_=aioxmpp.structs.MessageType.NORMAL,
+            from_=TEST_TO,
+        )
+        msg.xep0060_event = pubsub_xso.Event(purge)
+        self.assertIsNone(self.s.filter_inbound_message(msg))
+
+        self.assertNotIn((TEST_TO, "foo", "a"), self.s._item_cache)
+        self.assertIn((TEST_TO, "bar", "a"), self.s._item_cache)
+
+    def test_delete_notification_invalidates_node(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+
+        msg = aioxmpp.stanza.Message(
+            type_=aioxmpp.structs.MessageType.NORMAL,
+            from_=TEST_TO,
+        )
+        msg.xep0060_event = pubsub_xso.Event(pubsub_xso.EventDelete("foo"))
+        self.assertIsNone(self.s.filter_inbound_message(msg))
+
+        self.assertNotIn((TEST_TO, "foo", "a"), self.s._item_cache)
+        self.assertNotIn((TEST_TO, "foo"), self.s._notifying_nodes)
+
+    def test_own_retract_purge_and_delete_invalidate_cache(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload()), ("b", SomePayload())])
+        self.cc.send.return_value = None
+
+        run_coroutine(self.s.retract(TEST_TO, "foo", "a"))
+        self.assertNotIn((TEST_TO, "foo", "a"), self.s._item_cache)
+        self.assertIn((TEST_TO, "foo", "b"), self.s._item_cache)
+
+        run_coroutine(self.s.purge(TEST_TO, "foo"))
+        self.assertNotIn((TEST_TO, "foo", "b"), self.s._item_cache)
+
+        self._notify("foo", [("c", SomePayload())])
+        run_coroutine(self.s.delete(TEST_TO, "foo"))
+        self.assertNotIn((TEST_TO, "foo", "c"), self.s._item_cache)
+        self.assertNotIn((TEST_TO, "foo"), self.s._notifying_nodes)
+
+    def test_publish_invalidates_item(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+        self.cc.send.return_value = None
+
+        run_coroutine(self.s.publish(TEST_TO, "foo", SomePayload(),
+                                     id_="a"))
+
+        self.assertNotIn((TEST_TO, "foo", "a"), self.s._item_cache)
+
+    def test_stream_destruction_clears_cache(self):
+        self.s.item_cache_size = 1024
+        self._notify("foo", [("a", SomePayload())])
+
+        self.cc.on_stream_destroyed()
+
+        self.assertEqual(len(self.s._item_cache), 0)
+        self.assertFalse(self.s._notifying_nodes)
+
     def test_get_subscriptions(self):
         response = pubsub_xso.Request()
         response.payload = unittest.mock.Mock()
@@ -1073,6 +1488,37 @@ class TestService(unittest.TestCase):
         self.assertIsInstance(request.payload, pubsub_xso.Subscriptions)
         self.assertIsNone(request.payload.node)
 
+    def test_iter_subscriptions(self):
+        def make_response(nodes, last):
+            response = pubsub_xso.Request(
+                pubsub_xso.Subscriptions(subscriptions=[
+                    pubsub_xso.Subscription(TEST_FROM, node=node)
+                    for node in nodes
+                ])
+            )
+            if last is not None:
+                response.rsm = make_rsm(last)
+            return response
+
+        self.cc.send.side_effect = [
+            make_response(["a"], "1"),
+            make_response([], "1"),
+        ]
+
+        it = self.s.iter_subscriptions(TEST_TO, page_size=1)
+
+        self.assertEqual(
+            [sub.node for sub in run_coroutine(it.get_page())],
+            ["a"],
+        )
+        self.assertEqual(run_coroutine(it.get_page()), [])
+
+        self.assertEqual(2, len(self.cc.send.mock_calls))
+        request = self.cc.send.mock_calls[0][1][0].payload
+        self.assertIsInstance(request.payload, pubsub_xso.Subscriptions)
+        self.assertIsNone(request.payload.node)
+        self.assertEqual(request.rsm.max_, 1)
+
     def test_publish_with_id(self):
         payload = SomePayload()
 
@@ -1350,6 +1796,144 @@ class TestService(unittest.TestCase):
             None,
         )
 
+    def _make_pipelined_send(self):
+        pending = []
+        in_flight = [0, 0]
+
+        def send(iq):
+            fut = asyncio.Future()
+            pending.append((iq, fut))
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+
+            @asyncio.coroutine
+            def wait():
+                try:
+                    return (yield from fut)
+                finally:
+                    in_flight[0] -= 1
+
+            return wait()
+
+        self.cc.send = unittest.mock.Mock(side_effect=send)
+        return pending, in_flight
+
+    def test_publish_many_pipelines_within_window(self):
+        pending, in_flight = self._make_pipelined_send()
+        payloads = [SomePayload() for i in range(5)]
+
+        task = asyncio.ensure_future(self.s.publish_many(
+            TEST_TO,
+            "foo",
+            [("id{}".format(i), payload)
+             for i, payload in enumerate(payloads)],
+            window=2,
+        ))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(len(pending), 2)
+
+        while not task.done():
+            for iq, fut in pending:
+                if not fut.done():
+                    fut.set_result(None)
+            run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(in_flight[1], 2)
+        self.assertEqual(len(pending), 5)
+        self.assertEqual(
+            run_coroutine(task),
+            ["id{}".format(i) for i in range(5)],
+        )
+
+        for i, (iq, _) in enumerate(pending):
+            self.assertEqual(iq.to, TEST_TO)
+            self.assertEqual(iq.type_, aioxmpp.structs.IQType.SET)
+            publish = iq.payload.payload
+            self.assertIsInstance(publish, pubsub_xso.Publish)
+            self.assertEqual(publish.node, "foo")
+            self.assertEqual(publish.item.id_, "id{}".format(i))
+            self.assertIs(publish.item.registered_payload, payloads[i])
+
+    def test_publish_many_collects_errors_per_item(self):
+        pending, _ = self._make_pipelined_send()
+        exc = aioxmpp.errors.XMPPCancelError(
+            condition=(namespaces.stanzas, "not-allowed"),
+        )
+
+        task = asyncio.ensure_future(self.s.publish_many(
+            TEST_TO,
+            "foo",
+            [("a", SomePayload()), (None, SomePayload()), ("c", None)],
+        ))
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(len(pending), 3)
+
+        pending[0][1].set_exception(exc)
+        response = pubsub_xso.Request(pubsub_xso.Publish())
+        response.payload.item = pubsub_xso.Item("assigned")
+        pending[1][1].set_result(response)
+        pending[2][1].set_result(None)
+
+        self.assertEqual(
+            run_coroutine(task),
+            [exc, "assigned", "c"],
+        )
+
+    def test_publish_many_rejects_invalid_window(self):
+        with self.assertRaisesRegex(ValueError, "window"):
+            run_coroutine(self.s.publish_many(TEST_TO, "foo", [], window=0))
+
+    def test_publish_many_consumes_items_lazily(self):
+        pending, _ = self._make_pipelined_send()
+        consumed = []
+
+        def items():
+            for i in range(10):
+                consumed.append(i)
+                yield str(i), SomePayload()
+
+        task = asyncio.ensure_future(self.s.publish_many(
+            TEST_TO, "foo", items(), window=3,
+        ))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertEqual(len(consumed), 4)
+        self.assertEqual(len(pending), 3)
+
+        task.cancel()
+        run_coroutine(asyncio.sleep(0))
+        for _, fut in pending:
+            self.assertTrue(fut.cancelled())
+
+    def test_retract_many(self):
+        pending, in_flight = self._make_pipelined_send()
+        exc = aioxmpp.errors.XMPPCancelError(
+            condition=(namespaces.stanzas, "item-not-found"),
+        )
+
+        task = asyncio.ensure_future(self.s.retract_many(
+            TEST_TO, "foo", ["a", "b", "c"], notify=True, window=2,
+        ))
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(len(pending), 2)
+
+        pending[1][1].set_exception(exc)
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(len(pending), 3)
+        pending[0][1].set_result(None)
+        pending[2][1].set_result(None)
+
+        self.assertEqual(run_coroutine(task), [None, exc, None])
+        self.assertEqual(in_flight[1], 2)
+
+        for (iq, _), id_ in zip(pending, "abc"):
+            retract = iq.payload.payload
+            self.assertIsInstance(retract, pubsub_xso.Retract)
+            self.assertEqual(retract.node, "foo")
+            self.assertEqual(retract.item.id_, id_)
+            self.assertTrue(retract.notify)
+
     def test_retract(self):
         self.cc.send.return_value = None
 
@@ -1559,6 +2143,48 @@ class TestService(unittest.TestCase):
             ]
         )
 
+    def test_iter_nodes(self):
+        def make_response(nodes, last):
+            response = aioxmpp.disco.xso.ItemsQuery(items=[
+                aioxmpp.disco.xso.Item(jid, node=node, name=name)
+                for jid, node, name in nodes
+            ])
+            if last is not None:
+                response.rsm = make_rsm(last)
+            return response
+
+        self.cc.send.side_effect = [
+            make_response([
+                (TEST_TO, "foo", "foo name"),
+                (TEST_TO.replace(localpart="xyz"), "fnord", None),
+            ], "2"),
+            make_response([
+                (TEST_TO, "bar", None),
+            ], None),
+        ]
+
+        it = self.s.iter_nodes(TEST_TO, "collection", page_size=2)
+
+        self.assertEqual(
+            run_coroutine(it.get_page()),
+            [("foo", "foo name")],
+        )
+        self.assertEqual(
+            run_coroutine(it.get_page()),
+            [("bar", None)],
+        )
+        self.assertEqual(run_coroutine(it.get_page()), [])
+
+        self.assertEqual(2, len(self.cc.send.mock_calls))
+        request_iq = self.cc.send.mock_calls[1][1][0]
+        self.assertEqual(request_iq.to, TEST_TO)
+        self.assertIsInstance(request_iq.payload,
+                              aioxmpp.disco.xso.ItemsQuery)
+        self.assertEqual(request_iq.payload.node, "collection")
+        self.assertEqual(request_iq.payload.rsm.after.value, "2")
+
+        self.disco.query_items.assert_not_called()
+
     def test_delete_without_redirect_uri(self):
         self.cc.send.return_value = None
 
@@ -22,6 +22,7 @@
 import asyncio
 import contextlib
 import unittest
+import unittest.mock
 
 import aioxmpp.dispatcher
 import aioxmpp.errors as errors
@@ -72,6 +73,23 @@ class TestItem(unittest.TestCase):
             item.groups
         )
 
+    def test_uses_slots(self):
+        item = roster_service.Item(self.jid)
+        self.assertFalse(hasattr(item, "__dict__"))
+        with self.assertRaises(AttributeError):
+            item.foo = "bar"
+
+    def test_group_names_are_interned(self):
+        name1 = "".join(["fn", "ord"])
+        name2 = "".join(["fno", "rd"])
+        self.assertIsNot(name1, name2)
+
+        item1 = roster_service.Item(self.jid, groups=(name1,))
+        item2 = roster_service.Item(TEST_JID.replace(localpart="other"),
+                                    groups=(name2,))
+
+        self.assertIs(next(iter(item1.groups)), next(iter(item2.groups)))
+
     def test_update_from_xso_item(self):
         xso_item = roster_xso.Item(
             jid=self.jid,
@@ -405,6 +423,162 @@ class TestService(unittest.TestCase):
         self.assertIn(self.user2, self.s.items)
         self.assertEqual("foobarbaz", self.s.version)
 
+    def test_bulk_load_initial_roster_defaults_to_false(self):
+        self.assertFalse(roster_service.RosterClient.bulk_load_initial_roster)
+
+    def test_bulk_load_initial_roster(self):
+        self.s.bulk_load_initial_roster = True
+        user3 = structs.JID.fromstr("user3@foo.example")
+        old_item = self.s.items[self.user1]
+
+        response = roster_xso.Query(
+            items=[
+                roster_xso.Item(
+                    jid=self.user1,
+                    name="renamed",
+                    groups=[
+                        roster_xso.Group(name="group3"),
+                    ]
+                ),
+                roster_xso.Item(
+                    jid=user3,
+                    groups=[
+                        roster_xso.Group(name="group3"),
+                        roster_xso.Group(name="group4"),
+                    ]
+                ),
+            ],
+            ver="new"
+        )
+        self.cc.send.return_value = response
+
+        reloaded = unittest.mock.Mock()
+        reloaded.return_value = None
+
+        def check_state():
+            reloaded()
+            self.assertSetEqual(set(self.s.items), {self.user1, user3})
+
+        self.s.on_roster_reloaded.connect(check_state)
+
+        run_coroutine(self.cc.before_stream_established())
+
+        reloaded.assert_called_once_with()
+        self.assertSequenceEqual(
+            self.listener.mock_calls,
+            [
+                unittest.mock.call.on_roster_reloaded(),
+                unittest.mock.call.on_initial_roster_received(),
+            ],
+        )
+
+        self.assertIs(self.s.items[self.user1], old_item)
+        self.assertEqual(old_item.name, "renamed")
+        self.assertEqual("new", self.s.version)
+        self.assertDictEqual(
+            self.s.groups,
+            {
+                "group3": {old_item, self.s.items[user3]},
+                "group4": {self.s.items[user3]},
+            }
+        )
+
+    def test_store_defaults_to_None(self):
+        self.assertIsNone(self.s.store)
+
+    def test_setting_store_imports_roster(self):
+        store = unittest.mock.Mock()
+        store.load.return_value = {
+            "items": {
+                "user3@foo.example": {"subscription": "both"},
+            },
+            "ver": "stored",
+        }
+
+        self.s.store = store
+
+        self.assertIs(self.s.store, store)
+        store.load.assert_called_once_with()
+        self.assertSetEqual(
+            set(self.s.items),
+            {structs.JID.fromstr("user3@foo.example")},
+        )
+        self.assertEqual(self.s.version, "stored")
+
+    def test_roster_push_is_appended_to_store(self):
+        store = unittest.mock.Mock()
+        store.load.return_value = self.s.export_as_json()
+        store.needs_snapshot = False
+        self.s.store = store
+
+        request = roster_xso.Query(
+            items=[
+                roster_xso.Item(
+                    jid=self.user1,
+                    subscription="remove"),
+                roster_xso.Item(
+                    jid=self.user2,
+                    subscription="to"),
+            ],
+            ver="pushed"
+        )
+
+        iq = stanza.IQ(type_=structs.IQType.SET)
+        iq.payload = request
+        run_coroutine(self.s.handle_roster_push(iq))
+
+        store.append.assert_called_once_with(
+            "pushed",
+            {
+                str(self.user1): None,
+                str(self.user2): self.s.items[self.user2].export_as_json(),
+            }
+        )
+        store.write_snapshot.assert_not_called()
+
+    def test_roster_push_writes_snapshot_if_store_requests_it(self):
+        store = unittest.mock.Mock()
+        store.load.return_value = self.s.export_as_json()
+        store.needs_snapshot = True
+        self.s.store = store
+
+        iq = stanza.IQ(type_=structs.IQType.SET)
+        iq.payload = roster_xso.Query(
+            items=[
+                roster_xso.Item(jid=self.user1, subscription="both"),
+            ],
+            ver="pushed"
+        )
+        run_coroutine(self.s.handle_roster_push(iq))
+
+        store.write_snapshot.assert_called_once_with(self.s.export_as_json())
+
+    def test_full_initial_roster_writes_snapshot(self):
+        store = unittest.mock.Mock()
+        store.load.return_value = {}
+        self.s.store = store
+
+        self.cc.send.return_value = roster_xso.Query(
+            items=[
+                roster_xso.Item(jid=self.user1),
+            ],
+            ver="full"
+        )
+        run_coroutine(self.cc.before_stream_established())
+
+        store.write_snapshot.assert_called_once_with(self.s.export_as_json())
+        self.assertEqual(self.s.export_as_json()["ver"], "full")
+
+    def test_incremental_initial_roster_does_not_write_snapshot(self):
+        store = unittest.mock.Mock()
+        store.load.return_value = {}
+        self.s.store = store
+
+        self.cc.send.return_value = None
+        run_coroutine(self.cc.before_stream_established())
+
+        store.write_snapshot.assert_not_called()
+
     def test_item_objects_do_not_change_during_push(self):
         old_item = self.s.items[self.user1]
 
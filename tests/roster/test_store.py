@@ -0,0 +1,128 @@
+########################################################################
+# File name: test_store.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import json
+import pathlib
+import tempfile
+import unittest
+
+import aioxmpp.roster.store as roster_store
+
+
+class TestRosterStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmpdir.name) / "roster"
+        self.s = roster_store.RosterStore(self.path, snapshot_interval=2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load_empty(self):
+        self.assertDictEqual(
+            self.s.load(),
+            {"items": {}, "ver": None},
+        )
+
+    def test_snapshot_and_log(self):
+        self.s.write_snapshot({
+            "items": {
+                "a@example.com": {"subscription": "both"},
+                "b@example.com": {"subscription": "none"},
+            },
+            "ver": "1",
+        })
+
+        self.s.append("2", {
+            "a@example.com": None,
+            "c@example.com": {"subscription": "to"},
+        })
+        self.assertFalse(self.s.needs_snapshot)
+
+        self.s.append("3", {"b@example.com": {"subscription": "from"}})
+        self.assertTrue(self.s.needs_snapshot)
+
+        s = roster_store.RosterStore(self.path, snapshot_interval=2)
+        data = s.load()
+        self.assertTrue(s.needs_snapshot)
+
+        self.assertDictEqual(
+            data,
+            {
+                "items": {
+                    "b@example.com": {"subscription": "from"},
+                    "c@example.com": {"subscription": "to"},
+                },
+                "ver": "3",
+            }
+        )
+
+    def test_write_snapshot_truncates_log(self):
+        self.s.append("1", {"a@example.com": {"subscription": "both"}})
+        self.s.append("2", {"b@example.com": {"subscription": "both"}})
+
+        self.s.write_snapshot({"items": {}, "ver": "3"})
+        self.assertFalse(self.s.needs_snapshot)
+
+        self.assertDictEqual(
+            self.s.load(),
+            {"items": {}, "ver": "3"},
+        )
+        with (self.path / self.s.LOG_NAME).open() as f:
+            self.assertEqual(f.read(), "")
+
+    def test_load_ignores_truncated_log_entry(self):
+        self.s.append("1", {"a@example.com": {"subscription": "both"}})
+        with (self.path / self.s.LOG_NAME).open("a") as f:
+            f.write('{"ver": "2", "ite')
+
+        data = self.s.load()
+        self.assertDictEqual(
+            data,
+            {
+                "items": {"a@example.com": {"subscription": "both"}},
+                "ver": "1",
+            }
+        )
+
+        # the corrupt entry does not hide entries appended later
+        self.s.append("3", {"b@example.com": {"subscription": "both"}})
+        self.assertSetEqual(
+            set(self.s.load()["items"]),
+            {"a@example.com", "b@example.com"},
+        )
+
+    def test_clear(self):
+        self.s.write_snapshot({"items": {}, "ver": "1"})
+        self.s.append("2", {})
+        self.s.clear()
+
+        self.assertDictEqual(
+            self.s.load(),
+            {"items": {}, "ver": None},
+        )
+
+    def test_snapshot_is_json(self):
+        data = {"items": {"a@example.com": {"subscription": "both"}},
+                "ver": "1"}
+        self.s.write_snapshot(data)
+        with (self.path / self.s.SNAPSHOT_NAME).open() as f:
+            self.assertDictEqual(json.load(f), data)
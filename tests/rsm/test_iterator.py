@@ -0,0 +1,200 @@
+########################################################################
+# File name: test_iterator.py
+# This file is part of: aioxmpp
+#
+# LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+########################################################################
+import asyncio
+import unittest
+
+import aioxmpp.rsm.iterator as rsm_iterator
+import aioxmpp.rsm.xso as rsm_xso
+
+from aioxmpp.testutils import (
+    run_coroutine,
+)
+
+
+def make_rsm(first, last, count=None):
+    rsm = rsm_xso.ResultSetMetadata()
+    if first is not None:
+        rsm.first = rsm_xso.First()
+        rsm.first.value = first
+    if last is not None:
+        rsm.last = rsm_xso.Last()
+        rsm.last.value = last
+    rsm.count = count
+    return rsm
+
+
+class FakeService:
+    def __init__(self, items):
+        self.items = items
+        self.requests = []
+
+    @asyncio.coroutine
+    def fetch_page(self, rsm):
+        self.requests.append(rsm)
+        start = 0
+        if rsm.after is not None:
+            start = int(rsm.after.value) + 1
+        page = self.items[start:start+rsm.max_]
+        if not page:
+            return [], make_rsm(None, None, count=len(self.items))
+        return page, make_rsm(
+            str(start),
+            str(start + len(page) - 1),
+            count=len(self.items),
+        )
+
+
+class TestResultSetIterator(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeService(list(range(7)))
+        self.it = rsm_iterator.ResultSetIterator(
+            self.service.fetch_page,
+            page_size=3,
+        )
+
+    def tearDown(self):
+        self.it.close()
+
+    def test_rejects_non_positive_page_size(self):
+        with self.assertRaisesRegex(ValueError, "page_size"):
+            rsm_iterator.ResultSetIterator(self.service.fetch_page,
+                                           page_size=0)
+
+    def test_get_page_returns_pages_then_empty_list(self):
+        self.assertEqual(run_coroutine(self.it.get_page()), [0, 1, 2])
+        self.assertEqual(run_coroutine(self.it.get_page()), [3, 4, 5])
+        self.assertEqual(run_coroutine(self.it.get_page()), [6])
+        self.assertEqual(run_coroutine(self.it.get_page()), [])
+        self.assertEqual(run_coroutine(self.it.get_page()), [])
+
+        self.assertEqual(self.it.count, 7)
+
+    def test_requests_use_limit_and_after(self):
+        run_coroutine(self.it.get_page())
+        run_coroutine(self.it.get_page())
+
+        first, second, *_ = self.service.requests
+        self.assertEqual(first.max_, 3)
+        self.assertIsNone(first.after)
+        self.assertEqual(second.max_, 3)
+        self.assertEqual(second.after.value, "2")
+
+    def test_prefetches_next_page(self):
+        run_coroutine(self.it.get_page())
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(len(self.service.requests), 2)
+
+    def test_no_prefetch(self):
+        it = rsm_iterator.ResultSetIterator(
+            self.service.fetch_page,
+            page_size=3,
+            prefetch=False,
+        )
+        run_coroutine(it.get_page())
+        run_coroutine(asyncio.sleep(0))
+        self.assertEqual(len(self.service.requests), 1)
+        self.assertEqual(run_coroutine(it.get_page()), [3, 4, 5])
+
+    def test_stops_without_rsm_in_response(self):
+        requests = []
+
+        @asyncio.coroutine
+        def fetch_page(rsm):
+            requests.append(rsm)
+            return [1, 2], None
+
+        it = rsm_iterator.ResultSetIterator(fetch_page)
+        self.assertEqual(run_coroutine(it.get_page()), [1, 2])
+        self.assertEqual(run_coroutine(it.get_page()), [])
+        self.assertEqual(len(requests), 1)
+
+    def test_stops_if_peer_does_not_advance(self):
+        requests = []
+
+        @asyncio.coroutine
+        def fetch_page(rsm):
+            requests.append(rsm)
+            return [1], make_rsm("a", "a")
+
+        it = rsm_iterator.ResultSetIterator(fetch_page)
+        self.assertEqual(run_coroutine(it.get_page()), [1])
+        self.assertEqual(run_coroutine(it.get_page()), [1])
+        self.assertEqual(run_coroutine(it.get_page()), [])
+        self.assertEqual(len(requests), 2)
+
+    def test_skips_empty_pages(self):
+        @asyncio.coroutine
+        def fetch_page(rsm):
+            items, rsm = yield from self.service.fetch_page(rsm)
+            return [item for item in items if item > 4], rsm
+
+        it = rsm_iterator.ResultSetIterator(fetch_page, page_size=3)
+        self.assertEqual(run_coroutine(it.get_page()), [5])
+        self.assertEqual(run_coroutine(it.get_page()), [6])
+        self.assertEqual(run_coroutine(it.get_page()), [])
+
+    def test_error_ends_iteration(self):
+        exc = RuntimeError()
+
+        @asyncio.coroutine
+        def fetch_page(rsm):
+            raise exc
+
+        it = rsm_iterator.ResultSetIterator(fetch_page)
+        with self.assertRaises(RuntimeError) as ctx:
+            run_coroutine(it.get_page())
+        self.assertIs(ctx.exception, exc)
+
+        self.assertEqual(run_coroutine(it.get_page()), [])
+
+    def test_close_cancels_prefetch(self):
+        blocker = asyncio.Future()
+
+        @asyncio.coroutine
+        def fetch_page(rsm):
+            if rsm.after is not None:
+                yield from blocker
+            return (yield from self.service.fetch_page(rsm))
+
+        it = rsm_iterator.ResultSetIterator(fetch_page, page_size=3)
+        run_coroutine(it.get_page())
+        task = it._next_task
+        self.assertIsNotNone(task)
+
+        it.close()
+        run_coroutine(asyncio.sleep(0))
+        self.assertTrue(task.cancelled())
+        self.assertEqual(run_coroutine(it.get_page()), [])
+
+    def test_anext_yields_items(self):
+        @asyncio.coroutine
+        def collect():
+            result = []
+            while True:
+                try:
+                    item = yield from self.it.__anext__()
+                except StopAsyncIteration:
+                    return result
+                result.append(item)
+
+        self.assertIs(self.it.__aiter__(), self.it)
+        self.assertEqual(run_coroutine(collect()), list(range(7)))
@@ -21,6 +21,7 @@
 ########################################################################
 import collections.abc
 import unittest
+import unittest.mock
 
 import aioxmpp.cache as cache
 
@@ -300,3 +301,201 @@ class TestLRUDict(unittest.TestCase):
             with self.assertRaises(KeyError):
                 self.d[k]
             self.assertTrue(self.d._test_consistency())
+
+    def test_values_and_items(self):
+        self.d.maxsize = 3
+        self.d[1] = "a"
+        self.d[2] = "b"
+        self.d[3] = "c"
+
+        self.assertCountEqual(self.d.values(), ["a", "b", "c"])
+        self.assertCountEqual(
+            self.d.items(),
+            [(1, "a"), (2, "b"), (3, "c")],
+        )
+
+    def test_default_ttl(self):
+        self.assertIsNone(self.d.ttl)
+
+    def test_ttl_rejects_non_positive_values(self):
+        with self.assertRaisesRegex(ValueError, "must be positive"):
+            self.d.ttl = 0
+
+    def test_entries_expire_after_ttl(self):
+        self.d.maxsize = None
+        self.d.ttl = 10
+
+        with unittest.mock.patch("aioxmpp.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            self.d["a"] = 1
+            self.d.set("b", 2, ttl=20)
+
+            monotonic.return_value = 109
+            self.assertEqual(self.d["a"], 1)
+            self.assertEqual(self.d["b"], 2)
+
+            monotonic.return_value = 110
+            with self.assertRaises(KeyError):
+                self.d["a"]
+            self.assertEqual(self.d["b"], 2)
+            self.assertTrue(self.d._test_consistency())
+
+            self.assertEqual(len(self.d), 1)
+
+    def test_replacing_entry_resets_ttl(self):
+        self.d.ttl = 10
+
+        with unittest.mock.patch("aioxmpp.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            self.d["a"] = 1
+
+            monotonic.return_value = 105
+            self.d["a"] = 2
+
+            monotonic.return_value = 112
+            self.assertEqual(self.d["a"], 2)
+
+            self.d.ttl = None
+            self.d["a"] = 3
+
+            monotonic.return_value = 1000
+            self.assertEqual(self.d["a"], 3)
+
+    def test_expire(self):
+        self.d.maxsize = None
+
+        with unittest.mock.patch("aioxmpp.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            self.d.set("a", 1, ttl=10)
+            self.d.set("b", 2, ttl=20)
+            self.d["c"] = 3
+
+            monotonic.return_value = 115
+            self.assertEqual(self.d.expire(), 1)
+
+            self.assertSetEqual(set(self.d), {"b", "c"})
+        self.assertEqual(self.d.stats.expirations, 1)
+        self.assertTrue(self.d._test_consistency())
+
+    def test_iteration_skips_expired_entries(self):
+        self.d.maxsize = None
+
+        with unittest.mock.patch("aioxmpp.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            self.d.set("a", 1, ttl=10)
+            self.d.set("b", 2, ttl=20)
+            self.d["c"] = 3
+
+            monotonic.return_value = 115
+            self.assertSetEqual(set(self.d), {"b", "c"})
+            self.assertCountEqual(list(self.d.values()), [2, 3])
+            self.assertCountEqual(list(self.d.items()), [("b", 2), ("c", 3)])
+
+            monotonic.return_value = 1000
+            self.assertCountEqual(list(self.d.values()), [3])
+
+        self.assertTrue(self.d._test_consistency())
+
+    def test_views_skip_entries_expiring_during_iteration(self):
+        self.d.maxsize = None
+
+        with unittest.mock.patch("aioxmpp.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            self.d.set("a", 1, ttl=10)
+            self.d["b"] = 2
+
+            values = iter(self.d.values())
+            items = iter(self.d.items())
+            monotonic.return_value = 115
+            self.assertCountEqual(list(values), [2])
+            self.assertCountEqual(list(items), [("b", 2)])
+
+    def test_expire_without_ttl(self):
+        self.d["a"] = 1
+        self.assertEqual(self.d.expire(), 0)
+        self.assertEqual(len(self.d), 1)
+
+    def test_default_maxweight(self):
+        self.assertIsNone(self.d.maxweight)
+        self.assertIsNone(self.d.weight_func)
+        self.assertEqual(self.d.weight, 0)
+
+    def test_maxweight_rejects_non_positive_integers(self):
+        with self.assertRaisesRegex(ValueError, "must be positive"):
+            self.d.maxweight = 0
+
+    def test_purge_by_weight(self):
+        self.d.maxsize = None
+        self.d.maxweight = 10
+        self.d.weight_func = len
+
+        self.d["a"] = b"xxxx"
+        self.d["b"] = b"xxxx"
+        self.assertEqual(self.d.weight, 8)
+
+        # use "a", so that "b" is purged first
+        self.d["a"]
+        self.d["c"] = b"xxxx"
+
+        self.assertSetEqual(set(self.d), {"a", "c"})
+        self.assertEqual(self.d.weight, 8)
+        self.assertEqual(self.d.stats.evictions, 1)
+        self.assertTrue(self.d._test_consistency())
+
+        self.d.set("d", b"", weight=3)
+        self.assertSetEqual(set(self.d), {"c", "d"})
+        self.assertEqual(self.d.weight, 7)
+        self.assertTrue(self.d._test_consistency())
+
+    def test_entry_heavier_than_maxweight_is_not_retained(self):
+        self.d.maxsize = None
+        self.d.maxweight = 10
+
+        self.d.set("a", object(), weight=3)
+        self.d.set("b", object(), weight=11)
+
+        self.assertSetEqual(set(self.d), set())
+        self.assertEqual(self.d.weight, 0)
+
+    def test_replacing_entry_updates_weight(self):
+        self.d.weight_func = len
+
+        self.d["a"] = b"xx"
+        self.d["a"] = b"xxxxx"
+        self.assertEqual(self.d.weight, 5)
+
+        del self.d["a"]
+        self.assertEqual(self.d.weight, 0)
+        self.assertTrue(self.d._test_consistency())
+
+    def test_decreasing_maxweight_purges(self):
+        self.d.maxsize = None
+        self.d.set("a", object(), weight=4)
+        self.d.set("b", object(), weight=4)
+
+        self.d.maxweight = 5
+
+        self.assertSetEqual(set(self.d), {"b"})
+
+    def test_clear_resets_weight(self):
+        self.d.set("a", object(), weight=4)
+        self.d.clear()
+        self.assertEqual(self.d.weight, 0)
+        self.assertTrue(self.d._test_consistency())
+
+    def test_stats(self):
+        self.d.maxsize = 1
+        self.assertEqual(self.d.stats, cache.LRUStats(0, 0, 0, 0))
+
+        self.d["a"] = 1
+        self.d["a"]
+        self.d.get("b")
+        self.d["b"] = 2
+
+        self.assertEqual(
+            self.d.stats,
+            cache.LRUStats(hits=1, misses=1, evictions=1, expirations=0),
+        )
+
+        self.d.reset_stats()
+        self.assertEqual(self.d.stats, cache.LRUStats(0, 0, 0, 0))
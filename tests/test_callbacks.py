@@ -1178,6 +1178,92 @@ class TestSyncAdHocSignal(unittest.TestCase):
             coro.mock_calls
         )
 
+    def test_fire_concurrently_runs_coroutines_concurrently(self):
+        calls = []
+        release = asyncio.Event()
+
+        def make_coro(i):
+            @asyncio.coroutine
+            def coro(*args):
+                calls.append((i, "start", args))
+                yield from release.wait()
+                calls.append((i, "end"))
+                return True
+            return coro
+
+        signal = SyncAdHocSignal()
+        for i in range(3):
+            signal.connect(make_coro(i))
+
+        task = asyncio.ensure_future(signal.fire_concurrently("x"))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertSequenceEqual(
+            [
+                (0, "start", ("x",)),
+                (1, "start", ("x",)),
+                (2, "start", ("x",)),
+            ],
+            calls
+        )
+        self.assertFalse(task.done())
+
+        release.set()
+        run_coroutine(task)
+
+        self.assertCountEqual(
+            [(0, "end"), (1, "end"), (2, "end")],
+            calls[3:]
+        )
+
+    def test_fire_concurrently_removes_on_false_result(self):
+        coro1 = CoroutineMock()
+        coro1.return_value = False
+        coro2 = CoroutineMock()
+        coro2.return_value = True
+
+        signal = SyncAdHocSignal()
+        signal.connect(coro1)
+        signal.connect(coro2)
+
+        run_coroutine(signal.fire_concurrently())
+        run_coroutine(signal.fire_concurrently())
+
+        self.assertEqual(len(coro1.mock_calls), 1)
+        self.assertEqual(len(coro2.mock_calls), 2)
+
+    def test_fire_concurrently_reraises_first_exception_after_all(self):
+        exc1 = ValueError()
+        exc2 = KeyError()
+
+        coro1 = CoroutineMock()
+        coro1.return_value = True
+        coro2 = CoroutineMock()
+        coro2.side_effect = exc1
+        coro3 = CoroutineMock()
+        coro3.side_effect = exc2
+        coro4 = CoroutineMock()
+        coro4.return_value = True
+
+        signal = SyncAdHocSignal()
+        for coro in [coro1, coro2, coro3, coro4]:
+            signal.connect(coro)
+
+        with self.assertRaises(ValueError) as ctx:
+            run_coroutine(signal.fire_concurrently())
+
+        self.assertIs(ctx.exception, exc1)
+        coro4.assert_called_once_with()
+
+        # raising does not disconnect
+        coro2.side_effect = None
+        coro2.return_value = True
+        coro3.side_effect = None
+        coro3.return_value = True
+        run_coroutine(signal.fire_concurrently())
+        self.assertEqual(len(coro2.mock_calls), 2)
+        self.assertEqual(len(coro3.mock_calls), 2)
+
 
 class TestSignal(unittest.TestCase):
     def test_get(self):
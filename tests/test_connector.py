@@ -68,6 +68,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         base_logger = unittest.mock.Mock(spec=logging.Logger)
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -207,6 +208,127 @@ class TestSTARTTLSConnector(unittest.TestCase):
             )
         )
 
+    def _run_starttls_with_session_cache(self, starttls_exc=None):
+        features = nonza.StreamFeatures()
+        features[...] = nonza.StartTLSFeature()
+
+        features_future = asyncio.Future()
+        features_future.set_result(features)
+
+        base = unittest.mock.Mock()
+        self.base = base
+        base.protocol.starttls = CoroutineMock()
+        base.protocol.starttls.side_effect = starttls_exc
+        base.create_starttls_connection = CoroutineMock()
+        base.create_starttls_connection.return_value = (
+            unittest.mock.sentinel.transport,
+            base.protocol,
+        )
+        base.metadata.tls_required = True
+        base.metadata.tls_session_cache = base.session_cache
+        base.session_cache.wrap_post_handshake.return_value = \
+            unittest.mock.sentinel.post_handshake
+        base.XMLStream.return_value = base.protocol
+        base.Future.return_value = features_future
+        base.send_and_wait_for = CoroutineMock()
+        base.send_and_wait_for.return_value = unittest.mock.Mock(
+            spec=nonza.StartTLSProceed,
+        )
+        base.certificate_verifier.pre_handshake = CoroutineMock()
+        base.metadata.certificate_verifier_factory.return_value = \
+            base.certificate_verifier
+        base.metadata.ssl_context_factory.return_value = \
+            unittest.mock.sentinel.ssl_context
+        base.reset_stream_and_get_features = CoroutineMock()
+        base.reset_stream_and_get_features.return_value = \
+            unittest.mock.sentinel.reset
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(unittest.mock.patch(
+                "asyncio.Future",
+                new=base.Future,
+            ))
+            stack.enter_context(unittest.mock.patch(
+                "aioxmpp.ssl_transport.create_starttls_connection",
+                new=base.create_starttls_connection,
+            ))
+            stack.enter_context(unittest.mock.patch(
+                "aioxmpp.protocol.XMLStream",
+                new=base.XMLStream,
+            ))
+            stack.enter_context(unittest.mock.patch(
+                "aioxmpp.protocol.send_and_wait_for",
+                new=base.send_and_wait_for,
+            ))
+            stack.enter_context(unittest.mock.patch(
+                "aioxmpp.protocol.reset_stream_and_get_features",
+                new=base.reset_stream_and_get_features,
+            ))
+
+            result = run_coroutine(self.c.connect(
+                unittest.mock.sentinel.loop,
+                base.metadata,
+                unittest.mock.sentinel.domain,
+                unittest.mock.sentinel.host,
+                unittest.mock.sentinel.port,
+                unittest.mock.sentinel.timeout,
+            ))
+
+        return base, result
+
+    def test_connect_uses_tls_session_cache(self):
+        base, result = self._run_starttls_with_session_cache()
+
+        key = base.session_cache.make_key.return_value
+
+        self.assertSequenceEqual(
+            base.session_cache.mock_calls,
+            [
+                unittest.mock.call.make_key(
+                    base.metadata,
+                    unittest.mock.sentinel.domain,
+                    unittest.mock.sentinel.host,
+                    unittest.mock.sentinel.port,
+                ),
+                unittest.mock.call.setup_context(
+                    unittest.mock.sentinel.ssl_context,
+                    key,
+                ),
+                unittest.mock.call.wrap_post_handshake(
+                    base.certificate_verifier.post_handshake,
+                ),
+                unittest.mock.call.store(
+                    key,
+                    unittest.mock.sentinel.transport,
+                ),
+            ]
+        )
+
+        base.protocol.starttls.assert_called_once_with(
+            ssl_context=unittest.mock.sentinel.ssl_context,
+            post_handshake_callback=unittest.mock.sentinel.post_handshake,
+        )
+
+        self.assertEqual(
+            result,
+            (
+                unittest.mock.sentinel.transport,
+                base.protocol,
+                unittest.mock.sentinel.reset,
+            )
+        )
+
+    def test_connect_discards_tls_session_if_starttls_fails(self):
+        exc = errors.TLSFailure("foo")
+
+        with self.assertRaises(errors.TLSFailure):
+            self._run_starttls_with_session_cache(starttls_exc=exc)
+
+        self.base.session_cache.discard.assert_called_once_with(
+            self.base.session_cache.make_key.return_value,
+        )
+        self.base.session_cache.store.assert_not_called()
+
     def test_abort_xmlstream_if_connect_fails(self):
         captured_features_future = None
 
@@ -224,6 +346,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.side_effect = Exception()
         base.XMLStream.return_value = base.protocol
@@ -318,6 +441,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -472,6 +596,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -604,6 +729,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -731,6 +857,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -829,6 +956,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -962,6 +1090,7 @@ class TestSTARTTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -1104,6 +1233,7 @@ class TestXMPPOverTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.return_value = (
@@ -1217,6 +1347,7 @@ class TestXMPPOverTLSConnector(unittest.TestCase):
 
     def test_context_factory(self):
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
 
         ssl_context_factory = self.c._context_factory_factory(
             unittest.mock.sentinel.logger,
@@ -1245,9 +1376,119 @@ class TestXMPPOverTLSConnector(unittest.TestCase):
             base.metadata.ssl_context_factory()
         )
 
+    def test_context_factory_sets_up_tls_session_cache(self):
+        base = unittest.mock.Mock()
+
+        ssl_context_factory = self.c._context_factory_factory(
+            unittest.mock.sentinel.logger,
+            base.metadata,
+            base.certificate_verifier,
+            session_key=unittest.mock.sentinel.key,
+        )
+
+        ssl_context = ssl_context_factory(unittest.mock.sentinel.transport)
+
+        base.metadata.tls_session_cache.setup_context.assert_called_once_with(
+            ssl_context,
+            unittest.mock.sentinel.key,
+        )
+
+    def test_connect_uses_tls_session_cache(self):
+        features_future = asyncio.Future()
+        features_future.set_result(
+            unittest.mock.sentinel.features
+        )
+
+        base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = base.session_cache
+        base.session_cache.wrap_post_handshake.return_value = \
+            unittest.mock.sentinel.post_handshake
+        base.create_starttls_connection = CoroutineMock()
+        base.create_starttls_connection.return_value = (
+            unittest.mock.sentinel.transport,
+            base.protocol,
+        )
+        base.XMLStream.return_value = base.protocol
+        base.Future.return_value = features_future
+        base.certificate_verifier.pre_handshake = CoroutineMock()
+        base.metadata.certificate_verifier_factory.return_value = \
+            base.certificate_verifier
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(unittest.mock.patch(
+                "asyncio.Future",
+                new=base.Future,
+            ))
+            stack.enter_context(unittest.mock.patch(
+                "aioxmpp.ssl_transport.create_starttls_connection",
+                new=base.create_starttls_connection,
+            ))
+            stack.enter_context(unittest.mock.patch(
+                "aioxmpp.protocol.XMLStream",
+                new=base.XMLStream,
+            ))
+            stack.enter_context(unittest.mock.patch.object(
+                self.c,
+                "_context_factory_factory",
+                new=base._context_factory_factory,
+            ))
+
+            result = run_coroutine(self.c.connect(
+                unittest.mock.sentinel.loop,
+                base.metadata,
+                unittest.mock.sentinel.domain,
+                unittest.mock.sentinel.host,
+                unittest.mock.sentinel.port,
+                unittest.mock.sentinel.timeout,
+            ))
+
+        key = base.session_cache.make_key.return_value
+
+        base._context_factory_factory.assert_called_once_with(
+            unittest.mock.ANY,
+            base.metadata,
+            base.certificate_verifier,
+            session_key=key,
+        )
+
+        _, _, kwargs = base.create_starttls_connection.mock_calls[0]
+        self.assertEqual(
+            kwargs["post_handshake_callback"],
+            unittest.mock.sentinel.post_handshake,
+        )
+
+        self.assertSequenceEqual(
+            base.session_cache.mock_calls,
+            [
+                unittest.mock.call.make_key(
+                    base.metadata,
+                    unittest.mock.sentinel.domain,
+                    unittest.mock.sentinel.host,
+                    unittest.mock.sentinel.port,
+                ),
+                unittest.mock.call.wrap_post_handshake(
+                    base.certificate_verifier.post_handshake,
+                ),
+                unittest.mock.call.store(
+                    key,
+                    unittest.mock.sentinel.transport,
+                ),
+            ]
+        )
+
+        self.assertEqual(
+            result,
+            (
+                unittest.mock.sentinel.transport,
+                base.protocol,
+                unittest.mock.sentinel.features,
+            )
+        )
+
     def test_context_factory_warns_if_set_alpn_protos_is_not_defined(self):
         base_logger = unittest.mock.Mock(spec=logging.Logger)
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         del base.metadata.ssl_context_factory.return_value.set_alpn_protos
 
         context_factory = self.c._context_factory_factory(
@@ -1282,6 +1523,7 @@ class TestXMPPOverTLSConnector(unittest.TestCase):
     def test_context_factory_warns_if_set_alpn_protos_raises(self):
         base_logger = unittest.mock.Mock(spec=logging.Logger)
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.metadata.ssl_context_factory.return_value.set_alpn_protos.\
             side_effect = NotImplementedError
 
@@ -1329,6 +1571,7 @@ class TestXMPPOverTLSConnector(unittest.TestCase):
         )
 
         base = unittest.mock.Mock()
+        base.metadata.tls_session_cache = None
         base.protocol.starttls = CoroutineMock()
         base.create_starttls_connection = CoroutineMock()
         base.create_starttls_connection.side_effect = Exception()
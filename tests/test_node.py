@@ -37,6 +37,7 @@ import aiosasl
 
 import aioxmpp
 import aioxmpp.dispatcher
+import aioxmpp.entitycaps
 import aioxmpp.node as node
 import aioxmpp.structs as structs
 import aioxmpp.nonza as nonza
@@ -1624,6 +1625,89 @@ class Testconnect_xmlstream(unittest.TestCase):
                     base.metadata,
                 ))
 
+    def test_uses_discover_argument_instead_of_discover_connectors(self):
+        base = unittest.mock.Mock()
+        jid = unittest.mock.Mock()
+        logger = unittest.mock.Mock()
+
+        base.c.connect = CoroutineMock()
+        base.c.connect.return_value = (
+            unittest.mock.sentinel.transport,
+            unittest.mock.sentinel.protocol,
+            unittest.mock.sentinel.features,
+        )
+
+        discover = CoroutineMock()
+        discover.return_value = [
+            (unittest.mock.sentinel.h, unittest.mock.sentinel.p, base.c),
+        ]
+
+        result = run_coroutine(node.connect_xmlstream(
+            jid,
+            base.metadata,
+            loop=unittest.mock.sentinel.loop,
+            logger=logger,
+            discover=discover,
+        ))
+
+        self.discover_connectors.assert_not_called()
+        discover.assert_called_once_with(
+            jid.domain,
+            loop=unittest.mock.sentinel.loop,
+            logger=logger,
+        )
+
+        self.assertEqual(
+            result,
+            (
+                unittest.mock.sentinel.transport,
+                unittest.mock.sentinel.protocol,
+                unittest.mock.sentinel.post_sasl_features,
+            )
+        )
+
+    def test_records_timings(self):
+        base = unittest.mock.Mock()
+        jid = unittest.mock.Mock()
+
+        base.c1.connect = CoroutineMock()
+        base.c1.connect.side_effect = OSError()
+        base.c2.connect = CoroutineMock()
+        base.c2.connect.return_value = (
+            unittest.mock.sentinel.transport,
+            unittest.mock.sentinel.protocol,
+            unittest.mock.sentinel.features,
+        )
+
+        self.discover_connectors.return_value = [
+            (unittest.mock.sentinel.h2, unittest.mock.sentinel.p2, base.c2),
+        ]
+
+        timings = {}
+
+        with unittest.mock.patch("aioxmpp.node.time") as time:
+            time.monotonic.side_effect = range(10)
+            run_coroutine(node.connect_xmlstream(
+                jid,
+                base.metadata,
+                override_peer=[
+                    (unittest.mock.sentinel.h1, unittest.mock.sentinel.p1,
+                     base.c1),
+                ],
+                loop=unittest.mock.sentinel.loop,
+                timings=timings,
+            ))
+
+        # 0: start of c1, 1/2: discovery, 3/4: c2, 5/6: sasl
+        self.assertDictEqual(
+            timings,
+            {
+                "discover": 1,
+                "connect": 1,
+                "sasl": 1,
+            }
+        )
+
 
 class TestClient(xmltestutils.XMLTestCase):
     @asyncio.coroutine
@@ -1942,6 +2026,7 @@ class TestClient(xmltestutils.XMLTestCase):
             override_peer=[],
             loop=self.loop,
             logger=self.client.logger,
+            timings=unittest.mock.ANY,
         )
 
     def test_start_with_override_peer(self):
@@ -1963,6 +2048,7 @@ class TestClient(xmltestutils.XMLTestCase):
             override_peer=self.client.override_peer,
             loop=self.loop,
             logger=self.client.logger,
+            timings=unittest.mock.ANY,
         )
 
     def test_reject_start_twice(self):
@@ -2080,7 +2166,8 @@ class TestClient(xmltestutils.XMLTestCase):
                     negotiation_timeout=0.01,
                     override_peer=[],
                     loop=self.loop,
-                    logger=self.client.logger)
+                    logger=self.client.logger,
+                    timings=unittest.mock.ANY)
             ]*2,
             self.connect_xmlstream_rec.mock_calls
         )
@@ -2106,7 +2193,8 @@ class TestClient(xmltestutils.XMLTestCase):
             negotiation_timeout=60.0,
             override_peer=[],
             loop=self.loop,
-            logger=self.client.logger)
+            logger=self.client.logger,
+            timings=unittest.mock.ANY)
 
         self.client.backoff_start = timedelta(seconds=0.05)
         self.client.backoff_factor = 2
@@ -2250,7 +2338,8 @@ class TestClient(xmltestutils.XMLTestCase):
                     negotiation_timeout=0.01,
                     override_peer=[],
                     loop=self.loop,
-                    logger=self.client.logger)
+                    logger=self.client.logger,
+                    timings=unittest.mock.ANY)
             ]*2,
             self.connect_xmlstream_rec.mock_calls
         )
@@ -2376,7 +2465,8 @@ class TestClient(xmltestutils.XMLTestCase):
             negotiation_timeout=60.0,
             override_peer=[],
             loop=self.loop,
-            logger=self.client.logger)
+            logger=self.client.logger,
+            timings=unittest.mock.ANY)
 
         exc = OSError()
         self.connect_xmlstream_rec.side_effect = exc
@@ -2444,6 +2534,69 @@ class TestClient(xmltestutils.XMLTestCase):
         self.client.stop()
         run_coroutine(asyncio.sleep(0))
 
+    def test_backoff_jitter_shortens_backoff(self):
+        exc = OSError()
+        self.connect_xmlstream_rec.side_effect = exc
+        self.client.backoff_start = timedelta(seconds=10)
+        self.client.backoff_jitter = 0.5
+
+        with contextlib.ExitStack() as stack:
+            uniform = stack.enter_context(unittest.mock.patch(
+                "random.uniform",
+            ))
+            uniform.return_value = 0.25
+
+            sleep = stack.enter_context(unittest.mock.patch(
+                "asyncio.sleep",
+                new=CoroutineMock(),
+            ))
+            sleep.side_effect = asyncio.CancelledError()
+
+            with self.assertRaises(asyncio.CancelledError):
+                run_coroutine(self.client._main())
+
+        uniform.assert_called_once_with(0, 0.5)
+        sleep.assert_called_once_with(7.5)
+
+    def test_backoff_jitter_defaults_to_zero(self):
+        self.assertEqual(self.client.backoff_jitter, 0)
+
+    def test_uses_connect_xmlstream_of_pool(self):
+        pool = unittest.mock.Mock()
+        pool.connect_xmlstream = CoroutineMock()
+        pool.connect_xmlstream.side_effect = OSError()
+        self.client._pool = pool
+
+        self.client.start()
+        run_coroutine(asyncio.sleep(0))
+
+        self.connect_xmlstream_rec.assert_not_called()
+        pool.connect_xmlstream.assert_called_once_with(
+            self.test_jid,
+            self.security_layer,
+            negotiation_timeout=60.0,
+            override_peer=[],
+            loop=self.loop,
+            logger=self.client.logger,
+            timings=unittest.mock.ANY,
+        )
+
+        self.client.stop()
+        run_coroutine(asyncio.sleep(0))
+
+    def test_summon_passes_services_to_pool(self):
+        class Svc1(service.Service):
+            pass
+
+        pool = unittest.mock.Mock()
+        self.client._pool = pool
+
+        instance = self.client.summon(Svc1)
+        pool._setup_service.assert_called_once_with(instance)
+
+        self.client.summon(Svc1)
+        pool._setup_service.assert_called_once_with(instance)
+
     def test_abort_after_max_initial_attempts(self):
         self.client = node.Client(
             self.test_jid,
@@ -2461,7 +2614,8 @@ class TestClient(xmltestutils.XMLTestCase):
             negotiation_timeout=60.0,
             override_peer=[],
             loop=self.loop,
-            logger=self.client.logger)
+            logger=self.client.logger,
+            timings=unittest.mock.ANY)
 
         exc = OSError()
         self.connect_xmlstream_rec.side_effect = exc
@@ -2497,7 +2651,8 @@ class TestClient(xmltestutils.XMLTestCase):
             negotiation_timeout=60.0,
             override_peer=[],
             loop=self.loop,
-            logger=self.client.logger)
+            logger=self.client.logger,
+            timings=unittest.mock.ANY)
 
         exc = dns.resolver.NoNameservers()
         self.connect_xmlstream_rec.side_effect = exc
@@ -2572,7 +2727,8 @@ class TestClient(xmltestutils.XMLTestCase):
             negotiation_timeout=60.0,
             override_peer=[],
             loop=self.loop,
-            logger=self.client.logger)
+            logger=self.client.logger,
+            timings=unittest.mock.ANY)
 
         exc = OpenSSL.SSL.Error
         self.connect_xmlstream_rec.side_effect = exc
@@ -2863,6 +3019,159 @@ class TestClient(xmltestutils.XMLTestCase):
             XMLStreamMock.Close()
         ]))
 
+    def test_pipelined_negotiation_sends_sm_enable_before_bind_reply(self):
+        self.features[...] = nonza.StreamManagementFeature()
+        self.client.pipelined_negotiation = True
+
+        bind_request, = self.resource_binding
+        bind_reply = bind_request.response
+
+        self.client.start()
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(bind_request.obj),
+            XMLStreamMock.Send(
+                nonza.SMEnable(resume=True),
+                response=[
+                    bind_reply,
+                    XMLStreamMock.Receive(
+                        nonza.SMEnabled(resume=True, id_="foobar")
+                    ),
+                ]
+            ),
+        ]))
+
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(self.client.established)
+        self.established_rec.assert_called_once_with()
+        self.assertEqual(self.client.local_jid, self.test_jid)
+        self.assertTrue(self.client.stream.sm_enabled)
+        # the bind reply arrived before <enabled/> and must not be counted
+        self.assertEqual(self.client.stream.sm_inbound_ctr, 0)
+
+        self.assertCountEqual(
+            ["bind", "sm_enable", "before_stream_established"],
+            list(self.client.negotiation_timings)
+        )
+
+        self.client.stop()
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(
+                nonza.SMAcknowledgement(counter=0)
+            ),
+            XMLStreamMock.Close()
+        ]))
+
+    def test_pipelined_negotiation_propagates_failure_before_send(self):
+        exc = errors.StreamNegotiationFailure("foo")
+
+        with contextlib.ExitStack() as stack:
+            bind = stack.enter_context(unittest.mock.patch.object(
+                self.client, "_bind",
+                new=CoroutineMock(),
+            ))
+            bind.side_effect = exc
+            start_sm = stack.enter_context(unittest.mock.patch.object(
+                self.client, "_start_sm",
+                new=CoroutineMock(),
+            ))
+
+            with self.assertRaises(errors.StreamNegotiationFailure) as ctx:
+                run_coroutine(
+                    self.client._negotiate_pipelined(True, False),
+                    timeout=1,
+                )
+
+        self.assertIs(ctx.exception, exc)
+        start_sm.assert_not_called()
+
+    def test_pipelined_negotiation_with_legacy_session(self):
+        self.features[...] = rfc3921.SessionFeature()
+        self.client.pipelined_negotiation = True
+
+        def autoset_id(stanza):
+            stanza.id_ = type(stanza.payload).__name__
+
+        bind_request = stanza.IQ(
+            payload=rfc6120.Bind(resource=self.test_jid.resource),
+            type_=structs.IQType.SET,
+            id_="Bind",
+        )
+        bind_reply = stanza.IQ(
+            payload=rfc6120.Bind(jid=self.test_jid),
+            type_=structs.IQType.RESULT,
+            id_="Bind",
+        )
+        session_request = stanza.IQ(
+            payload=rfc3921.Session(),
+            type_=structs.IQType.SET,
+            id_="Session",
+        )
+        session_reply = stanza.IQ(
+            type_=structs.IQType.RESULT,
+            id_="Session",
+        )
+
+        with unittest.mock.patch("aioxmpp.stanza.StanzaBase.autoset_id",
+                                 autoset_id):
+            self.client.start()
+            run_coroutine(self.xmlstream.run_test([
+                XMLStreamMock.Send(bind_request),
+                XMLStreamMock.Send(
+                    session_request,
+                    response=[
+                        XMLStreamMock.Receive(bind_reply),
+                        XMLStreamMock.Receive(session_reply),
+                    ]
+                ),
+            ]))
+
+            run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(self.client.established)
+        self.assertIn("legacy_session", self.client.negotiation_timings)
+
+    def test_pipelined_negotiation_runs_before_stream_established_concurrently(
+            self):
+        self.client.pipelined_negotiation = True
+
+        started = []
+        release = asyncio.Event()
+
+        def make_handler(i):
+            @asyncio.coroutine
+            def handler():
+                started.append(i)
+                yield from release.wait()
+                return True
+            return handler
+
+        self.client.before_stream_established.connect(make_handler(0))
+        self.client.before_stream_established.connect(make_handler(1))
+
+        self.client.start()
+        run_coroutine(self.xmlstream.run_test(self.resource_binding))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertSequenceEqual(started, [0, 1])
+        self.established_rec.assert_not_called()
+
+        release.set()
+        run_coroutine(asyncio.sleep(0.01))
+
+        self.established_rec.assert_called_once_with()
+
+    def test_sequential_negotiation_records_timings(self):
+        self.client.start()
+        run_coroutine(self.xmlstream.run_test(self.resource_binding))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(self.client.established)
+        self.assertSequenceEqual(
+            ["bind", "before_stream_established"],
+            list(self.client.negotiation_timings)
+        )
+
     def test_resume_stream_management(self):
         self.features[...] = nonza.StreamManagementFeature()
 
@@ -2914,6 +3223,108 @@ class TestClient(xmltestutils.XMLTestCase):
             XMLStreamMock.Close()
         ]))
 
+    def test_export_sm_state_requires_sm(self):
+        with self.assertRaises(RuntimeError):
+            self.client.export_sm_state_as_json()
+
+    def test_export_sm_state(self):
+        self.features[...] = nonza.StreamManagementFeature()
+
+        self.client.start()
+        run_coroutine(self.xmlstream.run_test(
+            self.resource_binding +
+            self.sm_negotiation_exchange
+        ))
+        run_coroutine(asyncio.sleep(0))
+
+        with unittest.mock.patch.object(
+                self.client.stream,
+                "export_sm_state_as_json") as export:
+            export.return_value = {"id": "foobar"}
+            data = self.client.export_sm_state_as_json()
+
+        self.assertDictEqual(
+            data,
+            {
+                "local_jid": str(self.test_jid),
+                "stream": {"id": "foobar"},
+            }
+        )
+
+        self.client.stop()
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(
+                nonza.SMAcknowledgement(counter=0)
+            ),
+            XMLStreamMock.Close()
+        ]))
+
+    def test_import_sm_state_rejects_other_account(self):
+        with self.assertRaises(ValueError):
+            self.client.import_sm_state_from_json({
+                "local_jid": "other@bar.example/baz",
+                "stream": {},
+            })
+
+    def test_import_sm_state_rejects_running_client(self):
+        self.client.start()
+        with self.assertRaises(RuntimeError):
+            self.client.import_sm_state_from_json({
+                "local_jid": str(self.test_jid),
+                "stream": {},
+            })
+        self.client.stop()
+        run_coroutine(asyncio.sleep(0))
+
+    def test_resume_imported_sm_state(self):
+        self.features[...] = nonza.StreamManagementFeature()
+
+        bse = CoroutineMock()
+        bse.return_value = True
+        self.client.before_stream_established.connect(bse)
+
+        self.client.import_sm_state_from_json({
+            "local_jid": "foo@bar.example/other",
+            "stream": {
+                "id": "foobar",
+                "inbound_ctr": 3,
+                "outbound_base": 2,
+                "max": None,
+                "location": None,
+                "unacked": [],
+            },
+        })
+
+        self.assertEqual(
+            self.client.local_jid,
+            structs.JID.fromstr("foo@bar.example/other"),
+        )
+
+        self.client.start()
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(
+                nonza.SMResume(counter=3, previd="foobar"),
+                response=[
+                    XMLStreamMock.Receive(
+                        nonza.SMResumed(counter=2, previd="foobar")
+                    )
+                ]
+            )
+        ]))
+        run_coroutine(asyncio.sleep(0))
+
+        self.assertTrue(self.client.established)
+        self.established_rec.assert_called_once_with()
+        bse.assert_not_called()
+
+        self.client.stop()
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(
+                nonza.SMAcknowledgement(counter=3)
+            ),
+            XMLStreamMock.Close()
+        ]))
+
     def test_stop_stream_management_if_remote_stops_providing_support(self):
         self.features[...] = nonza.StreamManagementFeature()
 
@@ -2997,7 +3408,8 @@ class TestClient(xmltestutils.XMLTestCase):
                     override_peer=[],
                     negotiation_timeout=60.0,
                     loop=self.loop,
-                    logger=self.client.logger),
+                    logger=self.client.logger,
+                    timings=unittest.mock.ANY),
                 unittest.mock.call(
                     self.test_jid,
                     self.security_layer,
@@ -3006,7 +3418,8 @@ class TestClient(xmltestutils.XMLTestCase):
                     ],
                     negotiation_timeout=60.0,
                     loop=self.loop,
-                    logger=self.client.logger),
+                    logger=self.client.logger,
+                    timings=unittest.mock.ANY),
             ],
             self.connect_xmlstream_rec.mock_calls
         )
@@ -3074,7 +3487,8 @@ class TestClient(xmltestutils.XMLTestCase):
                     ],
                     negotiation_timeout=60.0,
                     loop=self.loop,
-                    logger=self.client.logger),
+                    logger=self.client.logger,
+                    timings=unittest.mock.ANY),
                 unittest.mock.call(
                     self.test_jid,
                     self.security_layer,
@@ -3084,7 +3498,8 @@ class TestClient(xmltestutils.XMLTestCase):
                     ],
                     negotiation_timeout=60.0,
                     loop=self.loop,
-                    logger=self.client.logger),
+                    logger=self.client.logger,
+                    timings=unittest.mock.ANY),
             ],
             self.connect_xmlstream_rec.mock_calls
         )
@@ -4359,3 +4774,255 @@ class TestUseConnected(unittest.TestCase):
                 self.cm.presence,
                 aioxmpp.PresenceState(True)
             )
+
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.pool = node.ClientPool(loop=self.loop)
+        self.test_jid = structs.JID.fromstr("foo@bar.example/baz")
+        self.security_layer = object()
+
+    def tearDown(self):
+        del self.pool
+
+    def test_defaults(self):
+        self.assertEqual(self.pool.clients, frozenset())
+        self.assertEqual(self.pool.connecting, 0)
+        self.assertIsInstance(self.pool.entitycaps_cache,
+                              aioxmpp.entitycaps.Cache)
+
+    def test_rejects_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            node.ClientPool(max_concurrent_connects=0)
+        with self.assertRaises(ValueError):
+            node.ClientPool(backoff_jitter=1.5)
+
+    def test_make_client(self):
+        client = self.pool.make_client(
+            self.test_jid,
+            self.security_layer,
+            max_initial_attempts=None,
+        )
+        self.assertIsInstance(client, node.Client)
+        self.assertIs(client.pool, self.pool)
+        self.assertEqual(client.backoff_jitter, 0.5)
+        self.assertEqual(self.pool.clients, {client})
+
+    def test_make_client_with_client_class(self):
+        client = self.pool.make_client(
+            self.test_jid,
+            self.security_layer,
+            client_class=node.PresenceManagedClient,
+        )
+        self.assertIsInstance(client, node.PresenceManagedClient)
+        self.assertIs(client.pool, self.pool)
+
+    def test_add_client_rejects_client_of_other_pool(self):
+        client = node.Client(self.test_jid, self.security_layer)
+        other = node.ClientPool(loop=self.loop)
+        other.add_client(client)
+
+        with self.assertRaisesRegex(ValueError, "different pool"):
+            self.pool.add_client(client)
+
+        self.assertIs(client.pool, other)
+
+    def test_add_client_is_idempotent(self):
+        client = node.Client(self.test_jid, self.security_layer)
+        self.pool.add_client(client)
+        self.pool.add_client(client)
+        self.assertEqual(self.pool.clients, {client})
+
+    def test_remove_client(self):
+        client = self.pool.make_client(self.test_jid, self.security_layer)
+        self.pool.remove_client(client)
+        self.assertIsNone(client.pool)
+        self.assertEqual(self.pool.clients, frozenset())
+
+        with self.assertRaises(KeyError):
+            self.pool.remove_client(client)
+
+    def test_shares_entitycaps_cache(self):
+        c1 = self.pool.make_client(self.test_jid, self.security_layer)
+        c2 = self.pool.make_client(
+            self.test_jid.replace(localpart="other"),
+            self.security_layer,
+        )
+
+        s1 = c1.summon(aioxmpp.EntityCapsService)
+        s2 = c2.summon(aioxmpp.EntityCapsService)
+
+        self.assertIs(s1.cache, self.pool.entitycaps_cache)
+        self.assertIs(s2.cache, self.pool.entitycaps_cache)
+
+    def test_add_client_configures_existing_services(self):
+        client = node.Client(self.test_jid, self.security_layer)
+        svc = client.summon(aioxmpp.EntityCapsService)
+        self.pool.add_client(client)
+        self.assertIs(svc.cache, self.pool.entitycaps_cache)
+
+    def test_add_client_injects_tls_session_cache(self):
+        sl = aioxmpp.make_security_layer("foo")
+        client = self.pool.make_client(self.test_jid, sl)
+        self.assertIs(client._security_layer.tls_session_cache,
+                      self.pool.tls_session_cache)
+        self.assertEqual(client._security_layer.sasl_providers,
+                         sl.sasl_providers)
+
+    def test_add_client_keeps_existing_tls_session_cache(self):
+        sl = aioxmpp.make_security_layer(
+            "foo",
+            tls_session_cache=unittest.mock.sentinel.cache,
+        )
+        client = self.pool.make_client(self.test_jid, sl)
+        self.assertIs(client._security_layer, sl)
+
+    def test_discover_connectors_caches_result(self):
+        with unittest.mock.patch("aioxmpp.node.discover_connectors",
+                                 new=CoroutineMock()) as discover:
+            discover.return_value = [unittest.mock.sentinel.option]
+
+            result1 = run_coroutine(
+                self.pool.discover_connectors("bar.example")
+            )
+            result2 = run_coroutine(
+                self.pool.discover_connectors("bar.example")
+            )
+
+        discover.assert_called_once_with(
+            "bar.example",
+            loop=None,
+            logger=node.logger,
+        )
+        self.assertEqual(result1, [unittest.mock.sentinel.option])
+        self.assertEqual(result2, [unittest.mock.sentinel.option])
+        self.assertIsNot(result1, result2)
+
+    def test_discover_connectors_coalesces_concurrent_lookups(self):
+        fut = asyncio.Future()
+
+        @asyncio.coroutine
+        def discover(*args, **kwargs):
+            return (yield from fut)
+
+        with unittest.mock.patch("aioxmpp.node.discover_connectors",
+                                 new=unittest.mock.Mock(
+                                     side_effect=discover)) as mock:
+            t1 = asyncio.ensure_future(
+                self.pool.discover_connectors("bar.example")
+            )
+            t2 = asyncio.ensure_future(
+                self.pool.discover_connectors("bar.example")
+            )
+            run_coroutine(asyncio.sleep(0))
+            fut.set_result([unittest.mock.sentinel.option])
+
+            self.assertEqual(run_coroutine(t1),
+                             [unittest.mock.sentinel.option])
+            self.assertEqual(run_coroutine(t2),
+                             [unittest.mock.sentinel.option])
+
+        self.assertEqual(len(mock.mock_calls), 1)
+
+    def test_discover_connectors_does_not_cache_failure(self):
+        with unittest.mock.patch("aioxmpp.node.discover_connectors",
+                                 new=CoroutineMock()) as discover:
+            discover.side_effect = ValueError()
+
+            with self.assertRaises(ValueError):
+                run_coroutine(self.pool.discover_connectors("bar.example"))
+
+            discover.side_effect = None
+            discover.return_value = [unittest.mock.sentinel.option]
+
+            self.assertEqual(
+                run_coroutine(self.pool.discover_connectors("bar.example")),
+                [unittest.mock.sentinel.option],
+            )
+
+        self.assertEqual(len(discover.mock_calls), 2)
+
+    def test_discover_connectors_expires_after_ttl(self):
+        pool = node.ClientPool(dns_cache_ttl=timedelta(seconds=0),
+                               loop=self.loop)
+        with unittest.mock.patch("aioxmpp.node.discover_connectors",
+                                 new=CoroutineMock()) as discover:
+            discover.return_value = []
+            run_coroutine(pool.discover_connectors("bar.example"))
+            run_coroutine(asyncio.sleep(0.001))
+            run_coroutine(pool.discover_connectors("bar.example"))
+
+        self.assertEqual(len(discover.mock_calls), 2)
+
+    def test_flush_dns_cache(self):
+        with unittest.mock.patch("aioxmpp.node.discover_connectors",
+                                 new=CoroutineMock()) as discover:
+            discover.return_value = []
+            run_coroutine(self.pool.discover_connectors("bar.example"))
+            self.pool.flush_dns_cache()
+            run_coroutine(self.pool.discover_connectors("bar.example"))
+
+        self.assertEqual(len(discover.mock_calls), 2)
+
+    def test_connect_xmlstream_uses_cached_discovery(self):
+        with unittest.mock.patch("aioxmpp.node.connect_xmlstream",
+                                 new=CoroutineMock()) as connect:
+            connect.return_value = unittest.mock.sentinel.result
+            result = run_coroutine(self.pool.connect_xmlstream(
+                self.test_jid,
+                self.security_layer,
+                negotiation_timeout=10.0,
+            ))
+
+        connect.assert_called_once_with(
+            self.test_jid,
+            self.security_layer,
+            discover=self.pool.discover_connectors,
+            negotiation_timeout=10.0,
+        )
+        self.assertEqual(result, unittest.mock.sentinel.result)
+        self.assertEqual(self.pool.connecting, 0)
+
+    def test_connect_xmlstream_limits_concurrency(self):
+        pool = node.ClientPool(max_concurrent_connects=2, loop=self.loop)
+        futures = []
+
+        @asyncio.coroutine
+        def connect(*args, **kwargs):
+            fut = asyncio.Future()
+            futures.append(fut)
+            return (yield from fut)
+
+        with unittest.mock.patch("aioxmpp.node.connect_xmlstream",
+                                 new=connect):
+            tasks = [
+                asyncio.ensure_future(pool.connect_xmlstream(
+                    self.test_jid,
+                    self.security_layer,
+                ))
+                for i in range(3)
+            ]
+            run_coroutine(asyncio.sleep(0))
+
+            self.assertEqual(len(futures), 2)
+            self.assertEqual(pool.connecting, 2)
+
+            futures[0].set_exception(OSError())
+            run_coroutine(asyncio.sleep(0))
+            run_coroutine(asyncio.sleep(0))
+
+            self.assertEqual(len(futures), 3)
+            self.assertEqual(pool.connecting, 2)
+
+            futures[1].set_result(unittest.mock.sentinel.r1)
+            futures[2].set_result(unittest.mock.sentinel.r2)
+
+            with self.assertRaises(OSError):
+                run_coroutine(tasks[0])
+            self.assertEqual(run_coroutine(tasks[1]),
+                             unittest.mock.sentinel.r1)
+            self.assertEqual(run_coroutine(tasks[2]),
+                             unittest.mock.sentinel.r2)
+
+        self.assertEqual(pool.connecting, 0)
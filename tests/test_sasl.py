@@ -20,18 +20,27 @@
 #
 ########################################################################
 import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import unittest
+import unittest.mock
 
 import aiosasl
 
 import aioxmpp.nonza as nonza
 import aioxmpp.sasl as sasl
 import aioxmpp.errors as errors
+import aioxmpp.structs as structs
 
 from aioxmpp.utils import namespaces
 
 from aioxmpp import xmltestutils
 from aioxmpp.testutils import (
     XMLStreamMock,
+    CoroutineMock,
+    run_coroutine,
     run_coroutine_with_peer,
 )
 
@@ -247,3 +256,255 @@ class TestSASLXMPPInterface(xmltestutils.XMLTestCase):
     def tearDown(self):
         del self.xmlstream
         del self.loop
+
+
+# test vector from RFC 7677, section 3
+RFC7677_CLIENT_NONCE = b"rOprNGfwEbeRWgbNEkqO"
+RFC7677_SERVER_FIRST = (
+    b"r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,"
+    b"s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096"
+)
+RFC7677_CLIENT_FINAL = (
+    b"c=biws,r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,"
+    b"p=dHzbZapWIk4jUhN+Ute9ytag9zjfMHgsqmmiz7AndVQ="
+)
+RFC7677_SERVER_FINAL = b"v=6rriTRBi23WpRR/wtup+mMhUZUn/dB5nLTJRsjl95G4="
+RFC7677_SALT = base64.b64decode(b"W22ZaJ0SNY7soEsUEjb6gQ==")
+RFC7677_TOKEN = ("SCRAM-SHA-256", "sha256")
+
+
+class TestSCRAMKeyCache(unittest.TestCase):
+    def setUp(self):
+        self.jid = structs.JID.fromstr("user@example.com/res")
+        self.keys = sasl.SCRAMKeys(b"client", b"server")
+        self.store = unittest.mock.Mock(spec=sasl.AbstractSCRAMKeyStore)
+        self.store.load.return_value = None
+        self.secret = b"secret"
+        self.tag = hmac.new(self.secret, b"pencil", hashlib.sha256).digest()
+        self.cache = sasl.SCRAMKeyCache(store=self.store, secret=self.secret)
+
+    def tearDown(self):
+        del self.cache
+
+    def _put(self, jid, mechanism="SCRAM-SHA-1", password="pencil",
+             salt=b"salt", iteration_count=4096, cache=None):
+        if cache is None:
+            cache = self.cache
+        cache.put(jid, mechanism, password, salt, iteration_count, self.keys)
+
+    def _get(self, jid, mechanism="SCRAM-SHA-1", password="pencil",
+             salt=b"salt", iteration_count=4096, cache=None):
+        if cache is None:
+            cache = self.cache
+        return cache.get(jid, mechanism, password, salt, iteration_count)
+
+    def test_maxsize(self):
+        cache = sasl.SCRAMKeyCache()
+        self.assertEqual(cache.maxsize, 128)
+        cache.maxsize = 1
+        self._put(self.jid, salt=b"s1", cache=cache)
+        self._put(self.jid, salt=b"s2", cache=cache)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(self._get(self.jid, salt=b"s1", cache=cache))
+
+    def test_get_miss_consults_store(self):
+        self.assertIsNone(self._get(self.jid))
+        self.store.load.assert_called_once_with(
+            (self.jid.bare(), "SCRAM-SHA-1", self.tag, b"salt", 4096)
+        )
+
+    def test_get_from_store_populates_memory(self):
+        self.store.load.return_value = (b"client", b"server")
+        self.assertEqual(self._get(self.jid), self.keys)
+        self.store.load.reset_mock()
+        self.assertEqual(self._get(self.jid), self.keys)
+        self.store.load.assert_not_called()
+
+    def test_put_and_get_key_by_all_parameters(self):
+        self._put(self.jid)
+        self.store.save.assert_called_once_with(
+            (self.jid.bare(), "SCRAM-SHA-1", self.tag, b"salt", 4096),
+            self.keys,
+        )
+        self.assertEqual(self._get(self.jid.bare()), self.keys)
+        self.assertIsNone(self._get(self.jid, mechanism="SCRAM-SHA-256"))
+        self.assertIsNone(self._get(self.jid, salt=b"other"))
+        self.assertIsNone(self._get(self.jid, iteration_count=8192))
+
+    def test_entries_are_bound_to_password(self):
+        self._put(self.jid)
+        self.assertIsNone(self._get(self.jid, password="wrong"))
+        self.assertIsNone(self._get(self.jid, password=b"wrong"))
+
+    def test_password_is_saslprepped(self):
+        self._put(self.jid, password="pencil\u00a0")
+        self.assertEqual(self._get(self.jid, password=b"pencil "),
+                         self.keys)
+
+    def test_tag_depends_on_secret(self):
+        self._put(self.jid)
+        other = sasl.SCRAMKeyCache(store=self.store)
+        self.assertIsNone(self._get(self.jid, cache=other))
+        (key,), _ = self.store.load.call_args
+        self.assertNotEqual(key[2], self.tag)
+
+    def test_store_does_not_receive_password(self):
+        self._put(self.jid)
+        (key, _), _ = self.store.save.call_args
+        self.assertNotIn("pencil", key)
+        self.assertNotIn(b"pencil", key)
+
+    def test_invalidate(self):
+        other = structs.JID.fromstr("other@example.com")
+        self._put(self.jid)
+        self._put(other)
+        self.cache.invalidate(self.jid)
+        self.store.forget.assert_called_once_with(self.jid.bare())
+        self.assertIsNone(self._get(self.jid))
+        self.assertEqual(self._get(other), self.keys)
+
+    def test_clear_does_not_touch_store(self):
+        self._put(self.jid)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.store.forget.assert_not_called()
+
+
+class TestCachingSCRAM(unittest.TestCase):
+    def setUp(self):
+        self.jid = structs.JID.fromstr("user@example.com")
+        self.saved_random = sasl._system_random
+        sasl._system_random = unittest.mock.Mock()
+        sasl._system_random.getrandbits.return_value = int.from_bytes(
+            base64.b64decode(RFC7677_CLIENT_NONCE),
+            "little",
+        )
+        self.sm = unittest.mock.Mock()
+        self.sm.initiate = CoroutineMock()
+        self.sm.initiate.return_value = ("challenge", RFC7677_SERVER_FIRST)
+        self.sm.response = CoroutineMock()
+        self.sm.response.return_value = ("success", RFC7677_SERVER_FINAL)
+        self.sm.abort = CoroutineMock()
+        self.cache = sasl.SCRAMKeyCache()
+
+    def tearDown(self):
+        sasl._system_random = self.saved_random
+
+    @asyncio.coroutine
+    def _credential_provider(self):
+        return "user", "pencil"
+
+    def _make(self, **kwargs):
+        return sasl.CachingSCRAM(self._credential_provider, **kwargs)
+
+    def test_is_scram(self):
+        self.assertTrue(issubclass(sasl.CachingSCRAM, aiosasl.SCRAM))
+
+    def test_key_cache_requires_jid(self):
+        with self.assertRaises(ValueError):
+            self._make(key_cache=self.cache)
+
+    def test_rfc7677_without_cache(self):
+        mech = self._make()
+        self.assertTrue(run_coroutine(mech.authenticate(self.sm,
+                                                        RFC7677_TOKEN)))
+        self.sm.initiate.assert_called_once_with(
+            "SCRAM-SHA-256",
+            b"n,,n=user,r=" + RFC7677_CLIENT_NONCE,
+        )
+        self.sm.response.assert_called_once_with(RFC7677_CLIENT_FINAL)
+        self.assertFalse(mech.used_cached_keys)
+
+    def test_derivation_runs_in_executor(self):
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        mech = self._make(executor=executor)
+        with unittest.mock.patch.object(
+                executor, "submit",
+                wraps=executor.submit) as submit:
+            run_coroutine(mech.authenticate(self.sm, RFC7677_TOKEN))
+
+        self.assertEqual(len(submit.mock_calls), 1)
+        self.sm.response.assert_called_once_with(RFC7677_CLIENT_FINAL)
+
+    def test_store_keys_after_success(self):
+        mech = self._make(jid=self.jid, key_cache=self.cache)
+        run_coroutine(mech.authenticate(self.sm, RFC7677_TOKEN))
+        keys = self.cache.get(self.jid, "SCRAM-SHA-256", "pencil",
+                              RFC7677_SALT, 4096)
+        self.assertIsNotNone(keys)
+        self.assertEqual(
+            keys,
+            sasl._derive_scram_keys("sha256", b"pencil", RFC7677_SALT, 4096)
+        )
+
+    def test_use_cached_keys(self):
+        keys = sasl._derive_scram_keys("sha256", b"pencil",
+                                       RFC7677_SALT, 4096)
+        self.cache.put(self.jid, "SCRAM-SHA-256", "pencil",
+                       RFC7677_SALT, 4096, keys)
+
+        mech = self._make(jid=self.jid, key_cache=self.cache)
+        with unittest.mock.patch("aiosasl.pbkdf2") as pbkdf2:
+            self.assertTrue(run_coroutine(
+                mech.authenticate(self.sm, RFC7677_TOKEN)
+            ))
+        pbkdf2.assert_not_called()
+        self.assertTrue(mech.used_cached_keys)
+        self.sm.response.assert_called_once_with(RFC7677_CLIENT_FINAL)
+
+    def test_wrong_password_does_not_use_cached_keys(self):
+        keys = sasl._derive_scram_keys("sha256", b"pencil",
+                                       RFC7677_SALT, 4096)
+        self.cache.put(self.jid, "SCRAM-SHA-256", "pencil",
+                       RFC7677_SALT, 4096, keys)
+
+        @asyncio.coroutine
+        def response(payload):
+            if payload != RFC7677_CLIENT_FINAL:
+                raise aiosasl.SASLFailure("not-authorized")
+            return "success", RFC7677_SERVER_FINAL
+
+        @asyncio.coroutine
+        def credential_provider():
+            return "user", "wrong"
+
+        self.sm.response.side_effect = response
+
+        mech = sasl.CachingSCRAM(credential_provider,
+                                 jid=self.jid,
+                                 key_cache=self.cache)
+        with self.assertRaises(aiosasl.AuthenticationFailure):
+            run_coroutine(mech.authenticate(self.sm, RFC7677_TOKEN))
+        self.assertFalse(mech.used_cached_keys)
+        self.assertNotEqual(self.sm.response.mock_calls[-1],
+                            unittest.mock.call(RFC7677_CLIENT_FINAL))
+
+    def test_do_not_store_keys_on_invalid_server_signature(self):
+        self.sm.response.return_value = (
+            "success",
+            b"v=" + base64.b64encode(b"\x00" * 32),
+        )
+        mech = self._make(jid=self.jid, key_cache=self.cache)
+        with self.assertRaises(aiosasl.SASLFailure):
+            run_coroutine(mech.authenticate(self.sm, RFC7677_TOKEN))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_do_not_store_keys_on_failure(self):
+        self.sm.response.side_effect = aiosasl.SASLFailure(
+            "not-authorized"
+        )
+        mech = self._make(jid=self.jid, key_cache=self.cache)
+        with self.assertRaises(aiosasl.AuthenticationFailure):
+            run_coroutine(mech.authenticate(self.sm, RFC7677_TOKEN))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_abort_on_nonce_mismatch(self):
+        self.sm.initiate.return_value = (
+            "challenge",
+            b"r=foo,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096",
+        )
+        mech = self._make()
+        with self.assertRaisesRegex(aiosasl.SASLFailure, "nonce"):
+            run_coroutine(mech.authenticate(self.sm, RFC7677_TOKEN))
+        self.sm.abort.assert_called_once_with()
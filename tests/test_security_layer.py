@@ -34,6 +34,7 @@ import aioxmpp.errors as errors
 import aioxmpp.structs as structs
 import aioxmpp.security_layer as security_layer
 import aioxmpp.nonza as nonza
+import aioxmpp.sasl
 
 from aioxmpp.utils import namespaces
 
@@ -1562,6 +1563,8 @@ class TestPasswordSASLProvider(xmltestutils.XMLTestCase):
         aiosasl._system_random.getrandbits.return_value = int.from_bytes(
             b"foo",
             "little")
+        self.saved_random = aioxmpp.sasl._system_random
+        aioxmpp.sasl._system_random = aiosasl._system_random
 
         self.client_jid = structs.JID.fromstr("foo@bar.example")
 
@@ -1840,6 +1843,144 @@ class TestPasswordSASLProvider(xmltestutils.XMLTestCase):
             )
         )
 
+    def test_uses_caching_scram_with_cache_and_executor(self):
+        self.mechanisms.mechanisms.append(
+            security_layer.SASLMechanism(name="SCRAM-SHA-1")
+        )
+
+        cache = unittest.mock.sentinel.scram_key_cache
+        executor = unittest.mock.sentinel.executor
+
+        provider = security_layer.PasswordSASLProvider(
+            self._password_provider_wrapper,
+            scram_key_cache=cache,
+            executor=executor)
+
+        with contextlib.ExitStack() as stack:
+            CachingSCRAM = stack.enter_context(unittest.mock.patch(
+                "aioxmpp.sasl.CachingSCRAM",
+                new=unittest.mock.MagicMock(
+                    wraps=aioxmpp.sasl.CachingSCRAM,
+                    any_supported=aioxmpp.sasl.CachingSCRAM.any_supported,
+                )
+            ))
+            _execute = stack.enter_context(unittest.mock.patch.object(
+                provider, "_execute",
+                new=CoroutineMock()
+            ))
+            _execute.return_value = True
+
+            self.assertTrue(run_coroutine(provider.execute(
+                self.client_jid,
+                self.features,
+                self.xmlstream,
+                None,
+            )))
+
+        CachingSCRAM.assert_called_once_with(
+            unittest.mock.ANY,
+            jid=self.client_jid.bare(),
+            key_cache=cache,
+            executor=executor,
+        )
+
+    def test_retry_with_fresh_keys_if_cached_keys_fail(self):
+        self.mechanisms.mechanisms.append(
+            security_layer.SASLMechanism(name="SCRAM-SHA-1")
+        )
+
+        cache = unittest.mock.Mock()
+        provider = security_layer.PasswordSASLProvider(
+            self._password_provider_wrapper,
+            scram_key_cache=cache,
+            max_auth_attempts=2)
+
+        results = [
+            aiosasl.AuthenticationFailure("not-authorized"),
+            True,
+        ]
+
+        @asyncio.coroutine
+        def execute(intf, mechanism, token):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                mechanism.used_cached_keys = True
+                raise result
+            mechanism.used_cached_keys = False
+            return result
+
+        with unittest.mock.patch.object(provider, "_execute",
+                                        new=execute):
+            self.assertTrue(run_coroutine(provider.execute(
+                self.client_jid,
+                self.features,
+                self.xmlstream,
+                None,
+            )))
+
+        cache.invalidate.assert_called_once_with(self.client_jid.bare())
+        self.assertFalse(results)
+
+    def test_retry_with_fresh_keys_counts_as_attempt(self):
+        self.mechanisms.mechanisms.append(
+            security_layer.SASLMechanism(name="SCRAM-SHA-1")
+        )
+
+        cache = unittest.mock.Mock()
+        provider = security_layer.PasswordSASLProvider(
+            self._password_provider_wrapper,
+            scram_key_cache=cache,
+            max_auth_attempts=1)
+
+        executed = []
+
+        @asyncio.coroutine
+        def execute(intf, mechanism, token):
+            executed.append(mechanism)
+            mechanism.used_cached_keys = True
+            raise aiosasl.AuthenticationFailure("not-authorized")
+
+        with unittest.mock.patch.object(provider, "_execute",
+                                        new=execute):
+            with self.assertRaises(aiosasl.AuthenticationFailure):
+                run_coroutine(provider.execute(
+                    self.client_jid,
+                    self.features,
+                    self.xmlstream,
+                    None,
+                ))
+
+        self.assertEqual(len(executed), 1)
+        cache.invalidate.assert_called_once_with(self.client_jid.bare())
+
+    def test_failure_with_fresh_keys_counts_as_attempt(self):
+        self.mechanisms.mechanisms.append(
+            security_layer.SASLMechanism(name="SCRAM-SHA-1")
+        )
+
+        cache = unittest.mock.Mock()
+        provider = security_layer.PasswordSASLProvider(
+            self._password_provider_wrapper,
+            scram_key_cache=cache,
+            max_auth_attempts=2)
+
+        @asyncio.coroutine
+        def execute(intf, mechanism, token):
+            mechanism.used_cached_keys = False
+            raise aiosasl.AuthenticationFailure("not-authorized")
+
+        with unittest.mock.patch.object(provider, "_execute",
+                                        new=execute):
+            with self.assertRaises(aiosasl.AuthenticationFailure):
+                run_coroutine(provider.execute(
+                    self.client_jid,
+                    self.features,
+                    self.xmlstream,
+                    None,
+                ))
+
+        cache.invalidate.assert_not_called()
+
     def tearDown(self):
         del self.xmlstream
         del self.transport
@@ -1848,6 +1989,7 @@ class TestPasswordSASLProvider(xmltestutils.XMLTestCase):
 
         import random
         aiosasl._system_random = random.SystemRandom()
+        aioxmpp.sasl._system_random = self.saved_random
 
 
 @unittest.skipUnless(hasattr(aiosasl, "ANONYMOUS"),
@@ -2162,6 +2304,408 @@ class Testnegotiate_sasl(xmltestutils.XMLTestCase):
             self.transport)
 
 
+class TestTLSSessionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = security_layer.TLSSessionCache()
+        self.key = ("domain.example", "host.domain.example", 5222)
+
+    def tearDown(self):
+        del self.cache
+
+    def _get_info_callback(self):
+        ctx = unittest.mock.Mock()
+        self.cache.setup_context(ctx, self.key)
+        ctx.set_info_callback.assert_called_once_with(unittest.mock.ANY)
+        _, (info_callback,), _ = ctx.set_info_callback.mock_calls[0]
+        return info_callback
+
+    def _make_transport(self, session=None, master_key=b"master key"):
+        transport = unittest.mock.Mock()
+        ssl_object = transport.get_extra_info.return_value
+        ssl_object.get_session.return_value = session
+        ssl_object.master_key.return_value = master_key
+        return transport
+
+    def test_defaults(self):
+        self.assertEqual(self.cache.maxsize, 1024)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_maxsize(self):
+        cache = security_layer.TLSSessionCache(maxsize=1)
+        self.assertEqual(cache.maxsize, 1)
+
+        cache.store(("a", "a", 1), self._make_transport(
+            unittest.mock.sentinel.s1
+        ))
+        cache.store(("b", "b", 1), self._make_transport(
+            unittest.mock.sentinel.s2
+        ))
+
+        self.assertEqual(len(cache), 1)
+
+    def test_store_uses_session_of_ssl_object(self):
+        transport = self._make_transport(unittest.mock.sentinel.session)
+        self.cache.store(self.key, transport)
+
+        transport.get_extra_info.assert_called_once_with("ssl_object")
+        self.assertEqual(len(self.cache), 1)
+
+    def test_store_without_session_discards(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        self.cache.store(self.key, self._make_transport(None))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_store_without_master_key_discards(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        transport = self._make_transport(unittest.mock.sentinel.session)
+        ssl_object = transport.get_extra_info.return_value
+        ssl_object.master_key.side_effect = OpenSSL.SSL.Error()
+        self.cache.store(self.key, transport)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_store_without_ssl_object_discards(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        transport = unittest.mock.Mock()
+        transport.get_extra_info.return_value = None
+        self.cache.store(self.key, transport)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_discard_and_clear(self):
+        self.cache.discard(self.key)
+
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        self.cache.discard(self.key)
+        self.assertEqual(len(self.cache), 0)
+
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_info_callback_offers_stored_session(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        conn.set_session.assert_called_once_with(
+            unittest.mock.sentinel.session
+        )
+
+    def test_info_callback_uses_session_current_at_handshake(self):
+        info_callback = self._get_info_callback()
+
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        conn.set_session.assert_called_once_with(
+            unittest.mock.sentinel.session
+        )
+
+    def test_info_callback_ignores_other_events(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_DONE, 1)
+
+        conn.set_session.assert_not_called()
+
+    def test_info_callback_does_not_override_existing_session(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = unittest.mock.sentinel.other
+
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        conn.set_session.assert_not_called()
+
+    def test_info_callback_without_stored_session(self):
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        conn.set_session.assert_not_called()
+
+    def test_info_callback_discards_unusable_session(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session
+        ))
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+        conn.set_session.side_effect = OpenSSL.SSL.Error()
+
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_make_key_includes_trust_configuration(self):
+        metadata = unittest.mock.Mock()
+
+        key = self.cache.make_key(metadata, "domain", "host", 5222)
+
+        self.assertEqual(
+            key,
+            (
+                "domain", "host", 5222,
+                metadata.ssl_context_factory,
+                metadata.certificate_verifier_factory,
+            )
+        )
+
+        other = unittest.mock.Mock()
+        other.ssl_context_factory = metadata.ssl_context_factory
+        self.assertNotEqual(
+            self.cache.make_key(other, "domain", "host", 5222),
+            key,
+        )
+
+    def test_was_resumed_compares_master_key_of_offered_session(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session,
+            master_key=b"offered",
+        ))
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        transport = unittest.mock.Mock()
+        transport.get_extra_info.return_value = conn
+
+        conn.master_key.return_value = b"offered"
+        self.assertTrue(self.cache.was_resumed(transport))
+        conn.master_key.return_value = b"fresh"
+        self.assertFalse(self.cache.was_resumed(transport))
+
+        transport.get_extra_info.assert_called_with("ssl_object")
+
+    def test_was_resumed_without_offered_session(self):
+        transport = self._make_transport(master_key=b"master key")
+        self.assertFalse(self.cache.was_resumed(transport))
+
+    def test_was_resumed_without_master_key(self):
+        self.cache.store(self.key, self._make_transport(
+            unittest.mock.sentinel.session,
+        ))
+        info_callback = self._get_info_callback()
+
+        conn = unittest.mock.Mock()
+        conn.get_session.return_value = None
+        conn.master_key.side_effect = OpenSSL.SSL.Error()
+        info_callback(conn, OpenSSL.SSL.SSL_CB_HANDSHAKE_START, 1)
+
+        transport = unittest.mock.Mock()
+        transport.get_extra_info.return_value = conn
+        self.assertFalse(self.cache.was_resumed(transport))
+
+    def test_was_resumed_without_ssl_object(self):
+        transport = unittest.mock.Mock()
+        transport.get_extra_info.return_value = None
+        self.assertFalse(self.cache.was_resumed(transport))
+
+    def test_wrap_post_handshake_calls_verifier_for_full_handshake(self):
+        post_handshake = CoroutineMock()
+        wrapped = self.cache.wrap_post_handshake(post_handshake)
+
+        with unittest.mock.patch.object(self.cache, "was_resumed") as resumed:
+            resumed.return_value = False
+            run_coroutine(wrapped(unittest.mock.sentinel.transport))
+
+        resumed.assert_called_once_with(unittest.mock.sentinel.transport)
+        post_handshake.assert_called_once_with(
+            unittest.mock.sentinel.transport,
+        )
+
+    def test_wrap_post_handshake_skips_verifier_for_resumed_session(self):
+        post_handshake = CoroutineMock()
+        wrapped = self.cache.wrap_post_handshake(post_handshake)
+
+        with unittest.mock.patch.object(self.cache, "was_resumed") as resumed:
+            resumed.return_value = True
+            run_coroutine(wrapped(unittest.mock.sentinel.transport))
+
+        post_handshake.assert_not_called()
+
+    def _make_server_context(self, key, cert, session_id,
+                             max_proto_version):
+        ctx = OpenSSL.SSL.Context(OpenSSL.SSL.SSLv23_METHOD)
+        ctx.use_privatekey(key)
+        ctx.use_certificate(cert)
+        ctx.set_session_id(session_id)
+        if max_proto_version is not None:
+            ctx.set_max_proto_version(max_proto_version)
+        return ctx
+
+    def _resume_with_openssl(self, max_proto_version):
+        # exercise the cache against real in-memory handshakes
+        key = OpenSSL.crypto.PKey()
+        key.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
+        cert = OpenSSL.crypto.X509()
+        cert.get_subject().CN = "localhost"
+        cert.set_serial_number(1)
+        cert.gmtime_adj_notBefore(0)
+        cert.gmtime_adj_notAfter(3600)
+        cert.set_issuer(cert.get_subject())
+        cert.set_pubkey(key)
+        cert.sign(key, "sha256")
+
+        server_ctx = self._make_server_context(key, cert, b"aioxmpp-test",
+                                               max_proto_version)
+
+        def pump(src, dest):
+            try:
+                data = src.bio_read(65536)
+            except OpenSSL.SSL.WantReadError:
+                return False
+            dest.bio_write(data)
+            return True
+
+        def handshake(client_ctx, server_ctx):
+            server = OpenSSL.SSL.Connection(server_ctx, None)
+            server.set_accept_state()
+            client = OpenSSL.SSL.Connection(client_ctx, None)
+            client.set_connect_state()
+
+            for i in range(20):
+                for conn in (client, server):
+                    try:
+                        conn.do_handshake()
+                    except OpenSSL.SSL.WantReadError:
+                        pass
+                moved = pump(client, server)
+                moved = pump(server, client) or moved
+                if not moved:
+                    break
+
+            return client, server
+
+        def receive_tickets(client, server):
+            # like the stream features, session tickets are received only
+            # after the post handshake callback has run
+            pump(server, client)
+            try:
+                client.recv(1)
+            except OpenSSL.SSL.WantReadError:
+                pass
+
+        verify_calls = []
+
+        def make_client_ctx():
+            ctx = OpenSSL.SSL.Context(OpenSSL.SSL.SSLv23_METHOD)
+            ctx.set_verify(
+                OpenSSL.SSL.VERIFY_PEER,
+                lambda *args: verify_calls.append(args) or True,
+            )
+            self.cache.setup_context(ctx, self.key)
+            return ctx
+
+        def transport_for(client):
+            transport = unittest.mock.Mock()
+            transport.get_extra_info.return_value = client
+            return transport
+
+        client, server = handshake(make_client_ctx(), server_ctx)
+        self.assertFalse(self.cache.was_resumed(transport_for(client)))
+        self.assertTrue(verify_calls)
+        receive_tickets(client, server)
+        self.cache.store(self.key, transport_for(client))
+        self.assertEqual(len(self.cache), 1)
+
+        verify_calls.clear()
+        client, server = handshake(make_client_ctx(), server_ctx)
+        self.assertTrue(self.cache.was_resumed(transport_for(client)))
+        self.assertFalse(verify_calls)
+        receive_tickets(client, server)
+        self.cache.store(self.key, transport_for(client))
+
+        # a server which does not know the session declines resumption
+        other_server_ctx = self._make_server_context(
+            key, cert, b"aioxmpp-other", max_proto_version,
+        )
+        other_server_ctx.set_options(OpenSSL.SSL.OP_NO_TICKET)
+        other_server_ctx.set_session_cache_mode(
+            OpenSSL.SSL.SESS_CACHE_OFF
+        )
+        verify_calls.clear()
+        client, _ = handshake(make_client_ctx(), other_server_ctx)
+        self.assertFalse(self.cache.was_resumed(transport_for(client)))
+        self.assertTrue(verify_calls)
+
+    def test_resumes_tls12_session_with_openssl(self):
+        self._resume_with_openssl(OpenSSL.SSL.TLS1_2_VERSION)
+
+    def test_resumes_session_with_openssl(self):
+        self._resume_with_openssl(None)
+
+
+class TestSecurityLayer(unittest.TestCase):
+    def test_tls_session_cache_defaults_to_None(self):
+        sl = security_layer.SecurityLayer(
+            unittest.mock.sentinel.ssl_context_factory,
+            unittest.mock.sentinel.certificate_verifier_factory,
+            True,
+            (),
+        )
+        self.assertIsNone(sl.tls_session_cache)
+
+    def test_tls_session_cache(self):
+        sl = security_layer.SecurityLayer(
+            unittest.mock.sentinel.ssl_context_factory,
+            unittest.mock.sentinel.certificate_verifier_factory,
+            True,
+            (),
+            tls_session_cache=unittest.mock.sentinel.cache,
+        )
+        self.assertEqual(sl.tls_session_cache, unittest.mock.sentinel.cache)
+
+    def test_replace(self):
+        sl = security_layer.SecurityLayer(
+            unittest.mock.sentinel.ssl_context_factory,
+            unittest.mock.sentinel.certificate_verifier_factory,
+            True,
+            (),
+        )
+        sl = sl._replace(tls_session_cache=unittest.mock.sentinel.cache)
+        self.assertEqual(sl.tls_session_cache, unittest.mock.sentinel.cache)
+        self.assertEqual(sl.ssl_context_factory,
+                         unittest.mock.sentinel.ssl_context_factory)
+
+
 class TestSTARTTLSProvider(unittest.TestCase):
     def test_init(self):
         obj = security_layer.STARTTLSProvider(
@@ -2315,7 +2859,8 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             PKIXCertificateVerifier,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
         self.assertEqual(
@@ -2363,7 +2908,8 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             PKIXCertificateVerifier,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
         self.assertEqual(
@@ -2423,7 +2969,8 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             unittest.mock.ANY,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
         _, (_, factory, *_), _ = SecurityLayer.mock_calls[0]
@@ -2512,10 +3059,11 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             unittest.mock.ANY,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
-        _, (_, callable, _, _), _ = SecurityLayer.mock_calls[0]
+        _, (_, callable, _, _, _), _ = SecurityLayer.mock_calls[0]
 
         self.assertEqual(
             result,
@@ -2600,10 +3148,11 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             unittest.mock.ANY,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
-        _, (_, callable, _, _), _ = SecurityLayer.mock_calls[0]
+        _, (_, callable, _, _, _), _ = SecurityLayer.mock_calls[0]
 
         self.assertEqual(
             result,
@@ -2673,10 +3222,11 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             unittest.mock.ANY,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
-        _, (_, callable, _, _), _ = SecurityLayer.mock_calls[0]
+        _, (_, callable, _, _, _), _ = SecurityLayer.mock_calls[0]
 
         self.assertEqual(
             result,
@@ -2741,7 +3291,8 @@ class Testmake(unittest.TestCase):
             default_ssl_context,
             _NullVerifier,
             True,
-            (PasswordSASLProvider(),)
+            (PasswordSASLProvider(),),
+            None,
         )
 
         self.assertEqual(
@@ -2801,7 +3352,8 @@ class Testmake(unittest.TestCase):
             (
                 AnonymousSASLProvider(),
                 PasswordSASLProvider(),
-            )
+            ),
+            None,
         )
 
         self.assertEqual(
@@ -2858,7 +3410,8 @@ class Testmake(unittest.TestCase):
             True,
             (
                 AnonymousSASLProvider(),
-            )
+            ),
+            None,
         )
 
         self.assertEqual(
@@ -2915,7 +3468,8 @@ class Testmake(unittest.TestCase):
             True,
             (
                 AnonymousSASLProvider(),
-            )
+            ),
+            None,
         )
 
         self.assertEqual(
@@ -2963,3 +3517,14 @@ class Testmake(unittest.TestCase):
                     None,
                     anonymous="",
                 )
+
+    def test_tls_session_cache(self):
+        result = security_layer.make(
+            "foo",
+            tls_session_cache=unittest.mock.sentinel.cache,
+        )
+
+        self.assertEqual(
+            result.tls_session_cache,
+            unittest.mock.sentinel.cache,
+        )
@@ -23,6 +23,7 @@ import asyncio
 import contextlib
 import functools
 import ipaddress
+import json
 import time
 import unittest
 import warnings
@@ -2928,7 +2929,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(self.stream._send_immediately(pres))
 
         base.register_iq_response_future.assert_not_called()
-        base._enqueue.assert_called_with(unittest.mock.ANY)
+        base._enqueue.assert_called_with(unittest.mock.ANY,
+                                         on_state_change=None)
 
     def test_send_awaits_stanza_token_for_message(self):
         message = make_test_presence()
@@ -2953,7 +2955,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(self.stream._send_immediately(message))
 
         base.register_iq_response_future.assert_not_called()
-        base._enqueue.assert_called_with(unittest.mock.ANY)
+        base._enqueue.assert_called_with(unittest.mock.ANY,
+                                         on_state_change=None)
 
     def test_send_awaits_stanza_token_for_iq_response(self):
         iq = make_test_iq(type_=aioxmpp.IQType.RESULT)
@@ -2978,7 +2981,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(self.stream._send_immediately(iq))
 
         base.register_iq_response_future.assert_not_called()
-        base._enqueue.assert_called_with(unittest.mock.ANY)
+        base._enqueue.assert_called_with(unittest.mock.ANY,
+                                         on_state_change=None)
 
     def test_send_awaits_stanza_token_for_iq_and_registers_for_reply(self):
         iq = make_test_iq()
@@ -3006,7 +3010,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
             base.iq_response_map.add_listener.assert_called_once_with(
                 (iq.to, iq.id_),
                 unittest.mock.ANY,
@@ -3053,7 +3058,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
             base.iq_response_map.add_listener.assert_called_once_with(
                 (iq.to, iq.id_),
                 unittest.mock.ANY,
@@ -3106,7 +3112,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
             base.iq_response_map.add_listener.assert_called_once_with(
                 (iq.to, iq.id_),
                 unittest.mock.ANY,
@@ -3150,7 +3157,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
 
             stanza_fut.set_result(None)
 
@@ -3184,7 +3192,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
             base.iq_response_map.add_listener.assert_called_once_with(
                 (iq.to, iq.id_),
                 unittest.mock.ANY,
@@ -3229,7 +3238,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
             base.iq_response_map.add_listener.assert_called_once_with(
                 (iq.to, iq.id_),
                 unittest.mock.ANY,
@@ -3271,7 +3281,8 @@ class TestStanzaStream(StanzaStreamTestBase):
             run_coroutine(asyncio.sleep(0.01))
 
             self.assertFalse(task.done())
-            base._enqueue.assert_called_with(unittest.mock.ANY)
+            base._enqueue.assert_called_with(unittest.mock.ANY,
+                                             on_state_change=None)
             base.iq_response_map.add_listener.assert_called_once_with(
                 (iq.to, iq.id_),
                 unittest.mock.ANY,
@@ -4060,6 +4071,81 @@ class TestStanzaStreamSM(StanzaStreamTestBase):
             self.stream.sm_inbound_ctr
         )
 
+    def test_sm_start_does_not_count_stanzas_received_before_enabled(self):
+        iq = make_test_iq()
+        error_iq = iq.make_reply(type_=structs.IQType.ERROR)
+        error_iq.error = stanza.Error(
+            condition=(namespaces.stanzas, "service-unavailable")
+        )
+
+        self.stream.start(self.xmlstream)
+        run_coroutine_with_peer(
+            self.stream.start_sm(),
+            self.xmlstream.run_test([
+                XMLStreamMock.Send(
+                    nonza.SMEnable(resume=True),
+                    response=[
+                        # e.g. the reply to a pipelined request
+                        XMLStreamMock.Receive(iq),
+                        XMLStreamMock.Receive(
+                            nonza.SMEnabled(resume=True,
+                                            id_="barbaz")
+                        ),
+                    ]
+                ),
+            ])
+        )
+
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(error_iq),
+            XMLStreamMock.Send(nonza.SMRequest()),
+        ]))
+
+        self.assertTrue(self.stream.sm_enabled)
+        self.assertEqual(
+            0,
+            self.stream.sm_inbound_ctr
+        )
+
+    def test_sm_start_counts_stanzas_received_right_after_enabled(self):
+        iq = make_test_iq()
+        error_iq = iq.make_reply(type_=structs.IQType.ERROR)
+        error_iq.error = stanza.Error(
+            condition=(namespaces.stanzas, "service-unavailable")
+        )
+        msg = make_test_message()
+
+        self.stream.start(self.xmlstream)
+        run_coroutine_with_peer(
+            self.stream.start_sm(),
+            self.xmlstream.run_test([
+                XMLStreamMock.Send(
+                    nonza.SMEnable(resume=True),
+                    response=[
+                        XMLStreamMock.Receive(iq),
+                        XMLStreamMock.Receive(
+                            nonza.SMEnabled(resume=True,
+                                            id_="barbaz")
+                        ),
+                        # parsed from the same chunk, before start_sm
+                        # resumes
+                        XMLStreamMock.Receive(msg),
+                    ]
+                ),
+            ])
+        )
+
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(error_iq),
+            XMLStreamMock.Send(nonza.SMRequest()),
+        ]))
+
+        self.assertTrue(self.stream.sm_enabled)
+        self.assertEqual(
+            1,
+            self.stream.sm_inbound_ctr
+        )
+
     def test_sm_ack_requires_enabled_sm(self):
         with self.assertRaisesRegex(RuntimeError, "is not enabled"):
             self.stream.sm_ack(0)
@@ -4425,6 +4511,141 @@ class TestStanzaStreamSM(StanzaStreamTestBase):
             r"stream management disabled"
         )
 
+    def test_export_sm_state_requires_enabled_sm(self):
+        with self.assertRaisesRegex(RuntimeError, "not enabled"):
+            self.stream.export_sm_state_as_json()
+
+    def test_export_sm_state_requires_resumable_stream(self):
+        self.stream.start(self.xmlstream)
+        run_coroutine_with_peer(
+            self.stream.start_sm(request_resumption=False),
+            self.xmlstream.run_test([
+                XMLStreamMock.Send(
+                    nonza.SMEnable(resume=False),
+                    response=XMLStreamMock.Receive(
+                        nonza.SMEnabled(resume=False)
+                    )
+                )
+            ])
+        )
+
+        with self.assertRaisesRegex(RuntimeError, "not resumable"):
+            self.stream.export_sm_state_as_json()
+
+    def test_export_and_import_sm_state(self):
+        msgs = [make_test_message() for i in range(3)]
+        for i, msg in enumerate(msgs):
+            msg.id_ = "msg{}".format(i)
+
+        self.stream.start(self.xmlstream)
+        run_coroutine_with_peer(
+            self.stream.start_sm(),
+            self.xmlstream.run_test([
+                XMLStreamMock.Send(
+                    nonza.SMEnable(resume=True),
+                    response=XMLStreamMock.Receive(
+                        nonza.SMEnabled(resume=True,
+                                        id_="foobar",
+                                        location=("fe80::", 5222),
+                                        max_=600)
+                    )
+                )
+            ])
+        )
+
+        for msg in msgs:
+            self.stream._enqueue(msg)
+
+        run_coroutine(self.xmlstream.run_test([
+            XMLStreamMock.Send(msgs[0]),
+            XMLStreamMock.Send(msgs[1]),
+            XMLStreamMock.Send(msgs[2]),
+            XMLStreamMock.Send(
+                nonza.SMRequest(),
+                response=[
+                    XMLStreamMock.Receive(
+                        nonza.SMAcknowledgement(counter=1)
+                    ),
+                    XMLStreamMock.Receive(make_test_message()),
+                ]
+            )
+        ]))
+        run_coroutine(asyncio.sleep(0))
+
+        data = self.stream.export_sm_state_as_json()
+        self.assertEqual(data["id"], "foobar")
+        self.assertEqual(data["inbound_ctr"], 1)
+        self.assertEqual(data["outbound_base"], 1)
+        self.assertEqual(data["max"], 600)
+        self.assertEqual(data["location"], "[fe80::]:5222")
+        self.assertEqual(len(data["unacked"]), 2)
+
+        # must survive a round-trip through JSON
+        data = json.loads(json.dumps(data))
+
+        _, _, other = make_mocked_streams(self.loop)
+        tokens = other.import_sm_state_from_json(data)
+
+        self.assertTrue(other.sm_enabled)
+        self.assertTrue(other.sm_resumable)
+        self.assertEqual(other.sm_id, "foobar")
+        self.assertEqual(other.sm_inbound_ctr, 1)
+        self.assertEqual(other.sm_outbound_base, 1)
+        self.assertEqual(other.sm_max, 600)
+        self.assertEqual(other.sm_location,
+                         (ipaddress.IPv6Address("fe80::"), 5222))
+        self.assertEqual(len(tokens), 2)
+        for token in tokens:
+            self.assertEqual(token.state, stream.StanzaState.SENT)
+        self.assertSequenceEqual(
+            [token.stanza.id_ for token in tokens],
+            ["msg1", "msg2"],
+        )
+
+        xmlstream = XMLStreamMock(self, loop=self.loop)
+        run_coroutine_with_peer(
+            other.resume_sm(xmlstream),
+            xmlstream.run_test([
+                XMLStreamMock.Send(
+                    nonza.SMResume(previd="foobar", counter=1),
+                    response=XMLStreamMock.Receive(
+                        nonza.SMResumed(previd="foobar", counter=2)
+                    )
+                ),
+                XMLStreamMock.Send(tokens[1].stanza),
+                XMLStreamMock.Send(nonza.SMRequest()),
+            ])
+        )
+
+        self.assertEqual(tokens[0].state, stream.StanzaState.ACKED)
+
+        other.stop()
+        run_coroutine(asyncio.sleep(0))
+
+    def test_import_sm_state_rejects_enabled_sm(self):
+        self.stream.start(self.xmlstream)
+        run_coroutine_with_peer(
+            self.stream.start_sm(),
+            self.xmlstream.run_test(self.successful_sm)
+        )
+        data = self.stream.export_sm_state_as_json()
+
+        self.stream.stop()
+        run_coroutine(asyncio.sleep(0))
+
+        with self.assertRaisesRegex(RuntimeError, "already enabled"):
+            self.stream.import_sm_state_from_json(data)
+
+    def test_import_sm_state_rejects_running_stream(self):
+        self.stream.start(self.xmlstream)
+
+        with self.assertRaisesRegex(RuntimeError, "running"):
+            self.stream.import_sm_state_from_json({
+                "id": "foobar",
+                "inbound_ctr": 0,
+                "outbound_base": 0,
+            })
+
     def test_sm_resume_overflow(self):
         iqs = [make_test_iq() for i in range(4)]
 
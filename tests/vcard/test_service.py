@@ -20,7 +20,10 @@
 #
 ########################################################################
 
+import asyncio
+import hashlib
 import unittest
+import unittest.mock
 
 import aioxmpp
 import aioxmpp.service as service
@@ -139,3 +142,235 @@ class TestService(unittest.TestCase):
         self.assertEqual(arg.type_, aioxmpp.IQType.SET)
         self.assertEqual(arg.to, None)
         self.assertIs(arg.payload, vcard)
+
+
+class TestServiceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cc = make_connected_client()
+        self.cc.local_jid = TEST_JID2
+        self.s = vcard_service.VCardService(
+            self.cc,
+            dependencies={},
+        )
+        self.sent = []
+        self.cc.send = unittest.mock.Mock(side_effect=self._send)
+
+    def tearDown(self):
+        del self.cc
+        del self.s
+
+    @asyncio.coroutine
+    def _send(self, iq):
+        self.sent.append(iq)
+        yield from asyncio.sleep(0)
+        return vcard_xso.VCard()
+
+    def _vcard_with_photo(self, data):
+        vcard = vcard_xso.VCard()
+        vcard.set_photo_data("image/png", data)
+        return vcard
+
+    def test_stream_destroyed_is_depsignal_handler(self):
+        self.assertTrue(service.is_depsignal_handler(
+            aioxmpp.Client,
+            "on_stream_destroyed",
+            self.s._clear_cache,
+        ))
+
+    def test_cache_disabled_by_default(self):
+        self.assertEqual(self.s.cache_size, 0)
+        self.assertIsNone(self.s.cache_ttl)
+
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.assertEqual(len(self.sent), 2)
+
+    def test_deduplicates_concurrent_requests(self):
+        results = run_coroutine(asyncio.gather(
+            self.s.get_vcard(TEST_JID1),
+            self.s.get_vcard(TEST_JID1),
+        ))
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertIs(results[0], results[1])
+        self.assertFalse(self.s._pending)
+
+    def test_does_not_deduplicate_own_vcard(self):
+        results = run_coroutine(asyncio.gather(
+            self.s.get_vcard(),
+            self.s.get_vcard(),
+        ))
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertIsNot(results[0], results[1])
+
+    def test_deduplicated_requests_share_errors(self):
+        self.cc.send.side_effect = aioxmpp.XMPPCancelError(
+            (namespaces.stanzas, "fnord")
+        )
+
+        @asyncio.coroutine
+        def fetch():
+            with self.assertRaises(aioxmpp.XMPPCancelError):
+                yield from self.s.get_vcard(TEST_JID1)
+
+        run_coroutine(asyncio.gather(fetch(), fetch()))
+        self.assertEqual(len(self.cc.send.mock_calls), 1)
+        self.assertFalse(self.s._pending)
+
+    def test_cache(self):
+        self.s.cache_size = 10
+
+        first = run_coroutine(self.s.get_vcard(TEST_JID1))
+        second = run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertIs(first, second)
+
+        run_coroutine(self.s.get_vcard(TEST_JID1.replace(localpart="x")))
+        self.assertEqual(len(self.sent), 2)
+
+    def test_cache_does_not_store_own_vcard(self):
+        self.s.cache_size = 10
+
+        run_coroutine(self.s.get_vcard())
+        run_coroutine(self.s.get_vcard())
+
+        self.assertEqual(len(self.sent), 2)
+
+    def test_require_fresh_bypasses_and_updates_cache(self):
+        self.s.cache_size = 10
+
+        first = run_coroutine(self.s.get_vcard(TEST_JID1))
+        fresh = run_coroutine(self.s.get_vcard(TEST_JID1, require_fresh=True))
+        cached = run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertIsNot(first, fresh)
+        self.assertIs(fresh, cached)
+
+    def test_cache_stores_masked_errors(self):
+        self.s.cache_size = 10
+        self.cc.send.side_effect = aioxmpp.XMPPCancelError(
+            (namespaces.stanzas, "item-not-found")
+        )
+
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+        res = run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.assertEqual(len(self.cc.send.mock_calls), 1)
+        self.assertEqual(len(res.elements), 0)
+
+    def test_cache_does_not_store_errors(self):
+        self.s.cache_size = 10
+        self.cc.send.side_effect = aioxmpp.XMPPCancelError(
+            (namespaces.stanzas, "fnord")
+        )
+
+        for i in range(2):
+            with self.assertRaises(aioxmpp.XMPPCancelError):
+                run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.assertEqual(len(self.cc.send.mock_calls), 2)
+
+    def test_cache_size(self):
+        self.s.cache_size = 1
+        self.assertEqual(self.s.cache_size, 1)
+
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+        run_coroutine(self.s.get_vcard(TEST_JID1.replace(localpart="x")))
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.assertEqual(len(self.sent), 3)
+
+    def test_disabling_cache_clears_it(self):
+        self.s.cache_size = 10
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.s.cache_size = 0
+        self.assertEqual(self.s.cache_size, 0)
+        self.assertEqual(len(self.s._cache), 0)
+
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+        self.assertEqual(len(self.sent), 2)
+
+    def test_cache_size_rejects_negative(self):
+        with self.assertRaises(ValueError):
+            self.s.cache_size = -1
+
+    def test_cache_ttl(self):
+        self.s.cache_size = 10
+        self.s.cache_ttl = 60
+        self.assertEqual(self.s.cache_ttl, 60)
+
+        with unittest.mock.patch("time.monotonic") as monotonic:
+            monotonic.return_value = 1000
+            run_coroutine(self.s.get_vcard(TEST_JID1))
+            monotonic.return_value = 1059
+            run_coroutine(self.s.get_vcard(TEST_JID1))
+            self.assertEqual(len(self.sent), 1)
+
+            monotonic.return_value = 1061
+            run_coroutine(self.s.get_vcard(TEST_JID1))
+            self.assertEqual(len(self.sent), 2)
+
+    def test_invalidate_vcard(self):
+        self.s.cache_size = 10
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.s.invalidate_vcard(TEST_JID1)
+        self.s.invalidate_vcard(TEST_JID1)
+
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+        self.assertEqual(len(self.sent), 2)
+
+    def test_handle_photo_hash(self):
+        self.s.cache_size = 10
+        photo = b"\x89PNG"
+        vcard = self._vcard_with_photo(photo)
+        self.s._cache[TEST_JID1] = [vcard, None]
+        photo_hash = hashlib.sha1(photo).hexdigest()
+
+        self.s.handle_photo_hash(TEST_JID1, photo_hash.upper())
+        self.assertIn(TEST_JID1, self.s._cache)
+        self.assertEqual(self.s._cache[TEST_JID1][1], photo_hash)
+
+        with unittest.mock.patch.object(self.s, "_photo_hash") as hash_:
+            self.s.handle_photo_hash(TEST_JID1, photo_hash)
+            hash_.assert_not_called()
+
+        self.s.handle_photo_hash(TEST_JID1, "0" * 40)
+        self.assertNotIn(TEST_JID1, self.s._cache)
+
+    def test_handle_photo_hash_without_photo(self):
+        self.s.cache_size = 10
+        self.s._cache[TEST_JID1] = [vcard_xso.VCard(), None]
+
+        self.s.handle_photo_hash(TEST_JID1, "")
+        self.assertIn(TEST_JID1, self.s._cache)
+
+        self.s.handle_photo_hash(TEST_JID1, "1234")
+        self.assertNotIn(TEST_JID1, self.s._cache)
+
+    def test_handle_photo_hash_ignores_uncached(self):
+        self.s.handle_photo_hash(TEST_JID1, "1234")
+
+    def test_set_vcard_invalidates_own_bare_jid(self):
+        self.s.cache_size = 10
+        run_coroutine(self.s.get_vcard(TEST_JID2.bare()))
+
+        run_coroutine(self.s.set_vcard(vcard_xso.VCard()))
+
+        run_coroutine(self.s.get_vcard(TEST_JID2.bare()))
+        self.assertEqual(len(self.sent), 3)
+
+    def test_stream_destroyed_clears_cache(self):
+        self.s.cache_size = 10
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+
+        self.s._clear_cache()
+
+        run_coroutine(self.s.get_vcard(TEST_JID1))
+        self.assertEqual(len(self.sent), 2)